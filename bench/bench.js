@@ -0,0 +1,19 @@
+// ===== bench/bench — helpers shared by the benchmark pages =====
+
+// ---- Consortium under test ----
+// The manifest lists stop counts per snapshot; without it, count /paradas/.
+async function largestConsorcio() {
+  const manifest = await loadSnapshotManifest();
+  const entries = Object.entries(manifest?.snapshots || {});
+  if (entries.length) return entries.sort((a, b) => b[1].stops - a[1].stops)[0][0];
+
+  const { consorcios = [] } = await fetchJSON(`${API}/consorcios`);
+  const counts = await Promise.all(consorcios.map(c =>
+    fetchJSON(`${API}/${c.idConsorcio}/paradas/`).then(d => (d.paradas || []).length).catch(() => 0)));
+  return consorcios[counts.indexOf(Math.max(...counts))].idConsorcio;
+}
+
+function percentile(sorted, p) {
+  if (!sorted.length) return 0;
+  return sorted[Math.min(sorted.length - 1, Math.floor(p / 100 * sorted.length))];
+}
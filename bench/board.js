@@ -0,0 +1,285 @@
+// ===== bench/board — a big departure board: keyed list against the old patch =====
+// Builds a synthetic day of departures (?n=500) and plays the station board's
+// life through it twice: the sweep adding one hour's window at a time, the
+// 1 s minute-label tick, a prune of the buses gone, and near-term refreshes
+// that move cards mid-board to the end and back. Once on keyedlist.js, the way
+// station.js uses it (cached scheduled times and label nodes, minimal moves),
+// and once with the querySelectorAll / insertBefore patch the board used
+// before. Every step ends with a layout, so the times include it; moves are
+// cards moved or inserted. Both boards must end up in the same order.
+//
+// Results are shown in a table and left on window.benchResult for Playwright.
+
+const benchParams = new URLSearchParams(location.search);
+const benchStatus = document.getElementById('bench-status');
+const benchTable  = document.getElementById('bench-results');
+const keyedBoard  = document.getElementById('board-keyed');
+const legacyBoard = document.getElementById('board-legacy');
+
+const LINES = ['M-110', 'M-112', 'M-114', 'M-120', 'M-121', 'M-125', 'M-130', 'M-133',
+  'M-138', 'M-140', 'M-150', 'M-160'];
+const TICKS = 60;
+
+runBench().catch(e => {
+  benchStatus.textContent = `Benchmark failed: ${e.message}`;
+  window.benchResult = { error: e.message };
+});
+
+// ---- Departures ----
+// n departures from now to the end of the service day (at most 18 h), each
+// line|time once, in the order the API windows would hand them out.
+function syntheticDay(n, now) {
+  const span = 18 * 60;
+  const start = now.getHours() * 60 + now.getMinutes();
+  const services = [];
+  const seen = new Set();
+  for (let i = 0; services.length < n; i++) {
+    const mins = start + Math.floor(i * span / n) + (i % 3);
+    const linea = LINES[(i * 7) % LINES.length];
+    const servicio = `${String(Math.floor(mins / 60) % 24).padStart(2, '0')}:${String(mins % 60).padStart(2, '0')}`;
+    if (seen.has(`${linea}|${servicio}`)) continue;
+    seen.add(`${linea}|${servicio}`);
+    services.push({ idLinea: linea.slice(2), linea, servicio, destino: `Destino ${i % 17}`,
+      nombre: `Línea ${linea} · Málaga - Destino ${i % 17}`, _window: Math.floor((mins - start) / 60) });
+  }
+  return services;
+}
+
+function scheduledAt(servicio, now) {
+  const [hh, mm] = servicio.split(':').map(Number);
+  const t = new Date(now);
+  t.setHours(hh, mm, 0, 0);
+  if (t < now - 3600000) t.setDate(t.getDate() + 1);
+  return t;
+}
+
+function formatMins(mins) {
+  if (mins <= 0) return t('now');
+  if (mins < 60) return t('min', mins);
+  const h = Math.floor(mins / 60);
+  const m = mins % 60;
+  return m === 0 ? `${h}h` : `${h}h${m}min`;
+}
+
+function minsClass(mins) {
+  return mins <= 2 ? 'mins-now' : mins <= 10 ? 'mins-soon' : 'mins-later';
+}
+
+function makeCard(s, now) {
+  const card = document.createElement('div');
+  card.className = 'departure-card';
+  card.dataset.key = `${s.idLinea}|${s.servicio}`;
+  card.dataset.servicio = s.servicio;
+  const mins = Math.round((scheduledAt(s.servicio, now) - now) / 60000);
+  card.innerHTML = `
+    <div class="departure-line">${s.linea}</div>
+    <div class="departure-body">
+      <div class="departure-dest">${s.destino}</div>
+      <div class="departure-name">${s.nombre}</div>
+    </div>
+    <div class="departure-time-col">
+      <span class="departure-sched">${s.servicio}</span>
+      <span class="departure-mins ${minsClass(mins)}">${formatMins(mins)}</span>
+    </div>
+    <span class="departure-info-arrow">›</span>
+  `;
+  return card;
+}
+
+function enrich(services, now) {
+  return services
+    .map(s => ({ ...s, _scheduled: scheduledAt(s.servicio, now) }))
+    .filter(s => Math.round((s._scheduled - now) / 60000) >= -1)
+    .sort((a, b) => a._scheduled - b._scheduled);
+}
+
+// ---- Keyed board (station.js) ----
+function keyedRunner(board, counter) {
+  let at = null;   // the clock the rows are labelled for
+  const tickRow = row => {
+    const mins = Math.round((row.scheduled - at) / 60000);
+    const label = formatMins(mins);
+    if (label === row.label) return;
+    row.minsEl.textContent = row.label = label;
+    row.minsEl.className = `departure-mins ${minsClass(mins)}`;
+  };
+  const list = createKeyedList(board, {
+    key: s => `${s.idLinea}|${s.servicio}`,
+    create(s, row) {
+      const card = makeCard(s, at);
+      row.minsEl = card.querySelector('.departure-mins');
+      row.scheduled = s._scheduled.getTime();
+      row.label = row.minsEl.textContent;
+      return card;
+    },
+    update(row, s) {
+      row.scheduled = s._scheduled.getTime();
+      tickRow(row);
+    },
+  });
+  return {
+    patch(services, now) {
+      at = now;
+      const enriched = enrich(services, now);
+      const fresh = new Set(enriched.map(s => `${s.idLinea}|${s.servicio}`));
+      const kept = list.items().filter(s => !fresh.has(`${s.idLinea}|${s.servicio}`) &&
+        Math.round((s._scheduled - now) / 60000) >= -1);
+      list.set([...enriched, ...kept]);
+      list.flush();
+      counter.moves = list.stats.moved + list.stats.created;
+    },
+    tick(now) {
+      at = now;
+      list.rows().forEach(tickRow);
+    },
+    prune(now) {
+      at = now;
+      list.set(list.items().filter(s => Math.round((s._scheduled - now) / 60000) >= -1));
+      list.flush();
+      this.tick(now);
+      counter.moves = list.stats.moved + list.stats.created;
+    },
+  };
+}
+
+// ---- Legacy board (station.js before keyedlist.js) ----
+function legacyRunner(board, counter) {
+  const insertBefore = (node, ref) => { counter.moves++; board.insertBefore(node, ref); };
+  const tickCard = (card, now) => {
+    const mins = Math.round((scheduledAt(card.dataset.servicio, now) - now) / 60000);
+    const minsEl = card.querySelector('.departure-mins');
+    minsEl.textContent = formatMins(mins);
+    minsEl.className = `departure-mins ${minsClass(mins)}`;
+    return mins;
+  };
+  return {
+    patch(services, now) {
+      const enriched = enrich(services, now);
+      const existing = {};
+      board.querySelectorAll('.departure-card[data-key]').forEach(el => { existing[el.dataset.key] = el; });
+      const newKeys = new Set(enriched.map(s => `${s.idLinea}|${s.servicio}`));
+      Object.entries(existing).forEach(([key, el]) => {
+        if (!newKeys.has(key) && Math.round((scheduledAt(el.dataset.servicio, now) - now) / 60000) < -1) {
+          delete existing[key];
+        }
+      });
+      const desired = enriched.map(s => {
+        const card = existing[`${s.idLinea}|${s.servicio}`];
+        if (!card) return makeCard(s, now);
+        tickCard(card, now);
+        return card;
+      });
+      Object.entries(existing).forEach(([key, el]) => { if (!newKeys.has(key)) desired.push(el); });
+      board.querySelectorAll('.departure-card[data-key]').forEach(el => {
+        if (!existing[el.dataset.key]) el.remove();
+      });
+      desired.forEach((card, i) => {
+        const current = board.children[i];
+        if (current !== card) insertBefore(card, current || null);
+      });
+      while (board.children.length > desired.length) board.lastElementChild.remove();
+    },
+    tick(now) {
+      board.querySelectorAll('.departure-card[data-key]').forEach(card => tickCard(card, now));
+    },
+    prune(now) {
+      board.querySelectorAll('.departure-card[data-key]').forEach(card => {
+        if (tickCard(card, now) < -1) card.remove();
+      });
+    },
+  };
+}
+
+// ---- Run ----
+function timed(board, fn) {
+  const t0 = performance.now();
+  fn();
+  void board.offsetHeight;   // include style and layout
+  return performance.now() - t0;
+}
+
+function runBoard(board, makeRunner, services, now) {
+  const counter = { moves: 0 };
+  const runner = makeRunner(board, counter);
+  const round = v => Math.round(v * 1000) / 1000;
+
+  // The sweep: one window (hour) at a time, patching with everything so far
+  const windows = Math.max(...services.map(s => s._window)) + 1;
+  const patches = [];
+  for (let w = 0; w < windows; w++) {
+    const collected = services.filter(s => s._window <= w);
+    patches.push(timed(board, () => runner.patch(collected, now)));
+  }
+  const sweepMoves = counter.moves;
+
+  // Ticks a second apart, across a minute boundary
+  const ticks = [];
+  for (let i = 0; i < TICKS; i++) {
+    const at = new Date(now.getTime() + i * 1000);
+    ticks.push(timed(board, () => runner.tick(at)));
+  }
+
+  // Twenty minutes later: the buses gone are pruned, then the next hour is
+  // re-queried twice — once missing every third departure (the board keeps
+  // them, after the rest), once whole again
+  const later = new Date(now.getTime() + 20 * 60000);
+  const pruneMs = timed(board, () => runner.prune(later));
+  const nearTerm = services.filter((s, i) => s._window > 0 || i % 3);
+  const refreshMs = timed(board, () => runner.patch(nearTerm, later)) +
+    timed(board, () => runner.patch(services, later));
+
+  patches.sort((a, b) => a - b);
+  ticks.sort((a, b) => a - b);
+  return {
+    cards: board.children.length,
+    windows,
+    sweepMs: round(patches.reduce((a, b) => a + b, 0)),
+    patchP50Ms: round(percentile(patches, 50)),
+    patchMaxMs: round(patches[patches.length - 1]),
+    sweepMoves,
+    tickP50Ms: round(percentile(ticks, 50)),
+    tickMaxMs: round(ticks[ticks.length - 1]),
+    pruneMs: round(pruneMs),
+    refreshMs: round(refreshMs),
+    moves: counter.moves,
+  };
+}
+
+async function runBench() {
+  const n = Math.min(5000, Math.max(1, Number(benchParams.get('n')) || 500));
+  const now = new Date();
+  now.setSeconds(0, 0);
+  const services = syntheticDay(n, now);
+
+  benchStatus.textContent = `Playing ${n} departures through both boards…`;
+  await new Promise(requestAnimationFrame);
+  const runs = {
+    keyed:  runBoard(keyedBoard, keyedRunner, services, now),
+    legacy: runBoard(legacyBoard, legacyRunner, services, now),
+  };
+  const keys = board => [...board.children].map(el => el.dataset.key).join();
+
+  window.benchResult = { departures: n, runs, same: keys(keyedBoard) === keys(legacyBoard) };
+  renderResult(window.benchResult);
+}
+
+function renderResult(result) {
+  benchStatus.textContent = `Done — ${result.departures} departures, ${result.runs.keyed.windows} windows; ` +
+    `boards ${result.same ? 'match' : 'DIFFER'}.`;
+  const columns = ['board', ...Object.keys(result.runs.keyed)];
+  benchTable.innerHTML = '';
+  const head = benchTable.createTHead().insertRow();
+  columns.forEach(name => {
+    const th = document.createElement('th');
+    th.textContent = name;
+    head.appendChild(th);
+  });
+  const body = benchTable.createTBody();
+  Object.entries(result.runs).forEach(([board, run]) => {
+    const row = body.insertRow();
+    columns.forEach(col => { row.insertCell().textContent = col === 'board' ? board : run[col]; });
+  });
+  benchTable.classList.remove('hidden');
+  keyedBoard.classList.add('hidden');
+  legacyBoard.classList.add('hidden');
+}
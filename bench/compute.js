@@ -0,0 +1,183 @@
+// ===== bench/compute — transfer probes: compute worker against the page =====
+// Builds synthetic horarios_origen_destino responses for ?probes=40 transfer
+// candidates, both legs ?trips=300 trips × LEG_COLS columns, and streams them
+// through the journey planner's probe pipeline twice: once with the compute
+// operations run on the page (createComputeClient({ inline: true }) — parsing,
+// compiling and matching as journey.js did before compute.js), once through
+// the worker. Probes answer PROBE_BURST at a time, all in one task, every
+// BURST_GAP_MS — the way a batch of fetches lands together.
+//
+// Each run records the page's long tasks (PerformanceObserver 'longtask'; null
+// where the browser has no such entries), how late a HEARTBEAT_MS timer ran at
+// worst (a tap waiting for the main thread), and the time to the last
+// itinerary. Both runs must keep the same itineraries.
+//
+// Results are shown in a table and left on window.benchResult for Playwright.
+
+const benchParams = new URLSearchParams(location.search);
+const benchStatus = document.getElementById('bench-status');
+const benchTable  = document.getElementById('bench-results');
+
+const LEG_COLS     = 24;   // 8 origin, 8 destination and 8 more stops' columns
+const PROBE_BURST  = 8;
+const BURST_GAP_MS = 30;
+const HEARTBEAT_MS = 4;
+const BEST_LIMIT   = 5;    // journey.js JOURNEY_LIMIT
+
+runBench().catch(e => {
+  benchStatus.textContent = `Benchmark failed: ${e.message}`;
+  window.benchResult = { error: e.message };
+});
+
+// ---- Responses ----
+function syntheticLeg(seed, trips) {
+  const clock = mins => scheduleClock(mins % (24 * 60));
+  const horario = [];
+  for (let i = 0; i < trips; i++) {
+    const start = 5 * 60 + Math.floor(i * 17 * 60 / trips) + seed % 7;
+    horario.push({
+      codigo: `M-${100 + (seed + i) % 40}`,
+      idlinea: String(100 + (seed + i) % 40),
+      dias: i % 4 ? 'L-V' : 'S-D-F',
+      horas: Array.from({ length: LEG_COLS }, (_, c) => (c + i + seed) % 5 ? clock(start + c * 3) : '--'),
+    });
+  }
+  return JSON.stringify({
+    nucleos: [{ nombre: 'Líneas' }, { nombre: `Origen ${seed}`, colspan: 8 }, { nombre: `Destino ${seed}`, colspan: 8 }],
+    bloques: [{ nombre: 'Líneas' }, ...Array.from({ length: LEG_COLS }, (_, c) => ({ nombre: `Parada ${seed}.${c}` })),
+      { nombre: 'Frecuencia' }],
+    frecuencias: [{ acronimo: 'L-V', nombre: 'lunes a viernes' },
+      { acronimo: 'S-D-F', nombre: 'sábados, domingos y festivos' }],
+    horario,
+  });
+}
+
+// ---- Run ----
+// Best `limit` itineraries by (arrival, order), as journey.js's heap keeps them
+function bestList(limit) {
+  const items = [];
+  return {
+    push(item) {
+      items.push(item);
+      items.sort((a, b) => a.time - b.time || a.order - b.order);
+      if (items.length > limit) items.pop();
+    },
+    keys: () => items.map(({ legs }) => legs.map(leg => `${leg.codigo}@${leg.depStr}`).join('>')),
+  };
+}
+
+async function runProbes(client, legs, now, realNow) {
+  const round = v => Math.round(v * 10) / 10;
+  const longTasks = [];
+  const observed = PerformanceObserver.supportedEntryTypes?.includes('longtask');
+  const observer = observed ? new PerformanceObserver(list => longTasks.push(...list.getEntries())) : null;
+  observer?.observe({ type: 'longtask' });
+
+  let beat = performance.now();
+  let maxLate = 0;
+  let beating = true;
+  const heartbeat = () => {
+    const at = performance.now();
+    maxLate = Math.max(maxLate, at - beat - HEARTBEAT_MS);
+    beat = at;
+    if (beating) setTimeout(heartbeat, HEARTBEAT_MS);
+  };
+  setTimeout(heartbeat, HEARTBEAT_MS);
+
+  // Every probe of a burst resolves in the same timer task
+  const arrivals = legs.map(() => { let resolve; const p = new Promise(r => { resolve = r; }); return { p, resolve }; });
+  for (let b = 0; b * PROBE_BURST < legs.length; b++) {
+    setTimeout(() => arrivals.slice(b * PROBE_BURST, (b + 1) * PROBE_BURST).forEach(a => a.resolve()),
+      (b + 1) * BURST_GAP_MS);
+  }
+
+  const best = bestList(BEST_LIMIT);
+  const t0 = performance.now();
+  await Promise.all(legs.map(async ({ leg1, leg2 }, ci) => {
+    await arrivals[ci].p;
+    const found = await client.call('transfers',
+      { leg1: leg1.url, leg2: leg2.url, date: now.getTime(), realNow, minTransfer: 5, limit: BEST_LIMIT },
+      { texts: { [leg1.url]: leg1.text, [leg2.url]: leg2.text } });
+    const at = new Date(realNow);
+    const leg1Trips = computeTrips(found.leg1, now, at);
+    const leg2Trips = computeTrips(found.leg2, now, at);
+    found.k.forEach((k, p) => best.push({
+      legs: [leg1Trips[p], leg2Trips[p]],
+      time: (leg2Trips[p].arrTime || leg1Trips[p].depTime).getTime(),
+      order: ci + k / found.count,
+    }));
+  }));
+  const doneMs = performance.now() - t0;
+
+  // Let the last heartbeat and long task entries in
+  await new Promise(r => setTimeout(r, 50));
+  beating = false;
+  observer?.disconnect();
+  const durations = longTasks.map(e => e.duration);
+  return {
+    run: {
+      doneMs: round(doneMs),
+      longTasks: observed ? durations.length : null,
+      longTaskMs: observed ? round(durations.reduce((a, b) => a + b, 0)) : null,
+      maxTaskMs: observed ? round(Math.max(0, ...durations)) : null,
+      maxLateMs: round(maxLate),
+      textsSent: client.stats.textsSent,
+    },
+    keys: best.keys(),
+  };
+}
+
+async function runBench() {
+  const probes = Math.min(200, Math.max(1, Number(benchParams.get('probes')) || 40));
+  const trips = Math.min(5000, Math.max(1, Number(benchParams.get('trips')) || 300));
+
+  // The next Monday, from 06:00: weekday trips run and most are still to leave
+  const now = new Date();
+  now.setDate(now.getDate() + ((8 - now.getDay()) % 7 || 7));
+  now.setHours(6, 0, 0, 0);
+  const realNow = now.getTime();
+
+  benchStatus.textContent = `Building ${probes} probes of ${trips} trips…`;
+  const legs = Array.from({ length: probes }, (_, ci) => ({
+    leg1: { url: `bench:leg1/${ci}`, text: syntheticLeg(2 * ci, trips) },
+    leg2: { url: `bench:leg2/${ci}`, text: syntheticLeg(2 * ci + 1, trips) },
+  }));
+  const warmUp = { url: 'bench:warm', text: syntheticLeg(0, 1) };
+
+  const runs = {};
+  const keys = {};
+  for (const [mode, client] of [['worker', createComputeClient()], ['page', createComputeClient({ inline: true })]]) {
+    benchStatus.textContent = `Streaming ${probes} probes through the ${mode}…`;
+    await client.call('trips', { url: warmUp.url, date: now.getTime(), realNow }, { texts: { [warmUp.url]: warmUp.text } });
+    await new Promise(requestAnimationFrame);
+    const result = await runProbes(client, legs, now, realNow);
+    runs[mode] = { ...result.run, inline: client.inline };
+    keys[mode] = result.keys;
+  }
+
+  window.benchResult = {
+    probes, trips, runs,
+    itineraries: keys.worker.length,
+    same: keys.worker.join() === keys.page.join(),
+  };
+  renderResult(window.benchResult);
+}
+
+function renderResult(result) {
+  benchStatus.textContent = `Done — ${result.probes} probes of ${result.trips} trips, ` +
+    `${result.itineraries} itineraries; runs ${result.same ? 'match' : 'DIFFER'}.`;
+  const columns = ['compute', ...Object.keys(result.runs.worker)];
+  benchTable.innerHTML = '';
+  const head = benchTable.createTHead().insertRow();
+  columns.forEach(name => {
+    const th = document.createElement('th');
+    th.textContent = name;
+    head.appendChild(th);
+  });
+  const body = benchTable.createTBody();
+  Object.entries(result.runs).forEach(([mode, run]) => {
+    const row = body.insertRow();
+    columns.forEach(col => { row.insertCell().textContent = col === 'compute' ? mode : run[col]; });
+  });
+  benchTable.classList.remove('hidden');
+}
@@ -0,0 +1,119 @@
+// ===== bench/journey — time to first itinerary in journey.html =====
+// Loads journey.html in an iframe and runs the transfer search for a few
+// nucleo pairs with no direct service (?pairs=201-107,51-201, consortium ?c=),
+// timing how long the first itinerary takes to show up against how long the
+// whole search takes. The snapshot router is switched off so the per-nucleo
+// probes run; ?snapshot=1 keeps it. ?index=0 switches off the transfer index
+// too, so every nucleo is probed. Each pair starts with an empty API cache.
+//
+// Results are shown in a table and left on window.benchResult for Playwright.
+
+const benchParams = new URLSearchParams(location.search);
+const benchStatus = document.getElementById('bench-status');
+const benchTable  = document.getElementById('bench-results');
+const benchFrame  = document.getElementById('bench-frame');
+
+const DEFAULT_PAIRS = '201-107,51-201,120-107';
+
+runBench().catch(e => {
+  benchStatus.textContent = `Benchmark failed: ${e.message}`;
+  window.benchResult = { error: e.message };
+});
+
+function waitFor(check, timeout = 60000) {
+  const t0 = performance.now();
+  return new Promise((resolve, reject) => {
+    (function poll() {
+      const value = check();
+      if (value) return resolve(value);
+      if (performance.now() - t0 > timeout) return reject(new Error('journey.html never became ready'));
+      setTimeout(poll, 50);
+    })();
+  });
+}
+
+// ---- Run ----
+async function runBench() {
+  const c = String(benchParams.get('c') || '4');
+  const pairs = (benchParams.get('pairs') || DEFAULT_PAIRS).split(',').map(p => p.split('-'));
+  const useSnapshot = benchParams.get('snapshot') === '1';
+  const useIndex = benchParams.get('index') !== '0';
+
+  benchStatus.textContent = `Loading journey.html for consortium ${c}…`;
+  const loaded = new Promise(resolve => benchFrame.addEventListener('load', resolve, { once: true }));
+  benchFrame.src = '../journey.html';
+  await loaded;
+  const win = benchFrame.contentWindow;
+  await waitFor(() => benchFrame.contentDocument.querySelector('#journey-region-list .card'));
+
+  // journey.js keeps its state in script-scope bindings, reachable through eval
+  const { consorcios = [] } = await win.fetchJSON(`${API}/consorcios`);
+  const consorcio = consorcios.find(x => String(x.idConsorcio) === c);
+  if (!consorcio) throw new Error(`consortium ${c} not found`);
+  await win.selectRegion(consorcio);
+  const nucleos = await waitFor(() => win.eval('allNucleos.length && allNucleos'));
+  if (!useSnapshot) win.loadSnapshot = () => Promise.resolve(null);
+  if (!useIndex) win.indexedTransferPoints = () => Promise.resolve(null);
+  win.setDateMode('tomorrow');   // a full day of service whatever time the bench runs
+
+  const rows = [];
+  for (const [from, to] of pairs) {
+    const origin = nucleos.find(n => String(n.idNucleo) === from);
+    const dest = nucleos.find(n => String(n.idNucleo) === to);
+    if (!origin || !dest) throw new Error(`nucleo pair ${from}-${to} not found`);
+    benchStatus.textContent = `Searching ${origin.nombre} → ${dest.nombre}…`;
+
+    await win.eval(`(async () => {
+      await caches.delete(API_CACHE);
+      localStorage.removeItem(API_CACHE_INDEX);
+      apiIndex = null;
+      apiMemory.clear();
+    })()`);
+    win.eval(`selectedFrom = allNucleos.find(n => String(n.idNucleo) === '${from}');
+              selectedTo   = allNucleos.find(n => String(n.idNucleo) === '${to}');`);
+    await win.runSearch();
+
+    const timing = win.eval('lastSearchTiming');
+    rows.push({
+      pair: `${from}-${to}`,
+      firstMs: timing.firstMs === null ? null : Math.round(timing.firstMs),
+      doneMs: Math.round(timing.doneMs),
+      itineraries: win.document.querySelectorAll('#itinerary-list .journey-card').length,
+      probes: timing.probes,
+      settled: timing.settled,
+      cutOff: timing.cutOff,
+    });
+  }
+
+  const first = rows.map(r => r.firstMs).filter(v => v !== null).sort((a, b) => a - b);
+  const done = rows.map(r => r.doneMs).sort((a, b) => a - b);
+  window.benchResult = {
+    consorcio: c,
+    snapshot: useSnapshot,
+    index: useIndex,
+    pairs: rows,
+    firstP50Ms: percentile(first, 50),
+    doneP50Ms: percentile(done, 50),
+  };
+  renderResult(window.benchResult);
+}
+
+// One row per pair
+function renderResult(result) {
+  benchStatus.textContent = `Done — consortium ${result.consorcio}, time to first itinerary p50 ` +
+    `${result.firstP50Ms} ms, whole search p50 ${result.doneP50Ms} ms.`;
+  const columns = Object.keys(result.pairs[0] || {});
+  benchTable.innerHTML = '';
+  const head = benchTable.createTHead().insertRow();
+  columns.forEach(name => {
+    const th = document.createElement('th');
+    th.textContent = name;
+    head.appendChild(th);
+  });
+  const body = benchTable.createTBody();
+  result.pairs.forEach(r => {
+    const row = body.insertRow();
+    columns.forEach(col => { row.insertCell().textContent = r[col] ?? '—'; });
+  });
+  benchTable.classList.remove('hidden');
+}
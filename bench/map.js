@@ -0,0 +1,159 @@
+// ===== bench/map — pan/zoom frame times for map.html =====
+// Loads map.html in an iframe for the consortium with the most stops (or ?c=),
+// drives its Leaflet map through a fixed zoom/pan script and records every
+// animation frame while it runs — once per stop renderer (DOM markers and
+// ?renderer=canvas) so the two can be compared on the same stop data. Other
+// query parameters are passed through to map.html.
+//
+// Results are shown in a table and left on window.benchResult for Playwright.
+
+const benchParams = new URLSearchParams(location.search);
+const benchStatus = document.getElementById('bench-status');
+const benchTable  = document.getElementById('bench-results');
+const benchFrame  = document.getElementById('bench-frame');
+
+const LONG_FRAME_MS = 50;
+const PAN_STEPS = 8;
+
+runBench().catch(e => {
+  benchStatus.textContent = `Benchmark failed: ${e.message}`;
+  window.benchResult = { error: e.message };
+});
+
+// ---- Frame helpers ----
+const nextFrame = win => new Promise(resolve => win.requestAnimationFrame(resolve));
+
+async function settle(win) {
+  await nextFrame(win);
+  await nextFrame(win);
+}
+
+function waitFor(check, timeout = 60000) {
+  const t0 = performance.now();
+  return new Promise((resolve, reject) => {
+    (function poll() {
+      const value = check();
+      if (value) return resolve(value);
+      if (performance.now() - t0 > timeout) return reject(new Error('map.html never became ready'));
+      setTimeout(poll, 50);
+    })();
+  });
+}
+
+// ---- Run ----
+// Without ?renderer=, both stop renderers run back to back on the same data.
+async function runBench() {
+  const c = String(benchParams.get('c') || await largestConsorcio());
+  const renderers = benchParams.has('renderer') ? [benchParams.get('renderer')] : ['dom', 'canvas'];
+
+  const runs = {};
+  let stops = 0, steps = 0;
+  for (const renderer of renderers) {
+    const pass = new URLSearchParams(benchParams);
+    pass.set('c', c);
+    pass.set('renderer', renderer);
+    const run = await benchRun(pass);
+    stops = run.stops;
+    steps = run.steps;
+    runs[renderer] = run.metrics;
+  }
+
+  window.benchResult = { consorcio: c, stops, steps, runs };
+  renderResult(window.benchResult);
+}
+
+async function benchRun(pass) {
+  const c = pass.get('c');
+  benchStatus.textContent = `Loading map.html (${pass.get('renderer')}) for consortium ${c}…`;
+  const t0 = performance.now();
+  const loaded = new Promise(resolve => benchFrame.addEventListener('load', resolve, { once: true }));
+  benchFrame.src = `../map.html?${pass}`;
+  await loaded;
+  const win = benchFrame.contentWindow;
+  const doc = benchFrame.contentDocument;
+
+  // map.js keeps its state in script-scope bindings, reachable through eval
+  const region = await waitFor(() => {
+    const r = win.eval('regionStops');
+    return r && String(r.id) === c && doc.getElementById('map-loading').classList.contains('hidden') && r;
+  });
+  await settle(win);
+  const mapReady = performance.now() - t0;
+
+  const map = win.eval('leafletMap');
+  const center = map.getBounds().getCenter();
+  const fitZoom = map.getZoom();
+
+  // Zoom in from the region view, pan a ring at two zoom levels, zoom back out
+  const steps = [];
+  for (let z = fitZoom; z <= 16; z++) steps.push({ zoom: z, center });
+  [11, 14].forEach(z => {
+    const r = 180 / 2 ** z;   // about half a screen at this zoom
+    for (let k = 0; k < PAN_STEPS; k++) {
+      const a = 2 * Math.PI * k / PAN_STEPS;
+      steps.push({ zoom: z, center: [center.lat + r * Math.sin(a) / 2, center.lng + r * Math.cos(a)] });
+    }
+  });
+  for (let z = 16; z >= fitZoom; z--) steps.push({ zoom: z, center });
+
+  const frames = [];
+  let recording = true, last = null;
+  (function tick(ts) {
+    if (last !== null) frames.push(ts - last);
+    last = ts;
+    if (recording) win.requestAnimationFrame(tick);
+  })(null);
+
+  benchStatus.textContent = `Running ${steps.length} steps over ${region.stops.length} stops (${pass.get('renderer')})…`;
+  const settleTimes = [];
+  let maxMarkers = 0;
+  for (const step of steps) {
+    const s0 = performance.now();
+    map.setView(step.center, step.zoom, { animate: false });
+    await settle(win);
+    settleTimes.push(performance.now() - s0);
+    maxMarkers = Math.max(maxMarkers, doc.querySelectorAll('.leaflet-marker-icon').length);
+  }
+  recording = false;
+
+  const sortedFrames = [...frames].sort((a, b) => a - b);
+  const sortedSettle = [...settleTimes].sort((a, b) => a - b);
+  const round = v => Math.round(v * 10) / 10;
+  return {
+    stops: region.stops.length,
+    steps: steps.length,
+    metrics: {
+      mapReadyMs: round(mapReady),
+      frames: frames.length,
+      frameP50Ms: round(percentile(sortedFrames, 50)),
+      frameP95Ms: round(percentile(sortedFrames, 95)),
+      frameMaxMs: round(sortedFrames[sortedFrames.length - 1] || 0),
+      longFrames: frames.filter(f => f > LONG_FRAME_MS).length,
+      settleP50Ms: round(percentile(sortedSettle, 50)),
+      settleP95Ms: round(percentile(sortedSettle, 95)),
+      maxMarkers,
+    },
+  };
+}
+
+// One row per metric, one column per renderer
+function renderResult(result) {
+  benchStatus.textContent = `Done — consortium ${result.consorcio}, ${result.stops} stops, ${result.steps} steps.`;
+  const renderers = Object.keys(result.runs);
+  benchTable.innerHTML = '';
+  const head = benchTable.createTHead().insertRow();
+  ['', ...renderers].forEach(name => {
+    const th = document.createElement('th');
+    th.textContent = name;
+    head.appendChild(th);
+  });
+  const body = benchTable.createTBody();
+  Object.keys(result.runs[renderers[0]]).forEach(metric => {
+    const row = body.insertRow();
+    const th = document.createElement('th');
+    th.textContent = metric;
+    row.appendChild(th);
+    renderers.forEach(r => { row.insertCell().textContent = result.runs[r][metric]; });
+  });
+  benchTable.classList.remove('hidden');
+}
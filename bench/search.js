@@ -0,0 +1,108 @@
+// ===== bench/search — autocomplete latency for the stop search index =====
+// Loads the stop list of the consortium with the most stops (or ?c=), times
+// the search.js index build, its persisted round trip and a set of worst-case
+// queries — one-letter prefixes that match nearly everything, common
+// trigrams, long queries that match nothing — against the linear scan the
+// pages used before. ?scale=N repeats the stop list N times to stand in for a
+// bigger network. Every query also checks that both find the same stops.
+//
+// Results are shown in a table and left on window.benchResult for Playwright.
+
+const benchParams = new URLSearchParams(location.search);
+const benchStatus = document.getElementById('bench-status');
+const benchTable  = document.getElementById('bench-results');
+
+const WORST_QUERIES = ['a', 'e', 'de', 'la', 'mal', 'san', 'est', 'c/', 'avenida',
+  'calle de la', 'estacion de autobuses', 'zzz', 'hospital universitario virgen'];
+const QUERY_RUNS = 50;
+const SCAN_RUNS  = 5;
+const RESULT_LIMIT = 30;   // app.js shows 30 stops
+const STOP_FIELDS = [s => s.nombre, s => s.municipio, s => s.nucleo];
+
+runBench().catch(e => {
+  benchStatus.textContent = `Benchmark failed: ${e.message}`;
+  window.benchResult = { error: e.message };
+});
+
+// The per-keystroke filter app.js ran before the index; returns stop indices
+function normalizeScan(str) {
+  return str.toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
+}
+
+function linearScan(stops, query, limit) {
+  const q = normalizeScan(query.trim());
+  const out = [];
+  for (let i = 0; i < stops.length && out.length < limit; i++) {
+    if (STOP_FIELDS.some(f => f(stops[i]) && normalizeScan(f(stops[i])).includes(q))) out.push(i);
+  }
+  return out;
+}
+
+function timeRuns(runs, fn) {
+  const times = [];
+  for (let r = 0; r < runs; r++) {
+    const t0 = performance.now();
+    fn();
+    times.push(performance.now() - t0);
+  }
+  return times.sort((a, b) => a - b);
+}
+
+// ---- Run ----
+async function runBench() {
+  const c = String(benchParams.get('c') || await largestConsorcio());
+  const scale = Math.max(1, Number(benchParams.get('scale')) || 1);
+  benchStatus.textContent = `Loading stops for consortium ${c}…`;
+  const data = await snapshotOr(c, snap => ({ paradas: snap.stopList() }), `${API}/${c}/paradas/`);
+  const stops = Array.from({ length: scale }, () => data.paradas || []).flat();
+
+  benchStatus.textContent = `Indexing ${stops.length} stops…`;
+  const round = v => Math.round(v * 1000) / 1000;
+  const t0 = performance.now();
+  const index = buildSearchIndex(stops, STOP_FIELDS);
+  const buildMs = performance.now() - t0;
+  const stored = encodeSearchIndex(index, searchSignature(stops, STOP_FIELDS));
+  const [loadMs] = timeRuns(1, () => decodeSearchIndex(JSON.parse(stored)));
+
+  const queries = WORST_QUERIES.map(q => {
+    const hits = new Set(searchIndex(index, q, Infinity));
+    const scanned = linearScan(stops, q, Infinity);
+    const indexed = timeRuns(QUERY_RUNS, () => searchIndex(index, q, RESULT_LIMIT));
+    const scan = timeRuns(SCAN_RUNS, () => linearScan(stops, q, RESULT_LIMIT));
+    return {
+      query: q,
+      matches: hits.size,
+      same: hits.size === scanned.length && scanned.every(i => hits.has(i)),
+      indexP50Ms: round(percentile(indexed, 50)),
+      indexMaxMs: round(indexed[indexed.length - 1]),
+      scanP50Ms: round(percentile(scan, 50)),
+    };
+  });
+
+  window.benchResult = {
+    consorcio: c, stops: stops.length, scale,
+    buildMs: round(buildMs), storedBytes: stored.length, loadMs: round(loadMs),
+    queries,
+  };
+  renderResult(window.benchResult);
+}
+
+function renderResult(result) {
+  benchStatus.textContent = `Done — consortium ${result.consorcio}, ${result.stops} stops: ` +
+    `index built in ${result.buildMs} ms, ${Math.round(result.storedBytes / 1024)} KB stored, ` +
+    `reloaded in ${result.loadMs} ms.`;
+  const columns = Object.keys(result.queries[0]);
+  benchTable.innerHTML = '';
+  const head = benchTable.createTHead().insertRow();
+  columns.forEach(name => {
+    const th = document.createElement('th');
+    th.textContent = name;
+    head.appendChild(th);
+  });
+  const body = benchTable.createTBody();
+  result.queries.forEach(q => {
+    const row = body.insertRow();
+    columns.forEach(col => { row.insertCell().textContent = q[col]; });
+  });
+  benchTable.classList.remove('hidden');
+}
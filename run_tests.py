@@ -6,11 +6,32 @@ Runs all tests, or a specific suite by name.
 Usage:
     python3 run_tests.py              # run everything
     python3 run_tests.py api          # API contract tests only
+    python3 run_tests.py stub         # local API stub
+    python3 run_tests.py snapshot     # network snapshot builder
+    python3 run_tests.py raptor       # journey router
+    python3 run_tests.py schedule     # timetable compiler
+    python3 run_tests.py calendar     # service calendar + holidays
+    python3 run_tests.py departures   # departures aggregator
+    python3 run_tests.py freqindex    # line frequency index
+    python3 run_tests.py transferindex # transfer-candidate index
     python3 run_tests.py home         # home page UI tests
     python3 run_tests.py navigation   # stop selector + back-button chain
     python3 run_tests.py timetable    # live departures (station page)
     python3 run_tests.py planner      # route planner
     python3 run_tests.py map          # stop map
+    python3 run_tests.py search       # autocomplete search index
+    python3 run_tests.py scheduler    # request scheduler (api.js)
+    python3 run_tests.py journey      # streaming journey search
+    python3 run_tests.py nearby       # nearest-stop queries + stops near me
+    python3 run_tests.py polyline     # line shape simplification + encoding
+    python3 run_tests.py tiles        # offline map tile cache
+    python3 run_tests.py offline      # service worker API caching policy
+    python3 run_tests.py nextbus      # saved stops prefetch, next-bus tiles
+    python3 run_tests.py perf         # performance trace + Diagnostics panel
+    python3 run_tests.py keyedlist    # keyed list rendering + board benchmark
+    python3 run_tests.py ttgrid       # virtual timetable grid + parsed-grid cache
+    python3 run_tests.py compute      # compute worker RPC + long-task benchmark
+    python3 run_tests.py bench        # page benchmarks against bench/budgets.json
 
 First run auto-installs dependencies into a .venv.
 """
@@ -49,11 +70,32 @@ import pytest
 
 SUITES = {
     "api":        "tests/test_api.py",
+    "stub":       "tests/test_stub.py",
+    "snapshot":   "tests/test_snapshot.py",
+    "raptor":     "tests/test_raptor.py",
+    "schedule":   "tests/test_schedule.py",
+    "calendar":   "tests/test_calendar.py",
+    "departures": "tests/test_departures.py",
+    "freqindex":  "tests/test_freq_index.py",
+    "transferindex": "tests/test_transfer_index.py",
     "home":       "tests/test_home.py",
     "navigation": "tests/test_navigation.py",
     "timetable":  "tests/test_timetable.py",
     "planner":    "tests/test_planner.py",
     "map":        "tests/test_map.py",
+    "search":     "tests/test_search.py",
+    "scheduler":  "tests/test_scheduler.py",
+    "journey":    "tests/test_journey.py",
+    "nearby":     "tests/test_nearby.py",
+    "polyline":   "tests/test_polyline.py",
+    "tiles":      "tests/test_tiles.py",
+    "offline":    "tests/test_offline.py",
+    "nextbus":    "tests/test_nextbus.py",
+    "perf":       "tests/test_perf.py",
+    "keyedlist":  "tests/test_keyedlist.py",
+    "ttgrid":     "tests/test_ttgrid.py",
+    "compute":    "tests/test_compute.py",
+    "bench":      "tests/test_bench.py",
 }
 
 if __name__ == "__main__":
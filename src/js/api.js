@@ -0,0 +1,404 @@
+// ===== api — shared CTAN API base + fetch layer =====
+// Loaded right after i18n.js and perf.js on every page that talks to the API.
+//
+// The base URLs can be overridden with the `apiBase` / `dataBase` cookies so
+// pages can be pointed at the local replay server (tools/ctan_stub.py) in
+// tests and development. Passing ?apiBase=<url> once sets the cookie;
+// ?apiBase=live clears it again (same for dataBase and departuresBase).
+
+const API_LIVE  = 'https://api.ctan.es/v1/Consorcios';
+const DATA_LIVE = 'data';   // static snapshots built by tools/build_snapshot.py
+
+function baseOverride(name, fallback) {
+  const fromQuery = new URLSearchParams(location.search).get(name);
+  if (fromQuery === 'live') {
+    setCookie(name, '', -1);
+    return fallback;
+  }
+  if (fromQuery) {
+    setCookie(name, fromQuery);
+    return fromQuery.replace(/\/+$/, '');
+  }
+  const override = getCookie(name);
+  return override ? override.replace(/\/+$/, '') : fallback;
+}
+
+const API       = baseOverride('apiBase', API_LIVE);
+const DATA_BASE = baseOverride('dataBase', DATA_LIVE);
+// Optional full-day departures aggregator (tools/departures.py) for station.js
+const DEPARTURES_BASE = baseOverride('departuresBase', '');
+
+// ---- Shared fetch layer ----
+// Every page fetches through fetchJSON(). Identical requests in flight share
+// one promise, responses stay in memory for the life of the page, and the
+// ones that don't change by the minute also go to the Cache API so stops,
+// lines and nucleos survive across pages and sessions. Entries expire per
+// endpoint (API_TTLS); the persistent store is capped at API_CACHE_MAX_BYTES
+// and evicts least-recently-used entries first.
+//
+// sw.js keeps its own copy of API responses for when the network is gone.
+// Every response remembers when it was fetched and where it came from, so
+// pages can say how old what they show is (apiResponseInfo()). With tracing on (perf.js) each
+// call is a fetch span, tagged with where its answer came from.
+
+const API_CACHE           = 'ctan-api';        // kept by sw.js on activate
+const API_CACHE_INDEX     = 'apiCacheIndex';   // localStorage: url → [storedAt, lastUsed, bytes]
+const API_CACHE_MAX_BYTES = 8 * 1024 * 1024;
+const API_CACHE_MAX_ENTRY = 2 * 1024 * 1024;
+
+const MINUTE = 60 * 1000;
+// First match on the URL path wins. persist: false keeps live data in memory only.
+const API_TTLS = [
+  { match: /\/servicios\/?$/,         ttl: 20 * 1000, persist: false },
+  { match: /\/noticias\/?$/,          ttl: 10 * MINUTE },
+  { match: /\/horarios_/,             ttl: 6 * 60 * MINUTE },
+  { match: /\/freqs-[^/]+\.json$/,     ttl: 6 * 60 * MINUTE },   // data/ line frequency index
+  { match: /\/transfers-[^/]+\.json$/, ttl: 6 * 60 * MINUTE },   // data/ nucleo ↔ line transfer index
+  { match: /\/(consorcios|paradas|lineas|nucleos|frecuencias|municipios|zonas)\b/, ttl: 7 * 24 * 60 * MINUTE },
+];
+const API_TTL_DEFAULT = { ttl: 5 * MINUTE };
+// sw.js X-Cache header → apiResponseInfo() source
+const API_SOURCES = { fresh: 'cache', stale: 'stale', offline: 'offline' };
+
+const apiMemory   = new Map();   // url → apiEntry()
+const apiInflight = new Map();   // url → shared request (apiFlight)
+let   apiIndex    = null;
+let   apiIndexTimer = null;
+
+function apiPolicy(url) {
+  const path = url.split('?')[0];
+  return API_TTLS.find(p => p.match.test(path)) || API_TTL_DEFAULT;
+}
+
+/**
+ * GET a JSON API response.
+ *   fresh   skip cached copies (still shares an in-flight request)
+ *   lane    scheduler lane for the network request (see apiFetch)
+ *   signal  AbortSignal; rejects this call with an AbortError. The shared
+ *           request itself is only cancelled once every caller has aborted.
+ *   raw     resolve with the body text, unparsed — for responses handed to
+ *           the compute worker (compute.js), which parses them off the page
+ * Falls back to an expired persistent copy when the network fails.
+ */
+function fetchJSON(url, { fresh = false, lane = 'visible', signal, raw = false } = {}) {
+  const span = perfFetch(url);
+  const policy = apiPolicy(url);
+  const body = entry => raw ? entry.text : entry.data;
+  const mem = apiMemory.get(url);
+  if (!fresh && mem && Date.now() - mem.at < policy.ttl) {
+    span('memory');
+    return Promise.resolve(mem).then(body);
+  }
+
+  let flight = apiInflight.get(url);
+  if (!flight || flight.controller.signal.aborted) {
+    flight = apiFlight(url, policy, fresh);
+    apiInflight.set(url, flight);
+  }
+  const answer = apiJoin(flight, lane, signal).then(body);
+  if (span !== perfNoop) {
+    answer.then(() => span(apiMemory.get(url)?.source),
+                err => span(err.name === 'AbortError' ? 'aborted' : 'error'));
+  }
+  return answer;
+}
+
+// A response as the memory and persistent caches hold it. The body is parsed
+// the first time `data` is read, so callers that only want the text (raw)
+// never pay for JSON.parse on the page.
+function apiEntry(at, text, source) {
+  return {
+    at, text, source,
+    get data() {
+      const data = JSON.parse(this.text);
+      Object.defineProperty(this, 'data', { value: data });
+      return data;
+    },
+  };
+}
+
+// One network round trip shared by every fetchJSON() caller of `url`;
+// resolves with its apiEntry()
+function apiFlight(url, policy, fresh) {
+  const controller = new AbortController();
+  const flight = { controller, waiters: 0, job: { url, init: {}, lane: null, signal: controller.signal } };
+  flight.promise = (async () => {
+    const stored = policy.persist === false ? null : await apiCacheGet(url);
+    if (!fresh && stored && Date.now() - stored.at < policy.ttl) {
+      const entry = apiEntry(stored.at, stored.text, 'cache');
+      apiMemory.set(url, entry);
+      return entry;
+    }
+    try {
+      const res = await apiSubmit(flight.job);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const text = await res.text();
+      // Not parsed here (see apiEntry), but an HTML error page must not be kept
+      if (!/^\s*[[{]/.test(text)) throw new Error('Not a JSON response');
+      // Answers from the worker's cache keep the time they were fetched
+      const entry = apiEntry(+res.headers.get('X-Cached-At') || Date.now(), text,
+        API_SOURCES[res.headers.get('X-Cache')] || 'network');
+      apiMemory.set(url, entry);
+      if (policy.persist !== false) apiCachePut(url, text, entry.at);
+      return entry;
+    } catch (err) {
+      if (!stored || err.name === 'AbortError') throw err;
+      const entry = apiEntry(stored.at, stored.text, 'offline');
+      apiMemory.set(url, entry);
+      return entry;
+    }
+  })().finally(() => {
+    if (apiInflight.get(url) === flight) apiInflight.delete(url);
+  });
+  return flight;
+}
+
+/**
+ * How the last fetchJSON() answer for url was obtained: { at, source } with
+ * `at` the time it was fetched from the API and `source` one of
+ *   network  just fetched
+ *   cache    still within its TTL (page cache, or the worker's max-age)
+ *   stale    past the worker's max-age, refetching in the background
+ *   offline  the network failed and an older copy answered
+ * or null before the first answer.
+ */
+function apiResponseInfo(url) {
+  const mem = apiMemory.get(url);
+  return mem ? { at: mem.at, source: mem.source } : null;
+}
+
+// t(key, age) when the answer for url came from a cache because the network
+// failed or while it refetches — e.g. "Schedule from cache, 3 h old" — else ''
+function cachedNote(url, key) {
+  const info = apiResponseInfo(url);
+  if (info?.source !== 'offline' && info?.source !== 'stale') return '';
+  return t(key, t('age', Math.round((Date.now() - info.at) / MINUTE)));
+}
+
+function apiJoin(flight, lane, signal) {
+  apiPromote(flight.job, lane);
+  if (!signal) {
+    flight.waiters = Infinity;   // someone can't cancel, so the request always completes
+    return flight.promise;
+  }
+  if (signal.aborted) return Promise.reject(apiAbortError());
+  flight.waiters++;
+  return new Promise((resolve, reject) => {
+    const onAbort = () => {
+      reject(apiAbortError());
+      if (--flight.waiters === 0) flight.controller.abort();
+    };
+    signal.addEventListener('abort', onAbort, { once: true });
+    flight.promise.then(resolve, reject).finally(() => signal.removeEventListener('abort', onAbort));
+  });
+}
+
+// ---- Request scheduler ----
+// Every network request the pages make goes through one queue with a global
+// concurrency cap, so a journey search probing every town, a station board
+// sweeping the day and a prefetch can't open dozens of connections at once.
+// Lanes are served strictly in API_LANES order: what the user is looking at,
+// then background refreshes, then prefetches. Aborting a request's signal
+// drops it from the queue (or aborts it in flight); network errors, 429 and
+// 5xx are retried with jittered exponential backoff, ahead of the lane.
+
+const API_MAX_CONCURRENT = 4;
+const API_LANES = ['visible', 'background', 'prefetch'];   // highest priority first
+const API_RETRIES = 2;
+const API_RETRY_BASE_MS = 300;
+
+const apiQueues   = Object.fromEntries(API_LANES.map(lane => [lane, []]));
+const apiCounters = Object.fromEntries(API_LANES.map(lane => [lane, {
+  queued: 0, peakQueued: 0, active: 0, started: 0, done: 0, failed: 0, cancelled: 0, retries: 0,
+  waitMs: 0, fetchMs: 0,   // summed over started requests
+}]));
+let apiActive = 0;
+let apiPeakActive = 0;
+
+/**
+ * fetch() through the scheduler. Options are fetch()'s plus
+ *   lane    'visible' (default) | 'background' | 'prefetch'
+ * Resolves with the Response — including 4xx and, after the last retry, 5xx.
+ */
+function apiFetch(url, { lane = 'visible', signal, ...init } = {}) {
+  return apiSubmit({ url, init, lane, signal });
+}
+
+// Abort the previous token and hand out a fresh one — for work that a newer
+// request supersedes (a station board reload, a new journey search)
+function supersede(token) {
+  if (token) token.abort();
+  return new AbortController();
+}
+
+function apiAbortError() {
+  return new DOMException('Request cancelled', 'AbortError');
+}
+
+function apiSubmit(job) {
+  return new Promise((resolve, reject) => {
+    job.lane = API_LANES.includes(job.lane) ? job.lane : API_LANES[0];
+    job.resolve = resolve;
+    job.reject = reject;
+    job.attempt = 0;
+    if (job.signal?.aborted) {
+      apiCounters[job.lane].cancelled++;
+      return reject(apiAbortError());
+    }
+    job.signal?.addEventListener('abort', () => apiCancel(job), { once: true });
+    apiEnqueue(job);
+  });
+}
+
+// Move a job up to a higher-priority lane (never down)
+function apiPromote(job, lane) {
+  if (!API_LANES.includes(lane)) lane = API_LANES[0];
+  if (job.lane && API_LANES.indexOf(lane) >= API_LANES.indexOf(job.lane)) return;
+  const queue = job.lane && apiQueues[job.lane];
+  const i = queue ? queue.indexOf(job) : -1;
+  if (i >= 0) {
+    queue.splice(i, 1);
+    apiCounters[job.lane].queued--;
+    job.lane = lane;
+    apiEnqueue(job);
+  } else {
+    job.lane = lane;   // not queued yet, running or backing off
+  }
+}
+
+function apiEnqueue(job, front = false) {
+  const counters = apiCounters[job.lane];
+  job.queuedAt = performance.now();
+  if (front) apiQueues[job.lane].unshift(job);
+  else apiQueues[job.lane].push(job);
+  counters.queued++;
+  counters.peakQueued = Math.max(counters.peakQueued, counters.queued);
+  apiPump();
+}
+
+function apiCancel(job) {
+  const queue = apiQueues[job.lane];
+  const i = queue.indexOf(job);
+  if (i < 0 && !job.backoff) return;   // in flight: fetch() sees the signal itself
+  if (i >= 0) {
+    queue.splice(i, 1);
+    apiCounters[job.lane].queued--;
+  }
+  clearTimeout(job.backoff);
+  apiCounters[job.lane].cancelled++;
+  job.reject(apiAbortError());
+}
+
+function apiPump() {
+  while (apiActive < API_MAX_CONCURRENT) {
+    const lane = API_LANES.find(l => apiQueues[l].length);
+    if (!lane) return;
+    const job = apiQueues[lane].shift();
+    apiCounters[lane].queued--;
+    apiRun(job);
+  }
+}
+
+async function apiRun(job) {
+  const counters = apiCounters[job.lane];
+  const t0 = performance.now();
+  counters.started++;
+  counters.active++;
+  counters.waitMs += t0 - job.queuedAt;
+  apiPeakActive = Math.max(apiPeakActive, ++apiActive);
+
+  let res = null, error = null;
+  try { res = await fetch(job.url, { ...job.init, signal: job.signal }); } catch (e) { error = e; }
+
+  counters.active--;
+  counters.fetchMs += performance.now() - t0;
+  apiActive--;
+
+  const transient = error || res.status === 429 || res.status >= 500;
+  if (job.signal?.aborted) {
+    counters.cancelled++;
+    job.reject(apiAbortError());
+  } else if (transient && job.attempt < API_RETRIES) {
+    counters.retries++;
+    const delay = API_RETRY_BASE_MS * 2 ** job.attempt++ * (0.5 + Math.random());
+    job.backoff = setTimeout(() => { job.backoff = null; apiEnqueue(job, true); }, delay);
+  } else {
+    counters[transient ? 'failed' : 'done']++;
+    if (error) job.reject(error);
+    else job.resolve(res);
+  }
+  apiPump();
+}
+
+// Queue depth and latency per lane, for the bench pages and tests
+function apiSchedulerStats() {
+  const round = v => Math.round(v * 10) / 10;
+  return {
+    maxConcurrent: API_MAX_CONCURRENT, active: apiActive, peakActive: apiPeakActive,
+    lanes: Object.fromEntries(API_LANES.map(lane => {
+      const c = apiCounters[lane];
+      return [lane, {
+        ...c, waitMs: round(c.waitMs), fetchMs: round(c.fetchMs),
+        avgWaitMs: c.started ? round(c.waitMs / c.started) : 0,
+        avgFetchMs: c.started ? round(c.fetchMs / c.started) : 0,
+      }];
+    })),
+  };
+}
+
+// ---- Persistent store (Cache API + LRU index) ----
+function apiCacheIndex() {
+  if (!apiIndex) {
+    try { apiIndex = JSON.parse(localStorage.getItem(API_CACHE_INDEX) || '{}'); } catch { apiIndex = {}; }
+  }
+  return apiIndex;
+}
+
+function saveApiCacheIndex(now = false) {
+  clearTimeout(apiIndexTimer);
+  const write = () => {
+    try { localStorage.setItem(API_CACHE_INDEX, JSON.stringify(apiIndex)); } catch { /* quota */ }
+  };
+  if (now) write();
+  else apiIndexTimer = setTimeout(write, 500);
+}
+addEventListener('pagehide', () => { if (apiIndex) saveApiCacheIndex(true); });
+
+async function apiCacheGet(url) {
+  const meta = apiCacheIndex()[url];
+  if (!meta || !('caches' in window)) return null;
+  try {
+    const res = await (await caches.open(API_CACHE)).match(url);
+    if (!res) {
+      delete apiIndex[url];   // cache cleared behind our back
+      saveApiCacheIndex();
+      return null;
+    }
+    meta[1] = Date.now();
+    saveApiCacheIndex();
+    return apiEntry(meta[0], await res.text(), 'cache');
+  } catch { return null; }
+}
+
+async function apiCachePut(url, text, at) {
+  if (!('caches' in window) || text.length > API_CACHE_MAX_ENTRY) return;
+  try {
+    const cache = await caches.open(API_CACHE);
+    await cache.put(url, new Response(text, { headers: { 'Content-Type': 'application/json' } }));
+    const index = apiCacheIndex();
+    index[url] = [at, at, text.length];
+
+    let total = Object.values(index).reduce((n, m) => n + m[2], 0);
+    if (total > API_CACHE_MAX_BYTES) {
+      const lru = Object.keys(index).sort((a, b) => index[a][1] - index[b][1]);
+      for (const key of lru) {
+        if (total <= API_CACHE_MAX_BYTES) break;
+        if (key === url) continue;
+        total -= index[key][2];
+        delete index[key];
+        cache.delete(key);
+      }
+    }
+    saveApiCacheIndex();
+  } catch { /* storage unavailable — memory cache still works */ }
+}
@@ -1,5 +1,3 @@
-const API = 'https://api.ctan.es/v1/Consorcios';
-
 const CONSORTIUM_ICONS = {
   '1': '🌻', // Sevilla
   '2': '⚓', // Cádiz
@@ -64,7 +62,9 @@ function renderSavedStops() {
 // ---- State ----
 let currentConsorcio = null;
 let allStops = [];
+let stopSearchList = null;   // search.js index over allStops
 let searchTimeout = null;
+let nearStops = null;        // Promise of every region's stops and their grid
 
 // ---- Elements ----
 const stepConsortium = document.getElementById('step-consortium');
@@ -77,6 +77,8 @@ const backToConsortium = document.getElementById('back-to-consortium');
 const langToggle = document.getElementById('lang-toggle');
 const appTitle = document.getElementById('app-title');
 const labelChooseRegion = document.getElementById('label-choose-region');
+const nearMeBtn = document.getElementById('near-me-btn');
+const nearMeList = document.getElementById('near-me-list');
 
 // ---- Language toggle ----
 function applyLang() {
@@ -88,6 +90,7 @@ function applyLang() {
   labelChooseRegion.textContent = t('chooseRegion');
   backToConsortium.textContent = t('backBtn');
   stopSearch.placeholder = t('searchPlaceholder');
+  nearMeBtn.textContent = `📍 ${t('nearMe')}`;
   if (currentConsorcio) consortiumTitle.textContent = currentConsorcio.nombre;
   if (allStops.length) {
     renderStopResults();
@@ -182,6 +185,7 @@ async function selectConsortium(c) {
   currentConsorcio = c;
   consortiumTitle.textContent = c.nombre;
   allStops = [];
+  stopSearchList = null;
 
   showStep(stepStop);
   stopList.innerHTML = '<div class="loading-spinner"></div>';
@@ -189,8 +193,11 @@ async function selectConsortium(c) {
   stopSearch.focus();
 
   try {
-    const data = await fetchJSON(`${API}/${c.idConsorcio}/paradas/`);
+    const data = await snapshotOr(c.idConsorcio, snap => ({ paradas: snap.stopList() }),
+      `${API}/${c.idConsorcio}/paradas/`);
     allStops = data.paradas || [];
+    stopSearchList = createSearchList(`stops-${c.idConsorcio}`, allStops,
+      [s => s.nombre, s => s.municipio, s => s.nucleo]);
     stopList.innerHTML = `<p class="hint">${t('stopsHint', allStops.length)}</p>`;
   } catch (e) {
     stopList.innerHTML = `<p class="hint">${t('noStopsLoad')}</p>`;
@@ -203,24 +210,13 @@ stopSearch.addEventListener('input', () => {
   searchTimeout = setTimeout(renderStopResults, 180);
 });
 
-function normalize(str) {
-  return str.toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
-}
-
 function renderStopResults() {
-  const q = normalize(stopSearch.value.trim());
-  if (!q) {
+  if (!stopSearch.value.trim() || !stopSearchList) {
     stopList.innerHTML = `<p class="hint">${t('stopsHint', allStops.length)}</p>`;
     return;
   }
 
-  const matches = allStops
-    .filter(s =>
-      normalize(s.nombre).includes(q) ||
-      (s.municipio && normalize(s.municipio).includes(q)) ||
-      (s.nucleo && normalize(s.nucleo).includes(q))
-    )
-    .slice(0, 30);
+  const matches = stopSearchList.search(stopSearch.value, 30);
 
   if (!matches.length) {
     stopList.innerHTML = `<p class="hint">${t('noStops', stopSearch.value)}</p>`;
@@ -238,11 +234,95 @@ function renderStopResults() {
     stopList.appendChild(card);
   });
 }
+renderStopResults = perfWrap('render', renderStopResults);
 
 function goToStation(stop) {
   window.location.href = `station.html?c=${currentConsorcio.idConsorcio}&s=${stop.idParada}`;
 }
 
+// ---- Stops near me ----
+// Every region's stops go into one spatial.js grid, persisted under
+// 'stops-all', so finding the nearest is a k-nearest query over a few cells
+// rather than a distance to every stop in Andalusia.
+const NEAR_ME_COUNT = 10;
+const NEAR_ME_MAX_M = 2000;
+
+function loadNearStops() {
+  if (!nearStops) {
+    nearStops = (async () => {
+      const { consorcios } = await fetchJSON(`${API}/consorcios`);
+      const lists = await Promise.all(consorcios.map(c =>
+        snapshotOr(c.idConsorcio, snap => ({ paradas: snap.stopList() }), `${API}/${c.idConsorcio}/paradas/`)
+          .then(data => (data.paradas || []).map(stop => ({ stop, consorcio: c })), () => [])));
+      const stops = lists.flat().filter(({ stop }) => {
+        const lat = parseFloat(stop.latitud), lng = parseFloat(stop.longitud);
+        return !isNaN(lat) && !isNaN(lng) && lat !== 0 && lng !== 0;
+      });
+      const lat = Float64Array.from(stops, ({ stop }) => parseFloat(stop.latitud));
+      const lng = Float64Array.from(stops, ({ stop }) => parseFloat(stop.longitud));
+      return { stops, grid: await loadStopGrid('stops-all', lat, lng) };
+    })();
+    nearStops.catch(() => { nearStops = null; });
+  }
+  return nearStops;
+}
+
+// Resolves to [lat, lng], or null when location is unavailable or denied
+function currentPosition() {
+  return new Promise(resolve => {
+    if (!navigator.geolocation) return resolve(null);
+    navigator.geolocation.getCurrentPosition(
+      pos => resolve([pos.coords.latitude, pos.coords.longitude]),
+      () => resolve(null),
+      { enableHighAccuracy: true, timeout: 15000, maximumAge: 60000 });
+  });
+}
+
+async function showStopsNearMe() {
+  nearMeBtn.disabled = true;
+  nearMeList.innerHTML = `<p class="hint">${t('nearMeLocating')}</p>`;
+  const loading = loadNearStops();   // overlaps the location fix
+  try {
+    const where = await currentPosition();
+    if (!where) {
+      nearMeList.innerHTML = `<p class="hint">${t('nearMeDenied')}</p>`;
+      return;
+    }
+    const { stops, grid } = await loading;
+    renderNearStops(stops, gridNearest(grid, where[0], where[1], NEAR_ME_COUNT, NEAR_ME_MAX_M));
+  } catch {
+    nearMeList.innerHTML = `<p class="hint">${t('noStopsLoad')}</p>`;
+  } finally {
+    nearMeBtn.disabled = false;
+  }
+}
+
+function renderNearStops(stops, nearest) {
+  if (!nearest.length) {
+    nearMeList.innerHTML = `<p class="hint">${t('nearMeNone')}</p>`;
+    return;
+  }
+  nearMeList.innerHTML = '';
+  nearest.forEach(({ i, m }) => {
+    const { stop, consorcio } = stops[i];
+    const card = document.createElement('a');
+    card.className = 'card saved-stop-card near-me-card';
+    card.href = `station.html?c=${consorcio.idConsorcio}&s=${stop.idParada}&from=${encodeURIComponent('stops.html')}`;
+    card.innerHTML = `
+      <div class="card-icon">📍</div>
+      <div class="saved-stop-card-body">
+        <div class="saved-stop-card-name">${escHtml(stop.nombre)}</div>
+        <div class="saved-stop-card-meta">${escHtml([stop.nucleo || stop.municipio, consorcio.nombreCorto].filter(Boolean).join(' · '))}</div>
+      </div>
+      <span class="near-me-distance">${t('distance', m)}</span>
+      <span class="card-arrow">›</span>
+    `;
+    nearMeList.appendChild(card);
+  });
+}
+
+nearMeBtn.addEventListener('click', showStopsNearMe);
+
 // ---- Navigation ----
 backToConsortium.addEventListener('click', () => {
   showStep(stepConsortium);
@@ -273,12 +353,6 @@ function createCard({ icon, title, sub, onClick }) {
   return el;
 }
 
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;')
@@ -0,0 +1,90 @@
+// ===== calendar — service days with public holidays =====
+// A frecuencia's day mask (schedule.js) has one bit per weekday plus
+// DAY_HOLIDAY. Each date resolves to exactly one of those bits: its weekday,
+// or DAY_HOLIDAY when it is a national or Andalusian public holiday
+// (src/data/holidays.json). "Sábados, domingos y festivos" trips then run on
+// a Thursday holiday and "Lunes a viernes" trips don't.
+//
+// serviceYearBits(year, mask) expands a mask into a bitset over the days of
+// the year, built once per (year, mask) — a consortium only has a handful of
+// masks — so serviceRunsOn(mask, date) is a single bit test. Until
+// loadServiceCalendar() resolves, and for years the data file doesn't list,
+// every date counts as its weekday — so the pages' date pickers stop at
+// serviceCalendarLastDay(), the end of the last listed year.
+//
+// tools/service_calendar.py is the Python twin.
+
+const DAY_HOLIDAY = 1 << 7;
+const HOLIDAYS_URL = 'src/data/holidays.json';
+const DAY_MS = 24 * 60 * 60 * 1000;
+
+let holidayDates = new Set();           // 'YYYY-MM-DD'
+let holidayYears = [];                  // years the data file lists
+let serviceCalendarLoad = null;
+const serviceDayTypeCache = new Map();  // year → Uint8Array, day-type bit per day of year
+const serviceBitsCache = new Map();     // 'year:mask' → Uint32Array, bit d = runs on day d
+
+function loadServiceCalendar() {
+  if (!serviceCalendarLoad) {
+    serviceCalendarLoad = fetch(HOLIDAYS_URL)
+      .then(res => { if (!res.ok) throw new Error(`HTTP ${res.status}`); return res.json(); })
+      .then(data => {
+        holidayYears = Object.keys(data.years || {}).map(Number);
+        setHolidays(Object.values(data.years || {}).flat().map(h => h.date));
+      })
+      .catch(() => { serviceCalendarLoad = null; });   // weekdays only; retry next time
+  }
+  return serviceCalendarLoad;
+}
+
+function setHolidays(dates) {
+  holidayDates = new Set(dates);
+  serviceDayTypeCache.clear();
+  serviceBitsCache.clear();
+}
+
+// 'YYYY-12-31' of the last year with holiday data, or null before it loads
+function serviceCalendarLastDay() {
+  return holidayYears.length ? `${Math.max(...holidayYears)}-12-31` : null;
+}
+
+// Local calendar date → 0-based day of its year
+function serviceDayOfYear(date) {
+  const y = date.getFullYear();
+  return Math.round((Date.UTC(y, date.getMonth(), date.getDate()) - Date.UTC(y, 0, 1)) / DAY_MS);
+}
+
+function serviceDayTypes(year) {
+  let types = serviceDayTypeCache.get(year);
+  if (!types) {
+    types = new Uint8Array(Math.round((Date.UTC(year + 1, 0, 1) - Date.UTC(year, 0, 1)) / DAY_MS));
+    for (let d = 0; d < types.length; d++) {
+      const day = new Date(Date.UTC(year, 0, 1 + d));
+      types[d] = holidayDates.has(day.toISOString().slice(0, 10)) ? DAY_HOLIDAY : 1 << day.getUTCDay();
+    }
+    serviceDayTypeCache.set(year, types);
+  }
+  return types;
+}
+
+function serviceYearBits(year, mask) {
+  const key = `${year}:${mask}`;
+  let bits = serviceBitsCache.get(key);
+  if (!bits) {
+    const types = serviceDayTypes(year);
+    bits = new Uint32Array(Math.ceil(types.length / 32));
+    types.forEach((type, d) => { if (type & mask) bits[d >>> 5] |= 1 << (d & 31); });
+    serviceBitsCache.set(key, bits);
+  }
+  return bits;
+}
+
+function serviceRunsOn(mask, date) {
+  const d = serviceDayOfYear(date);
+  return (serviceYearBits(date.getFullYear(), mask)[d >>> 5] >>> (d & 31)) & 1;
+}
+
+// Day-type bit of a date: its weekday, or DAY_HOLIDAY
+function serviceDayType(date) {
+  return serviceDayTypes(date.getFullYear())[serviceDayOfYear(date)];
+}
@@ -0,0 +1,346 @@
+// ===== compute — timetable parsing and itinerary matching in a worker =====
+// The same file runs on both sides. In a page it is a small RPC client:
+// computeCall(op, args, { texts }) posts one operation to a dedicated worker
+// (this script again, loaded with new Worker()) and resolves with its answer.
+// In the worker it is the loop that answers: it parses the response texts,
+// compiles them (schedule.js), runs the operation and posts the result back
+// with its typed arrays transferred, not copied. The page only fetches and
+// renders — fetchJSON(url, { raw: true }) hands over the body unparsed — so
+// JSON.parse, compileSchedule() and the trip scans never hold up a tap or a
+// frame, however many probes answer at once.
+//
+// `texts` maps each URL the operation reads to its body. The client keeps
+// the last COMPUTE_MAX_RESPONSES it has sent and only posts a body the
+// worker doesn't already hold; the worker drops the ones the client evicts.
+// Holiday dates (calendar.js) follow whenever the page's set changes. Times
+// travel as epoch ms: `date` is the service day, `realNow` the page's clock.
+//
+// Operations (COMPUTE_OPS):
+//   trips       { url, date, realNow, allDay?, limit? } → TripList
+//               trips still to leave (up to 5 min gone) unless allDay
+//   transfers   { leg1, leg2, date, realNow, minTransfer, limit }
+//               → { count, k: Uint16, wait: Int16, leg1: TripList, leg2: TripList }
+//               one transfer probe: each leg1 trip with the first leg2 trip it
+//               can catch (matchLegs()), the `limit` earliest arrivals of the
+//               `count` pairs, by (arrival, k)
+//   plan        { url, date, realNow, today, limit }
+//               → { trips: TripList, results: Uint16, via: string[][] }
+//               the planner's day of trips, the positions of the result cards
+//               (still to leave when today) and the towns each passes through
+//   departures  { urls, board } → { dep: Int16 }
+//               sorted minutes at the stop named like `board` on the first
+//               horarios_lineas response with an outbound timetable
+//
+// A TripList is { row: Uint16, dep: Int16, arr: Int16, codigo, idlinea, dias }
+// — rows of the compiled table; computeTrips() turns it into trip objects.
+// Where Worker is missing or the script fails to load, the operations run on
+// the page instead, same answers. Needs calendar.js and schedule.js (and on
+// the page perf.js and api.js).
+
+const COMPUTE_MAX_RESPONSES = 200;   // response bodies the worker keeps, least recently used out first
+const COMPUTE_IN_WORKER = typeof document === 'undefined';
+const COMPUTE_WORKER_URL = COMPUTE_IN_WORKER ? null : document.currentScript?.src;
+
+if (COMPUTE_IN_WORKER) importScripts('calendar.js', 'schedule.js');
+
+// ---- Responses ----
+const computeResponses = new Map();   // url → { text, data }, parsed on first use
+
+function computeReceive({ texts, evict, holidays }) {
+  evict?.forEach(url => computeResponses.delete(url));
+  Object.entries(texts || {}).forEach(([url, text]) => computeResponses.set(url, { text, data: undefined }));
+  if (holidays) setHolidays(holidays);
+}
+
+function computeData(url) {
+  const entry = computeResponses.get(url);
+  if (!entry) throw new Error(`No response for ${url}`);
+  if (entry.data === undefined) {
+    entry.data = JSON.parse(entry.text);
+    entry.text = null;
+  }
+  return entry.data;
+}
+
+// As journey.js normalize(): lower case, accents off
+function computeFold(str) {
+  return String(str || '').toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
+}
+
+// ---- Trips ----
+/**
+ * Trips of a horarios_origen_destino response running on `now`'s day, by
+ * departure: { row, depStr, depTime, arrStr, arrTime, mins } (scheduleTrip()).
+ * Unless allDay, trips that left more than 5 min before realNow are skipped.
+ */
+function extractTrips(data, now, { allDay = false, realNow = new Date() } = {}) {
+  const table = compileSchedule(data);
+  const trips = [];
+  for (const i of scheduleTrips(table, now)) {
+    const trip = scheduleTrip({ row: i }, table.dep[i], table.arr[i], now, realNow);
+    if (allDay || trip.mins >= -5) trips.push(trip);
+  }
+  return trips;
+}
+
+/**
+ * Each leg1 trip with the first leg2 trip leaving at least minTransfer
+ * minutes after it reaches the transfer town (30 min after departure when
+ * the response has no arrival there): [{ leg1, leg2, waitMins }].
+ */
+function matchLegs(leg1Trips, leg2Trips, minTransfer) {
+  const pairs = [];
+  for (const leg1 of leg1Trips) {
+    const arrAtTransfer = leg1.arrTime || new Date(leg1.depTime.getTime() + 30 * 60000);
+    const earliestLeg2  = new Date(arrAtTransfer.getTime() + minTransfer * 60000);
+    const leg2 = leg2Trips.find(t => t.depTime >= earliestLeg2);
+    if (leg2) pairs.push({ leg1, leg2, waitMins: Math.round((leg2.depTime - arrAtTransfer) / 60000) });
+  }
+  return pairs;
+}
+
+function computeTripList(table, trips) {
+  const row = Uint16Array.from(trips, t => t.row);
+  return {
+    row,
+    dep: Int16Array.from(row, i => table.dep[i]),
+    arr: Int16Array.from(row, i => table.arr[i]),
+    codigo: Array.from(row, i => table.codigo[i]),
+    idlinea: Array.from(row, i => table.idlinea[i]),
+    dias: Array.from(row, i => table.dias[i]),
+  };
+}
+
+// A TripList back into trip objects: { codigo, idlinea, dias, row, depStr, depTime, arrStr, arrTime, mins }
+function computeTrips(list, now, realNow = new Date()) {
+  return Array.from(list.row, (row, k) => scheduleTrip(
+    { codigo: list.codigo[k], idlinea: list.idlinea[k], dias: list.dias[k], row },
+    list.dep[k], list.arr[k], now, realNow));
+}
+
+// ---- Operations ----
+const COMPUTE_OPS = {
+  trips({ url, date, realNow, allDay = false, limit = Infinity }) {
+    const data = computeData(url);
+    const trips = extractTrips(data, new Date(date), { allDay, realNow: new Date(realNow) });
+    return computeTripList(compileSchedule(data), trips.slice(0, limit));
+  },
+
+  transfers({ leg1, leg2, date, realNow, minTransfer, limit }) {
+    const now = new Date(date);
+    const at = new Date(realNow);
+    const data1 = computeData(leg1);
+    const data2 = computeData(leg2);
+    const pairs = matchLegs(extractTrips(data1, now, { realNow: at }),
+      extractTrips(data2, now, { allDay: true, realNow: at }), minTransfer);
+    // An itinerary's time is its arrival, or its departure without one (journey.js itineraryTime())
+    const time = ({ leg1, leg2 }) => (leg2.arrTime || leg1.depTime).getTime();
+    const best = pairs.map((pair, k) => ({ pair, k, time: time(pair) }))
+      .sort((a, b) => a.time - b.time || a.k - b.k)
+      .slice(0, limit);
+    return {
+      count: pairs.length,
+      k: Uint16Array.from(best, b => b.k),
+      wait: Int16Array.from(best, b => b.pair.waitMins),
+      leg1: computeTripList(compileSchedule(data1), best.map(b => b.pair.leg1)),
+      leg2: computeTripList(compileSchedule(data2), best.map(b => b.pair.leg2)),
+    };
+  },
+
+  plan({ url, date, realNow, today, limit }) {
+    const data = computeData(url);
+    const table = compileSchedule(data);
+    const trips = extractTrips(data, new Date(date), { allDay: true, realNow: new Date(realNow) });
+    const results = [];
+    trips.forEach((trip, p) => { if (results.length < limit && (!today || trip.mins > -5)) results.push(p); });
+
+    // bloques[0] is the "Líneas" header and the last one "Frecuencia"; the
+    // horas column c is named by bloques[c], i.e. stopNames[c - 1]
+    const stopNames = (data.bloques || []).slice(1, -1).map(b => String(b.nombre || '').trim());
+    const towns = [];
+    for (let c = 0; c < table.cols; c++) {
+      if (!table.origin.includes(c) && !table.dest.includes(c) && stopNames[c - 1]) towns.push(c);
+    }
+    const via = results.map(p => towns
+      .filter(c => table.times[trips[p].row * table.cols + c] >= 0)
+      .map(c => stopNames[c - 1]));
+    return { trips: computeTripList(table, trips), results: Uint16Array.from(results), via };
+  },
+
+  departures({ urls, board }) {
+    let planif = null;
+    for (const url of urls) {
+      try { planif = computeData(url).planificadores?.[0]; } catch { planif = null; }
+      if ((planif?.bloquesIda || []).length) break;
+      planif = null;
+    }
+    if (!planif) return { dep: new Int16Array(0) };
+
+    // The boarding stop's row: same name, else one name inside the other, else the first stop
+    const want = computeFold(board);
+    const stopIndices = [];
+    planif.bloquesIda.forEach((b, i) => { if (b.tipo !== '1') stopIndices.push(i); });
+    const names = stopIndices.map(i => computeFold(planif.bloquesIda[i].nombre));
+    let boardRow = names.indexOf(want);
+    if (boardRow < 0) boardRow = names.findIndex(n => n.includes(want) || want.includes(n));
+    const horasIdx = stopIndices[Math.max(0, boardRow)];
+
+    // The API already filters by idFrecuencia for the day, so every trip runs
+    const dep = [];
+    for (const trip of planif.horarioIda || []) {
+      const timeStr = trip.horas?.[horasIdx];
+      if (!timeStr || timeStr === '--') continue;
+      const [hh, mm] = timeStr.split(':').map(Number);
+      if (!isNaN(hh) && !isNaN(mm)) dep.push(hh * 60 + mm);
+    }
+    return { dep: Int16Array.from(dep.sort((a, b) => a - b)) };
+  },
+};
+
+// The buffers of every typed array in an answer, to transfer instead of copy
+function computeTransferables(value, out = new Set()) {
+  if (ArrayBuffer.isView(value)) out.add(value.buffer);
+  else if (value && typeof value === 'object') Object.values(value).forEach(v => computeTransferables(v, out));
+  return [...out];
+}
+
+// ---- Worker loop ----
+if (COMPUTE_IN_WORKER) {
+  onmessage = ({ data: msg }) => {
+    let result;
+    try {
+      computeReceive(msg);
+      result = COMPUTE_OPS[msg.op](msg.args);
+    } catch (err) {
+      postMessage({ id: msg.id, error: err.message });
+      return;
+    }
+    postMessage({ id: msg.id, result }, computeTransferables(result));
+  };
+}
+
+// ---- Page client ----
+/**
+ * A connection to a compute worker of its own, started on the first call (or
+ * warm()). With inline: true — or when the worker can't start — operations
+ * run on the page, in a microtask after the call.
+ *   call(op, args, { texts, signal })  → Promise of the answer; aborting the
+ *                                        signal rejects it with an AbortError
+ *   warm()                             start the worker now
+ *   stats                              { calls, inline, textsSent, bytesSent }
+ */
+function createComputeClient({ inline = false } = {}) {
+  let worker = null;
+  let nextId = 1;
+  let sentHolidays = null;
+  const pending = new Map();   // id → call, until its answer
+  const sent = new Map();      // url → text the other side holds, least recently used first
+  const stats = { calls: 0, inline: 0, textsSent: 0, bytesSent: 0 };
+
+  function settle(call, answer) {
+    if (call.signal) call.signal.removeEventListener('abort', call.onAbort);
+    if ('error' in answer) call.reject(new Error(answer.error));
+    else call.resolve(answer.result);
+  }
+
+  function start() {
+    if (worker || inline) return;
+    try {
+      if (typeof Worker !== 'function' || !COMPUTE_WORKER_URL) throw new Error('No workers');
+      worker = new Worker(COMPUTE_WORKER_URL);
+    } catch {
+      inline = true;
+      return;
+    }
+    worker.onmessage = ({ data }) => {
+      const call = pending.get(data.id);
+      pending.delete(data.id);
+      if (call) settle(call, data);
+    };
+    // Only a failed load gets here (the loop answers its own errors): go inline, resend everything
+    worker.onerror = e => {
+      e.preventDefault();
+      worker.terminate();
+      worker = null;
+      inline = true;
+      sent.clear();
+      const calls = [...pending.values()];
+      pending.clear();
+      calls.forEach(dispatch);
+    };
+  }
+
+  function dispatch(call) {
+    const msg = { id: call.id, op: call.op, args: call.args, texts: {}, evict: [] };
+    for (const [url, text] of Object.entries(call.texts)) {
+      const known = sent.get(url) === text;
+      sent.delete(url);
+      sent.set(url, text);
+      if (known) continue;
+      msg.texts[url] = text;
+      stats.textsSent++;
+      stats.bytesSent += text.length;
+    }
+    while (sent.size > COMPUTE_MAX_RESPONSES) {
+      const oldest = sent.keys().next().value;
+      sent.delete(oldest);
+      msg.evict.push(oldest);
+    }
+
+    if (inline) {
+      stats.inline++;
+      Promise.resolve().then(() => {
+        let answer;
+        try {
+          computeReceive(msg);
+          answer = { result: COMPUTE_OPS[msg.op](msg.args) };
+        } catch (err) {
+          answer = { error: err.message };
+        }
+        settle(call, answer);
+      });
+      return;
+    }
+    if (typeof holidayDates !== 'undefined' && holidayDates !== sentHolidays) {
+      sentHolidays = holidayDates;
+      msg.holidays = [...holidayDates];
+    }
+    pending.set(call.id, call);
+    worker.postMessage(msg);
+  }
+
+  function call(op, args, { texts = {}, signal } = {}) {
+    if (!COMPUTE_OPS[op]) return Promise.reject(new Error(`Unknown compute operation ${op}`));
+    if (signal?.aborted) return Promise.reject(apiAbortError());
+    start();
+    stats.calls++;
+    const end = perfStart('compute', op);
+    const answer = new Promise((resolve, reject) => {
+      const c = { id: nextId++, op, args, texts, signal, resolve, reject };
+      if (signal) {
+        // The worker still finishes the operation; its answer is dropped
+        c.onAbort = () => {
+          pending.delete(c.id);
+          reject(apiAbortError());
+        };
+        signal.addEventListener('abort', c.onAbort, { once: true });
+      }
+      dispatch(c);
+    });
+    answer.then(() => end(), err => end(err.name === 'AbortError' ? 'aborted' : 'error'));
+    return answer;
+  }
+
+  return {
+    call,
+    warm: start,
+    stats,
+    get inline() { return inline; },
+  };
+}
+
+const computeClient = COMPUTE_IN_WORKER ? null : createComputeClient();
+
+function computeCall(op, args, opts) {
+  return computeClient.call(op, args, opts);
+}
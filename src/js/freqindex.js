@@ -0,0 +1,23 @@
+// ===== freqindex — which frequencies each line runs on =====
+// data/freqs-<c>.json is built daily by tools/freq_index.py: for every line,
+// the frequencies horarios_lineas has a timetable under. Timetable pages read
+// it before painting instead of probing once per /frecuencias entry, and only
+// fall back to the probe when this returns null.
+
+const FREQ_INDEX_SCHEMA  = 1;
+const FREQ_INDEX_MAX_AGE = 2 * 24 * 60 * MINUTE;   // two missed daily builds
+
+// [{ idfrecuencia, acronimo, nombre }] for a line, or null when the index is
+// missing, stale, or doesn't list the line.
+async function indexedLineFreqs(consorcioId, idLinea) {
+  let index;
+  try {
+    index = await fetchJSON(`${DATA_BASE}/freqs-${consorcioId}.json`);
+  } catch {
+    return null;
+  }
+  if (index?.schema !== FREQ_INDEX_SCHEMA) return null;
+  if (!(Date.now() - Date.parse(index.built) < FREQ_INDEX_MAX_AGE)) return null;
+  const freqs = index.lineas?.[String(idLinea)];
+  return freqs?.length ? freqs : null;
+}
@@ -39,6 +39,7 @@ const HOME_STRINGS = {
     featMapDesc:            'Browse all stops on a map',
     savedStopsLabel:        'Saved Stops',
     featuresLabel:          'Features',
+    nextBus: (line, dest, when) => `${line} to ${dest} · ${when}`,
   },
   es: {
     appTitle: 'Rastreador de Autobús',
@@ -66,6 +67,7 @@ const HOME_STRINGS = {
     featMapDesc:            'Explora todas las paradas en el mapa',
     savedStopsLabel:        'Paradas Guardadas',
     featuresLabel:          'Funciones',
+    nextBus: (line, dest, when) => `${line} a ${dest} · ${when}`,
   },
 };
 
@@ -100,6 +102,7 @@ function applyLang() {
 langToggle.addEventListener('click', () => {
   setLang(getLang() === 'en' ? 'es' : 'en');
   applyLang();
+  showNextBuses();
 });
 
 applyTheme();
@@ -131,6 +134,7 @@ function renderSavedStops() {
       <div class="saved-stop-card-body">
         <div class="saved-stop-card-name">${escHtml(stop.nombre || stop.idParada)}</div>
         <div class="saved-stop-card-meta">${escHtml(stop.nucleo || stop.municipio || '')}</div>
+        <div class="saved-stop-card-next" data-stop="${escHtml(`${stop.idConsorcio}:${stop.idParada}`)}"></div>
       </div>
       <span class="card-arrow">›</span>
     `;
@@ -146,6 +150,45 @@ function escHtml(str) {
 
 renderSavedStops();
 
+// ---- Saved stops' next bus ----
+// Each saved stop shows its next departure from what nextbus.js fetched in
+// the background (or the worker's cached windows on a fresh visit). The
+// prefetch runs when the page is idle and again every NEXT_BUS_EVERY while
+// it stays in view; the budget and the 'prefetch' lane are nextbus.js's.
+const NEXT_BUS_EVERY = 2 * 60 * 1000;
+const nextBusServices = {};   // 'consorcio:stop' → services from the last prefetch
+
+async function showNextBuses() {
+  const s = HOME_STRINGS[getLang()] || HOME_STRINGS.en;
+  const now = new Date();
+  for (const el of document.querySelectorAll('.saved-stop-card-next')) {
+    const [c, stop] = el.dataset.stop.split(':');
+    const services = nextBusServices[el.dataset.stop] || (await warmDepartures(c, stop, now))?.services || [];
+    const [next] = upcomingDepartures(services, now);
+    el.textContent = next ? s.nextBus(next.linea, next.destino, next.mins ? t('min', next.mins) : t('now')) : '';
+  }
+}
+
+async function prefetchNextBuses() {
+  if (document.visibilityState !== 'visible' || !getSavedStops().length) return;
+  const report = await prefetchSavedStops(getSavedStops());
+  if (!report) return;
+  Object.assign(nextBusServices, report.services);
+  showNextBuses();
+}
+
+function whenIdle(fn) {
+  if ('requestIdleCallback' in window) requestIdleCallback(fn, { timeout: 5000 });
+  else setTimeout(fn, 1000);
+}
+
+showNextBuses();
+whenIdle(prefetchNextBuses);
+setInterval(() => whenIdle(prefetchNextBuses), NEXT_BUS_EVERY);
+// The first visit has no controlling worker to keep the windows until it claims the page
+navigator.serviceWorker?.addEventListener('controllerchange', () => whenIdle(prefetchNextBuses));
+if (getSavedStops().length) registerNextBusSync();
+
 // ---- PWA Install Banner ----
 let deferredInstallPrompt = null;
 
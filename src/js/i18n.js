@@ -25,12 +25,22 @@ const TRANSLATIONS = {
     zone: z => `Zone ${z}`,
     now: 'Now',
     min: m => m === 1 ? '1 min' : `${m} min`,
+    // data served from cache (sw.js / api.js)
+    age: mins => mins < 60 ? `${Math.max(1, mins)} min` : mins < 2880 ? `${Math.round(mins / 60)} h` : `${Math.round(mins / 1440)} days`,
+    cachedDepartures: age => `Offline · ${age} old`,
+    cachedSchedule: age => `Schedule from cache, ${age} old`,
     showOnMap: 'Show on map',
     // saved stops
     saveStop:        'Save stop',
     unsaveStop:      'Saved ★',
     savedStops:      'Saved Stops',
     savedStopsEmpty: 'No saved stops yet',
+    // stops near me
+    nearMe:          'Stops near me',
+    nearMeLocating:  'Finding stops near you…',
+    nearMeDenied:    'Location is unavailable — allow it to see nearby stops.',
+    nearMeNone:      'No stops within 2 km.',
+    distance:        m => m < 1000 ? `${Math.round(m / 10) * 10} m` : `${(m / 1000).toFixed(1)} km`,
     // route page
     routeStops: 'Stops on this route',
     direction: 'Direction',
@@ -68,12 +78,22 @@ const TRANSLATIONS = {
     zone: z => `Zona ${z}`,
     now: 'Ahora',
     min: m => m === 1 ? '1 min' : `${m} min`,
+    // data served from cache (sw.js / api.js)
+    age: mins => mins < 60 ? `${Math.max(1, mins)} min` : mins < 2880 ? `${Math.round(mins / 60)} h` : `${Math.round(mins / 1440)} días`,
+    cachedDepartures: age => `Sin conexión · hace ${age}`,
+    cachedSchedule: age => `Horario en caché, de hace ${age}`,
     showOnMap: 'Ver en el mapa',
     // saved stops
     saveStop:        'Guardar parada',
     unsaveStop:      'Guardada ★',
     savedStops:      'Paradas guardadas',
     savedStopsEmpty: 'No hay paradas guardadas',
+    // stops near me
+    nearMe:          'Paradas cercanas',
+    nearMeLocating:  'Buscando paradas cerca de ti…',
+    nearMeDenied:    'Ubicación no disponible — permítela para ver paradas cercanas.',
+    nearMeNone:      'No hay paradas a menos de 2 km.',
+    distance:        m => m < 1000 ? `${Math.round(m / 10) * 10} m` : `${(m / 1000).toFixed(1).replace('.', ',')} km`,
     // route page
     routeStops: 'Paradas de esta línea',
     direction: 'Dirección',
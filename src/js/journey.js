@@ -1,5 +1,3 @@
-const API = 'https://api.ctan.es/v1/Consorcios';
-
 const CONSORTIUM_ICONS = {
   '1': '🌻', '2': '⚓', '3': '🏛️', '4': '☀️',
   '5': '🪨', '6': '🎸', '7': '🫒', '8': '🕌', '9': '🌊',
@@ -13,6 +11,7 @@ const STRINGS = {
     labelTo:         'To',
     searchBtn:       'Search',
     searching:       'Searching for connections…',
+    searchingMore:   'Looking for more connections…',
     resultsLabel:    mode => mode === 'today' ? 'Journeys today' : mode === 'tomorrow' ? 'Journeys tomorrow' : 'Journeys on this date',
     noRoutes:        'No routes found',
     noRoutesHint:    'Try a different origin or destination',
@@ -26,15 +25,16 @@ const STRINGS = {
     dateTomorrow:    'Tomorrow',
     datePick:        'Pick date',
     direct:          'DIRECT',
-    leg1Label:       'Leg 1',
-    leg2Label:       'Leg 2',
+    legLabel:        n => `Leg ${n}`,
     transfer:        'Transfer at',
     transferWait:    mins => `~${mins} min wait`,
+    walkTo:          (to, mins) => `Walk ${mins} min to ${to}`,
     minsLabel:       m => m <= 0 ? 'Now' : m === 1 ? 'in 1 min' : `in ${m} min`,
     passesThrough:   'via',
     linesHeading:    'Lines serving this destination:',
     stepBoard:       'Board',
     stepTransfer:    'Transfer',
+    stepWalk:        'Walk',
     stepArrive:      'Arrive',
     stepWait:        mins => `~${mins} min wait`,
     viewOnMap:       '📍 View on map',
@@ -49,6 +49,7 @@ const STRINGS = {
     labelTo:         'Hasta',
     searchBtn:       'Buscar',
     searching:       'Buscando conexiones…',
+    searchingMore:   'Buscando más conexiones…',
     resultsLabel:    mode => mode === 'today' ? 'Viajes hoy' : mode === 'tomorrow' ? 'Viajes mañana' : 'Viajes en esta fecha',
     noRoutes:        'No se encontraron rutas',
     noRoutesHint:    'Prueba con otro origen o destino',
@@ -62,15 +63,16 @@ const STRINGS = {
     dateTomorrow:    'Mañana',
     datePick:        'Elegir fecha',
     direct:          'DIRECTO',
-    leg1Label:       'Tramo 1',
-    leg2Label:       'Tramo 2',
+    legLabel:        n => `Tramo ${n}`,
     transfer:        'Transbordo en',
     transferWait:    mins => `~${mins} min espera`,
+    walkTo:          (to, mins) => `${mins} min a pie hasta ${to}`,
     minsLabel:       m => m <= 0 ? 'Ahora' : m === 1 ? 'en 1 min' : `en ${m} min`,
     passesThrough:   'vía',
     linesHeading:    'Líneas que sirven este destino:',
     stepBoard:       'Embarcar',
     stepTransfer:    'Transbordo',
+    stepWalk:        'A pie',
     stepArrive:      'Llegada',
     stepWait:        mins => `~${mins} min espera`,
     viewOnMap:       '📍 Ver en el mapa',
@@ -129,6 +131,7 @@ const defaultRegionChip    = document.getElementById('default-region-chip');
 // ---- State ----
 let currentConsorcio  = null;
 let allNucleos        = [];
+let nucleoSearchList  = null;  // search.js index over allNucleos
 let selectedFrom      = null;  // nucleo object, or { nombre, idNucleo: null, isOutOfNetwork: true }
 let selectedTo        = null;
 let selectedDateMode  = 'today';
@@ -138,6 +141,10 @@ let selectedPickedDate = null;
 const lineParadasCache  = {};  // idLinea → paradas[]
 const nucleoLineasCache = {};  // idNucleo → lineas[]
 let   allConsorcioLines = null; // all lines in consortium (fetched once)
+let   raptorNet         = null; // routing network built from the region's snapshot
+let   searchToken       = null; // AbortController of the running search (supersede())
+let   sheetToken        = null; // … and of the open out-of-network sheet
+let   lastSearchTiming  = null; // time to first / final itinerary of the last search (bench/journey.js)
 
 // ---- Date helpers ----
 function getSearchDate() {
@@ -158,7 +165,9 @@ function setDateMode(mode) {
   datePickerInput.classList.toggle('hidden', mode !== 'pick');
 }
 
+// No past dates, nor any past the last year of holiday data (holidays there would count as weekdays)
 datePickerInput.min = new Date().toISOString().slice(0, 10);
+loadServiceCalendar().then(() => { datePickerInput.max = serviceCalendarLastDay() || ''; });
 dateBtnToday.addEventListener('click',    () => setDateMode('today'));
 dateBtnTomorrow.addEventListener('click', () => setDateMode('tomorrow'));
 dateBtnPick.addEventListener('click', () => {
@@ -166,6 +175,7 @@ dateBtnPick.addEventListener('click', () => {
   try { datePickerInput.showPicker(); } catch { datePickerInput.focus(); }
 });
 datePickerInput.addEventListener('change', () => {
+  if (datePickerInput.max && datePickerInput.value > datePickerInput.max) datePickerInput.value = datePickerInput.max;
   if (datePickerInput.value) {
     const [y, m, d] = datePickerInput.value.split('-').map(Number);
     selectedPickedDate = new Date(y, m - 1, d, 0, 0, 0, 0);
@@ -273,12 +283,15 @@ async function selectRegion(c) {
   Object.keys(lineParadasCache).forEach(k => delete lineParadasCache[k]);
   Object.keys(nucleoLineasCache).forEach(k => delete nucleoLineasCache[k]);
   allConsorcioLines = null;
+  raptorNet = null;
   updateSearchBtn();
   showStep(stepForm);
 
   try {
-    const data = await fetchJSON(`${API}/${c.idConsorcio}/nucleos`);
+    const data = await snapshotOr(c.idConsorcio, snap => ({ nucleos: snap.nucleoList() }),
+      `${API}/${c.idConsorcio}/nucleos`);
     allNucleos = data.nucleos || [];
+    nucleoSearch();
   } catch {
     // non-fatal
   }
@@ -289,6 +302,14 @@ function normalize(str) {
   return str.toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
 }
 
+// Index over allNucleos, rebuilt whenever the list is replaced
+function nucleoSearch() {
+  if (nucleoSearchList?.items !== allNucleos) {
+    nucleoSearchList = createSearchList(`nucleos-${currentConsorcio.idConsorcio}`, allNucleos, [n => n.nombre]);
+  }
+  return nucleoSearchList;
+}
+
 function setupSearch(input, resultsEl, onSelect) {
   input.addEventListener('input', () => {
     clearTimeout(input._timeout);
@@ -305,12 +326,9 @@ function setupSearch(input, resultsEl, onSelect) {
 }
 
 function renderDropdown(input, resultsEl, onSelect) {
-  const q = normalize(input.value.trim());
-  if (!q) { hideDropdown(input, resultsEl); return; }
+  if (!input.value.trim()) { hideDropdown(input, resultsEl); return; }
 
-  const matches = allNucleos
-    .filter(n => normalize(n.nombre).includes(q))
-    .slice(0, 10);
+  const matches = nucleoSearch().search(input.value, 10);
 
   resultsEl.innerHTML = '';
 
@@ -392,228 +410,328 @@ async function runSearch() {
   routeSummary.textContent = `${selectedFrom.nombre}  →  ${selectedTo.nombre}`;
   resultsLabel.textContent = s('resultsLabel', selectedDateMode);
 
+  // A new search cancels the probes of the previous one
+  searchToken = supersede(searchToken);
+  const token = searchToken;
   const now = getSearchDate();
+  const t0 = performance.now();
+  const timing = lastSearchTiming = { firstMs: null, doneMs: null, probes: 0, settled: 0, cutOff: false };
+  computeClient.warm();          // starts while the calendar and first responses load
+  await loadServiceCalendar();   // holidays, so day filtering is right for any date
 
   try {
     if (selectedTo.isOutOfNetwork) {
       await runOutOfNetworkSearch(selectedFrom, selectedTo.nombre);
     } else {
-      const itineraries = await findJourneys(selectedFrom, selectedTo, now);
+      // Transfer probes stream in: better itineraries replace the list as they arrive
+      const onUpdate = itineraries => {
+        if (token !== searchToken) return;
+        if (timing.firstMs === null) timing.firstMs = performance.now() - t0;
+        showLoading(false);
+        renderItineraries(itineraries, now, { pending: true });
+      };
+      const itineraries = await findJourneys(selectedFrom, selectedTo, now,
+        { signal: token.signal, onUpdate, timing });
+      if (token !== searchToken) return;
+      timing.doneMs = performance.now() - t0;
+      if (timing.firstMs === null && itineraries.length) timing.firstMs = timing.doneMs;
       showLoading(false);
       renderItineraries(itineraries, now);
     }
   } catch {
+    if (token !== searchToken) return;
     showLoading(false);
-    itineraryList.innerHTML = `<p class="hint">${s('noConn')}</p>`;
-  }
-}
-
-// ---- Helpers extracted from planner.js ----
-function parseNucleosIndices(data) {
-  const nucleos = data.nucleos || [];
-  let colOffset = 0, originIndices = [], destIndices = [];
-  for (let i = 0; i < nucleos.length; i++) {
-    const span = nucleos[i].colspan || 1;
-    if (i === 0) { continue; } // skip blank "Líneas" header column
-    const indices = Array.from({ length: span }, (_, k) => colOffset + k);
-    if (i === 1) originIndices = indices;
-    else if (i === 2) destIndices = indices;
-    colOffset += span;
+    clearItineraries(`<p class="hint">${s('noConn')}</p>`);
   }
-  if (!originIndices.length) originIndices = [0];
-  if (!destIndices.length)   destIndices   = [data.horario?.[0]?.horas?.length - 1 ?? 0];
-  return { originIndices, destIndices };
-}
-
-function buildFreqMap(frecuencias, isWeekday, isSat, isSun) {
-  const map = {};
-  frecuencias.forEach(f => {
-    const acr  = f.acronimo.trim();
-    const name = (f.nombre || '').toLowerCase();
-    let runs = false;
-    if      (name.includes('monday to friday') || name.includes('lunes a viernes'))  runs = isWeekday;
-    else if (name.includes('monday to saturday') || name.includes('lunes a sábado') || name.includes('lunes a sabado')) runs = isWeekday || isSat;
-    else if ((name.includes('saturday') && name.includes('sunday')) || (name.includes('sábado') && name.includes('domingo'))) runs = isSat || isSun;
-    else if (name.includes('saturday') || name.includes('sábado')) runs = isSat;
-    else if (name.includes('sunday')   || name.includes('domingo')) runs = isSun;
-    else runs = true;
-    map[acr] = runs;
-  });
-  return map;
 }
 
+// ---- Timetable trips (compute.js) ----
 /**
- * Extract trip objects from a horarios_origen_destino response.
- * Returns array of { codigo, idlinea, dias, depStr, depTime, arrStr, arrTime, mins }
- * sorted by depTime ascending.
- *
- * @param {object} data  - API response
- * @param {Date}   now   - reference date (used for depTime construction)
- * @param {object} opts
- * @param {boolean} opts.allDay - if true, include past trips (no -5 min cutoff)
+ * Trips of a horarios_origen_destino request still to leave (up to 5 min
+ * gone), as computeTrips() builds them. The response goes to the compute
+ * worker unparsed; only the first `limit` trips come back.
  */
-function extractTrips(data, now, { allDay = false } = {}) {
-  const horario = data.horario || [];
-  if (!horario.length) return [];
-
-  const dow = now.getDay();
-  const isWeekday = dow >= 1 && dow <= 5;
-  const isSat = dow === 6;
-  const isSun = dow === 0;
-
-  const freqMap = buildFreqMap(data.frecuencias || [], isWeekday, isSat, isSun);
-  const { originIndices, destIndices } = parseNucleosIndices(data);
-  const realNow = new Date();
-
-  return horario.map(trip => {
-    // Find first non-'--' departure time in origin columns
-    let depStr = null;
-    for (const idx of originIndices) {
-      const h = trip.horas?.[idx];
-      if (h && h !== '--') { depStr = h; break; }
-    }
-    if (!depStr) return null;
-
-    const [hh, mm] = depStr.split(':').map(Number);
-    if (isNaN(hh) || isNaN(mm)) return null;
-
-    const depTime = new Date(now.getFullYear(), now.getMonth(), now.getDate(), hh, mm, 0, 0);
-
-    // Find last non-'--' arrival time in destination columns
-    let arrStr = null;
-    for (const idx of [...destIndices].reverse()) {
-      const h = trip.horas?.[idx];
-      if (h && h !== '--') { arrStr = h; break; }
-    }
-
-    let arrTime = null;
-    if (arrStr) {
-      const [ah, am] = arrStr.split(':').map(Number);
-      if (!isNaN(ah) && !isNaN(am)) {
-        arrTime = new Date(now.getFullYear(), now.getMonth(), now.getDate(), ah, am, 0, 0);
-        // Handle overnight: if arrival is before departure, it's the next day
-        if (arrTime < depTime) arrTime.setDate(arrTime.getDate() + 1);
-      }
-    }
-
-    const dias = (trip.dias || '').trim();
-    const runsToday = dias in freqMap ? freqMap[dias] : true;
-    if (!runsToday) return null;
-
-    const mins = Math.round((depTime - realNow) / 60000);
-    if (!allDay && mins < -5) return null;
-
-    return { ...trip, depStr, depTime, arrStr, arrTime, mins };
-  }).filter(Boolean).sort((a, b) => a.depTime - b.depTime);
+async function fetchTrips(url, now, { signal, limit } = {}) {
+  const text = await fetchJSON(url, { signal, raw: true });
+  const realNow = Date.now();
+  const list = await computeCall('trips', { url, date: now.getTime(), realNow, limit },
+    { texts: { [url]: text }, signal });
+  return computeTrips(list, now, new Date(realNow));
 }
 
 // ---- Cache helpers ----
 async function getLineasForNucleo(cid, nucId) {
   if (nucleoLineasCache[nucId]) return nucleoLineasCache[nucId];
-  const data = await fetchJSON(`${API}/${cid}/nucleos/${nucId}/lineas`);
+  const data = await snapshotOr(cid, snap => snap.nucleoLines(nucId) && { lineas: snap.nucleoLines(nucId) },
+    `${API}/${cid}/nucleos/${nucId}/lineas`);
   return (nucleoLineasCache[nucId] = data.lineas || []);
 }
 
 async function getLineParadas(cid, lineId) {
   if (lineParadasCache[lineId]) return lineParadasCache[lineId];
-  const data = await fetchJSON(`${API}/${cid}/lineas/${lineId}/paradas`);
+  const data = await snapshotOr(cid, snap => snap.lineStops(lineId) && { paradas: snap.lineStops(lineId) },
+    `${API}/${cid}/lineas/${lineId}/paradas`);
   return (lineParadasCache[lineId] = data.paradas || []);
 }
 
 // ---- Main journey-finding algorithm ----
-const MIN_TRANSFER_MINS = 10;
+// Itineraries share one shape whichever path found them:
+//   { type: 'direct'|'transfer', legs: [trip + { to }], transfers: [{ nucleo, waitMins, walk? }],
+//     totalDeparture, totalArrival }
+// A transfer that walks to a nearby town (snapshot routing only) has
+// walk: { to, mins }; the next leg boards there and waitMins counts from
+// the end of the walk.
+// Each leg is a trip like computeTrips() returns; `to` is the nucleo it ends at.
+
+// Minimum connection time, set in Settings → Route Planner
+function minTransferMins() {
+  return Number(getCookie('plannerMinTransfer')) || RAPTOR_DEFAULTS.minTransfer;
+}
 
-async function findJourneys(origin, dest, now) {
+/**
+ * Itineraries from origin to dest, best first (at most JOURNEY_LIMIT).
+ *   signal    AbortSignal of the search
+ *   onUpdate  called with the current best list whenever a transfer probe
+ *             improves it, at most once per frame, before the final result
+ *   timing    filled with probe counts (lastSearchTiming)
+ *   deadline  ms after which stragglers are cut off, once something is found
+ */
+async function findJourneys(origin, dest, now,
+  { signal, onUpdate, timing = {}, deadline = JOURNEY_DEADLINE_MS } = {}) {
   const cid = currentConsorcio.idConsorcio;
 
+  // Route on the snapshot when there is one — one local query instead of two
+  // API calls per nucleo, and it finds 2-transfer trips too. When it finds
+  // nothing (an old snapshot, or one missing a line) the API gets a say.
+  const snap = await loadSnapshot(cid);
+  if (snap) {
+    const itineraries = routeOnSnapshot(snap, origin, dest, now);
+    if (itineraries?.length) return itineraries;
+  }
+
+  // Transfer points from the offline index, fetched while phase 1 runs
+  const pointsLoad = indexedTransferPoints(cid, origin.idNucleo, dest.idNucleo);
+
   // Phase 1: try direct connection
-  const directData = await fetchJSON(
+  const directTrips = await fetchTrips(
     `${API}/${cid}/horarios_origen_destino` +
-    `?idNucleoOrigen=${origin.idNucleo}&idNucleoDestino=${dest.idNucleo}`
+    `?idNucleoOrigen=${origin.idNucleo}&idNucleoDestino=${dest.idNucleo}`,
+    now, { signal, limit: JOURNEY_LIMIT }
   );
-  const directTrips = extractTrips(directData, now);
 
   if (directTrips.length) {
-    return directTrips.slice(0, 5).map(t => ({
+    return directTrips.map(t => ({
       type: 'direct',
-      leg1: t,
+      legs: [{ ...t, to: dest }],
+      transfers: [],
       totalDeparture: t.depTime,
       totalArrival:   t.arrTime,
     }));
   }
 
   // Phase 2: find 1-transfer itineraries
-  // Probe all nuclei to find which are reachable from origin AND connect to dest.
-  // The paradas API uses different idNucleo values than the nucleos list, so we
-  // must use horarios_origen_destino directly to discover reachable candidates.
+  // Probe the nuclei sharing a line with both ends (transferindex.js), or all
+  // of them without the index. The paradas API uses different idNucleo values
+  // than the nucleos list, so reachability can't be read off the stops here.
+  const points = await pointsLoad;
+  timing.indexed = !!points;
   const candidates = allNucleos.filter(
     n => String(n.idNucleo) !== String(origin.idNucleo) &&
-         String(n.idNucleo) !== String(dest.idNucleo)
+         String(n.idNucleo) !== String(dest.idNucleo) &&
+         (!points || points.has(String(n.idNucleo)))
   );
+  return streamTransfers(cid, origin, dest, candidates, now, { signal, onUpdate, timing, deadline });
+}
 
-  // 2a. Probe origin → each candidate AND candidate → dest in parallel
-  const probeResults = await Promise.all(
-    candidates.map(async candidate => {
-      const nucId = String(candidate.idNucleo);
-      try {
-        const [leg1Data, leg2Data] = await Promise.all([
-          fetchJSON(`${API}/${cid}/horarios_origen_destino?idNucleoOrigen=${origin.idNucleo}&idNucleoDestino=${nucId}`),
-          fetchJSON(`${API}/${cid}/horarios_origen_destino?idNucleoOrigen=${nucId}&idNucleoDestino=${dest.idNucleo}`),
-        ]);
-        const leg1Trips = extractTrips(leg1Data, now);
-        const leg2Trips = extractTrips(leg2Data, now, { allDay: true });
-        if (!leg1Trips.length || !leg2Trips.length) return null;
-        return { candidate, leg1Trips, leg2Trips };
-      } catch { return null; }
-    })
-  );
+// ---- Streaming transfer search ----
+// Each candidate's pair of probes (origin → candidate, candidate → dest) is
+// matched by the compute worker as soon as both arrive, into a bounded heap
+// of the best itineraries, so one slow nucleo no longer holds up the list.
+// The request scheduler (api.js) caps how many probes are on the wire. Once
+// the deadline has passed and something has been found, stragglers are
+// cancelled.
+const JOURNEY_LIMIT = 5;
+const JOURNEY_DEADLINE_MS = 8000;
+
+async function streamTransfers(cid, origin, dest, candidates, now, { signal, onUpdate, timing, deadline }) {
+  const best = createItineraryHeap(JOURNEY_LIMIT);
+  const probes = new AbortController();   // aborted by the search's signal or the deadline
+  const stop = () => probes.abort();
+  signal?.addEventListener('abort', stop, { once: true });
+  timing.probes = candidates.length;
+  let settled = 0;
+
+  let frame = 0;
+  const publish = () => {
+    frame = 0;
+    if (!probes.signal.aborted) onUpdate?.(best.sorted());
+  };
+
+  const probe = async (candidate, ci) => {
+    const nucId = String(candidate.idNucleo);
+    const leg1 = `${API}/${cid}/horarios_origen_destino?idNucleoOrigen=${origin.idNucleo}&idNucleoDestino=${nucId}`;
+    const leg2 = `${API}/${cid}/horarios_origen_destino?idNucleoOrigen=${nucId}&idNucleoDestino=${dest.idNucleo}`;
+    try {
+      const [text1, text2] = await Promise.all([
+        fetchJSON(leg1, { signal: probes.signal, raw: true }),
+        fetchJSON(leg2, { signal: probes.signal, raw: true }),
+      ]);
+      const realNow = Date.now();
+      const found = await computeCall('transfers',
+        { leg1, leg2, date: now.getTime(), realNow, minTransfer: minTransferMins(), limit: JOURNEY_LIMIT },
+        { texts: { [leg1]: text1, [leg2]: text2 }, signal: probes.signal });
+      const at = new Date(realNow);
+      const leg1Trips = computeTrips(found.leg1, now, at);
+      const leg2Trips = computeTrips(found.leg2, now, at);
+      // Ties keep candidate order, as if every probe had answered at once
+      let improved = false;
+      found.k.forEach((k, p) => {
+        const itin = transferItinerary(leg1Trips[p], leg2Trips[p], found.wait[p], candidate, dest);
+        if (best.push(itin, ci + k / found.count)) improved = true;
+      });
+      if (improved && onUpdate && !frame) frame = requestAnimationFrame(publish);
+    } catch { /* not reachable, or cut off */ }
+    settled++;
+  };
+
+  await new Promise(resolve => {
+    let pending = candidates.length;
+    let expired = false;
+    const timer = setTimeout(() => {
+      expired = true;
+      if (best.size) resolve();
+    }, deadline);
+    const finish = () => { clearTimeout(timer); resolve(); };
+    if (!pending) return finish();
+    candidates.forEach((c, ci) => probe(c, ci).then(() => {
+      if (--pending === 0 || (expired && best.size)) finish();
+    }));
+  });
+
+  timing.settled = settled;
+  timing.cutOff = settled < candidates.length;
+  stop();
+  signal?.removeEventListener('abort', stop);
+  cancelAnimationFrame(frame);
+  return signal?.aborted ? [] : best.sorted();
+}
+
+// Bounded max-heap on arrival: keeps the `limit` earliest-arriving
+// itineraries pushed so far. `order` breaks ties (lower first); push()
+// returns whether the itinerary made it in.
+function itineraryTime(itin) {
+  return (itin.totalArrival || itin.totalDeparture).getTime();
+}
 
-  const validTransfers = probeResults.filter(Boolean);
-  if (!validTransfers.length) return [];
+function createItineraryHeap(limit) {
+  const heap = [];   // { itin, time, order }, latest at the root
+  const later = (a, b) => a.time - b.time || a.order - b.order;
+  const swap = (i, j) => { [heap[i], heap[j]] = [heap[j], heap[i]]; };
+
+  function siftUp(i) {
+    while (i > 0) {
+      const parent = (i - 1) >> 1;
+      if (later(heap[i], heap[parent]) <= 0) return;
+      swap(i, parent);
+      i = parent;
+    }
+  }
 
-  // 2b. Match legs for each valid transfer nucleus
-  const itineraries = [];
-  for (const { candidate, leg1Trips, leg2Trips } of validTransfers) {
-    const pairs = matchLegs(leg1Trips, leg2Trips, candidate);
-    itineraries.push(...pairs);
+  function siftDown(i) {
+    for (;;) {
+      const l = 2 * i + 1, r = l + 1;
+      let top = i;
+      if (l < heap.length && later(heap[l], heap[top]) > 0) top = l;
+      if (r < heap.length && later(heap[r], heap[top]) > 0) top = r;
+      if (top === i) return;
+      swap(i, top);
+      i = top;
+    }
   }
 
-  // Sort by total arrival time (fall back to departure), cap at 5
-  itineraries.sort((a, b) => {
-    const aT = a.totalArrival || a.totalDeparture;
-    const bT = b.totalArrival || b.totalDeparture;
-    return aT - bT;
-  });
+  let pushed = 0;
+  return {
+    get size() { return heap.length; },
+    push(itin, order = pushed) {
+      pushed++;
+      const entry = { itin, time: itineraryTime(itin), order };
+      if (heap.length < limit) {
+        heap.push(entry);
+        siftUp(heap.length - 1);
+        return true;
+      }
+      if (later(entry, heap[0]) >= 0) return false;
+      heap[0] = entry;
+      siftDown(0);
+      return true;
+    },
+    sorted: () => [...heap].sort(later).map(e => e.itin),
+  };
+}
 
-  return itineraries.slice(0, 5);
+// One leg1 trip with the leg2 trip it catches at transferNucleo (compute.js matchLegs())
+function transferItinerary(leg1, leg2, waitMins, transferNucleo, dest) {
+  return {
+    type: 'transfer',
+    legs: [{ ...leg1, to: transferNucleo }, { ...leg2, to: dest }],
+    transfers: [{ nucleo: transferNucleo, waitMins }],
+    totalDeparture: leg1.depTime,
+    totalArrival:   leg2.arrTime,
+  };
 }
 
-function matchLegs(leg1Trips, leg2Trips, transferNucleo) {
-  const pairs = [];
-  for (const leg1 of leg1Trips) {
-    // leg1.arrTime = arrival at transfer nucleus (from dest column of leg1 API call)
-    // If not available, use a conservative 30-minute estimate
-    const arrAtTransfer = leg1.arrTime || new Date(leg1.depTime.getTime() + 30 * 60000);
-    const earliestLeg2  = new Date(arrAtTransfer.getTime() + MIN_TRANSFER_MINS * 60000);
-
-    for (const leg2 of leg2Trips) {
-      if (leg2.depTime >= earliestLeg2) {
-        const waitMins = Math.round((leg2.depTime - arrAtTransfer) / 60000);
-        pairs.push({
-          type: 'transfer',
-          leg1,
-          leg2,
-          transferNucleo,
-          arrAtTransfer,
-          waitMins,
-          totalDeparture: leg1.depTime,
-          totalArrival:   leg2.arrTime,
-        });
-        break; // Only the best (earliest) leg2 for each leg1
-      }
-    }
-  }
-  return pairs;
+// ---- Snapshot routing (raptor.js) ----
+function routeOnSnapshot(snap, origin, dest, now) {
+  const o = snap.nucleos.id.indexOf(Number(origin.idNucleo));
+  const d = snap.nucleos.id.indexOf(Number(dest.idNucleo));
+  if (o < 0 || d < 0) return null;
+  if (raptorNet?.snap !== snap) raptorNet = buildRaptorNetwork(snap);
+
+  // Same cut-off as fetchTrips(): today, keep buses that left up to 5 min ago
+  const depart = selectedDateMode === 'today'
+    ? Math.max(0, now.getHours() * 60 + now.getMinutes() - 5)
+    : 0;
+  const journeys = raptorProfile(raptorNet, {
+    origin: o, dest: d, depart,
+    freqs: activeFreqRows(snap, now),
+    maxTransfers: RAPTOR_DEFAULTS.maxTransfers,
+    minTransfer: minTransferMins(),
+  }, 5);
+  return journeys.map(j => raptorItinerary(snap, j, now));
+}
+
+function raptorItinerary(snap, journey, now) {
+  const nucleos = snap.nucleoList();
+  const atMins = mins => new Date(now.getFullYear(), now.getMonth(), now.getDate(), 0, mins, 0, 0);
+  const hhmm = mins => `${String(Math.floor(mins / 60) % 24).padStart(2, '0')}:${String(mins % 60).padStart(2, '0')}`;
+
+  const rides = journey.legs.filter(l => !l.walk);
+  const legs = rides.map(l => {
+    const route = raptorNet.routes[l.route];
+    return {
+      codigo: snap.strings[snap.lines.code[route.line]],
+      idlinea: String(snap.lines.id[route.line]),
+      dias: snap.strings[snap.freqs.code[route.freq]],
+      depStr: hhmm(l.dep), depTime: atMins(l.dep),
+      arrStr: hhmm(l.arr), arrTime: atMins(l.arr),
+      to: nucleos[l.to],
+    };
+  });
+  // Walks only ever sit between two rides
+  const transfers = rides.slice(1).map((ride, i) => {
+    const walk = journey.legs[journey.legs.indexOf(ride) - 1];
+    return walk.walk
+      ? { nucleo: legs[i].to, walk: { to: nucleos[walk.to], mins: walk.arr - walk.dep }, waitMins: ride.dep - walk.arr }
+      : { nucleo: legs[i].to, waitMins: ride.dep - rides[i].arr };
+  });
+
+  return {
+    type: transfers.length ? 'transfer' : 'direct',
+    legs,
+    transfers,
+    totalDeparture: legs[0].depTime,
+    totalArrival:   legs[legs.length - 1].arrTime,
+  };
 }
 
 // ---- Out-of-network search (e.g. Marbella) ----
@@ -624,7 +742,7 @@ async function runOutOfNetworkSearch(origin, destName) {
   try {
     // Fetch all consortium lines once (cached per region selection)
     if (!allConsorcioLines) {
-      const data = await fetchJSON(`${API}/${cid}/lineas`);
+      const data = await snapshotOr(cid, snap => ({ lineas: snap.lineList() }), `${API}/${cid}/lineas`);
       allConsorcioLines = data.lineas || [];
     }
 
@@ -659,34 +777,72 @@ async function runOutOfNetworkSearch(origin, destName) {
     resultsLinesHint.classList.remove('hidden');
   } catch {
     showLoading(false);
-    itineraryList.innerHTML = `<p class="hint">${s('noConn')}</p>`;
+    clearItineraries(`<p class="hint">${s('noConn')}</p>`);
   }
 }
 
 // ---- Render itineraries ----
-function renderItineraries(itineraries, now) {
-  itineraryList.innerHTML = '';
+// The result cards, keyed by their legs, so a list re-rendered as probes
+// stream in keeps its cards and only adds, moves or rewrites the ones that
+// changed. Items are { itin, html }; a kept card is only rewritten when its
+// markup (the countdown, the language) differs.
+const itineraryCards = createKeyedList(itineraryList, {
+  name: 'itineraryCards',
+  key: ({ itin }) => itin.legs.map(leg => `${leg.codigo}@${leg.depStr}>${leg.to.idNucleo ?? leg.to.nombre}`).join('|'),
+  create({ itin, html }, row) {
+    const card = document.createElement('div');
+    card.className = `card journey-card journey-card-${itin.type}`;
+    card.innerHTML = html;
+    card.style.cursor = 'pointer';
+    card.addEventListener('click', () => openSheet(buildSheetHtml(row.item.itin), row.item.itin));
+    return card;
+  },
+  update(row, { html }) {
+    if (html !== row.item.html) row.node.innerHTML = html;
+  },
+});
+
+// Empty the list (cards, "searching more" spinner, hints), optionally leaving `html` in it
+function clearItineraries(html = '') {
+  itineraryCards.clear();
+  itineraryList.innerHTML = html;
+}
+
+// pending: more transfer probes are still running — the list is partial
+function renderItineraries(itineraries, now, { pending = false } = {}) {
   resultsNoService.classList.add('hidden');
 
   if (!itineraries.length) {
+    clearItineraries();
     resultsNoService.classList.remove('hidden');
     return;
   }
 
   const showCountdown = selectedDateMode === 'today';
   const realNow = new Date();
+  itineraryCards.set(itineraries.map(itin => ({ itin, html: itineraryHtml(itin, realNow, showCountdown) })));
+
+  // The spinner stays after the cards while probes are out
+  let more = itineraryList.querySelector('.journey-searching-more');
+  if (pending && !more) {
+    more = document.createElement('div');
+    more.className = 'load-more-sentinel journey-searching-more';
+    more.title = s('searchingMore');
+    more.innerHTML = '<div class="load-more-spinner"></div>';
+    itineraryList.appendChild(more);
+  } else if (!pending && more) {
+    more.remove();
+  }
+}
+renderItineraries = perfWrap('render', renderItineraries);
 
-  itineraries.forEach(itin => {
-    const card = document.createElement('div');
-    card.className = 'card journey-card';
-
-    if (itin.type === 'direct') {
-      const leg = itin.leg1;
-      const mins = Math.round((leg.depTime - realNow) / 60000);
-      const minsClass = mins <= 2 ? 'mins-now' : mins <= 15 ? 'mins-soon' : 'mins-later';
+function itineraryHtml(itin, realNow, showCountdown) {
+  const mins = Math.round((itin.legs[0].depTime - realNow) / 60000);
+  const minsClass = mins <= 2 ? 'mins-now' : mins <= 15 ? 'mins-soon' : 'mins-later';
 
-      card.classList.add('journey-card-direct');
-      card.innerHTML = `
+  if (itin.type === 'direct') {
+    const leg = itin.legs[0];
+    return `
         <div class="journey-direct-badge">${s('direct')}</div>
         <div class="journey-leg">
           <div class="journey-leg-body">
@@ -703,54 +859,34 @@ function renderItineraries(itineraries, now) {
           </div>
         </div>
       `;
-    } else {
-      const { leg1, leg2, transferNucleo, waitMins } = itin;
-      const mins = Math.round((leg1.depTime - realNow) / 60000);
-      const minsClass = mins <= 2 ? 'mins-now' : mins <= 15 ? 'mins-soon' : 'mins-later';
+  }
 
-      card.classList.add('journey-card-transfer');
-      card.innerHTML = `
+  return itin.legs.map((leg, i) => `
+        ${i > 0 ? transferBannerHtml(itin.transfers[i - 1]) : ''}
         <div class="journey-leg">
-          <div class="journey-leg-label">${s('leg1Label')}</div>
+          <div class="journey-leg-label">${s('legLabel', i + 1)}</div>
           <div class="journey-leg-body">
-            <div class="departure-line">${escHtml(leg1.codigo || '')}</div>
+            <div class="departure-line">${escHtml(leg.codigo || '')}</div>
             <div class="departure-body">
-              <div class="departure-dest">${escHtml(transferNucleo.nombre)}</div>
-              <div class="departure-name planner-days">${escHtml(leg1.dias || '')}</div>
+              <div class="departure-dest">${escHtml(leg.to.nombre)}</div>
+              <div class="departure-name planner-days">${escHtml(leg.dias || '')}</div>
             </div>
             <div class="departure-time-col">
-              <span class="departure-sched">${escHtml(leg1.depStr)}</span>
-              ${leg1.arrStr ? `<span class="planner-arrival">→ ${escHtml(leg1.arrStr)}</span>` : ''}
-              ${showCountdown ? `<span class="departure-mins ${minsClass}">${s('minsLabel', mins)}</span>` : ''}
+              <span class="departure-sched">${escHtml(leg.depStr)}</span>
+              ${leg.arrStr ? `<span class="planner-arrival">→ ${escHtml(leg.arrStr)}</span>` : ''}
+              ${i === 0 && showCountdown ? `<span class="departure-mins ${minsClass}">${s('minsLabel', mins)}</span>` : ''}
             </div>
           </div>
-        </div>
+        </div>`).join('');
+}
+
+function transferBannerHtml({ nucleo, walk, waitMins }) {
+  return `
         <div class="journey-transfer-banner">
-          <span class="journey-transfer-icon">⇄</span>
-          <span class="journey-transfer-text">${s('transfer')} ${escHtml(transferNucleo.nombre)}</span>
+          <span class="journey-transfer-icon">${walk ? '🚶' : '⇄'}</span>
+          <span class="journey-transfer-text">${s('transfer')} ${escHtml(nucleo.nombre)}${walk ? ` · ${escHtml(s('walkTo', walk.to.nombre, walk.mins))}` : ''}</span>
           <span class="journey-transfer-wait">${s('transferWait', waitMins)}</span>
-        </div>
-        <div class="journey-leg">
-          <div class="journey-leg-label">${s('leg2Label')}</div>
-          <div class="journey-leg-body">
-            <div class="departure-line">${escHtml(leg2.codigo || '')}</div>
-            <div class="departure-body">
-              <div class="departure-dest">${escHtml(selectedTo.nombre)}</div>
-              <div class="departure-name planner-days">${escHtml(leg2.dias || '')}</div>
-            </div>
-            <div class="departure-time-col">
-              <span class="departure-sched">${escHtml(leg2.depStr)}</span>
-              ${leg2.arrStr ? `<span class="planner-arrival">→ ${escHtml(leg2.arrStr)}</span>` : ''}
-            </div>
-          </div>
-        </div>
-      `;
-    }
-
-    card.style.cursor = 'pointer';
-    card.addEventListener('click', () => openSheet(buildSheetHtml(itin), itin));
-    itineraryList.appendChild(card);
-  });
+        </div>`;
 }
 
 // ---- Detail bottom sheet ----
@@ -766,6 +902,7 @@ function openSheet(html, itin) {
 }
 
 function closeSheet() {
+  if (sheetToken) sheetToken.abort();
   journeySheetBackdrop.classList.remove('open');
   journeyDetailSheet.classList.remove('open');
   setTimeout(() => {
@@ -792,43 +929,38 @@ function stepHtml(iconClass, iconEmoji, action, main, sub, time) {
 function buildSheetHtml(itin) {
   let html = '';
 
-  if (itin.type === 'direct') {
-    const { leg1 } = itin;
-    html += stepHtml('', '🚌', s('stepBoard'),
-      `${escHtml(leg1.codigo || '')} → ${escHtml(selectedTo.nombre)}`,
-      escHtml(leg1.dias || ''),
-      leg1.depStr || '');
-    html += stepHtml('arrive', '✓', s('stepArrive'),
-      escHtml(selectedTo.nombre),
-      '',
-      leg1.arrStr || '—');
-  } else {
-    const { leg1, leg2, transferNucleo, waitMins } = itin;
-    html += stepHtml('', '🚌', s('stepBoard'),
-      `${escHtml(leg1.codigo || '')} → ${escHtml(transferNucleo.nombre)}`,
-      escHtml(leg1.dias || ''),
-      leg1.depStr || '');
-    html += stepHtml('transfer', '⇄', s('stepTransfer'),
-      escHtml(transferNucleo.nombre),
-      s('stepWait', waitMins),
-      leg1.arrStr || '');
+  itin.legs.forEach((leg, i) => {
+    if (i > 0) {
+      const { nucleo, walk, waitMins } = itin.transfers[i - 1];
+      if (walk) {
+        html += stepHtml('transfer', '🚶', s('stepWalk'),
+          `${escHtml(nucleo.nombre)} → ${escHtml(walk.to.nombre)}`,
+          s('walkTo', walk.to.nombre, walk.mins),
+          itin.legs[i - 1].arrStr || '');
+      }
+      html += stepHtml('transfer', '⇄', s('stepTransfer'),
+        escHtml(walk ? walk.to.nombre : nucleo.nombre),
+        s('stepWait', waitMins),
+        walk ? '' : itin.legs[i - 1].arrStr || '');
+    }
     html += stepHtml('', '🚌', s('stepBoard'),
-      `${escHtml(leg2.codigo || '')} → ${escHtml(selectedTo.nombre)}`,
-      escHtml(leg2.dias || ''),
-      leg2.depStr || '');
-    html += stepHtml('arrive', '✓', s('stepArrive'),
-      escHtml(selectedTo.nombre),
-      '',
-      leg2.arrStr || '—');
-  }
+      `${escHtml(leg.codigo || '')} → ${escHtml(leg.to.nombre)}`,
+      escHtml(leg.dias || ''),
+      leg.depStr || '');
+  });
+  const last = itin.legs[itin.legs.length - 1];
+  html += stepHtml('arrive', '✓', s('stepArrive'),
+    escHtml(selectedTo.nombre),
+    '',
+    last.arrStr || '—');
 
   // Map button — starts as loading state; href filled in after polyline fetch
   html += `<button class="journey-map-btn" id="sheet-map-btn" disabled>${s('viewOnMap')}</button>`;
   return html;
 }
 
-// Leg colors for multi-segment journeys (A→B green, B→C red)
-const LEG_COLORS = ['#27ae60', '#e7231e'];
+// Leg colors for multi-segment journeys (A→B green, B→C red, C→D blue)
+const LEG_COLORS = ['#27ae60', '#e7231e', '#2980b9'];
 
 async function prepareMapButton(itin) {
   const cid = currentConsorcio.idConsorcio;
@@ -836,22 +968,21 @@ async function prepareMapButton(itin) {
   if (!btn) return;
 
   try {
-    const legs = itin.type === 'direct'
-      ? [{ trip: itin.leg1, color: LEG_COLORS[0] }]
-      : [{ trip: itin.leg1, color: LEG_COLORS[0] }, { trip: itin.leg2, color: LEG_COLORS[1] }];
+    const legs = itin.legs.map((trip, i) => ({ trip, color: LEG_COLORS[i % LEG_COLORS.length] }));
 
     const polyResults = await Promise.all(legs.map(async ({ trip, color }) => {
       if (!trip.idlinea) return null;
       try {
         const data = await fetchJSON(`${API}/${cid}/lineas/${trip.idlinea}`);
         const poly = data.polilinea || [];
-        return poly.length ? { points: poly, color, code: trip.codigo || '', lineaId: String(trip.idlinea) } : null;
+        if (!poly.length) return null;
+        storeLinePolyline(cid, trip.idlinea, poly);
+        return { color, code: trip.codigo || '', lineaId: String(trip.idlinea) };
       } catch { return null; }
     }));
     const journeyPolys = polyResults.filter(Boolean);
 
     sessionStorage.setItem('journeyPolylines', JSON.stringify(journeyPolys));
-    sessionStorage.removeItem('routePolyline');
     sessionStorage.removeItem('routePolylineCode');
     sessionStorage.removeItem('routeLineaId');
 
@@ -897,67 +1028,35 @@ function boardNucleoCandidates(lineName) {
 
 // Fetch leg2 departure times from a given boarding stop on the out-of-network line.
 // Returns array of { depStr, depTime } sorted ascending, or [] on failure.
-async function fetchLeg2Departures(cid, lineId, boardStopName, now) {
+async function fetchLeg2Departures(cid, lineId, boardStopName, now, signal) {
   try {
     // Probe all global frequencies in parallel, take first that returns horario data
-    const freqData = await fetchJSON(`${API}/${cid}/frecuencias`);
+    const freqData = await fetchJSON(`${API}/${cid}/frecuencias`, { signal });
     const globalFreqs = freqData.frecuencias || [];
     const today = now instanceof Date ? now : new Date();
     const dia = today.getDate();
     const mes = today.getMonth() + 1;
 
-    const ttResults = await Promise.all(globalFreqs.map(async gf => {
-      try {
-        const d = await fetchJSON(`${API}/${cid}/horarios_lineas?idLinea=${lineId}&idFrecuencia=${gf.idFreq}&dia=${dia}&mes=${mes}`);
-        const planif = (d.planificadores || [])[0];
-        if (!planif) return null;
-        return { planif, freqId: gf.idFreq };
-      } catch { return null; }
+    const urls = globalFreqs.map(gf =>
+      `${API}/${cid}/horarios_lineas?idLinea=${lineId}&idFrecuencia=${gf.idFreq}&dia=${dia}&mes=${mes}`);
+    const texts = {};
+    await Promise.all(urls.map(async url => {
+      try { texts[url] = await fetchJSON(url, { signal, raw: true }); } catch { /* no timetable */ }
     }));
 
-    // Use the first frequency that returned data
-    const result = ttResults.find(r => r && (r.planif.bloquesIda || []).length > 0);
-    if (!result) return [];
-
-    const bloques = result.planif.bloquesIda || [];
-    const horario = result.planif.horarioIda || [];
-
-    // Find the boarding stop row index by name
-    const normBoard = normalize(boardStopName);
-    const stopIndices = [];
-    bloques.forEach((b, i) => { if (b.tipo !== '1') stopIndices.push(i); });
-    const stopRows = bloques.filter(b => b.tipo !== '1');
-
-    // Find best match: exact, then partial
-    let boardRowIdx = stopRows.findIndex(b => normalize(b.nombre || '') === normBoard);
-    if (boardRowIdx < 0) {
-      boardRowIdx = stopRows.findIndex(b =>
-        normalize(b.nombre || '').includes(normBoard) || normBoard.includes(normalize(b.nombre || ''))
-      );
-    }
-    if (boardRowIdx < 0) boardRowIdx = 0; // fall back to first stop
-
-    const horasIdx = stopIndices[boardRowIdx];
-
-    // Build departure times from that column.
-    // The API already filters by idFrecuencia for today's schedule,
-    // so all returned trips run today — no need to re-filter by frequency.
-    const departures = [];
-    for (const trip of horario) {
-      const timeStr = trip.horas?.[horasIdx];
-      if (!timeStr || timeStr === '--') continue;
-      const [hh, mm] = timeStr.split(':').map(Number);
-      if (isNaN(hh) || isNaN(mm)) continue;
-      const depTime = new Date(today.getFullYear(), today.getMonth(), today.getDate(), hh, mm, 0, 0);
-      departures.push({ depStr: timeStr, depTime });
-    }
-    return departures.sort((a, b) => a.depTime - b.depTime);
+    // The compute worker scans the first frequency that returned data for the stop's column
+    const { dep } = await computeCall('departures',
+      { urls: urls.filter(url => url in texts), board: boardStopName }, { texts, signal });
+    return Array.from(dep, mins => ({ depStr: scheduleClock(mins), depTime: scheduleAt(today, mins) }));
   } catch { return []; }
 }
 
 function openOutOfNetworkSheet(line) {
   let html = `<div class="journey-loading"><div class="loading-spinner"></div></div>`;
   openSheet(html, null);
+  sheetToken = supersede(sheetToken);
+  const token = sheetToken;
+  const { signal } = token;
 
   (async () => {
     const cid = currentConsorcio.idConsorcio;
@@ -972,11 +1071,11 @@ function openOutOfNetworkSheet(line) {
     const [candidateResults, lineData, leg1LineData] = await Promise.all([
       Promise.all(candidates.map(async nucleo => {
         try {
-          const d = await fetchJSON(`${API}/${cid}/horarios_origen_destino?idNucleoOrigen=${selectedFrom.idNucleo}&idNucleoDestino=${nucleo.idNucleo}`);
-          return { nucleo, trips: extractTrips(d, now) };
+          const url = `${API}/${cid}/horarios_origen_destino?idNucleoOrigen=${selectedFrom.idNucleo}&idNucleoDestino=${nucleo.idNucleo}`;
+          return { nucleo, trips: await fetchTrips(url, now, { signal, limit: 3 }) };
         } catch { return { nucleo, trips: [] }; }
       })),
-      fetchJSON(`${API}/${cid}/lineas/${line.idLinea}`).catch(() => null),
+      fetchJSON(`${API}/${cid}/lineas/${line.idLinea}`, { signal }).catch(() => null),
       // Also fetch the leg1 line's polyline — we'll find the idLinea from leg1 trips
       Promise.resolve(null), // placeholder, resolved below after we know leg1
     ]);
@@ -991,12 +1090,13 @@ function openOutOfNetworkSheet(line) {
     const leg1IdLinea = leg1Trips[0]?.idlinea;
     const [leg2Deps, leg1PolyData] = await Promise.all([
       boardNucleo
-        ? fetchLeg2Departures(cid, line.idLinea, boardStopName, now)
+        ? fetchLeg2Departures(cid, line.idLinea, boardStopName, now, signal)
         : Promise.resolve([]),
       leg1IdLinea
-        ? fetchJSON(`${API}/${cid}/lineas/${leg1IdLinea}`).catch(() => null)
+        ? fetchJSON(`${API}/${cid}/lineas/${leg1IdLinea}`, { signal }).catch(() => null)
         : Promise.resolve(null),
     ]);
+    if (token !== sheetToken || signal.aborted) return;   // closed or reopened meanwhile
 
     // 3. Build itinerary pairs: for each leg1 arrival, find next leg2 departure
     const realNow = new Date();
@@ -1051,18 +1151,19 @@ function openOutOfNetworkSheet(line) {
     const journeyPolys = [];
     // Leg A→B polyline (green)
     if (leg1PolyData?.polilinea?.length) {
-      journeyPolys.push({ points: leg1PolyData.polilinea, color: LEG_COLORS[0], code: leg1Trips[0]?.codigo || '', lineaId: String(leg1IdLinea) });
+      storeLinePolyline(cid, leg1IdLinea, leg1PolyData.polilinea);
+      journeyPolys.push({ color: LEG_COLORS[0], code: leg1Trips[0]?.codigo || '', lineaId: String(leg1IdLinea) });
     }
     // Leg B→C polyline (red)
     if (lineData?.polilinea?.length) {
-      journeyPolys.push({ points: lineData.polilinea, color: LEG_COLORS[1], code: line.codigo || '', lineaId: String(line.idLinea) });
+      storeLinePolyline(cid, line.idLinea, lineData.polilinea);
+      journeyPolys.push({ color: LEG_COLORS[1], code: line.codigo || '', lineaId: String(line.idLinea) });
     }
 
     const btn = document.getElementById('sheet-map-btn');
     if (btn) {
       if (journeyPolys.length) {
         sessionStorage.setItem('journeyPolylines', JSON.stringify(journeyPolys));
-        sessionStorage.removeItem('routePolyline');
         sessionStorage.removeItem('routePolylineCode');
         sessionStorage.removeItem('routeLineaId');
         const link = document.createElement('a');
@@ -1099,23 +1200,17 @@ function showStep(step) {
 
 function showLoading(on) {
   resultsLoading.classList.toggle('hidden', !on);
-  itineraryList.innerHTML = '';
+  if (on) clearItineraries();
 }
 
 function clearResults() {
-  itineraryList.innerHTML = '';
+  clearItineraries();
   resultsNoService.classList.add('hidden');
   resultsLinesHint.classList.add('hidden');
   resultsLinesList.innerHTML = '';
 }
 
 // ---- Helpers ----
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;').replace(/</g, '&lt;')
@@ -0,0 +1,146 @@
+// ===== keyedlist — keyed list rendering: persistent rows, minimal moves, one frame per batch =====
+// createKeyedList() keeps a list of rows in a container in step with an
+// array of items. Each row lives in a key → row map that outlasts renders, so
+// a row's node and whatever its page caches on it (station.js keeps the
+// scheduled time and the minutes label) are found without querying the DOM.
+//
+// set() only records the items; the rows are reconciled once, in the next
+// animation frame, however many times set() was called before it. Rows whose
+// key is gone are removed, new keys get a node from create(), kept rows go
+// through update(), and only rows outside the longest run already in order
+// (a longest increasing subsequence of their old positions) are moved, so a
+// board that gained two departures moves nothing and a reversed one moves
+// n - 1 nodes.
+//
+// Rows sit together at the start of the container, before anything else in
+// it (a load-more sentinel, say). Rows taken out behind the list's back
+// (container.innerHTML = …) are dropped and made again if their key comes
+// back; pages that write the container themselves call clear() first so a
+// pending frame can't put old rows back. Needs perf.js.
+
+/**
+ * @param {Element} container
+ * @param {object} opts
+ *   key(item)          → string, unique per row
+ *   create(item, row)  → Element for a new row; may cache state on `row`
+ *   update(row, item)  → optional, for a kept row (row.item is still the old item)
+ *   name               → optional, times each frame as a 'render:<name>' span
+ */
+function createKeyedList(container, { key, create, update = null, name = null }) {
+  let order = [];            // rows in DOM order: { key, item, node, ... }
+  let rows = new Map();      // key → row
+  let pending = null;        // items of the latest set() not yet applied
+  let frame = 0;
+  const stats = { frames: 0, created: 0, moved: 0, removed: 0 };
+
+  function set(items) {
+    pending = items;
+    if (!frame) frame = requestAnimationFrame(flush);
+  }
+
+  // Apply a pending set() now instead of in the next frame
+  function flush() {
+    if (frame) cancelAnimationFrame(frame);
+    frame = 0;
+    if (!pending) return;
+    const items = pending;
+    pending = null;
+    const end = name ? perfStart('render', name) : perfNoop;
+    reconcile(items);
+    end();
+  }
+
+  function reconcile(items) {
+    stats.frames++;
+    const live = order.filter(row => row.node.parentNode === container);
+    live.forEach((row, i) => { row.index = i; });
+    const tail = live.length ? live[live.length - 1].node.nextSibling : container.firstChild;
+    const byKey = live.length === order.length ? rows : new Map(live.map(row => [row.key, row]));
+
+    const next = [];
+    const seq = [];          // old position of each next row, -1 when new
+    const nextRows = new Map();
+    for (const item of items) {
+      const k = key(item);
+      if (nextRows.has(k)) continue;
+      let row = byKey.get(k);
+      if (row) {
+        if (update) update(row, item);
+        row.item = item;
+        seq.push(row.index);
+      } else {
+        row = { key: k, item, node: null };
+        row.node = create(item, row);
+        stats.created++;
+        seq.push(-1);
+      }
+      nextRows.set(k, row);
+      next.push(row);
+    }
+
+    for (const row of live) {
+      if (nextRows.get(row.key) !== row) {
+        row.node.remove();
+        stats.removed++;
+      }
+    }
+
+    // Walk back from the tail: rows in the kept run stay, the rest go in front of their successor
+    const keep = longestIncreasing(seq);
+    let anchor = tail;
+    for (let i = next.length - 1; i >= 0; i--) {
+      const node = next[i].node;
+      if (!keep[i]) {
+        container.insertBefore(node, anchor);
+        if (seq[i] >= 0) stats.moved++;
+      }
+      anchor = node;
+    }
+
+    order = next;
+    rows = nextRows;
+  }
+
+  // Remove every row now and drop a pending set()
+  function clear() {
+    if (frame) cancelAnimationFrame(frame);
+    frame = 0;
+    pending = null;
+    order.forEach(row => row.node.remove());
+    order = [];
+    rows = new Map();
+  }
+
+  return {
+    set,
+    flush,
+    clear,
+    // The items as they will be after the next frame
+    items: () => pending ?? order.map(row => row.item),
+    // The rows on the page, in order (don't modify)
+    rows: () => order,
+    get: k => rows.get(k),
+    stats,
+  };
+}
+
+// Flags (by position) one longest strictly increasing run of seq, ignoring -1s
+function longestIncreasing(seq) {
+  const keep = new Uint8Array(seq.length);
+  const tails = [];          // tails[k]: position of the smallest last value of a run of length k + 1
+  const prev = new Int32Array(seq.length);
+  for (let i = 0; i < seq.length; i++) {
+    const v = seq[i];
+    if (v < 0) continue;
+    let lo = 0, hi = tails.length;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (seq[tails[mid]] < v) lo = mid + 1;
+      else hi = mid;
+    }
+    prev[i] = lo ? tails[lo - 1] : -1;
+    tails[lo] = i;
+  }
+  for (let i = tails.length ? tails[tails.length - 1] : -1; i >= 0; i = prev[i]) keep[i] = 1;
+  return keep;
+}
@@ -1,5 +1,4 @@
 // ===== Line Timetable Search =====
-const API = 'https://api.ctan.es/v1/Consorcios';
 
 const CONSORTIUM_ICONS = {
   '1': '🌻', '2': '⚓', '3': '🏛️', '4': '☀️',
@@ -68,14 +67,17 @@ const lttLineRegion    = document.getElementById('ltt-line-region');
 const lttDirectionTabs = document.getElementById('ltt-direction-tabs');
 const lttFreqTabs      = document.getElementById('ltt-freq-tabs');
 const lttGridWrapper   = document.getElementById('ltt-grid-wrapper');
+const lttCacheNote     = document.getElementById('ltt-cache-note');
 
 // ---- State ----
 let currentConsorcio = null;
+let lineSearchList = null;   // search.js index over allLines
 let allLines = [];
 let activeFreqId = null;
 let activeDir = 'ida';
 let currentLineId = null;
 let ttData = null;
+let ttUrl = null;    // the request ttData came from; keys its parsed grids
 
 // ---- Lang ----
 function applyLang() {
@@ -160,6 +162,7 @@ async function selectRegion(c) {
   lttLineResults.innerHTML = '';
   lttLineResults.classList.add('hidden');
   allLines = [];
+  lineSearchList = null;
 
   lttRegionWrapper.classList.add('hidden');
   lttSearchForm.classList.remove('hidden');
@@ -168,6 +171,7 @@ async function selectRegion(c) {
   try {
     const data = await fetchJSON(`${API}/${c.idConsorcio}/lineas`);
     allLines = data.lineas || [];
+    lineSearchList = createSearchList(`lines-${c.idConsorcio}`, allLines, [l => l.codigo, l => l.nombre]);
   } catch {
     // non-fatal
   }
@@ -181,17 +185,10 @@ lttBackRegion.addEventListener('click', () => {
 });
 
 // ---- Line search ----
-function normalize(str) {
-  return str.toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
-}
-
 lttLineInput.addEventListener('input', () => {
-  const q = normalize(lttLineInput.value.trim());
-  if (!q) { lttLineResults.classList.add('hidden'); return; }
+  if (!lttLineInput.value.trim()) { lttLineResults.classList.add('hidden'); return; }
 
-  const matches = allLines
-    .filter(l => normalize(l.codigo || '').includes(q) || normalize(l.nombre || '').includes(q))
-    .slice(0, 12);
+  const matches = lineSearchList ? lineSearchList.search(lttLineInput.value, 12) : [];
 
   if (!matches.length) {
     lttLineResults.innerHTML = `<div class="planner-dropdown-item ltt-no-results">${ls('noLines')}</div>`;
@@ -235,44 +232,15 @@ async function openLineTimetable(line) {
   lttFreqTabs.innerHTML = '';
   lttGridWrapper.innerHTML = '<div class="loading-spinner"></div>';
 
-  // Discover which frequencies this line actually runs on by probing all global freqs in parallel
+  // Discover which frequencies this line runs on: the line frequency index
+  // first, probing every global freq in parallel only when it can't answer
   try {
     const today = new Date();
     const dia = today.getDate();
     const mes = today.getMonth() + 1;
 
-    // Fetch global frequency list for this consortium
-    const freqData = await fetchJSON(`${API}/${currentConsorcio.idConsorcio}/frecuencias`);
-    const globalFreqs = freqData.frecuencias || [];
-
-    // Probe all frequencies in parallel — keep those that return planificadores
-    const probeResults = await Promise.all(
-      globalFreqs.map(async gf => {
-        try {
-          const d = await fetchJSON(
-            `${API}/${currentConsorcio.idConsorcio}/horarios_lineas` +
-            `?idLinea=${line.idLinea}&idFrecuencia=${gf.idFreq}&dia=${dia}&mes=${mes}`
-          );
-          const hasData = (d.planificadores || []).length > 0;
-          // The response may include its own frecuencias list — use that for labels
-          const freqsInResp = d.frecuencias || [];
-          return hasData ? { idFreq: gf.idFreq, freqsInResp } : null;
-        } catch { return null; }
-      })
-    );
-
-    // Build deduped freq list from those that returned data
-    const seenIds = new Set();
-    const availableFreqs = [];
-    for (const r of probeResults) {
-      if (!r) continue;
-      for (const f of r.freqsInResp) {
-        if (!seenIds.has(f.idfrecuencia)) {
-          seenIds.add(f.idfrecuencia);
-          availableFreqs.push(f); // { idfrecuencia, acronimo, nombre }
-        }
-      }
-    }
+    const availableFreqs = (await indexedLineFreqs(currentConsorcio.idConsorcio, line.idLinea)) ||
+      await probeLineFreqs(line.idLinea, dia, mes);
 
     if (!availableFreqs.length) {
       lttGridWrapper.innerHTML = `<p class="tt-no-data">${ls('noData')}</p>`;
@@ -289,6 +257,42 @@ async function openLineTimetable(line) {
   }
 }
 
+// Fallback: probe all frequencies in parallel — keep those that return planificadores
+async function probeLineFreqs(idLinea, dia, mes) {
+  // Fetch global frequency list for this consortium
+  const freqData = await fetchJSON(`${API}/${currentConsorcio.idConsorcio}/frecuencias`);
+  const globalFreqs = freqData.frecuencias || [];
+
+  const probeResults = await Promise.all(
+    globalFreqs.map(async gf => {
+      try {
+        const d = await fetchJSON(
+          `${API}/${currentConsorcio.idConsorcio}/horarios_lineas` +
+          `?idLinea=${idLinea}&idFrecuencia=${gf.idFreq}&dia=${dia}&mes=${mes}`
+        );
+        const hasData = (d.planificadores || []).length > 0;
+        // The response may include its own frecuencias list — use that for labels
+        const freqsInResp = d.frecuencias || [];
+        return hasData ? { idFreq: gf.idFreq, freqsInResp } : null;
+      } catch { return null; }
+    })
+  );
+
+  // Build deduped freq list from those that returned data
+  const seenIds = new Set();
+  const availableFreqs = [];
+  for (const r of probeResults) {
+    if (!r) continue;
+    for (const f of r.freqsInResp) {
+      if (!seenIds.has(f.idfrecuencia)) {
+        seenIds.add(f.idfrecuencia);
+        availableFreqs.push(f); // { idfrecuencia, acronimo, nombre }
+      }
+    }
+  }
+  return availableFreqs;
+}
+
 // ---- Back to search ----
 lttBackSearch.addEventListener('click', () => {
   lttStepGrid.classList.add('hidden');
@@ -340,10 +344,12 @@ function buildDirectionTabs(hasIda, hasVuelta) {
 async function loadAndRender(lineId, dia, mes) {
   lttGridWrapper.innerHTML = '<div class="loading-spinner"></div>';
   try {
-    ttData = await fetchJSON(
-      `${API}/${currentConsorcio.idConsorcio}/horarios_lineas` +
-      `?idLinea=${lineId}&idFrecuencia=${activeFreqId}&dia=${dia}&mes=${mes}`
-    );
+    const url = `${API}/${currentConsorcio.idConsorcio}/horarios_lineas` +
+      `?idLinea=${lineId}&idFrecuencia=${activeFreqId}&dia=${dia}&mes=${mes}`;
+    ttData = await fetchJSON(url);
+    ttUrl = url;
+    lttCacheNote.textContent = cachedNote(url, 'cachedSchedule');
+    lttCacheNote.classList.toggle('hidden', !lttCacheNote.textContent);
     const planif = (ttData.planificadores || [])[0] || {};
     const hasIda    = (planif.bloquesIda   || []).some(b => b.tipo !== '1');
     const hasVuelta = (planif.bloquesVuelta || []).some(b => b.tipo !== '1');
@@ -355,78 +361,19 @@ async function loadAndRender(lineId, dia, mes) {
 }
 
 // ---- Render timetable grid ----
+// Parsed once per request and direction (ttgrid.js), so a tab switch only redraws
 function renderGrid() {
-  const planif   = (ttData?.planificadores || [])[0];
-  if (!planif) {
-    lttGridWrapper.innerHTML = `<p class="tt-no-data">${ls('noData')}</p>`;
-    return;
-  }
-
-  const bloques = (activeDir === 'ida' ? planif.bloquesIda   : planif.bloquesVuelta) || [];
-  const horario = (activeDir === 'ida' ? planif.horarioIda   : planif.horarioVuelta) || [];
-
-  const stopRows   = bloques.filter(b => b.tipo !== '1');
-  const stopIndices = [];
-  bloques.forEach((b, i) => { if (b.tipo !== '1') stopIndices.push(i); });
-
-  if (!stopRows.length || !horario.length) {
+  const planif = (ttData?.planificadores || [])[0];
+  const grid = planif && timetableGrid(ttUrl, activeDir, planif, { head: 'first-stop' });
+  if (!grid) {
     lttGridWrapper.innerHTML = `<p class="tt-no-data">${ls('noData')}</p>`;
     return;
   }
-
-  const table = document.createElement('table');
-  table.className = 'tt-grid';
-
-  // Header row: trip departure times from first stop
-  const thead = document.createElement('thead');
-  const hRow  = document.createElement('tr');
-  const stopTh = document.createElement('th');
-  stopTh.textContent = ls('stop');
-  hRow.appendChild(stopTh);
-
-  const firstStopIdx = stopIndices[0];
-  horario.forEach(trip => {
-    const th = document.createElement('th');
-    const time = trip.horas?.[firstStopIdx];
-    th.textContent = (time && time !== '--') ? time : '·';
-    hRow.appendChild(th);
-  });
-  thead.appendChild(hRow);
-  table.appendChild(thead);
-
-  // Body rows: one per stop
-  const tbody = document.createElement('tbody');
-  stopRows.forEach((stop, rowIdx) => {
-    const horasIdx = stopIndices[rowIdx];
-    const tr = document.createElement('tr');
-
-    const nameTd = document.createElement('td');
-    nameTd.className = 'tt-stop-name';
-    nameTd.textContent = stop.nombre || '';
-    tr.appendChild(nameTd);
-
-    horario.forEach(trip => {
-      const td = document.createElement('td');
-      const time = trip.horas?.[horasIdx];
-      td.textContent = (time && time !== '--') ? time : '·';
-      if (!time || time === '--') td.classList.add('tt-cell-empty');
-      tr.appendChild(td);
-    });
-    tbody.appendChild(tr);
-  });
-  table.appendChild(tbody);
-
-  lttGridWrapper.innerHTML = '';
-  lttGridWrapper.appendChild(table);
+  renderTimetableGrid(lttGridWrapper, grid, { corner: ls('stop'), empty: '·' });
 }
+renderGrid = perfWrap('render', renderGrid);
 
 // ---- Helpers ----
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;').replace(/</g, '&lt;')
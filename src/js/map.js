@@ -1,5 +1,3 @@
-const API = 'https://api.ctan.es/v1/Consorcios';
-
 const CONSORTIUM_ICONS = {
   '1': '🌻', '2': '⚓', '3': '🏛️', '4': '☀️',
   '5': '🪨', '6': '🎸', '7': '🫒', '8': '🕌', '9': '🌊',
@@ -58,6 +56,8 @@ let currentConsorcio = null;
 let userLocationMarker = null;
 let locationWatchId = null;
 let polylineLayer = null;
+let tileUrl = null;            // Leaflet template for the basemap in use
+let baseLayer = null;
 
 // ---- Lang ----
 function applyLang() {
@@ -92,15 +92,24 @@ const mapParams = new URLSearchParams(location.search);
 const focusConsorcioId = mapParams.get('c');
 const focusStopId = mapParams.get('s');
 const hasPolyline = mapParams.get('polyline') === '1';
+// ?renderer=canvas draws stops on one canvas instead of a DOM marker each
+const STOP_RENDERER = mapParams.get('renderer') === 'canvas' ? 'canvas' : 'dom';
 
+// Shapes are packed per line by route.js / journey.js (polyline.js)
 function tryParsePolyline() {
-  try { return JSON.parse(sessionStorage.getItem('routePolyline') || 'null'); } catch { return null; }
+  const lineaId = sessionStorage.getItem('routeLineaId');
+  return lineaId && focusConsorcioId ? loadLinePolyline(focusConsorcioId, lineaId) : null;
 }
 function tryParseJourneyPolylines() {
-  try { return JSON.parse(sessionStorage.getItem('journeyPolylines') || 'null'); } catch { return null; }
+  try {
+    const segs = JSON.parse(sessionStorage.getItem('journeyPolylines') || 'null');
+    return segs && focusConsorcioId
+      ? segs.map(seg => ({ ...seg, poly: loadLinePolyline(focusConsorcioId, seg.lineaId) }))
+      : null;
+  } catch { return null; }
 }
-const storedPoly = hasPolyline ? tryParsePolyline() : null;
 const storedJourneyPolys = hasPolyline ? tryParseJourneyPolylines() : null;
+const storedPoly = hasPolyline && !storedJourneyPolys ? tryParsePolyline() : null;
 
 if (focusConsorcioId) {
   initMap();
@@ -170,15 +179,15 @@ function initMap() {
   const isDark = document.documentElement.getAttribute('data-theme') === 'dark' ||
     (document.documentElement.getAttribute('data-theme') !== 'light' &&
       window.matchMedia('(prefers-color-scheme: dark)').matches);
-  const tileUrl = isDark
-    ? 'https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png'
-    : 'https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png';
-  L.tileLayer(tileUrl, { maxZoom: 19 }).addTo(leafletMap);
+  // CORS requests, so sw.js can measure and keep the tiles (tiles.js)
+  tileUrl = tileTemplate(isDark);
+  baseLayer = L.tileLayer(tileUrl, { maxZoom: 19, crossOrigin: true }).addTo(leafletMap);
 
   // Zoom control bottom-right
   L.control.zoom({ position: 'bottomright' }).addTo(leafletMap);
 
   markersLayer = L.layerGroup().addTo(leafletMap);
+  leafletMap.on('moveend', scheduleStopRender);
 
   startLocationWatch();
 }
@@ -270,118 +279,376 @@ async function showMap(consorcio, focusStopId, routeStopIds) {
   requestAnimationFrame(() => leafletMap.invalidateSize());
 
   try {
-    const data = await fetchJSON(`${API}/${consorcio.idConsorcio}/paradas/`);
-    const stops = (data.paradas || []).filter(s =>
-      s.latitud && s.longitud &&
-      parseFloat(s.latitud) !== 0 && parseFloat(s.longitud) !== 0
-    );
+    const region = await loadRegionStops(consorcio);
 
-    markersLayer.clearLayers();
-    if (allMarkersLayer) { allMarkersLayer.clearLayers(); }
+    clearStopMarkers();
+    if (!allMarkersLayer) allMarkersLayer = L.layerGroup();
 
-    if (!stops.length) {
+    if (!region.stops.length) {
       mapLoading.classList.add('hidden');
       return;
     }
 
-    const stopIcon = L.divIcon({
-      className: '',
-      html: `<div class="map-stop-dot"></div>`,
-      iconSize: [14, 14],
-      iconAnchor: [7, 7],
-      popupAnchor: [0, -10],
+    // Route stops, off-route stops and the focus stop, by row in region.stops
+    const kind = new Uint8Array(region.stops.length);
+    let focusRow = -1;
+    let south = Infinity, west = Infinity, north = -Infinity, east = -Infinity;
+    region.stops.forEach((stop, i) => {
+      if (routeStopIds && !routeStopIds.has(String(stop.idParada))) return;
+      kind[i] = STOP_ROUTE;
+      if (focusStopId && String(stop.idParada) === String(focusStopId)) {
+        kind[i] = STOP_FOCUS;
+        focusRow = i;
+      }
+      south = Math.min(south, region.lat[i]); north = Math.max(north, region.lat[i]);
+      west = Math.min(west, region.lng[i]);   east = Math.max(east, region.lng[i]);
     });
+    stopKind = kind;
 
-    const dimIcon = L.divIcon({
-      className: '',
-      html: `<div class="map-stop-dot map-stop-dot-dim"></div>`,
-      iconSize: [10, 10],
-      iconAnchor: [5, 5],
-      popupAnchor: [0, -8],
-    });
+    leafletMap.invalidateSize();
+
+    if (focusRow >= 0) {
+      leafletMap.setView([region.lat[focusRow], region.lng[focusRow]], 15);
+    } else if (south <= north) {
+      leafletMap.fitBounds([[south, west], [north, east]], { padding: [40, 40] });
+    }
+    renderVisibleStops();
+    if (focusRow >= 0) {
+      if (stopCanvas) openStopPopup(focusRow);
+      else liveMarkers.get(focusRow)?.openPopup();
+    }
+
+    mapLoading.classList.add('hidden');
+
+    // Keep the region's basemap for offline use, once the visible tiles are in
+    const { grid } = region;
+    const prefetch = () => prefetchRegionTiles(consorcio.idConsorcio, [grid.minLat, grid.minLng,
+      grid.minLat + grid.rows * grid.cellDeg, grid.minLng + grid.cols * grid.cellDeg], tileUrl);
+    if (baseLayer.isLoading()) baseLayer.once('load', prefetch);
+    else prefetch();
+
+  } catch {
+    mapLoading.classList.add('hidden');
+  }
+}
 
-    const focusIcon = L.divIcon({
+// ---- Stop markers (viewport-driven) ----
+// A region's stops are parsed and grid-indexed once (spatial.js). Only stops
+// inside the padded viewport become Leaflet markers, markers are reused across
+// pans, and at low zoom dense views collapse into count bubbles. Popup HTML is
+// built when a popup opens, not per stop up front.
+const STOP_OFF   = 0;   // off-route: allMarkersLayer, only while toggled on
+const STOP_ROUTE = 1;
+const STOP_FOCUS = 2;   // always materialized, never clustered
+
+const CLUSTER_MAX_ZOOM  = 13;    // cluster below this zoom…
+const CLUSTER_MIN_STOPS = 300;   // …when more stops than this are in view
+const CLUSTER_PX        = 60;    // cluster cell on screen
+const VIEW_PAD          = 0.25;  // render this fraction of the view beyond each edge
+
+let regionStops = null;          // { id, stops, lat, lng, grid } for currentConsorcio
+let stopKind = null;             // Uint8Array, STOP_* per row of regionStops.stops
+const liveMarkers = new Map();   // row → L.marker
+let clusterLayer = null;
+let stopIcons = null;
+let stopRenderQueued = false;
+
+async function loadRegionStops(consorcio) {
+  const id = String(consorcio.idConsorcio);
+  if (regionStops?.id === id) return regionStops;
+  stopKind = null;
+
+  const data = await snapshotOr(consorcio.idConsorcio, snap => ({ paradas: snap.stopList() }),
+    `${API}/${consorcio.idConsorcio}/paradas/`);
+  const stops = (data.paradas || []).filter(s => {
+    const lat = parseFloat(s.latitud), lng = parseFloat(s.longitud);
+    return !isNaN(lat) && !isNaN(lng) && lat !== 0 && lng !== 0;
+  });
+  const lat = Float64Array.from(stops, s => parseFloat(s.latitud));
+  const lng = Float64Array.from(stops, s => parseFloat(s.longitud));
+  regionStops = { id, stops, lat, lng, grid: buildStopGrid(lat, lng) };
+  return regionStops;
+}
+
+function getStopIcons() {
+  if (!stopIcons) {
+    stopIcons = {
+      [STOP_ROUTE]: L.divIcon({
+        className: '',
+        html: `<div class="map-stop-dot"></div>`,
+        iconSize: [14, 14],
+        iconAnchor: [7, 7],
+        popupAnchor: [0, -10],
+      }),
+      [STOP_OFF]: L.divIcon({
+        className: '',
+        html: `<div class="map-stop-dot map-stop-dot-dim"></div>`,
+        iconSize: [10, 10],
+        iconAnchor: [5, 5],
+        popupAnchor: [0, -8],
+      }),
+      [STOP_FOCUS]: L.divIcon({
+        className: '',
+        html: `<div class="map-stop-dot map-stop-dot-focus"></div>`,
+        iconSize: [20, 20],
+        iconAnchor: [10, 10],
+        popupAnchor: [0, -13],
+      }),
+    };
+  }
+  return stopIcons;
+}
+
+function stopPopupHtml(row) {
+  const stop = regionStops.stops[row];
+  return `
+    <div class="map-popup">
+      <div class="map-popup-name">${escHtml(stop.nombre)}</div>
+      <div class="map-popup-meta">${escHtml([stop.nucleo, stop.municipio].filter(Boolean).join(' · '))}</div>
+      <a class="map-popup-btn" href="station.html?c=${currentConsorcio.idConsorcio}&s=${stop.idParada}&from=${encodeURIComponent('map.html')}">
+        ${ms('viewDepartures')} →
+      </a>
+    </div>
+  `;
+}
+
+function makeStopMarker(row) {
+  const k = stopKind[row];
+  const marker = L.marker([regionStops.lat[row], regionStops.lng[row]], { icon: getStopIcons()[k] });
+  marker.bindPopup(() => stopPopupHtml(row), { closeButton: false, className: 'map-leaflet-popup', maxWidth: 220 });
+  (k === STOP_OFF ? allMarkersLayer : markersLayer).addLayer(marker);
+  return marker;
+}
+
+function makeClusterMarker(cluster) {
+  const count = cluster.ids.length;
+  const size = count < 10 ? 28 : count < 100 ? 34 : 40;
+  const marker = L.marker([cluster.lat, cluster.lng], {
+    icon: L.divIcon({
       className: '',
-      html: `<div class="map-stop-dot map-stop-dot-focus"></div>`,
-      iconSize: [20, 20],
-      iconAnchor: [10, 10],
-      popupAnchor: [0, -13],
+      html: `<div class="map-stop-cluster">${count}</div>`,
+      iconSize: [size, size],
+      iconAnchor: [size / 2, size / 2],
+    }),
+  });
+  marker.on('click', () => {
+    const lats = cluster.ids.map(i => regionStops.lat[i]);
+    const lngs = cluster.ids.map(i => regionStops.lng[i]);
+    leafletMap.fitBounds([[Math.min(...lats), Math.min(...lngs)], [Math.max(...lats), Math.max(...lngs)]],
+      { padding: [40, 40], maxZoom: CLUSTER_MAX_ZOOM });
+  });
+  return marker;
+}
+
+// Markers live in layer groups, so they must leave the group, not just the map
+function dropStopMarker(marker) {
+  markersLayer.removeLayer(marker);
+  if (allMarkersLayer) allMarkersLayer.removeLayer(marker);
+}
+
+function clearStopMarkers() {
+  liveMarkers.forEach(dropStopMarker);
+  liveMarkers.clear();
+  if (clusterLayer) clusterLayer.clearLayers();
+}
+
+function scheduleStopRender() {
+  if (stopRenderQueued) return;
+  stopRenderQueued = true;
+  requestAnimationFrame(() => {
+    stopRenderQueued = false;
+    renderVisibleStops();
+  });
+}
+
+// Materialize markers for the stops in view; drop the ones that left it
+function renderVisibleStops() {
+  if (!regionStops || !stopKind || stopKind.length !== regionStops.stops.length) return;
+  if (STOP_RENDERER === 'canvas') {
+    if (!stopCanvas) stopCanvas = new StopCanvasLayer().addTo(leafletMap);
+    stopCanvas.redraw();
+    return;
+  }
+  if (!clusterLayer) clusterLayer = L.layerGroup().addTo(leafletMap);
+
+  const view = leafletMap.getBounds().pad(VIEW_PAD);
+  const zoom = leafletMap.getZoom();
+  const visible = gridQuery(regionStops.grid, view.getSouth(), view.getWest(), view.getNorth(), view.getEast())
+    .filter(i => stopKind[i] !== STOP_OFF || showingAllStops);
+
+  const wanted = new Set();
+  stopKind.forEach((k, i) => { if (k === STOP_FOCUS) wanted.add(i); });
+
+  clusterLayer.clearLayers();
+  const loose = visible.filter(i => stopKind[i] !== STOP_FOCUS);
+  if (zoom < CLUSTER_MAX_ZOOM && loose.length > CLUSTER_MIN_STOPS) {
+    clusterStops(regionStops.grid, loose, zoom, CLUSTER_PX).forEach(c => {
+      if (c.ids.length === 1) wanted.add(c.ids[0]);
+      else clusterLayer.addLayer(makeClusterMarker(c));
     });
+  } else {
+    loose.forEach(i => wanted.add(i));
+  }
 
-    const bounds = [];
-    let focusMarker = null;
-
-    stops.forEach(stop => {
-      const lat = parseFloat(stop.latitud);
-      const lng = parseFloat(stop.longitud);
-      if (isNaN(lat) || isNaN(lng)) return;
-
-      const isFocus = focusStopId && String(stop.idParada) === String(focusStopId);
-      const isRouteStop = !routeStopIds || routeStopIds.has(String(stop.idParada));
-
-      const popupContent = `
-        <div class="map-popup">
-          <div class="map-popup-name">${escHtml(stop.nombre)}</div>
-          <div class="map-popup-meta">${escHtml([stop.nucleo, stop.municipio].filter(Boolean).join(' · '))}</div>
-          <a class="map-popup-btn" href="station.html?c=${consorcio.idConsorcio}&s=${stop.idParada}&from=${encodeURIComponent('map.html')}">
-            ${ms('viewDepartures')} →
-          </a>
-        </div>
-      `;
+  liveMarkers.forEach((marker, i) => {
+    if (!wanted.has(i) && !marker.isPopupOpen()) {
+      dropStopMarker(marker);
+      liveMarkers.delete(i);
+    }
+  });
+  wanted.forEach(i => {
+    if (!liveMarkers.has(i)) liveMarkers.set(i, makeStopMarker(i));
+  });
+}
+renderVisibleStops = perfWrap('render', renderVisibleStops);
+
+// ---- Canvas stop layer ----
+// The ?renderer=canvas alternative to DOM markers: every stop in the padded
+// viewport is drawn onto one canvas, so there are no per-stop nodes to add or
+// remove when panning or toggling off-route stops. Taps are hit-tested against
+// the same grid index. Redraws on moveend; hidden while a zoom animates.
+const CANVAS_HIT_PX = 12;
+const CANVAS_DOT = {   // radius, fill, stroke width — matches the .map-stop-dot variants
+  [STOP_OFF]:   [5, '#aab', 1.5],
+  [STOP_ROUTE]: [7, null, 2.5],
+  [STOP_FOCUS]: [10, null, 3],
+};
 
-      if (isRouteStop) {
-        bounds.push([lat, lng]);
-        const marker = L.marker([lat, lng], { icon: isFocus ? focusIcon : stopIcon });
-        marker.bindPopup(popupContent, { closeButton: false, className: 'map-leaflet-popup', maxWidth: 220 });
-        markersLayer.addLayer(marker);
-        if (isFocus) focusMarker = marker;
-      } else {
-        // Off-route stop: add to allMarkersLayer with dimmed icon
-        if (!allMarkersLayer) allMarkersLayer = L.layerGroup();
-        const marker = L.marker([lat, lng], { icon: dimIcon });
-        marker.bindPopup(popupContent, { closeButton: false, className: 'map-leaflet-popup', maxWidth: 220 });
-        allMarkersLayer.addLayer(marker);
+let stopCanvas = null;
+
+const StopCanvasLayer = L.Layer.extend({
+  onAdd(map) {
+    this._canvas = L.DomUtil.create('canvas', 'map-stop-canvas');
+    map.getPanes().overlayPane.appendChild(this._canvas);
+    map.on('click', this._onClick, this);
+    map.on('mousemove', this._onHover, this);
+    map.on('zoomstart', this._hide, this);
+    map.on('resize', this.redraw, this);
+  },
+
+  onRemove(map) {
+    this._canvas.remove();
+    map.off('click', this._onClick, this);
+    map.off('mousemove', this._onHover, this);
+    map.off('zoomstart', this._hide, this);
+    map.off('resize', this.redraw, this);
+  },
+
+  _hide() {
+    this._canvas.style.visibility = 'hidden';
+  },
+
+  redraw() {
+    const map = this._map;
+    const canvas = this._canvas;
+    const size = map.getSize();
+    const pad = size.multiplyBy(VIEW_PAD).round();
+    const full = size.add(pad.multiplyBy(2));
+    const dpr = window.devicePixelRatio || 1;
+    const origin = map.containerPointToLayerPoint([0, 0]).subtract(pad);
+
+    canvas.width = full.x * dpr;
+    canvas.height = full.y * dpr;
+    canvas.style.width = `${full.x}px`;
+    canvas.style.height = `${full.y}px`;
+    L.DomUtil.setPosition(canvas, origin);
+    canvas.style.visibility = '';
+
+    const ctx = canvas.getContext('2d');
+    ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+    ctx.clearRect(0, 0, full.x, full.y);
+
+    const view = map.getBounds().pad(VIEW_PAD);
+    const rows = gridQuery(regionStops.grid, view.getSouth(), view.getWest(), view.getNorth(), view.getEast());
+    const brand = getComputedStyle(document.documentElement).getPropertyValue('--brand').trim() || '#1a6fdb';
+
+    // Dimmed stops first so route stops and the focus stop sit on top
+    [STOP_OFF, STOP_ROUTE, STOP_FOCUS].forEach(kind => {
+      if (kind === STOP_OFF && !showingAllStops) return;
+      const [r, fill, stroke] = CANVAS_DOT[kind];
+      ctx.globalAlpha = kind === STOP_OFF ? 0.55 : 1;
+      ctx.fillStyle = fill || brand;
+      ctx.strokeStyle = '#fff';
+      ctx.lineWidth = stroke;
+      ctx.beginPath();
+      rows.forEach(i => {
+        if (stopKind[i] !== kind) return;
+        const p = map.latLngToLayerPoint([regionStops.lat[i], regionStops.lng[i]]).subtract(origin);
+        ctx.moveTo(p.x + r, p.y);
+        ctx.arc(p.x, p.y, r, 0, 2 * Math.PI);
+      });
+      ctx.fill();
+      ctx.stroke();
+    });
+    ctx.globalAlpha = 1;
+  },
+
+  // Nearest drawn stop within CANVAS_HIT_PX of a container point, or -1
+  hitTest(point) {
+    const map = this._map;
+    const sw = map.containerPointToLatLng(point.add([-CANVAS_HIT_PX, CANVAS_HIT_PX]));
+    const ne = map.containerPointToLatLng(point.add([CANVAS_HIT_PX, -CANVAS_HIT_PX]));
+    let best = -1, bestDist = CANVAS_HIT_PX ** 2 + 1;
+    gridQuery(regionStops.grid, sw.lat, sw.lng, ne.lat, ne.lng).forEach(i => {
+      if (stopKind[i] === STOP_OFF && !showingAllStops) return;
+      const p = map.latLngToContainerPoint([regionStops.lat[i], regionStops.lng[i]]);
+      const d = (p.x - point.x) ** 2 + (p.y - point.y) ** 2;
+      if (d < bestDist || (d === bestDist && stopKind[i] > stopKind[best])) {
+        best = i;
+        bestDist = d;
       }
     });
+    return best;
+  },
 
-    leafletMap.invalidateSize();
+  _onClick(e) {
+    const row = this.hitTest(e.containerPoint);
+    if (row >= 0) openStopPopup(row);
+  },
 
-    if (focusMarker) {
-      leafletMap.setView(focusMarker.getLatLng(), 15);
-      focusMarker.openPopup();
-    } else if (bounds.length) {
-      leafletMap.fitBounds(bounds, { padding: [40, 40] });
-    }
+  _onHover(e) {
+    this._map.getContainer().style.cursor = this.hitTest(e.containerPoint) >= 0 ? 'pointer' : '';
+  },
+});
 
-    mapLoading.classList.add('hidden');
+function openStopPopup(row) {
+  const offset = CANVAS_DOT[stopKind[row]][0] + 3;
+  L.popup({ closeButton: false, className: 'map-leaflet-popup', maxWidth: 220, offset: [0, -offset] })
+    .setLatLng([regionStops.lat[row], regionStops.lng[row]])
+    .setContent(stopPopupHtml(row))
+    .openOn(leafletMap);
+}
 
-  } catch {
-    mapLoading.classList.add('hidden');
-  }
+// ---- Line shapes by zoom ----
+// Each drawn layer keeps its decoded shape; on zoomend it gets the points
+// that zoom level needs.
+let shapeLayers = [];
+function drawShape(poly, style) {
+  const layer = L.polyline(polylineLatLngs(poly, leafletMap.getZoom()), style).addTo(leafletMap);
+  if (!shapeLayers.length) leafletMap.on('zoomend', updateShapes);
+  shapeLayers.push({ layer, poly });
+  return layer;
+}
+function updateShapes() {
+  const zoom = leafletMap.getZoom();
+  shapeLayers = shapeLayers.filter(({ layer }) => leafletMap.hasLayer(layer));
+  shapeLayers.forEach(({ layer, poly }) => layer.setLatLngs(polylineLatLngs(poly, zoom)));
+  if (!shapeLayers.length) leafletMap.off('zoomend', updateShapes);
 }
 
 // ---- Route polyline ----
-async function drawRoutePolyline(polyData) {
-  if (!leafletMap || !polyData?.length) return;
+// poly: { lat, lng, levels } from loadLinePolyline()
+async function drawRoutePolyline(poly) {
+  if (!leafletMap || !poly?.lat.length) return;
   if (polylineLayer) { polylineLayer.remove(); polylineLayer = null; }
 
-  // The API returns polyline points as arrays: ["lat,lng,z"] or objects {latitud, longitud}
-  const latLngs = polyData.map(p => {
-    if (Array.isArray(p)) {
-      const parts = String(p[0]).split(',');
-      return [parseFloat(parts[0]), parseFloat(parts[1])];
-    }
-    return [parseFloat(p.latitud ?? p.lat), parseFloat(p.longitud ?? p.lng ?? p.lon)];
-  }).filter(([lat, lng]) => !isNaN(lat) && !isNaN(lng));
-  if (!latLngs.length) return;
-
-  polylineLayer = L.polyline(latLngs, {
+  polylineLayer = drawShape(poly, {
     color: '#1a6fdb',
     weight: 4,
     opacity: 0.85,
     lineJoin: 'round',
     lineCap: 'round',
-  }).addTo(leafletMap);
+  });
 
   // Show route code label on pill if available
   const routeCode = sessionStorage.getItem('routePolylineCode');
@@ -391,7 +658,9 @@ async function drawRoutePolyline(polyData) {
   const lineaId = sessionStorage.getItem('routeLineaId');
   if (lineaId && currentConsorcio) {
     try {
-      const data = await fetchJSON(`${API}/${currentConsorcio.idConsorcio}/lineas/${lineaId}/paradas`);
+      const cid = currentConsorcio.idConsorcio;
+      const data = await snapshotOr(cid, snap => snap.lineStops(lineaId) && { paradas: snap.lineStops(lineaId) },
+        `${API}/${cid}/lineas/${lineaId}/paradas`);
       const routeStopIds = new Set(
         (data.paradas || []).map(p => String(p.idParada))
       );
@@ -411,11 +680,11 @@ async function drawRoutePolyline(polyData) {
   }
 
   // Fit to polyline bounds (after potential re-render above)
-  leafletMap.fitBounds(polylineLayer.getBounds(), { padding: [40, 40] });
+  leafletMap.fitBounds(polylineBounds(poly), { padding: [40, 40] });
 }
 
 // ---- Multi-leg journey polylines ----
-// journeyPolys = [{ points: [...], color: '#hex', code: 'M-221', lineaId: '22' }, ...]
+// journeyPolys = [{ poly: { lat, lng, levels }, color: '#hex', code: 'M-221', lineaId: '22' }, ...]
 let journeyPolylineLayers = [];
 async function drawJourneyPolylines(journeyPolys) {
   if (!leafletMap || !journeyPolys?.length) return;
@@ -428,24 +697,16 @@ async function drawJourneyPolylines(journeyPolys) {
   if (label) regionPillName.textContent = label;
 
   for (const seg of journeyPolys) {
-    const latLngs = (seg.points || []).map(p => {
-      if (Array.isArray(p)) {
-        const parts = String(p[0]).split(',');
-        return [parseFloat(parts[0]), parseFloat(parts[1])];
-      }
-      return [parseFloat(p.latitud ?? p.lat), parseFloat(p.longitud ?? p.lng ?? p.lon)];
-    }).filter(([lat, lng]) => !isNaN(lat) && !isNaN(lng));
-    if (!latLngs.length) continue;
-
-    const layer = L.polyline(latLngs, {
+    if (!seg.poly?.lat.length) continue;
+    const layer = drawShape(seg.poly, {
       color: seg.color || '#1a6fdb',
       weight: 5,
       opacity: 0.9,
       lineJoin: 'round',
       lineCap: 'round',
-    }).addTo(leafletMap);
+    });
     journeyPolylineLayers.push(layer);
-    allBounds.push(...latLngs);
+    allBounds.push(...polylineBounds(seg.poly));
   }
 
   // Filter stop markers to only those on the journey's lines
@@ -454,7 +715,9 @@ async function drawJourneyPolylines(journeyPolys) {
       const lineaIds = journeyPolys.map(p => p.lineaId).filter(Boolean);
       const routeStopIds = new Set();
       await Promise.all(lineaIds.map(async id => {
-        const data = await fetchJSON(`${API}/${currentConsorcio.idConsorcio}/lineas/${id}/paradas`);
+        const cid = currentConsorcio.idConsorcio;
+        const data = await snapshotOr(cid, snap => snap.lineStops(id) && { paradas: snap.lineStops(id) },
+          `${API}/${cid}/lineas/${id}/paradas`);
         (data.paradas || []).forEach(p => routeStopIds.add(String(p.idParada)));
       }));
       if (routeStopIds.size) {
@@ -484,6 +747,7 @@ allStopsToggle.addEventListener('click', () => {
     allStopsToggleLabel.textContent = ms('showAllStops');
     allStopsToggle.classList.remove('active');
   }
+  renderVisibleStops();
 });
 
 // ---- Region switcher ----
@@ -498,12 +762,6 @@ regionBtn.addEventListener('click', () => {
 });
 
 // ---- Helpers ----
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;').replace(/</g, '&lt;')
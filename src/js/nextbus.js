@@ -0,0 +1,168 @@
+// ===== nextbus — saved stops' next departures, fetched ahead =====
+// While the home screen sits idle it fetches the next departure windows of
+// every saved stop on the scheduler's 'prefetch' lane, so anything the user
+// asks for goes first. sw.js keeps each servicios window it passes on (see
+// its "API responses" section); home.js reads them back to show the next bus
+// on each saved stop, and station.js paints a saved stop from them before
+// its own sweep. Where the browser allows periodic background sync, the
+// worker refreshes the same windows itself (its "Saved stops" section).
+//
+// A daily byte budget keeps this from draining mobile data. Its ledger and
+// the list of stops live in NEXTBUS_STATE in the worker's cache, which the
+// worker can read and the pages can write. Nothing is fetched under
+// Save-Data or on 2G, or before a service worker controls the page (without
+// it nothing would be kept). Needs api.js.
+
+const NEXTBUS_CACHE       = 'ctan-api-sw';               // sw.js API_SW_CACHE
+const NEXTBUS_STATE       = '__nextbus__/state.json';    // { api, stops, budget, day, bytes }
+const NEXTBUS_DAILY_BYTES = 512 * 1024;
+const NEXTBUS_MAX_STOPS   = 8;
+const NEXTBUS_WINDOWS     = 2;                 // servicios windows per stop (about 2 h)
+const NEXTBUS_REFRESH_MS  = 5 * 60 * 1000;     // a stop fetched more recently is skipped
+const NEXTBUS_WARM_MS     = 15 * 60 * 1000;    // oldest copy worth painting (sw.js fallback age)
+const NEXTBUS_SYNC_TAG    = 'nextbus';
+const NEXTBUS_SYNC_EVERY  = 30 * 60 * 1000;
+
+// horaIni for a servicios window starting at `date` (as station.js)
+function nextBusHoraIni(date) {
+  const pad = n => String(n).padStart(2, '0');
+  return `${pad(date.getDate())}-${pad(date.getMonth() + 1)}-${date.getFullYear()}+${pad(date.getHours())}:${pad(date.getMinutes())}`;
+}
+
+// 'yyyy-mm-dd HH:MM', comparable with the X-Window bounds sw.js stores
+function nextBusMinuteKey(date) {
+  const pad = n => String(n).padStart(2, '0');
+  return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())} ${pad(date.getHours())}:${pad(date.getMinutes())}`;
+}
+
+function nextBusUrl(consorcioId, stopId, date) {
+  return `${API}/${consorcioId}/paradas/${stopId}/servicios?horaIni=${nextBusHoraIni(date)}`;
+}
+
+// ---- Warm reads ----
+/**
+ * The services of every cached window for the stop that is still running at
+ * `now` and no older than maxAge, deduplicated, with the time of the oldest
+ * window used: { services, at }. null when there is no such window; an
+ * empty list when there are windows but no buses in them.
+ */
+async function warmDepartures(consorcioId, stopId, now = new Date(), maxAge = NEXTBUS_WARM_MS) {
+  if (!('caches' in window)) return null;
+  try {
+    const cache = await caches.open(NEXTBUS_CACHE);
+    const windows = await cache.matchAll(nextBusUrl(consorcioId, stopId, now), { ignoreSearch: true });
+    const nowKey = nextBusMinuteKey(now);
+    const seen = new Set(), services = [];
+    let at = Infinity;
+    for (const res of windows) {
+      const end = (res.headers.get('X-Window') || '').split('|')[1];
+      const cachedAt = +res.headers.get('X-Cached-At');
+      if (!end || end < nowKey || Date.now() - cachedAt > maxAge) continue;
+      for (const s of (await res.json()).servicios || []) {
+        const key = `${s.idLinea}|${s.servicio}`;
+        if (!seen.has(key)) { seen.add(key); services.push(s); }
+      }
+      at = Math.min(at, cachedAt);
+    }
+    return at === Infinity ? null : { services, at };
+  } catch { return null; }
+}
+
+// The first `n` services not yet gone at `now`, soonest first, with minutes to go
+function upcomingDepartures(services, now, n = 1) {
+  const mins = s => {
+    const [hh, mm] = s.servicio.split(':').map(Number);
+    const t = new Date(now);
+    t.setHours(hh, mm, 0, 0);
+    return Math.round((t - now) / 60000);
+  };
+  return services
+    .map(s => ({ ...s, mins: mins(s) }))
+    .filter(s => s.mins >= 0)
+    .sort((a, b) => a.mins - b.mins)
+    .slice(0, n);
+}
+
+// ---- Budget + state shared with sw.js ----
+async function nextBusState() {
+  const today = new Date().toDateString();
+  let state = null;
+  try {
+    const res = await (await caches.open(NEXTBUS_CACHE)).match(NEXTBUS_STATE);
+    state = res ? await res.json() : null;
+  } catch { /* no state yet */ }
+  state = { api: API, stops: [], budget: NEXTBUS_DAILY_BYTES, day: today, bytes: 0, ...state };
+  if (state.day !== today) Object.assign(state, { day: today, bytes: 0 });
+  return state;
+}
+
+async function saveNextBusState(state) {
+  try {
+    await (await caches.open(NEXTBUS_CACHE)).put(NEXTBUS_STATE, new Response(JSON.stringify(state), {
+      headers: { 'Content-Type': 'application/json' },
+    }));
+  } catch { /* storage unavailable */ }
+}
+
+function nextBusAllowed() {
+  const conn = navigator.connection;
+  return !conn?.saveData && !/2g/.test(conn?.effectiveType || '');
+}
+
+// ---- Prefetch ----
+/**
+ * Fetch the next NEXTBUS_WINDOWS windows of each saved stop (the first
+ * NEXTBUS_MAX_STOPS) that wasn't fetched in the last NEXTBUS_REFRESH_MS,
+ * until the day's budget is spent. Resolves to { stops, fetched, bytes,
+ * stopped, services } — fetched counts windows, bytes is the day's total so
+ * far, services maps 'consorcio:stop' to what was fetched — or null when
+ * prefetching isn't possible right now.
+ */
+async function prefetchSavedStops(stops) {
+  if (!nextBusAllowed() || !navigator.serviceWorker?.controller || !('caches' in window)) return null;
+  const state = await nextBusState();
+  state.api = API;
+  state.stops = stops.slice(0, NEXTBUS_MAX_STOPS).map(s => ({ c: String(s.idConsorcio), s: String(s.idParada) }));
+  state.budget = NEXTBUS_DAILY_BYTES;
+
+  const report = { stops: 0, fetched: 0, bytes: 0, stopped: false, services: {} };
+  for (const { c, s } of state.stops) {
+    const now = new Date();
+    const warm = await warmDepartures(c, s, now, NEXTBUS_REFRESH_MS);
+    if (warm) continue;
+    report.stops++;
+    const services = report.services[`${c}:${s}`] = [];
+    let cursor = now;
+    for (let w = 0; w < NEXTBUS_WINDOWS; w++) {
+      if (state.bytes >= state.budget) {
+        report.stopped = true;
+        break;
+      }
+      let data;
+      try {
+        data = await fetchJSON(nextBusUrl(c, s, cursor), { lane: 'prefetch' });
+      } catch { break; }
+      state.bytes += JSON.stringify(data).length;
+      report.fetched++;
+      services.push(...(data.servicios || []));
+      if (!data.horaFin) break;
+      cursor = new Date(new Date(data.horaFin.replace(' ', 'T')).getTime() + 60000);
+    }
+    if (report.stopped) break;
+  }
+  report.bytes = state.bytes;
+  await saveNextBusState(state);
+  return report;
+}
+
+// Ask for periodic background sync of the saved stops where it's granted
+async function registerNextBusSync() {
+  try {
+    const reg = await navigator.serviceWorker?.getRegistration();
+    if (!reg?.periodicSync || !nextBusAllowed()) return false;
+    const { state } = await navigator.permissions.query({ name: 'periodic-background-sync' });
+    if (state !== 'granted') return false;
+    await reg.periodicSync.register(NEXTBUS_SYNC_TAG, { minInterval: NEXTBUS_SYNC_EVERY });
+    return true;
+  } catch { return false; }
+}
@@ -0,0 +1,148 @@
+// ===== perf — User Timing spans + per-endpoint latency histograms =====
+// Off unless the perfTrace cookie is set (Settings → Diagnostics, or a test).
+// Off, perfStart() and perfFetch() hand back one shared no-op and perfWrap()
+// returns the function it was given, so instrumented code pays a boolean
+// check and nothing else.
+//
+// On, every span becomes a performance.measure() named '<kind>:<name>' —
+// fetch:paradas/:id/servicios (fetchJSON, by endpoint, named as the stub's
+// stats name them), compute:transfers, render:renderGrid — and is counted
+// into a latency histogram per name (PERF_BUCKETS, ms). Spans can carry a
+// tag; fetch spans are tagged with where the answer came from (network,
+// memory, cache, stale, offline, error, aborted). Each page adds its counts
+// to localStorage PERF_STORE when it is hidden, so the Settings panel shows
+// every page's; perfSnapshot() gives the same figures to the panel's export
+// and to Playwright. Needs i18n.js (cookies); load it before api.js.
+
+const PERF_COOKIE  = 'perfTrace';
+const PERF_STORE   = 'perfStats';   // localStorage: span name → counts
+const PERF_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000];   // ms, upper bounds; one more bucket past the last
+const PERF_ENABLED = getCookie(PERF_COOKIE) === '1';
+
+const perfPending = {};   // this page's counts, not yet in PERF_STORE
+
+function perfNoop() {}
+
+// ---- Spans ----
+/**
+ * Start a span; call what it returns to end it, with an optional tag.
+ *   const end = perfStart('render', 'renderGrid'); … end();
+ */
+function perfStart(kind, name) {
+  if (!PERF_ENABLED) return perfNoop;
+  const start = performance.now();
+  return tag => {
+    const end = performance.now();
+    const label = `${kind}:${name}`;
+    performance.measure(label, { start, end, detail: tag ? { tag } : null });
+    perfAdd(perfPending, label, end - start, tag);
+  };
+}
+
+// A fetch span for an API or data URL; the endpoint name is only worked out when enabled
+function perfFetch(url) {
+  return PERF_ENABLED ? perfStart('fetch', perfEndpoint(url)) : perfNoop;
+}
+
+// fn itself when disabled, else fn timed as a '<kind>:<fn.name>' span (until it settles, if async)
+function perfWrap(kind, fn) {
+  if (!PERF_ENABLED) return fn;
+  return function (...args) {
+    const end = perfStart(kind, fn.name);
+    let result;
+    try {
+      result = fn.apply(this, args);
+    } catch (err) {
+      end('error');
+      throw err;
+    }
+    if (result instanceof Promise) result.then(() => end(), () => end('error'));
+    else end();
+    return result;
+  };
+}
+
+// 4/paradas/149/servicios?horaIni=… → paradas/:id/servicios (tools/ctan_stub.py endpoint_name)
+function perfEndpoint(url) {
+  const path = url.split('?')[0];
+  const api = path.match(/\/Consorcios\/(.*)$/);
+  const parts = (api ? api[1] : `data/${path.split('/').pop()}`).split('/').filter(Boolean);
+  if (/^\d+$/.test(parts[0])) parts.shift();   // the consortium id
+  return parts.map(p => /^\d+$/.test(p) ? ':id' : p).join('/') || 'consorcios';
+}
+
+// ---- Histograms ----
+function perfEmpty() {
+  return { count: 0, totalMs: 0, maxMs: 0, buckets: new Array(PERF_BUCKETS.length + 1).fill(0), tags: {} };
+}
+
+function perfAdd(stats, name, ms, tag) {
+  const s = stats[name] ||= perfEmpty();
+  const bucket = PERF_BUCKETS.findIndex(limit => ms <= limit);
+  s.count++;
+  s.totalMs += ms;
+  s.maxMs = Math.max(s.maxMs, ms);
+  s.buckets[bucket < 0 ? PERF_BUCKETS.length : bucket]++;
+  if (tag) s.tags[tag] = (s.tags[tag] || 0) + 1;
+}
+
+function perfMerge(into, from) {
+  for (const [name, s] of Object.entries(from)) {
+    const t = into[name] ||= perfEmpty();
+    t.count += s.count;
+    t.totalMs += s.totalMs;
+    t.maxMs = Math.max(t.maxMs, s.maxMs);
+    s.buckets.forEach((n, i) => { t.buckets[i] += n; });
+    for (const [tag, n] of Object.entries(s.tags)) t.tags[tag] = (t.tags[tag] || 0) + n;
+  }
+  return into;
+}
+
+// Upper bound of the bucket holding quantile q (Infinity past the last bucket)
+function perfQuantile(s, q) {
+  let seen = 0;
+  for (let i = 0; i < s.buckets.length; i++) {
+    seen += s.buckets[i];
+    if (seen >= q * s.count) return PERF_BUCKETS[i] ?? Infinity;
+  }
+  return Infinity;
+}
+
+// ---- Store (shared by every page) ----
+function perfStored() {
+  try { return JSON.parse(localStorage.getItem(PERF_STORE)) || {}; } catch { return {}; }
+}
+
+function perfFlush() {
+  if (!Object.keys(perfPending).length) return;
+  try {
+    localStorage.setItem(PERF_STORE, JSON.stringify(perfMerge(perfStored(), perfPending)));
+  } catch { /* storage full or unavailable: keep counting in memory */ return; }
+  for (const name of Object.keys(perfPending)) delete perfPending[name];
+}
+
+/**
+ * Every page's counts so far: { enabled, buckets, stats } with stats mapping
+ * span name → { count, totalMs, maxMs, buckets, tags }.
+ */
+function perfSnapshot() {
+  return { enabled: PERF_ENABLED, buckets: PERF_BUCKETS, stats: perfMerge(perfMerge({}, perfStored()), perfPending) };
+}
+
+function perfReset() {
+  localStorage.removeItem(PERF_STORE);
+  for (const name of Object.keys(perfPending)) delete perfPending[name];
+  performance.clearMeasures();
+}
+
+// Takes effect from the next page load
+function setPerfEnabled(on) {
+  setCookie(PERF_COOKIE, on ? '1' : '', on ? 365 : -1);
+}
+
+if (PERF_ENABLED) {
+  addEventListener('pagehide', perfFlush);
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') perfFlush();
+  });
+}
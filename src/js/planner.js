@@ -1,5 +1,3 @@
-const API = 'https://api.ctan.es/v1/Consorcios';
-
 const CONSORTIUM_ICONS = {
   '1': '🌻', '2': '⚓', '3': '🏛️', '4': '☀️',
   '5': '🪨', '6': '🎸', '7': '🫒', '8': '🕌', '9': '🌊',
@@ -102,12 +100,12 @@ const defaultRegionChip  = document.getElementById('default-region-chip');
 // ---- State ----
 let currentConsorcio = null;
 let allNucleos = [];
+let nucleoSearchList = null;   // search.js index over allNucleos
 let selectedFrom = null;
 let selectedTo = null;
 let fromSearchTimeout = null;
 let toSearchTimeout = null;
-let lastResultsData = null;   // cached for lang re-render
-let lastResultsNow = null;
+let lastResults = null;   // the last search's decoded plan, for lang re-render
 let selectedDateMode = 'today';
 let selectedPickedDate = null;
 
@@ -133,6 +131,8 @@ function setDateMode(mode) {
 
 // Set min date to today so past dates can't be picked
 datePickerInput.min = new Date().toISOString().slice(0, 10);
+// …nor past the last year of holiday data, where holidays would count as weekdays
+loadServiceCalendar().then(() => { datePickerInput.max = serviceCalendarLastDay() || ''; });
 
 dateBtnToday.addEventListener('click',    () => setDateMode('today'));
 dateBtnTomorrow.addEventListener('click', () => setDateMode('tomorrow'));
@@ -141,6 +141,7 @@ dateBtnPick.addEventListener('click', () => {
   try { datePickerInput.showPicker(); } catch { datePickerInput.focus(); }
 });
 datePickerInput.addEventListener('change', () => {
+  if (datePickerInput.max && datePickerInput.value > datePickerInput.max) datePickerInput.value = datePickerInput.max;
   if (datePickerInput.value) {
     const [y, m, d] = datePickerInput.value.split('-').map(Number);
     selectedPickedDate = new Date(y, m - 1, d, 0, 0, 0, 0);
@@ -174,10 +175,10 @@ langToggle.addEventListener('click', () => {
   applyLang();
   if (!stepRegion.classList.contains('hidden')) {
     loadRegions();
-  } else if (!stepResults.classList.contains('hidden') && lastResultsData) {
+  } else if (!stepResults.classList.contains('hidden') && lastResults) {
     // Re-render results so "via", "in X min" etc. switch language instantly
     routeSummary.textContent = `${selectedFrom.nombre}  →  ${selectedTo.nombre}`;
-    renderResults(lastResultsData, lastResultsNow);
+    renderResults(lastResults);
   }
 });
 
@@ -225,8 +226,9 @@ async function restoreSearch(cId, fromId, toId) {
     if (!consorcio) { loadRegions(); return; }
     currentConsorcio = consorcio;
 
-    const nData = await fetchJSON(`${API}/${cId}/nucleos`);
+    const nData = await snapshotOr(cId, snap => ({ nucleos: snap.nucleoList() }), `${API}/${cId}/nucleos`);
     allNucleos = nData.nucleos || [];
+    nucleoSearch();
 
     selectedFrom = allNucleos.find(n => String(n.idNucleo) === String(fromId));
     selectedTo   = allNucleos.find(n => String(n.idNucleo) === String(toId));
@@ -290,8 +292,10 @@ async function selectRegion(c) {
   showPlannerStep(stepForm);
 
   try {
-    const data = await fetchJSON(`${API}/${c.idConsorcio}/nucleos`);
+    const data = await snapshotOr(c.idConsorcio, snap => ({ nucleos: snap.nucleoList() }),
+      `${API}/${c.idConsorcio}/nucleos`);
     allNucleos = data.nucleos || [];
+    nucleoSearch();
   } catch {
     // non-fatal — search will just show nothing
   }
@@ -313,17 +317,18 @@ function setupSearch(input, resultsEl, onSelect) {
   });
 }
 
-function normalize(str) {
-  return str.toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
+// Index over allNucleos, rebuilt whenever the list is replaced
+function nucleoSearch() {
+  if (nucleoSearchList?.items !== allNucleos) {
+    nucleoSearchList = createSearchList(`nucleos-${currentConsorcio.idConsorcio}`, allNucleos, [n => n.nombre]);
+  }
+  return nucleoSearchList;
 }
 
 function renderDropdown(input, resultsEl, onSelect) {
-  const q = normalize(input.value.trim());
-  if (!q) { hideDropdown(input, resultsEl); return; }
+  if (!input.value.trim()) { hideDropdown(input, resultsEl); return; }
 
-  const matches = allNucleos
-    .filter(n => normalize(n.nombre).includes(q))
-    .slice(0, 10);
+  const matches = nucleoSearch().search(input.value, 10);
 
   if (!matches.length) { hideDropdown(input, resultsEl); return; }
 
@@ -377,7 +382,7 @@ searchBtn.addEventListener('click', runSearch);
 async function runSearch() {
   if (!selectedFrom || !selectedTo) return;
   showPlannerStep(stepResults);
-  resultsList.innerHTML = '<div class="loading-spinner"></div>';
+  clearResultCards('<div class="loading-spinner"></div>');
   resultsNoService.classList.add('hidden');
   directSection.classList.add('hidden');
   routeSummary.textContent = `${selectedFrom.nombre}  →  ${selectedTo.nombre}`;
@@ -385,251 +390,108 @@ async function runSearch() {
 
   try {
     const now = getSearchDate();
-    const data = await fetchJSON(
-      `${API}/${currentConsorcio.idConsorcio}/horarios_origen_destino` +
-      `?idNucleoOrigen=${selectedFrom.idNucleo}&idNucleoDestino=${selectedTo.idNucleo}`
-    );
-
-    lastResultsData = data;
-    lastResultsNow = now;
-    renderResults(data, now);
-    renderDirectConnections(data, now);
+    const url = `${API}/${currentConsorcio.idConsorcio}/horarios_origen_destino` +
+      `?idNucleoOrigen=${selectedFrom.idNucleo}&idNucleoDestino=${selectedTo.idNucleo}`;
+    computeClient.warm();
+    const [text] = await Promise.all([
+      fetchJSON(url, { raw: true }),
+      loadServiceCalendar(),   // holidays, so the day's trips are right for any date
+    ]);
+
+    // The compute worker parses the response and picks the cards (compute.js 'plan')
+    const realNow = Date.now();
+    const plan = await computeCall('plan',
+      { url, date: now.getTime(), realNow, today: selectedDateMode === 'today', limit: 12 },
+      { texts: { [url]: text } });
+    const trips = computeTrips(plan.trips, now, new Date(realNow));
+    lastResults = { trips, results: Array.from(plan.results, (p, k) => ({ trip: trips[p], via: plan.via[k] })) };
+    clearResultCards();   // the spinner, and keys are rows of the previous table
+    renderResults(lastResults);
+    renderDirectConnections(lastResults, now);
   } catch {
-    resultsList.innerHTML = `<p class="hint">${s('noConn')}</p>`;
+    clearResultCards(`<p class="hint">${s('noConn')}</p>`);
   }
 }
 
-function renderResults(data, now) {
-  const horario = data.horario || [];
-  const bloques = data.bloques || [];
+// The result cards, keyed by their row in the horarios table (a new search
+// clears them), so a re-render — the language toggle — only rewrites cards
+// whose markup changed. Items are { trip, html }.
+const resultCards = createKeyedList(resultsList, {
+  name: 'resultCards',
+  key: ({ trip }) => String(trip.row),
+  create({ html }, row) {
+    const card = document.createElement('div');
+    card.className = 'card planner-result-card';
+    card.innerHTML = html;
+    card.style.cursor = 'pointer';
+    card.addEventListener('click', () => {
+      const { trip } = row.item;
+      // Build a restoreable planner URL so back from route returns to results
+      const plannerUrl = `planner.html?c=${currentConsorcio.idConsorcio}` +
+        `&fromN=${selectedFrom.idNucleo}&toN=${selectedTo.idNucleo}`;
+      const from = encodeURIComponent(plannerUrl);
+      window.location.href =
+        `route.html?c=${currentConsorcio.idConsorcio}&l=${trip.idlinea}` +
+        `&code=${encodeURIComponent(trip.codigo)}` +
+        `&dest=${encodeURIComponent(selectedTo.nombre)}` +
+        `&sentido=1&from=${from}`;
+    });
+    return card;
+  },
+  update(row, { html }) {
+    if (html !== row.item.html) row.node.innerHTML = html;
+  },
+});
 
-  // bloques[1..n-2] are intermediate stop names (skip first "Líneas" and last "Frecuencia")
-  const stopNames = bloques.slice(1, -1).map(b => b.nombre.trim());
+// Empty the results (cards, spinner, hints), optionally leaving `html` in them
+function clearResultCards(html = '') {
+  resultCards.clear();
+  resultsList.innerHTML = html;
+}
 
-  if (!horario.length) {
-    resultsList.innerHTML = '';
+// `plan` is { trips, results: [{ trip, via }] } as runSearch() decodes it
+function renderResults(plan) {
+  if (!plan.results.length) {
+    clearResultCards();
     resultsNoService.classList.remove('hidden');
     return;
   }
 
   resultsNoService.classList.add('hidden');
 
-  const dow = now.getDay(); // 0=Sun, 1=Mon ... 6=Sat
-  const isWeekday = dow >= 1 && dow <= 5;
-  const isSat = dow === 6;
-  const isSun = dow === 0;
-  const isWeekend = isSat || isSun;
-
-  // Build a lookup: acronym → does it run today?
-  // Use the frecuencias array the API returns to understand each code.
-  const frecuencias = data.frecuencias || [];
-  const freqRunsToday = {};
-  frecuencias.forEach(f => {
-    const acr = f.acronimo.trim();
-    const name = (f.nombre || '').toLowerCase();
-    let runs = false;
-    if (name.includes('monday to friday') || name.includes('lunes a viernes')) runs = isWeekday;
-    else if (name.includes('monday to saturday') || name.includes('lunes a sábado') || name.includes('lunes a sabado')) runs = isWeekday || isSat;
-    else if (name.includes('saturday') && name.includes('sunday') || name.includes('sábado') && name.includes('domingo')) runs = isWeekend;
-    else if (name.includes('saturday') || name.includes('sábado')) runs = isSat;
-    else if (name.includes('sunday') || name.includes('domingo')) runs = isSun;
-    else runs = true; // daily or unknown
-    freqRunsToday[acr] = runs;
-  });
-
-  // Use the nucleos layout to find which horas[] indices belong to origin vs destination.
-  // nucleos[0] is the "Líneas" column (colspan 1), then origin group, then destination group.
-  // We skip the first column (line name) and map each nucleo to its column range.
-  const nucleos = data.nucleos || [];
-  let colOffset = 0; // nucleos[0] is a blank label row with no horas column — skip it
-  let originIndices = [];
-  let destIndices = [];
-  // nucleos[0] = blank "Líneas" header (decorative, no horas slot)
-  // nucleos[1] = origin town, nucleos[2] = dest town
-  for (let i = 0; i < nucleos.length; i++) {
-    const span = nucleos[i].colspan || 1;
-    if (i === 0) continue; // skip blank header — it has no corresponding horas column
-    const indices = Array.from({ length: span }, (_, k) => colOffset + k);
-    if (i === 1) originIndices = indices;
-    else if (i === 2) destIndices = indices;
-    colOffset += span;
-  }
-  // Fallback: if nucleos parsing gave nothing useful, use first col as dep, last as arr
-  if (!originIndices.length) originIndices = [0];
-  if (!destIndices.length) destIndices = [horario[0]?.horas.length - 1 ?? 0];
-
-  const enriched = horario.map(trip => {
-    // Find first non-'--' time in the origin columns
-    let departureStr = null;
-    for (const idx of originIndices) {
-      const h = trip.horas[idx];
-      if (h && h !== '--') { departureStr = h; break; }
-    }
-    if (!departureStr) return null;
-
-    const [hh, mm] = departureStr.split(':').map(Number);
-    if (isNaN(hh) || isNaN(mm)) return null;
-
-    const depTime = new Date(now);
-    depTime.setHours(hh, mm, 0, 0);
-
-    // Find last non-'--' time in destination columns
-    let arrivalStr = null;
-    for (const idx of [...destIndices].reverse()) {
-      const h = trip.horas[idx];
-      if (h && h !== '--') { arrivalStr = h; break; }
-    }
-
-    // Look up whether this trip's dias acronym runs today
-    const dias = (trip.dias || '').trim();
-    const runsToday = dias in freqRunsToday ? freqRunsToday[dias] : true;
-
-    // For today: calculate minutes from now; for future dates: all trips are valid
-    const realNow = new Date();
-    const mins = Math.round((depTime - realNow) / 60000);
-    return { ...trip, depTime, mins, runsToday, departureStr, arrivalStr, stopNames };
-  })
-  .filter(t => {
-    if (!t || !t.runsToday) return false;
-    // For today: only show trips not yet departed (allow 5 min grace)
-    // For future dates: show all trips on that day
-    return selectedDateMode === 'today' ? t.mins > -5 : true;
-  })
-  .sort((a, b) => a.depTime - b.depTime)
-  .slice(0, 12);
-
-  if (!enriched.length) {
-    resultsList.innerHTML = '';
-    resultsNoService.classList.remove('hidden');
-    return;
-  }
-
-  resultsList.innerHTML = '';
-  enriched.forEach(trip => {
-    const card = document.createElement('div');
-    card.className = 'card planner-result-card';
-
-    const showCountdown = selectedDateMode === 'today';
-    const minsLabel = showCountdown ? (trip.mins <= 0 ? s('minsLabel', 0) : s('minsLabel', trip.mins)) : '';
-    const minsClass = trip.mins <= 2 ? 'mins-now' : trip.mins <= 15 ? 'mins-soon' : 'mins-later';
-
-    // Intermediate stops: any stop that's not in origin or dest columns and has a time
-    const via = trip.horas
-      .map((h, i) => {
-        if (originIndices.includes(i) || destIndices.includes(i)) return null;
-        if (!h || h === '--') return null;
-        // Map horas index back to stopNames index (stopNames = bloques[1..-1])
-        const nameIdx = i - 1; // bloques[0] = "Líneas", so bloques[i] = stopNames[i-1]
-        return stopNames[nameIdx] || null;
-      })
-      .filter(Boolean)
-      .join(', ');
-
-    const arrivalStr = trip.arrivalStr;
+  const showCountdown = selectedDateMode === 'today';
+  // For today: minutes from now, counted again on every render
+  const realNow = Date.now();
+  resultCards.set(plan.results.map(({ trip, via }) => {
+    const mins = Math.round((trip.depTime - realNow) / 60000);
+    const minsLabel = showCountdown ? (mins <= 0 ? s('minsLabel', 0) : s('minsLabel', mins)) : '';
+    const minsClass = mins <= 2 ? 'mins-now' : mins <= 15 ? 'mins-soon' : 'mins-later';
 
-    card.innerHTML = `
+    const html = `
       <div class="departure-line">${escHtml(trip.codigo)}</div>
       <div class="departure-body">
         <div class="departure-dest">${escHtml(selectedTo.nombre)}</div>
-        ${via ? `<div class="departure-name">${escHtml(s('passesThrough'))} ${escHtml(via)}</div>` : ''}
+        ${via.length ? `<div class="departure-name">${escHtml(s('passesThrough'))} ${escHtml(via.join(', '))}</div>` : ''}
         <div class="departure-name planner-days">${escHtml(trip.dias)}</div>
       </div>
       <div class="departure-time-col">
-        <span class="departure-sched">${escHtml(trip.departureStr)}</span>
-        ${arrivalStr && arrivalStr !== '--' ? `<span class="planner-arrival">→ ${escHtml(arrivalStr)}</span>` : ''}
+        <span class="departure-sched">${trip.depStr}</span>
+        ${trip.arrStr ? `<span class="planner-arrival">→ ${trip.arrStr}</span>` : ''}
         ${showCountdown ? `<span class="departure-mins ${minsClass}">${minsLabel}</span>` : ''}
       </div>
       <span class="departure-info-arrow">›</span>
     `;
-
-    card.style.cursor = 'pointer';
-    card.addEventListener('click', () => {
-      // Build a restoreable planner URL so back from route returns to results
-      const plannerUrl = `planner.html?c=${currentConsorcio.idConsorcio}` +
-        `&fromN=${selectedFrom.idNucleo}&toN=${selectedTo.idNucleo}`;
-      const from = encodeURIComponent(plannerUrl);
-      window.location.href =
-        `route.html?c=${currentConsorcio.idConsorcio}&l=${trip.idlinea}` +
-        `&code=${encodeURIComponent(trip.codigo)}` +
-        `&dest=${encodeURIComponent(selectedTo.nombre)}` +
-        `&sentido=1&from=${from}`;
-    });
-
-    resultsList.appendChild(card);
-  });
+    return { trip, html };
+  }));
 }
+renderResults = perfWrap('render', renderResults);
 
-function renderDirectConnections(data, now) {
+function renderDirectConnections(plan, now) {
   directSection.classList.add('hidden');
   directList.innerHTML = '';
 
-  const horario = data.horario || [];
-  if (!horario.length) return;
-
-  // Reuse the same nucleos-index parsing logic from renderResults
-  const nucleos = data.nucleos || [];
-  let colOffset = 0;
-  let originIndices = [];
-  let destIndices = [];
-  for (let i = 0; i < nucleos.length; i++) {
-    const span = nucleos[i].colspan || 1;
-    if (i === 0) continue; // skip blank header — no corresponding horas column
-    const indices = Array.from({ length: span }, (_, k) => colOffset + k);
-    if (i === 1) originIndices = indices;
-    else if (i === 2) destIndices = indices;
-    colOffset += span;
-  }
-  if (!originIndices.length) originIndices = [0];
-  if (!destIndices.length)   destIndices   = [horario[0]?.horas.length - 1 ?? 0];
-
-  // Build frecuencia lookup for today
-  const dow = now.getDay();
-  const isWeekday = dow >= 1 && dow <= 5;
-  const isSat = dow === 6;
-  const isSun = dow === 0;
-  const frecuencias = data.frecuencias || [];
-  const freqRunsToday = {};
-  frecuencias.forEach(f => {
-    const acr  = f.acronimo.trim();
-    const name = (f.nombre || '').toLowerCase();
-    let runs = false;
-    if (name.includes('monday to friday') || name.includes('lunes a viernes')) runs = isWeekday;
-    else if (name.includes('monday to saturday') || name.includes('lunes a sábado') || name.includes('lunes a sabado')) runs = isWeekday || isSat;
-    else if ((name.includes('saturday') && name.includes('sunday')) || (name.includes('sábado') && name.includes('domingo'))) runs = isSat || isSun;
-    else if (name.includes('saturday') || name.includes('sábado')) runs = isSat;
-    else if (name.includes('sunday')   || name.includes('domingo')) runs = isSun;
-    else runs = true;
-    freqRunsToday[acr] = runs;
-  });
-
-  // Build all trips for the full day (no time cutoff, sorted by departure)
-  const trips = horario.map(trip => {
-    let depStr = null;
-    for (const idx of originIndices) {
-      const h = trip.horas?.[idx];
-      if (h && h !== '--') { depStr = h; break; }
-    }
-    if (!depStr) return null;
-
-    const [hh, mm] = depStr.split(':').map(Number);
-    if (isNaN(hh) || isNaN(mm)) return null;
-
-    const depTime = new Date(now.getFullYear(), now.getMonth(), now.getDate(), hh, mm);
-
-    let arrStr = null;
-    for (const idx of [...destIndices].reverse()) {
-      const h = trip.horas?.[idx];
-      if (h && h !== '--') { arrStr = h; break; }
-    }
-
-    const dias = (trip.dias || '').trim();
-    const runsToday = dias in freqRunsToday ? freqRunsToday[dias] : true;
-    if (!runsToday) return null;
-
-    return { ...trip, depStr, arrStr, depTime };
-  })
-  .filter(Boolean)
-  .sort((a, b) => a.depTime - b.depTime);
+  // All trips for the full day (no time cutoff, sorted by departure)
+  const { trips } = plan;
 
   if (!trips.length) return;
 
@@ -669,6 +531,7 @@ function renderDirectConnections(data, now) {
 
   directSection.classList.remove('hidden');
 }
+renderDirectConnections = perfWrap('render', renderDirectConnections);
 
 // ---- Navigation ----
 backToRegion.addEventListener('click', () => {
@@ -685,12 +548,6 @@ function showPlannerStep(step) {
 }
 
 // ---- Helpers ----
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;').replace(/</g, '&lt;')
@@ -0,0 +1,208 @@
+// ===== polyline — simplified, encoded line shapes =====
+// A line's polilinea comes as thousands of ["lat,lng,z"] strings. route.js
+// and journey.js pack it once per line into sessionStorage: Douglas-Peucker
+// gives every point the zoom level at which it first moves the line by a
+// pixel, points that never do are dropped, and the rest are stored as a
+// Google encoded polyline (1e-5°) plus one level character per point.
+// map.js decodes that straight into typed arrays and draws only the points
+// its zoom level needs.
+//
+// Pure functions apart from storeLinePolyline()/loadLinePolyline().
+
+const POLYLINE_SCHEMA   = 1;
+const POLYLINE_MAX_ZOOM = 19;
+const POLYLINE_KEY      = 'polyline:';            // + consorcio:linea
+const POLYLINE_DEG_M    = 6371008.8 * Math.PI / 180;
+const POLYLINE_EQUATOR_PX_M = 40075016.686 / 256; // metres per pixel at zoom 0
+
+/**
+ * The API's point shapes — ["lat,lng,z"] arrays or {latitud, longitud}
+ * objects — as parallel Float64Arrays, skipping unparseable points.
+ */
+function parsePolyline(points) {
+  const lat = new Float64Array(points.length), lng = new Float64Array(points.length);
+  let n = 0;
+  points.forEach(p => {
+    let y, x;
+    if (Array.isArray(p)) {
+      const parts = String(p[0]).split(',');
+      y = parseFloat(parts[0]); x = parseFloat(parts[1]);
+    } else {
+      y = parseFloat(p?.latitud ?? p?.lat); x = parseFloat(p?.longitud ?? p?.lng ?? p?.lon);
+    }
+    if (isNaN(y) || isNaN(x)) return;
+    lat[n] = y; lng[n] = x; n++;
+  });
+  return { lat: lat.slice(0, n), lng: lng.slice(0, n) };
+}
+
+// ---- Simplification ----
+/**
+ * Douglas-Peucker importance in metres: the largest tolerance at which each
+ * point survives. A point's split distance is capped by its parent's, so
+ * keeping the points above ε is exactly Douglas-Peucker at ε. Endpoints are
+ * Infinity. Spans whose split is at most `floorM` aren't refined further;
+ * their points stay 0.
+ */
+function polylineImportance(lat, lng, floorM = 0) {
+  const n = lat.length;
+  const imp = new Float64Array(n);
+  if (!n) return imp;
+  imp[0] = imp[n - 1] = Infinity;
+
+  // Local equirectangular metres around the mean latitude
+  let mean = 0;
+  for (let i = 0; i < n; i++) mean += lat[i];
+  const kx = POLYLINE_DEG_M * Math.cos(mean / n * Math.PI / 180), ky = POLYLINE_DEG_M;
+
+  // Spans to split as (first, last) pairs. A span's ends are its parent
+  // split and one of the parent's ends, so its cap is the smaller of theirs.
+  const stack = new Int32Array(2 * n);
+  let top = 0;
+  stack[top++] = 0; stack[top++] = n - 1;
+  while (top) {
+    const b = stack[--top], a = stack[--top];
+    if (b - a < 2) continue;
+    const cap = Math.min(imp[a], imp[b]);
+    const ax = lng[a] * kx, ay = lat[a] * ky;
+    const dx = lng[b] * kx - ax, dy = lat[b] * ky - ay;
+    const len2 = dx * dx + dy * dy;
+    let far = a + 1, far2 = -1;
+    for (let i = a + 1; i < b; i++) {
+      const px = lng[i] * kx - ax, py = lat[i] * ky - ay;
+      // Distance to the segment, not the line: routes double back on themselves
+      const t = len2 ? Math.max(0, Math.min(1, (px * dx + py * dy) / len2)) : 0;
+      const ex = px - t * dx, ey = py - t * dy;
+      const d2 = ex * ex + ey * ey;
+      if (d2 > far2) { far2 = d2; far = i; }
+    }
+    imp[far] = Math.min(Math.sqrt(far2), cap);
+    if (imp[far] > floorM) {
+      stack[top++] = a; stack[top++] = far;
+      stack[top++] = far; stack[top++] = b;
+    }
+  }
+  return imp;
+}
+
+/**
+ * Per point, the lowest zoom at which dropping it moves the line by at
+ * least a pixel (0 for endpoints), or 255 when it never is up to
+ * POLYLINE_MAX_ZOOM.
+ */
+function polylineLevels(lat, lng) {
+  const n = lat.length;
+  let mean = 0;
+  for (let i = 0; i < n; i++) mean += lat[i];
+  const pxM = POLYLINE_EQUATOR_PX_M * Math.cos((n ? mean / n : 0) * Math.PI / 180);
+  const imp = polylineImportance(lat, lng, pxM / 2 ** POLYLINE_MAX_ZOOM);
+  return Uint8Array.from(imp, m => {
+    if (m === Infinity) return 0;
+    const z = Math.max(0, Math.ceil(Math.log2(pxM / m)));
+    return z <= POLYLINE_MAX_ZOOM ? z : 255;
+  });
+}
+
+// ---- Encoding ----
+// Google's encoded polyline algorithm: zig-zagged deltas of 1e-5° in 5-bit
+// chunks, offset into printable ASCII.
+function encodePolyline(lat, lng) {
+  let out = '', py = 0, px = 0;
+  const put = v => {
+    v = v < 0 ? ~(v << 1) : v << 1;
+    while (v >= 0x20) {
+      out += String.fromCharCode((0x20 | (v & 0x1f)) + 63);
+      v >>>= 5;
+    }
+    out += String.fromCharCode(v + 63);
+  };
+  for (let i = 0; i < lat.length; i++) {
+    const y = Math.round(lat[i] * 1e5), x = Math.round(lng[i] * 1e5);
+    put(y - py); put(x - px);
+    py = y; px = x;
+  }
+  return out;
+}
+
+function decodePolyline(str, n) {
+  const lat = new Float64Array(n), lng = new Float64Array(n);
+  let pos = 0, y = 0, x = 0;
+  const take = () => {
+    let v = 0, shift = 0, b;
+    do {
+      b = str.charCodeAt(pos++) - 63;
+      v |= (b & 0x1f) << shift;
+      shift += 5;
+    } while (b >= 0x20);
+    return v & 1 ? ~(v >>> 1) : v >>> 1;
+  };
+  for (let i = 0; i < n; i++) {
+    y += take(); x += take();
+    lat[i] = y / 1e5; lng[i] = x / 1e5;
+  }
+  return { lat, lng };
+}
+
+/** API points → the stored JSON: { v, n, p: encoded, z: level per point }. */
+function packPolyline(points) {
+  const { lat, lng } = parsePolyline(points);
+  const levels = polylineLevels(lat, lng);
+  const keep = [];
+  levels.forEach((z, i) => { if (z !== 255) keep.push(i); });
+  return JSON.stringify({
+    v: POLYLINE_SCHEMA,
+    n: keep.length,
+    p: encodePolyline(keep.map(i => lat[i]), keep.map(i => lng[i])),
+    z: keep.map(i => String.fromCharCode(65 + levels[i])).join(''),
+  });
+}
+
+/** The stored JSON → { lat, lng, levels } typed arrays, or null. */
+function unpackPolyline(text) {
+  try {
+    const rec = JSON.parse(text);
+    if (rec?.v !== POLYLINE_SCHEMA || rec.z.length !== rec.n) return null;
+    const { lat, lng } = decodePolyline(rec.p, rec.n);
+    const levels = new Uint8Array(rec.n);
+    for (let i = 0; i < rec.n; i++) levels[i] = rec.z.charCodeAt(i) - 65;
+    return { lat, lng, levels };
+  } catch { return null; }
+}
+
+// [[lat, lng]] of the points needed at `zoom`, for L.polyline
+function polylineLatLngs(poly, zoom) {
+  const out = [];
+  for (let i = 0; i < poly.levels.length; i++) {
+    if (poly.levels[i] <= zoom) out.push([poly.lat[i], poly.lng[i]]);
+  }
+  return out;
+}
+
+// [[south, west], [north, east]]
+function polylineBounds(poly) {
+  let s = Infinity, w = Infinity, n = -Infinity, e = -Infinity;
+  for (let i = 0; i < poly.lat.length; i++) {
+    if (poly.lat[i] < s) s = poly.lat[i];
+    if (poly.lat[i] > n) n = poly.lat[i];
+    if (poly.lng[i] < w) w = poly.lng[i];
+    if (poly.lng[i] > e) e = poly.lng[i];
+  }
+  return [[s, w], [n, e]];
+}
+
+// ---- Per-line cache ----
+// Lines don't change shape within a session, so a line already packed in
+// this tab isn't packed again.
+function storeLinePolyline(consorcioId, lineaId, points) {
+  const key = `${POLYLINE_KEY}${consorcioId}:${lineaId}`;
+  try {
+    if (!sessionStorage.getItem(key)) sessionStorage.setItem(key, packPolyline(points));
+  } catch { /* storage full or unavailable — the map shows stops only */ }
+}
+
+function loadLinePolyline(consorcioId, lineaId) {
+  try {
+    const text = sessionStorage.getItem(`${POLYLINE_KEY}${consorcioId}:${lineaId}`);
+    return text ? unpackPolyline(text) : null;
+  } catch { return null; }
+}
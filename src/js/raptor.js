@@ -0,0 +1,271 @@
+// ===== raptor — round-based journey router over the network snapshot =====
+// RAPTOR (Delling et al.) on a nucleo-level network: each line pattern from
+// the snapshot is collapsed to the sequence of towns it passes, exactly like
+// horarios_origen_destino does — departing a town means the first stop time
+// inside it, arriving means the last. Round k finds the earliest arrival
+// with k rides, so one query returns the Pareto set over (arrival, transfers).
+// Between two rides a transfer may walk to a nearby town: any two stops of
+// different towns within walkM metres (spatial.js) give a footpath.
+//
+// Pure functions, no DOM. tools/raptor.py is the reference implementation;
+// tests/fixtures/raptor/ holds the shared corpus.
+
+const RAPTOR_INF = 0x7fff;
+const RAPTOR_DEFAULTS = { maxTransfers: 2, minTransfer: 10, walkM: 400 };
+const RAPTOR_WALK_M_PER_MIN = 80;   // ~4.8 km/h
+
+// Set of snapshot freq rows running on `date` (day rules from schedule.js,
+// holidays from calendar.js)
+function activeFreqRows(snap, date) {
+  const rows = new Set();
+  snap.freqs.id.forEach((_, i) => {
+    if (serviceRunsOn(freqDayMask(snap.strings[snap.freqs.name[i]]), date)) rows.add(i);
+  });
+  return rows;
+}
+
+function raptorNormalize(str) {
+  return String(str || '').toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '').trim();
+}
+
+// Stop → nucleo row. The paradas API's idNucleo doesn't always match the
+// nucleos list, so match the stop's town name first and the id second.
+function stopNucleoRows(snap) {
+  const byName = new Map(), byId = new Map();
+  snap.nucleos.id.forEach((id, i) => {
+    byName.set(raptorNormalize(snap.strings[snap.nucleos.name[i]]), i);
+    byId.set(id, i);
+  });
+  return Int16Array.from(snap.stops.id, (_, si) => {
+    const n = byName.get(raptorNormalize(snap.strings[snap.stops.nucleoName[si]]));
+    if (n !== undefined) return n;
+    return byId.get(snap.stops.nucleoId[si]) ?? -1;
+  });
+}
+
+// Footpaths between towns: per town, [[town, minutes]] to every other town
+// with a stop within walkM metres of one of its stops, quickest first.
+function raptorWalks(snap, stopNuc, walkM) {
+  const stops = [];
+  stopNuc.forEach((n, si) => {
+    if (n >= 0 && Number.isFinite(snap.stops.lat[si]) && Number.isFinite(snap.stops.lng[si])) stops.push(si);
+  });
+  const lat = Float64Array.from(stops, si => snap.stops.lat[si]);
+  const lng = Float64Array.from(stops, si => snap.stops.lng[si]);
+  const grid = buildStopGrid(lat, lng);
+
+  const walks = Array.from(snap.nucleos.id, () => new Map());   // town → minutes
+  stops.forEach((si, a) => {
+    const from = stopNuc[si];
+    gridWithin(grid, lat[a], lng[a], walkM).forEach(({ i: b, m }) => {
+      const to = stopNuc[stops[b]];
+      if (to === from) return;
+      const mins = Math.max(1, Math.ceil(m / RAPTOR_WALK_M_PER_MIN));
+      if (!(walks[from].get(to) <= mins)) walks[from].set(to, mins);
+    });
+  });
+  return walks.map(m => [...m].sort((x, y) => x[1] - y[1] || x[0] - y[0]));
+}
+
+/**
+ * Build the routing network once per snapshot.
+ * Routes are snapshot timetables (one pattern × one frequency) projected onto
+ * towns: nodes[], and per trip dep[]/arr[] flattened row-major (−1 = no call).
+ * walks[town] are the footpaths a transfer may take (raptorWalks).
+ */
+function buildRaptorNetwork(snap, { walkM = RAPTOR_DEFAULTS.walkM } = {}) {
+  const stopNuc = stopNucleoRows(snap);
+  const tt = snap.timetables;
+  const routes = [];
+  const nodeRoutes = Array.from(snap.nucleos.id, () => []);
+
+  for (let t = 0; t < tt.pattern.length; t++) {
+    const stops = snap.patternStops(tt.pattern[t]);
+    const nTrips = tt.trips[t];
+    const times = tt.times.subarray(tt.timeStart[t], tt.timeStart[t + 1]);
+
+    // Group consecutive stops in the same town
+    const groups = [];
+    stops.forEach((si, k) => {
+      const n = stopNuc[si];
+      if (n < 0) return;
+      const last = groups[groups.length - 1];
+      if (last && last.node === n && last.end === k) last.end = k + 1;
+      else groups.push({ node: n, start: k, end: k + 1 });
+    });
+    if (groups.length < 2) continue;
+
+    const len = groups.length;
+    const dep = new Int16Array(nTrips * len).fill(-1);
+    const arr = new Int16Array(nTrips * len).fill(-1);
+    for (let trip = 0; trip < nTrips; trip++) {
+      const row = trip * stops.length;
+      groups.forEach((g, pos) => {
+        for (let k = g.start; k < g.end; k++) {
+          const v = times[row + k];
+          if (v < 0) continue;
+          if (dep[trip * len + pos] < 0) dep[trip * len + pos] = v;
+          arr[trip * len + pos] = v;
+        }
+      });
+    }
+
+    const r = routes.length;
+    routes.push({
+      timetable: t,
+      line: snap.patterns.line[tt.pattern[t]],
+      freq: tt.freq[t],
+      nodes: Int16Array.from(groups, g => g.node),
+      nTrips, dep, arr,
+    });
+    groups.forEach((g, pos) => nodeRoutes[g.node].push([r, pos]));
+  }
+
+  const walks = raptorWalks(snap, stopNuc, walkM);
+  return { snap, routes, nodeRoutes, walks, nNodes: snap.nucleos.id.length };
+}
+
+/**
+ * One RAPTOR query.
+ *   origin, dest   nucleo rows
+ *   depart         minutes after midnight
+ *   freqs          Set of active freq rows (activeFreqRows)
+ * Returns Pareto-optimal journeys, fewest transfers first:
+ *   [{ transfers, dep, arr, legs: [{ route, trip, from, to, dep, arr }] }]
+ * A transfer that walks adds a leg { walk: true, from, to, dep, arr }.
+ */
+function raptorQuery(net, { origin, dest, depart, freqs, maxTransfers, minTransfer }) {
+  maxTransfers = maxTransfers ?? RAPTOR_DEFAULTS.maxTransfers;
+  minTransfer  = minTransfer  ?? RAPTOR_DEFAULTS.minTransfer;
+  const { routes, nodeRoutes, walks, nNodes } = net;
+
+  const best = new Int16Array(nNodes).fill(RAPTOR_INF);
+  const labels = [new Int16Array(nNodes).fill(RAPTOR_INF)];
+  const parents = [null];
+  labels[0][origin] = depart;
+  best[origin] = depart;
+  let marked = new Set([origin]);
+  const results = [];
+
+  for (let k = 1; k <= maxTransfers + 1 && marked.size; k++) {
+    const prev = labels[k - 1];
+    const cur = new Int16Array(nNodes).fill(RAPTOR_INF);
+    const parent = new Array(nNodes).fill(null);
+    labels.push(cur);
+    parents.push(parent);
+
+    // Routes touching a marked node, scanned from the earliest marked position
+    const queue = new Map();
+    marked.forEach(node => {
+      nodeRoutes[node].forEach(([r, pos]) => {
+        if (!freqs.has(routes[r].freq)) return;
+        if (!queue.has(r) || pos < queue.get(r)) queue.set(r, pos);
+      });
+    });
+    marked = new Set();
+
+    queue.forEach((start, r) => {
+      const { nodes, nTrips, dep, arr } = routes[r];
+      const len = nodes.length;
+      let trip = -1, boardPos = -1;
+
+      for (let pos = start; pos < len; pos++) {
+        const node = nodes[pos];
+
+        if (trip >= 0) {
+          const a = arr[trip * len + pos];
+          if (a >= 0 && a < Math.min(best[node], best[dest])) {
+            cur[node] = a;
+            best[node] = a;
+            parent[node] = { route: r, trip, boardPos, alightPos: pos };
+            marked.add(node);
+          }
+        }
+
+        // Catch an earlier trip here? (trips don't overtake, so the first
+        // boardable one is the earliest)
+        if (prev[node] === RAPTOR_INF) continue;
+        const ready = k === 1 ? prev[node] : prev[node] + minTransfer;
+        const limit = trip >= 0 ? trip : nTrips;
+        for (let t = 0; t < limit; t++) {
+          const d = dep[t * len + pos];
+          if (d >= 0 && d >= ready) {
+            trip = t;
+            boardPos = pos;
+            break;
+          }
+        }
+      }
+    });
+
+    // Footpaths from the towns a ride reached, for the next round to board
+    // from. Collected first, so a walk never starts from another walk.
+    if (k <= maxTransfers) {
+      const walked = [];
+      marked.forEach(node => walks[node].forEach(([to, mins]) => {
+        if (to !== dest) walked.push({ walk: node, to, dep: cur[node], arr: cur[node] + mins, ride: parent[node] });
+      }));
+      walked.forEach(w => {
+        if (w.arr < Math.min(best[w.to], best[dest])) {
+          cur[w.to] = w.arr;
+          best[w.to] = w.arr;
+          parent[w.to] = w;
+          marked.add(w.to);
+        }
+      });
+    }
+
+    if (cur[dest] !== RAPTOR_INF &&
+        (!results.length || cur[dest] < results[results.length - 1].arr)) {
+      results.push(raptorJourney(net, parents, k, dest));
+    }
+  }
+  return results;
+}
+
+function raptorJourney(net, parents, k, dest) {
+  const legs = [];
+  let node = dest;
+  for (let round = k; round >= 1; round--) {
+    let p = parents[round][node];
+    if (p.walk !== undefined) {
+      legs.unshift({ walk: true, from: p.walk, to: node, dep: p.dep, arr: p.arr });
+      node = p.walk;
+      p = p.ride;
+    }
+    const { nodes, dep, arr } = net.routes[p.route];
+    const len = nodes.length;
+    legs.unshift({
+      route: p.route,
+      trip: p.trip,
+      from: nodes[p.boardPos],
+      to: nodes[p.alightPos],
+      dep: dep[p.trip * len + p.boardPos],
+      arr: arr[p.trip * len + p.alightPos],
+    });
+    node = nodes[p.boardPos];
+  }
+  return { transfers: k - 1, dep: legs[0].dep, arr: legs[legs.length - 1].arr, legs };
+}
+
+/**
+ * Several departures: re-run from just after the earliest departure found
+ * until `count` distinct journeys are collected. Sorted by arrival.
+ */
+function raptorProfile(net, query, count = 5) {
+  const seen = new Set();
+  const out = [];
+  let depart = query.depart;
+  for (let guard = 0; guard < count * 4 && out.length < count; guard++) {
+    const found = raptorQuery(net, { ...query, depart });
+    if (!found.length) break;
+    found.forEach(j => {
+      const key = j.legs.map(l => l.walk ? `walk:${l.to}` : `${l.route}:${l.trip}`).join('>');
+      if (!seen.has(key)) { seen.add(key); out.push(j); }
+    });
+    depart = Math.min(...found.map(j => j.dep)) + 1;
+  }
+  return out
+    .sort((a, b) => a.arr - b.arr || a.transfers - b.transfers || b.dep - a.dep)
+    .slice(0, count);
+}
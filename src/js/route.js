@@ -1,5 +1,3 @@
-const API = 'https://api.ctan.es/v1/Consorcios';
-
 // ---- Parse URL params ----
 // c = consorcioId, l = lineaId, s = current stopId (to highlight), from = 'station.html?...' (back link)
 const params = new URLSearchParams(location.search);
@@ -219,6 +217,7 @@ function renderStops(stops, direction) {
     routeStopsEl.appendChild(el);
   });
 }
+renderStops = perfWrap('render', renderStops);
 
 // ---- Full timetable button ----
 function initTimetableButton() {
@@ -235,7 +234,8 @@ function initPolylineButton() {
   const poly = lineaData?.polilinea;
   if (!poly || !poly.length) return;
 
-  sessionStorage.setItem('routePolyline',     JSON.stringify(poly));
+  storeLinePolyline(CONSORCIO_ID, LINEA_ID, poly);
+  sessionStorage.removeItem('journeyPolylines');
   sessionStorage.setItem('routePolylineCode', LINEA_CODE);
   sessionStorage.setItem('routeLineaId',      LINEA_ID);
 
@@ -246,12 +246,6 @@ function initPolylineButton() {
 }
 
 // ---- Helpers ----
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;')
@@ -0,0 +1,197 @@
+// ===== schedule — compiled horarios_origen_destino timetables =====
+// planner.js and journey.js read the same response shape — through the
+// compute worker (compute.js), which loads this file too: trips as rows of
+// 'HH:MM' strings, a nucleos header whose colspans say which columns belong to
+// the origin and destination towns, and frecuencias whose names say which days
+// each `dias` acronym runs. compileSchedule() turns a response into a typed
+// trip table once (memoized per response object, so every operation on a
+// response the worker holds reuses it) and every consumer queries that table
+// instead of re-parsing strings:
+//
+//   trips, cols       table size
+//   origin, dest      Int16 column indices of the origin / destination town
+//   times             Int16 minutes after midnight, row-major trips × cols,
+//                     -1 where the trip doesn't call (or the cell isn't HH:MM)
+//   dep, arr          Int16 per trip: first filled origin column, last filled
+//                     destination column (-1 = none); arr is not wrapped past
+//                     midnight — consumers compare it with dep
+//   days              Uint8 per trip, bit d = runs when Date#getDay() is d,
+//                     DAY_HOLIDAY (calendar.js) = runs on public holidays
+//   order             Uint16 trips with a departure, by (dep, row)
+//   codigo, idlinea, dias   per-trip labels
+//
+// tools/schedule.py is the Python twin: serializeSchedule() and its
+// serialize() produce the same bytes for the same response
+// (tests/fixtures/schedule/golden.json).
+
+const SCHEDULE_SCHEMA = 1;
+
+const DAY_SUN = 1 << 0;
+const DAY_SAT = 1 << 6;
+const DAYS_WEEKDAYS = 0b0111110;
+const DAYS_ALL = 0xff;   // every weekday and DAY_HOLIDAY
+
+// First rule whose every pattern matches wins; no match runs daily.
+// Frequency names come in either language. Weekend rules also run on public
+// holidays when the name says so ("… y festivos"); weekday rules never do.
+const FREQ_HOLIDAYS = /holiday|festivo/;
+const FREQ_DAY_RULES = [
+  { all: [/monday to friday|lunes a viernes/], days: DAYS_WEEKDAYS },
+  { all: [/monday to saturday|lunes a s[aá]bado/], days: DAYS_WEEKDAYS | DAY_SAT },
+  { all: [/saturday/, /sunday/], days: DAY_SAT | DAY_SUN },
+  { all: [/sábado/, /domingo/], days: DAY_SAT | DAY_SUN },
+  { all: [/saturday|sábado/], days: DAY_SAT },
+  { all: [/sunday|domingo/], days: DAY_SUN },
+  { all: [FREQ_HOLIDAYS], days: DAY_HOLIDAY },
+];
+
+const freqDayMasks = new Map();   // frecuencia name → day mask
+
+function freqDayMask(name) {
+  const key = String(name || '').toLowerCase();
+  let mask = freqDayMasks.get(key);
+  if (mask === undefined) {
+    const rule = FREQ_DAY_RULES.find(r => r.all.every(re => re.test(key)));
+    mask = rule ? rule.days : DAYS_ALL;
+    if (rule && !(mask & DAYS_WEEKDAYS) && FREQ_HOLIDAYS.test(key)) mask |= DAY_HOLIDAY;
+    freqDayMasks.set(key, mask);
+  }
+  return mask;
+}
+
+// 'HH:MM' → minutes after midnight, -1 for '--', blanks and anything else
+function scheduleMinutes(value) {
+  const m = /^([0-9]{1,2}):([0-9]{2})$/.exec(String(value ?? '').trim());
+  return m ? Number(m[1]) * 60 + Number(m[2]) : -1;
+}
+
+function scheduleClock(mins) {
+  return `${String(Math.floor(mins / 60)).padStart(2, '0')}:${String(mins % 60).padStart(2, '0')}`;
+}
+
+// nucleos[0] is the blank "Líneas" header with no horas column; nucleos[1] is
+// the origin town and nucleos[2] the destination, each spanning `colspan`.
+function scheduleColumns(data) {
+  const nucleos = data.nucleos || [];
+  let col = 0, origin = [], dest = [];
+  for (let i = 1; i < nucleos.length; i++) {
+    const span = nucleos[i].colspan || 1;
+    const cols = Array.from({ length: span }, (_, k) => col + k);
+    if (i === 1) origin = cols;
+    else if (i === 2) dest = cols;
+    col += span;
+  }
+  // Without a usable header: first column departs, last column arrives
+  if (!origin.length) origin = [0];
+  if (!dest.length) {
+    const first = (data.horario || [])[0]?.horas || [];
+    dest = first.length ? [first.length - 1] : [];
+  }
+  return { origin, dest };
+}
+
+const compiledSchedules = new WeakMap();   // response → table
+
+function compileSchedule(data) {
+  let table = compiledSchedules.get(data);
+  if (table) return table;
+
+  const horario = data.horario || [];
+  const n = horario.length;
+  const cols = horario.reduce((max, trip) => Math.max(max, (trip.horas || []).length), 0);
+  const { origin, dest } = scheduleColumns(data);
+
+  const acronymDays = new Map();
+  (data.frecuencias || []).forEach(f => {
+    acronymDays.set(String(f.acronimo || '').trim(), freqDayMask(f.nombre));
+  });
+
+  const times = new Int16Array(n * cols).fill(-1);
+  const dep = new Int16Array(n).fill(-1);
+  const arr = new Int16Array(n).fill(-1);
+  const days = new Uint8Array(n);
+  horario.forEach((trip, i) => {
+    const horas = trip.horas || [];
+    horas.forEach((h, c) => { times[i * cols + c] = scheduleMinutes(h); });
+    // The first / last cell that isn't blank decides, even if it doesn't parse
+    const filled = c => { const h = horas[c]; return h && h !== '--'; };
+    const d = origin.find(filled);
+    if (d !== undefined) dep[i] = scheduleMinutes(horas[d]);
+    const a = [...dest].reverse().find(filled);
+    if (a !== undefined) arr[i] = scheduleMinutes(horas[a]);
+    const dias = String(trip.dias || '').trim();
+    days[i] = acronymDays.has(dias) ? acronymDays.get(dias) : DAYS_ALL;
+  });
+
+  const order = Uint16Array.from(
+    horario.map((_, i) => i).filter(i => dep[i] >= 0).sort((a, b) => dep[a] - dep[b] || a - b));
+
+  table = {
+    trips: n, cols,
+    origin: Int16Array.from(origin), dest: Int16Array.from(dest),
+    times, dep, arr, days, order,
+    codigo: horario.map(t => String(t.codigo ?? '')),
+    idlinea: horario.map(t => String(t.idlinea ?? '')),
+    dias: horario.map(t => String(t.dias ?? '')),
+  };
+  compiledSchedules.set(data, table);
+  return table;
+}
+
+// ---- Queries ----
+function scheduleRunsOn(table, i, date) {
+  return serviceRunsOn(table.days[i], date);
+}
+
+// Trip rows running on `date` that depart at or after `from` minutes, by departure
+function scheduleTrips(table, date, from = 0) {
+  const out = [];
+  for (const i of table.order) {
+    if (table.dep[i] >= from && scheduleRunsOn(table, i, date)) out.push(i);
+  }
+  return out;
+}
+
+// A time on `date`'s day, `mins` after its midnight
+function scheduleAt(date, mins) {
+  return new Date(date.getFullYear(), date.getMonth(), date.getDate(), 0, mins, 0, 0);
+}
+
+/**
+ * A trip as the pages show it: `fields` plus depStr/depTime, arrStr/arrTime
+ * (null without an arrival; the next day when it is before the departure) and
+ * mins, whole minutes from realNow to the departure.
+ */
+function scheduleTrip(fields, dep, arr, date, realNow) {
+  const depTime = scheduleAt(date, dep);
+  let arrTime = null;
+  if (arr >= 0) {
+    arrTime = scheduleAt(date, arr);
+    if (arrTime < depTime) arrTime.setDate(arrTime.getDate() + 1);
+  }
+  return {
+    ...fields,
+    depStr: scheduleClock(dep), depTime,
+    arrStr: arr >= 0 ? scheduleClock(arr) : null, arrTime,
+    mins: Math.round((depTime - realNow) / 60000),
+  };
+}
+
+// ---- Serialization ----
+// Same layout as the snapshot: base64 little-endian typed arrays.
+function scheduleB64(typed) {
+  const bytes = new Uint8Array(typed.buffer, typed.byteOffset, typed.byteLength);
+  let bin = '';
+  for (let i = 0; i < bytes.length; i += 0x8000) bin += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  return btoa(bin);
+}
+
+function serializeSchedule(table) {
+  return JSON.stringify({
+    schema: SCHEDULE_SCHEMA, trips: table.trips, cols: table.cols,
+    origin: scheduleB64(table.origin), dest: scheduleB64(table.dest),
+    times: scheduleB64(table.times), dep: scheduleB64(table.dep), arr: scheduleB64(table.arr),
+    days: scheduleB64(table.days), order: scheduleB64(table.order),
+    codigo: table.codigo, idlinea: table.idlinea, dias: table.dias,
+  });
+}
@@ -0,0 +1,197 @@
+// ===== search — shared autocomplete index =====
+// Built once per list (stops, nucleos, lines): every field is normalized up
+// front and every trigram of every field points at the entries containing it,
+// in CSR layout (gram → start offset → entry ids) like spatial.js. A query
+// intersects the posting lists of its trigrams and only then checks the
+// surviving entries, so a keystroke never re-normalizes or scans the list.
+// Queries shorter than a trigram scan the pre-normalized keys instead.
+//
+// Results are ranked: field starts with the query, then a word in it does,
+// then plain substring; earlier fields and earlier entries break ties.
+//
+// Indexes are persisted next to the API responses they were built from (see
+// loadSearchIndex), so a repeat visit skips the build.
+
+const SEARCH_SCHEMA = 1;
+const SEARCH_CACHE_PATH = 'search-index/';   // pseudo-URL path inside API_CACHE
+
+function searchNormalize(str) {
+  return String(str || '').toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
+}
+
+function searchGrams(key, into) {
+  for (let i = 0; i + 3 <= key.length; i++) into.add(key.slice(i, i + 3));
+  return into;
+}
+
+/**
+ * Index `items` on the given fields (functions item → string).
+ * Returns { n, fields, keys, grams: Map<gram, [start, end]>, ids: Uint32Array }.
+ */
+function buildSearchIndex(items, fields) {
+  const nf = fields.length;
+  const keys = new Array(items.length * nf);
+  const postings = new Map();
+  items.forEach((item, i) => {
+    const grams = new Set();
+    for (let f = 0; f < nf; f++) {
+      const key = searchNormalize(fields[f](item));
+      keys[i * nf + f] = key;
+      searchGrams(key, grams);
+    }
+    grams.forEach(g => {
+      let list = postings.get(g);
+      if (!list) postings.set(g, list = []);
+      list.push(i);
+    });
+  });
+
+  let total = 0;
+  postings.forEach(list => { total += list.length; });
+  const ids = new Uint32Array(total);
+  const grams = new Map();
+  let at = 0;
+  postings.forEach((list, g) => {
+    grams.set(g, [at, at + list.length]);
+    ids.set(list, at);
+    at += list.length;
+  });
+  return { n: items.length, fields: nf, keys, grams, ids };
+}
+
+// 0 = prefix, 1 = word start, 2 = substring, -1 = no match
+function searchRank(key, q) {
+  let at = key.indexOf(q);
+  if (at <= 0) return at;
+  for (; at > 0; at = key.indexOf(q, at + 1)) {
+    if (!isWordChar(key.charCodeAt(at - 1))) return 1;
+  }
+  return 2;
+}
+
+function isWordChar(code) {
+  return (code >= 97 && code <= 122) || (code >= 48 && code <= 57);
+}
+
+// a ∩ ids[lo, hi), both ascending; reuses a's storage
+function intersectSorted(a, ids, lo, hi) {
+  let n = 0;
+  for (let i = 0, k = lo; i < a.length && k < hi;) {
+    if (a[i] < ids[k]) i++;
+    else if (a[i] > ids[k]) k++;
+    else { a[n++] = a[i++]; k++; }
+  }
+  return a.subarray(0, n);
+}
+
+/**
+ * Entry indices matching `query`, best first, at most `limit`.
+ * Candidates arrive in entry order, so each rank bucket fills in final order
+ * and stops taking entries once it holds `limit`; the scan ends as soon as the
+ * best buckets alone can fill the result.
+ */
+function searchIndex(index, query, limit = 30) {
+  const q = searchNormalize(query.trim());
+  if (!q) return [];
+  const { n, fields, keys, grams, ids } = index;
+
+  let candidates = null;
+  if (q.length >= 3) {
+    // Posting lists are ascending: intersect them by merging, shortest first
+    const lists = [];
+    for (const g of searchGrams(q, new Set())) {
+      const span = grams.get(g);
+      if (!span) return [];
+      lists.push(span);
+    }
+    lists.sort((a, b) => (a[1] - a[0]) - (b[1] - b[0]));
+    candidates = ids.slice(lists[0][0], lists[0][1]);
+    for (let l = 1; l < lists.length && candidates.length; l++) {
+      candidates = intersectSorted(candidates, ids, lists[l][0], lists[l][1]);
+    }
+  }
+
+  // bucket = rank * fields + field; the first bucket is "first field starts with q"
+  const buckets = Array.from({ length: 3 * fields }, () => []);
+  const total = candidates ? candidates.length : n;
+  for (let c = 0; c < total && buckets[0].length < limit; c++) {
+    const i = candidates ? candidates[c] : c;
+    let best = -1;
+    for (let f = 0; f < fields; f++) {
+      const r = searchRank(keys[i * fields + f], q);
+      if (r >= 0 && (best < 0 || r * fields + f < best)) best = r * fields + f;
+      if (best === 0) break;
+    }
+    if (best >= 0 && buckets[best].length < limit) buckets[best].push(i);
+  }
+  return buckets.flat().slice(0, limit);
+}
+
+// ---- Persistence ----
+// Stored through api.js's persistent store, so indexes share the stop data's
+// byte budget and LRU eviction. The signature (FNV-1a over the indexed text)
+// ties an index to the list it was built from: a changed list rebuilds.
+function searchSignature(items, fields) {
+  let h = 0x811c9dc5;
+  items.forEach(item => fields.forEach(field => {
+    const s = String(field(item) || '');
+    for (let i = 0; i < s.length; i++) h = Math.imul(h ^ s.charCodeAt(i), 0x01000193);
+    h = Math.imul(h ^ 0x1f, 0x01000193);
+  }));
+  return `${items.length}-${(h >>> 0).toString(16)}`;
+}
+
+function encodeSearchIndex(index, sig) {
+  const bytes = new Uint8Array(index.ids.buffer);
+  let bin = '';
+  for (let i = 0; i < bytes.length; i += 0x8000) bin += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  return JSON.stringify({
+    schema: SEARCH_SCHEMA, sig, n: index.n, fields: index.fields, keys: index.keys,
+    grams: [...index.grams], ids: btoa(bin),
+  });
+}
+
+function decodeSearchIndex(raw) {
+  const bin = atob(raw.ids);
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return { n: raw.n, fields: raw.fields, keys: raw.keys, grams: new Map(raw.grams), ids: new Uint32Array(bytes.buffer) };
+}
+
+/**
+ * The index for `items` under the name `dataset` (e.g. 'stops-4'): from the
+ * persistent store when it was built from the same list, otherwise built now
+ * (by `build`, if given) and stored for the next page load.
+ */
+async function loadSearchIndex(dataset, items, fields, build = () => buildSearchIndex(items, fields)) {
+  const sig = searchSignature(items, fields);
+  const url = new URL(`${SEARCH_CACHE_PATH}${encodeURIComponent(dataset)}`, location.href).href;
+  const stored = await apiCacheGet(url);
+  try {
+    if (stored?.data?.schema === SEARCH_SCHEMA && stored.data.sig === sig) return decodeSearchIndex(stored.data);
+  } catch { /* corrupt — rebuild */ }
+
+  const index = build();
+  apiCachePut(url, encodeSearchIndex(index, sig), Date.now());
+  return index;
+}
+
+// ---- Page helper ----
+/**
+ * A searchable list for an autocomplete box. The persisted index is loaded in
+ * the background; a query that arrives first builds it on the spot instead,
+ * and that build is what gets stored.
+ *   search(query, limit) → matching items, best first
+ */
+function createSearchList(dataset, items, fields) {
+  let index = null;
+  const build = () => {
+    if (!index) index = buildSearchIndex(items, fields);
+    return index;
+  };
+  loadSearchIndex(dataset, items, fields, build).then(loaded => { if (!index) index = loaded; });
+  return {
+    items,
+    search: (query, limit) => searchIndex(build(), query, limit).map(i => items[i]),
+  };
+}
@@ -11,6 +11,8 @@ const SETTINGS_STRINGS = {
     dateModeDesc:     'Which day to search by default',
     segToday:         'Today',
     segTomorrow:      'Tomorrow',
+    transferTitle:    'Transfer time',
+    transferDesc:     'Minimum time to change buses',
     regionTitle:      'Default region',
     regionNone:       'None set',
     clearRegion:      'Clear',
@@ -24,9 +26,31 @@ const SETTINGS_STRINGS = {
     cacheClear:       'Clear',
     toastLangSaved:   lang => `Language set to ${lang === 'en' ? 'English' : 'Español'}`,
     toastDateSaved:   mode => `Default date: ${mode === 'today' ? 'Today' : 'Tomorrow'}`,
+    toastTransferSaved: mins => `Transfer time: ${mins} min`,
     toastRegionCleared: 'Default region cleared',
     toastStopsCleared:  'All saved stops cleared',
     toastCacheCleared:  'Cache cleared — reload to apply',
+    tilesLabel:       'Offline map',
+    tilesTitle:       'Saved map tiles',
+    tilesUsage:       (mb, of, n) => `${mb} MB of ${of} MB · ${n} tiles`,
+    tilesUnavailable: 'Available once the app has loaded offline support',
+    tilesBudgetTitle: 'Storage limit (MB)',
+    tilesBudgetDesc:  'Least recently used tiles are removed beyond this',
+    toastTilesPurged: 'Saved map tiles cleared',
+    toastTilesBudget: mb => `Map storage limit: ${mb} MB`,
+    perfLabel:        'Diagnostics',
+    perfTitle:        'Performance trace',
+    perfDesc:         'Times requests, parsing and rendering on every page',
+    perfDataTitle:    'Recorded spans',
+    perfSummary:      (n, kinds) => `${n} spans of ${kinds} kinds`,
+    perfEmpty:        'Nothing recorded yet',
+    perfOffHint:      'Turn the trace on, then use the app',
+    perfExport:       'Export',
+    perfColumns:      ['Span', 'Count', 'Mean', 'p95', 'Max'],
+    segOff:           'Off',
+    segOn:            'On',
+    toastPerf:        on => on ? 'Performance trace on from the next page' : 'Performance trace off',
+    toastPerfCleared: 'Performance trace cleared',
     removeStop:       '✕',
     installLabel:         'App',
     installTitle:         'Add to Home Screen',
@@ -68,6 +92,8 @@ const SETTINGS_STRINGS = {
     dateModeDesc:     'Qué día buscar por defecto',
     segToday:         'Hoy',
     segTomorrow:      'Mañana',
+    transferTitle:    'Tiempo de transbordo',
+    transferDesc:     'Tiempo mínimo para cambiar de autobús',
     regionTitle:      'Región predeterminada',
     regionNone:       'Sin definir',
     clearRegion:      'Borrar',
@@ -81,9 +107,31 @@ const SETTINGS_STRINGS = {
     cacheClear:       'Vaciar',
     toastLangSaved:   lang => `Idioma: ${lang === 'en' ? 'English' : 'Español'}`,
     toastDateSaved:   mode => `Fecha por defecto: ${mode === 'today' ? 'Hoy' : 'Mañana'}`,
+    toastTransferSaved: mins => `Tiempo de transbordo: ${mins} min`,
     toastRegionCleared: 'Región predeterminada eliminada',
     toastStopsCleared:  'Todas las paradas guardadas eliminadas',
     toastCacheCleared:  'Caché vaciada — recarga para aplicar',
+    tilesLabel:       'Mapa sin conexión',
+    tilesTitle:       'Teselas del mapa guardadas',
+    tilesUsage:       (mb, of, n) => `${mb} MB de ${of} MB · ${n} teselas`,
+    tilesUnavailable: 'Disponible cuando la app haya cargado el modo sin conexión',
+    tilesBudgetTitle: 'Límite de espacio (MB)',
+    tilesBudgetDesc:  'Se eliminan las teselas usadas hace más tiempo por encima del límite',
+    toastTilesPurged: 'Teselas del mapa borradas',
+    toastTilesBudget: mb => `Límite del mapa: ${mb} MB`,
+    perfLabel:        'Diagnóstico',
+    perfTitle:        'Traza de rendimiento',
+    perfDesc:         'Mide peticiones, análisis y dibujado en cada página',
+    perfDataTitle:    'Tramos registrados',
+    perfSummary:      (n, kinds) => `${n} tramos de ${kinds} tipos`,
+    perfEmpty:        'Aún no hay nada registrado',
+    perfOffHint:      'Activa la traza y usa la app',
+    perfExport:       'Exportar',
+    perfColumns:      ['Tramo', 'Veces', 'Media', 'p95', 'Máx'],
+    segOff:           'No',
+    segOn:            'Sí',
+    toastPerf:        on => on ? 'Traza de rendimiento activa desde la próxima página' : 'Traza de rendimiento desactivada',
+    toastPerfCleared: 'Traza de rendimiento borrada',
     removeStop:       '✕',
     installLabel:         'App',
     installTitle:         'Añadir a pantalla de inicio',
@@ -214,6 +262,8 @@ function applyLang() {
   document.getElementById('settings-datemode-desc').textContent  = ss('dateModeDesc');
   document.getElementById('seg-today').textContent               = ss('segToday');
   document.getElementById('seg-tomorrow').textContent            = ss('segTomorrow');
+  document.getElementById('settings-transfer-title').textContent = ss('transferTitle');
+  document.getElementById('settings-transfer-desc').textContent  = ss('transferDesc');
   document.getElementById('settings-region-title').textContent   = ss('regionTitle');
   document.getElementById('settings-stops-label').textContent    = ss('stopsLabel');
   document.getElementById('settings-stops-empty').textContent    = ss('stopsEmpty');
@@ -224,6 +274,21 @@ function applyLang() {
   document.getElementById('settings-cache-desc').textContent     = ss('cacheDesc');
   document.getElementById('clear-cache-btn').textContent         = ss('cacheClear');
   document.getElementById('clear-region-btn').textContent        = ss('clearRegion');
+  document.getElementById('settings-tiles-label').textContent    = ss('tilesLabel');
+  document.getElementById('settings-tiles-title').textContent    = ss('tilesTitle');
+  document.getElementById('settings-tiles-budget-title').textContent = ss('tilesBudgetTitle');
+  document.getElementById('settings-tiles-budget-desc').textContent  = ss('tilesBudgetDesc');
+  document.getElementById('purge-tiles-btn').textContent         = ss('cacheClear');
+  renderTileUsage();
+  document.getElementById('settings-perf-label').textContent     = ss('perfLabel');
+  document.getElementById('settings-perf-title').textContent     = ss('perfTitle');
+  document.getElementById('settings-perf-desc').textContent      = ss('perfDesc');
+  document.getElementById('settings-perf-data-title').textContent = ss('perfDataTitle');
+  document.getElementById('seg-perf-off').textContent            = ss('segOff');
+  document.getElementById('seg-perf-on').textContent             = ss('segOn');
+  document.getElementById('perf-export-btn').textContent         = ss('perfExport');
+  document.getElementById('perf-reset-btn').textContent          = ss('cacheClear');
+  renderPerfStats();
 
   // Default region name
   const dr = getDefaultRegion();
@@ -255,6 +320,7 @@ function applyLang() {
   // Sync seg buttons
   syncSeg('lang-seg', lang);
   syncSeg('datemode-seg', getCookie('plannerDateMode') || 'today');
+  syncSeg('transfer-seg', getCookie('plannerMinTransfer') || '10');
   syncSeg('theme-seg', getTheme());
 }
 
@@ -285,6 +351,16 @@ document.getElementById('datemode-seg').addEventListener('click', e => {
   showToast(ss('toastDateSaved', val));
 });
 
+// ---- Transfer time seg (read by journey.js) ----
+document.getElementById('transfer-seg').addEventListener('click', e => {
+  const btn = e.target.closest('.settings-seg-btn');
+  if (!btn) return;
+  const val = btn.dataset.val;
+  setCookie('plannerMinTransfer', val, 365);
+  syncSeg('transfer-seg', val);
+  showToast(ss('toastTransferSaved', val));
+});
+
 // ---- Theme seg ----
 document.getElementById('theme-seg').addEventListener('click', e => {
   const btn = e.target.closest('.settings-seg-btn');
@@ -318,13 +394,110 @@ document.getElementById('lang-toggle').addEventListener('click', () => {
   showToast(ss('toastLangSaved', newLang));
 });
 
+// ---- Offline map tiles (sw.js via tiles.js) ----
+const MB = 1024 * 1024;
+
+async function renderTileUsage(usage) {
+  usage = usage || await tileCacheUsage();
+  const el = document.getElementById('settings-tiles-usage');
+  if (!usage) {
+    el.textContent = ss('tilesUnavailable');
+    return;
+  }
+  el.textContent = ss('tilesUsage', (usage.bytes / MB).toFixed(1), Math.round(usage.budget / MB), usage.tiles);
+  syncSeg('tiles-budget-seg', String(Math.round(usage.budget / MB)));
+}
+
+document.getElementById('purge-tiles-btn').addEventListener('click', async () => {
+  renderTileUsage(await purgeTileCache());
+  showToast(ss('toastTilesPurged'));
+});
+
+document.getElementById('tiles-budget-seg').addEventListener('click', async e => {
+  const btn = e.target.closest('.settings-seg-btn');
+  if (!btn) return;
+  syncSeg('tiles-budget-seg', btn.dataset.val);
+  renderTileUsage(await setTileCacheBudget(Number(btn.dataset.val) * MB));
+  showToast(ss('toastTilesBudget', btn.dataset.val));
+});
+
+// ---- Diagnostics (perf.js) ----
+function perfBound(ms) {
+  return ms === Infinity ? `> ${PERF_BUCKETS.at(-1)} ms` : `≤ ${ms} ms`;
+}
+
+function renderPerfStats() {
+  const { stats } = perfSnapshot();
+  const spans = Object.entries(stats).sort((a, b) => b[1].totalMs - a[1].totalMs);
+  const count = spans.reduce((n, [, s]) => n + s.count, 0);
+  syncSeg('perf-seg', getCookie(PERF_COOKIE) === '1' ? 'on' : 'off');   // PERF_ENABLED lags until a reload
+  document.getElementById('settings-perf-summary').textContent =
+    count ? ss('perfSummary', count, spans.length) : ss(PERF_ENABLED ? 'perfEmpty' : 'perfOffHint');
+
+  const el = document.getElementById('settings-perf-stats');
+  el.innerHTML = '';
+  if (!count) return;
+  const table = document.createElement('table');
+  table.className = 'perf-table';
+  const head = table.createTHead().insertRow();
+  ss('perfColumns').forEach(label => {
+    const th = document.createElement('th');
+    th.textContent = label;
+    head.appendChild(th);
+  });
+  const body = table.createTBody();
+  spans.forEach(([name, s]) => {
+    const row = body.insertRow();
+    const cell = row.insertCell();
+    cell.className = 'perf-span';
+    cell.textContent = name;
+    const tags = Object.entries(s.tags).map(([tag, n]) => `${tag} ${n}`).join(' · ');
+    if (tags) {
+      const small = document.createElement('span');
+      small.className = 'perf-tags';
+      small.textContent = tags;
+      cell.appendChild(small);
+    }
+    [s.count, `${Math.round(s.totalMs / s.count)} ms`, perfBound(perfQuantile(s, 0.95)), `${Math.round(s.maxMs)} ms`]
+      .forEach(value => { row.insertCell().textContent = value; });
+  });
+  el.appendChild(table);
+}
+
+document.getElementById('perf-seg').addEventListener('click', e => {
+  const btn = e.target.closest('.settings-seg-btn');
+  if (!btn) return;
+  const on = btn.dataset.val === 'on';
+  setPerfEnabled(on);
+  syncSeg('perf-seg', btn.dataset.val);
+  showToast(ss('toastPerf', on));
+});
+
+document.getElementById('perf-export-btn').addEventListener('click', () => {
+  const trace = { exportedAt: new Date().toISOString(), userAgent: navigator.userAgent, ...perfSnapshot() };
+  const link = document.createElement('a');
+  link.href = URL.createObjectURL(new Blob([JSON.stringify(trace, null, 2)], { type: 'application/json' }));
+  link.download = `ctan-perf-${trace.exportedAt.slice(0, 10)}.json`;
+  link.click();
+  setTimeout(() => URL.revokeObjectURL(link.href), 0);
+});
+
+document.getElementById('perf-reset-btn').addEventListener('click', () => {
+  perfReset();
+  renderPerfStats();
+  showToast(ss('toastPerfCleared'));
+});
+
 // ---- Clear cache ----
 document.getElementById('clear-cache-btn').addEventListener('click', async () => {
+  await purgeTileCache();   // resets the worker's tile index along with the cache
   if ('caches' in window) {
     const keys = await caches.keys();
     await Promise.all(keys.map(k => caches.delete(k)));
   }
+  localStorage.removeItem('apiCacheIndex');   // LRU index of the deleted ctan-api cache
   showToast(ss('toastCacheCleared'));
+  renderTileUsage();
 });
 
 // ---- Install guide ----
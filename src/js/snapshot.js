@@ -0,0 +1,225 @@
+// ===== snapshot — per-consortium network snapshot =====
+// One static file per consortium (built by tools/build_snapshot.py) holding
+// stops, nucleos, lines, line stop patterns and packed trip times. Pages ask
+// for it first and only fall back to the API when it's missing, of another
+// schema, or built (manifest.built) more than SNAPSHOT_MAX_AGE_MS ago.
+//
+// Files are content-addressed (snapshot-<c>.<hash>.json) and listed in
+// data/manifest.json; the service worker caches them forever and drops old
+// hashes when the manifest changes.
+
+const SNAPSHOT_SCHEMA     = 1;
+const SNAPSHOT_MAX_AGE_MS = 7 * 24 * 60 * 60 * 1000;   // the deploy rebuilds nightly
+
+let snapshotManifest = null;   // Promise<manifest|null>
+const snapshots = {};          // consorcioId → Promise<snapshot|null>
+
+function loadSnapshotManifest() {
+  if (!snapshotManifest) {
+    snapshotManifest = fetch(`${DATA_BASE}/manifest.json`)
+      .then(res => (res.ok ? res.json() : null))
+      .catch(() => null);
+  }
+  return snapshotManifest;
+}
+
+function loadSnapshot(consorcioId) {
+  const c = String(consorcioId);
+  if (!snapshots[c]) {
+    snapshots[c] = (async () => {
+      const manifest = await loadSnapshotManifest();
+      const entry = manifest?.snapshots?.[c];
+      if (!entry || manifest.schema !== SNAPSHOT_SCHEMA || !snapshotFresh(manifest)) return null;
+      const res = await fetch(`${DATA_BASE}/${entry.file}`);
+      if (!res.ok) return null;
+      return decodeSnapshot(await res.json(), entry);
+    })().catch(() => null);
+  }
+  return snapshots[c];
+}
+
+// A manifest without a build time counts as stale
+function snapshotFresh(manifest) {
+  return Date.now() - Date.parse(manifest.built) < SNAPSHOT_MAX_AGE_MS;
+}
+
+// Try the snapshot first; `pick` returns an API-shaped response or null.
+// Falls back to the page's fetchJSON(url).
+async function snapshotOr(consorcioId, pick, url) {
+  const snap = await loadSnapshot(consorcioId);
+  const hit = snap ? pick(snap) : null;
+  return hit || fetchJSON(url);
+}
+
+// ---- Decoding ----
+// Typed arrays are little-endian on the wire, which matches every platform
+// the app runs on, so they're viewed in place without byte swapping.
+function b64Array(Type, b64) {
+  const bin = atob(b64 || '');
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return new Type(bytes.buffer);
+}
+
+function decodeSnapshot(raw, entry) {
+  const str = raw.strings;
+  const nuc = raw.nucleos, st = raw.stops, ln = raw.lines;
+  const pt = raw.patterns, fq = raw.freqs, tt = raw.timetables;
+
+  const snap = {
+    consorcio: raw.consorcio,
+    hash: entry?.hash || null,
+    strings: str,
+    nucleos: {
+      id: b64Array(Int32Array, nuc.id),
+      municipio: b64Array(Int32Array, nuc.municipio),
+      name: b64Array(Uint16Array, nuc.nameStr),
+      zone: b64Array(Uint16Array, nuc.zoneStr),
+      lineStart: b64Array(Uint32Array, nuc.lineStart),
+      lines: b64Array(Uint16Array, nuc.nucleoLines),
+    },
+    stops: {
+      id: b64Array(Int32Array, st.id),
+      name: b64Array(Uint16Array, st.nameStr),
+      zone: b64Array(Uint16Array, st.zoneStr),
+      municipio: b64Array(Uint16Array, st.municipioStr),
+      nucleoName: b64Array(Uint16Array, st.nucleoNameStr),
+      nucleoId: b64Array(Int32Array, st.nucleoId),
+      lat: b64Array(Float32Array, st.lat),
+      lng: b64Array(Float32Array, st.lng),
+    },
+    lines: {
+      id: b64Array(Int32Array, ln.id),
+      code: b64Array(Uint16Array, ln.codeStr),
+      name: b64Array(Uint16Array, ln.nameStr),
+      modo: b64Array(Uint16Array, ln.modoStr),
+      operadores: b64Array(Uint16Array, ln.operadoresStr),
+      noticias: b64Array(Uint8Array, ln.noticias),
+    },
+    patterns: {
+      line: b64Array(Uint16Array, pt.line),
+      sentido: b64Array(Uint8Array, pt.sentido),
+      stopStart: b64Array(Uint32Array, pt.stopStart),
+      stops: b64Array(Uint16Array, pt.patternStops),
+    },
+    freqs: {
+      id: b64Array(Int32Array, fq.id),
+      code: b64Array(Uint16Array, fq.codeStr),
+      name: b64Array(Uint16Array, fq.nameStr),
+    },
+    timetables: {
+      pattern: b64Array(Uint16Array, tt.pattern),
+      freq: b64Array(Uint16Array, tt.freq),
+      trips: b64Array(Uint16Array, tt.trips),
+      timeStart: b64Array(Uint32Array, tt.timeStart),
+      times: b64Array(Int16Array, tt.times),
+    },
+  };
+
+  const stopRow = new Map();
+  snap.stops.id.forEach((id, i) => stopRow.set(String(id), i));
+  const lineRow = new Map();
+  snap.lines.id.forEach((id, i) => lineRow.set(String(id), i));
+  snap.stopRow = id => stopRow.get(String(id));
+  snap.lineRow = id => lineRow.get(String(id));
+
+  // ---- API-shaped views (same fields the endpoints return) ----
+  // Float32 holds ~7 significant digits; round before printing so 36.6597
+  // doesn't come back as 36.659698
+  const coord = v => (Number.isNaN(v) ? '' : Number(v.toPrecision(7)).toFixed(6));
+  let stopList = null, nucleoList = null, lineList = null;
+
+  snap.stopObject = i => ({
+    idParada: String(snap.stops.id[i]),
+    idNucleo: String(snap.stops.nucleoId[i] || ''),
+    idZona: str[snap.stops.zone[i]],
+    nombre: str[snap.stops.name[i]],
+    latitud: coord(snap.stops.lat[i]),
+    longitud: coord(snap.stops.lng[i]),
+    municipio: str[snap.stops.municipio[i]],
+    nucleo: str[snap.stops.nucleoName[i]],
+  });
+
+  // GET /{c}/paradas/
+  snap.stopList = () => {
+    if (!stopList) stopList = Array.from(snap.stops.id, (_, i) => snap.stopObject(i));
+    return stopList;
+  };
+
+  // GET /{c}/nucleos
+  snap.nucleoList = () => {
+    if (!nucleoList) {
+      nucleoList = Array.from(snap.nucleos.id, (id, i) => ({
+        idNucleo: String(id),
+        idMunicipio: String(snap.nucleos.municipio[i]),
+        idZona: str[snap.nucleos.zone[i]],
+        nombre: str[snap.nucleos.name[i]],
+      }));
+    }
+    return nucleoList;
+  };
+
+  // GET /{c}/lineas
+  snap.lineList = () => {
+    if (!lineList) {
+      lineList = Array.from(snap.lines.id, (id, i) => ({
+        idLinea: String(id),
+        codigo: str[snap.lines.code[i]],
+        nombre: str[snap.lines.name[i]],
+        modo: str[snap.lines.modo[i]],
+        operadores: str[snap.lines.operadores[i]],
+      }));
+    }
+    return lineList;
+  };
+
+  // Pattern rows for a line (one per direction)
+  snap.linePatterns = idLinea => {
+    const li = lineRow.get(String(idLinea));
+    const out = [];
+    if (li === undefined) return out;
+    for (let p = 0; p < snap.patterns.line.length; p++) {
+      if (snap.patterns.line[p] === li) out.push(p);
+    }
+    return out;
+  };
+
+  snap.patternStops = p =>
+    snap.patterns.stops.subarray(snap.patterns.stopStart[p], snap.patterns.stopStart[p + 1]);
+
+  // GET /{c}/lineas/{id}/paradas — null when the line isn't in the snapshot
+  snap.lineStops = idLinea => {
+    const pats = snap.linePatterns(idLinea);
+    if (!pats.length) return null;
+    const out = [];
+    pats.forEach(p => {
+      snap.patternStops(p).forEach((si, k) => {
+        out.push({
+          idParada: String(snap.stops.id[si]),
+          nombre: str[snap.stops.name[si]],
+          sentido: String(snap.patterns.sentido[p]),
+          orden: k + 1,
+          latitud: coord(snap.stops.lat[si]),
+          longitud: coord(snap.stops.lng[si]),
+        });
+      });
+    });
+    return out;
+  };
+
+  // GET /{c}/nucleos/{id}/lineas — null when the nucleo isn't in the snapshot.
+  // Recorded from the endpoint rather than derived from stops, because the
+  // paradas API uses different idNucleo values than the nucleos list.
+  snap.nucleoLines = idNucleo => {
+    const ni = snap.nucleos.id.indexOf(Number(idNucleo));
+    if (ni < 0) return null;
+    const rows = snap.nucleos.lines.subarray(snap.nucleos.lineStart[ni], snap.nucleos.lineStart[ni + 1]);
+    return Array.from(rows, li => ({
+      idLinea: String(snap.lines.id[li]),
+      codigo: str[snap.lines.code[li]],
+      nombre: str[snap.lines.name[li]],
+    }));
+  };
+
+  return snap;
+}
@@ -0,0 +1,194 @@
+// ===== spatial — grid index over stop coordinates =====
+// A uniform lat/lng grid in CSR layout (cell → start offset → items), built
+// once per region with a counting sort. Bounding-box queries only touch the
+// cells the box overlaps, so the map can materialize just the stops in view.
+// clusterStops() bins points by screen cell at a zoom level, using the same
+// Web Mercator projection as Leaflet. gridWithin() and gridNearest() answer
+// radius and k-nearest queries in metres (haversine) from the same cells:
+// the stops near me list (app.js) and walking transfers (raptor.js).
+//
+// Pure functions, no DOM. loadStopGrid() persists a grid through api.js's
+// store, like search.js does for its indexes.
+
+const GRID_MIN_CELL_DEG = 0.002;   // ~200 m; keeps tiny regions from one-stop cells
+const TILE_PX = 256;
+const EARTH_RADIUS_M = 6371008.8;
+const DEG_M = EARTH_RADIUS_M * Math.PI / 180;   // metres per degree of latitude
+const GRID_SCHEMA = 1;
+const GRID_CACHE_PATH = 'stop-grid/';           // pseudo-URL path inside API_CACHE
+
+/**
+ * Index points given as parallel lat/lng arrays. The cell size aims for about
+ * one point per cell over the region's bounding box.
+ */
+function buildStopGrid(lat, lng) {
+  const n = lat.length;
+  let minLat = Infinity, maxLat = -Infinity, minLng = Infinity, maxLng = -Infinity;
+  for (let i = 0; i < n; i++) {
+    if (lat[i] < minLat) minLat = lat[i];
+    if (lat[i] > maxLat) maxLat = lat[i];
+    if (lng[i] < minLng) minLng = lng[i];
+    if (lng[i] > maxLng) maxLng = lng[i];
+  }
+  if (!n) minLat = maxLat = minLng = maxLng = 0;
+
+  const cellDeg = Math.max(GRID_MIN_CELL_DEG, Math.sqrt((maxLat - minLat) * (maxLng - minLng) / Math.max(n, 1)));
+  const cols = Math.floor((maxLng - minLng) / cellDeg) + 1;
+  const rows = Math.floor((maxLat - minLat) / cellDeg) + 1;
+
+  const cellOf = new Uint32Array(n);
+  const start = new Uint32Array(cols * rows + 1);
+  for (let i = 0; i < n; i++) {
+    const c = Math.floor((lat[i] - minLat) / cellDeg) * cols + Math.floor((lng[i] - minLng) / cellDeg);
+    cellOf[i] = c;
+    start[c + 1]++;
+  }
+  for (let c = 0; c < cols * rows; c++) start[c + 1] += start[c];
+  const fill = start.slice(0, cols * rows);
+  const items = new Uint32Array(n);
+  for (let i = 0; i < n; i++) items[fill[cellOf[i]]++] = i;
+
+  return { lat, lng, minLat, minLng, cellDeg, cols, rows, start, items };
+}
+
+// Point indices inside [south, north] × [west, east]
+function gridQuery(grid, south, west, north, east) {
+  const { lat, lng, minLat, minLng, cellDeg, cols, rows, start, items } = grid;
+  const out = [];
+  const r0 = Math.max(0, Math.floor((south - minLat) / cellDeg));
+  const r1 = Math.min(rows - 1, Math.floor((north - minLat) / cellDeg));
+  const c0 = Math.max(0, Math.floor((west - minLng) / cellDeg));
+  const c1 = Math.min(cols - 1, Math.floor((east - minLng) / cellDeg));
+  for (let r = r0; r <= r1; r++) {
+    for (let c = c0; c <= c1; c++) {
+      const cell = r * cols + c;
+      for (let k = start[cell]; k < start[cell + 1]; k++) {
+        const i = items[k];
+        if (lat[i] >= south && lat[i] <= north && lng[i] >= west && lng[i] <= east) out.push(i);
+      }
+    }
+  }
+  return out;
+}
+
+// Leaflet's EPSG:3857 world pixel coordinates at `zoom`
+function worldPixel(lat, lng, zoom) {
+  const scale = TILE_PX * 2 ** zoom;
+  const s = Math.sin(lat * Math.PI / 180);
+  return [
+    (lng + 180) / 360 * scale,
+    (0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI)) * scale,
+  ];
+}
+
+/**
+ * Group point indices that fall in the same cellPx × cellPx screen cell.
+ * Returns [{ ids, lat, lng }] with the members' mean position.
+ */
+function clusterStops(grid, ids, zoom, cellPx) {
+  const bins = new Map();
+  ids.forEach(i => {
+    const [x, y] = worldPixel(grid.lat[i], grid.lng[i], zoom);
+    const key = `${Math.floor(x / cellPx)},${Math.floor(y / cellPx)}`;
+    let bin = bins.get(key);
+    if (!bin) bins.set(key, bin = { ids: [], lat: 0, lng: 0 });
+    bin.ids.push(i);
+    bin.lat += grid.lat[i];
+    bin.lng += grid.lng[i];
+  });
+  return Array.from(bins.values(), b => ({ ids: b.ids, lat: b.lat / b.ids.length, lng: b.lng / b.ids.length }));
+}
+
+// ---- Distance queries ----
+function haversineM(lat1, lng1, lat2, lng2) {
+  const rad = Math.PI / 180;
+  const dLat = (lat2 - lat1) * rad, dLng = (lng2 - lng1) * rad;
+  const h = Math.sin(dLat / 2) ** 2 + Math.cos(lat1 * rad) * Math.cos(lat2 * rad) * Math.sin(dLng / 2) ** 2;
+  return 2 * EARTH_RADIUS_M * Math.asin(Math.sqrt(Math.min(1, h)));
+}
+
+/**
+ * Points within `radiusM` metres of (lat, lng), nearest first:
+ * [{ i, m }] with the point index and its distance.
+ */
+function gridWithin(grid, lat, lng, radiusM) {
+  const dLat = radiusM / DEG_M;
+  const dLng = dLat / Math.max(0.01, Math.cos(lat * Math.PI / 180));
+  const out = [];
+  gridQuery(grid, lat - dLat, lng - dLng, lat + dLat, lng + dLng).forEach(i => {
+    const m = haversineM(lat, lng, grid.lat[i], grid.lng[i]);
+    if (m <= radiusM) out.push({ i, m });
+  });
+  return out.sort((a, b) => a.m - b.m || a.i - b.i);
+}
+
+/**
+ * The k points nearest to (lat, lng), at most `maxM` metres away, nearest
+ * first. Radius queries grow from one cell until k points are inside — any
+ * point outside the radius is farther than all of them.
+ */
+function gridNearest(grid, lat, lng, k, maxM = Infinity) {
+  const n = grid.lat.length;
+  if (!n || k <= 0) return [];
+  // No point is farther than this: a corner of the grid plus its diagonal
+  const reach = haversineM(lat, lng, grid.minLat, grid.minLng) +
+    1.5 * Math.max(grid.rows, grid.cols) * grid.cellDeg * DEG_M;
+  let radius = Math.min(maxM, grid.cellDeg * DEG_M);
+  for (;;) {
+    const found = gridWithin(grid, lat, lng, radius);
+    if (found.length >= k || radius >= maxM || radius >= reach) return found.slice(0, k);
+    radius = Math.min(maxM, radius * 2);
+  }
+}
+
+// ---- Persistence ----
+// Stored through api.js's persistent store under a signature of the
+// coordinates, so a changed stop list rebuilds.
+function gridSignature(lat, lng) {
+  let h = 0x811c9dc5;
+  [lat, lng].forEach(values => {
+    const words = new Uint32Array(Float64Array.from(values).buffer);
+    for (let i = 0; i < words.length; i++) h = Math.imul(h ^ words[i], 0x01000193);
+  });
+  return `${lat.length}-${(h >>> 0).toString(16)}`;
+}
+
+function gridBase64(array) {
+  const bytes = new Uint8Array(array.buffer, array.byteOffset, array.byteLength);
+  let bin = '';
+  for (let i = 0; i < bytes.length; i += 0x8000) bin += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  return btoa(bin);
+}
+
+function gridUint32(b64) {
+  const bin = atob(b64);
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return new Uint32Array(bytes.buffer);
+}
+
+/**
+ * The grid over lat/lng under the name `dataset` (e.g. 'stops-all'): from
+ * the persistent store when it was built from the same coordinates,
+ * otherwise built now and stored for the next page load.
+ */
+async function loadStopGrid(dataset, lat, lng) {
+  const sig = gridSignature(lat, lng);
+  const url = new URL(`${GRID_CACHE_PATH}${encodeURIComponent(dataset)}`, location.href).href;
+  const entry = await apiCacheGet(url);
+  try {
+    const stored = entry?.data;
+    if (stored?.schema === GRID_SCHEMA && stored.sig === sig) {
+      const { minLat, minLng, cellDeg, cols, rows } = stored;
+      return { lat, lng, minLat, minLng, cellDeg, cols, rows, start: gridUint32(stored.start), items: gridUint32(stored.items) };
+    }
+  } catch { /* corrupt — rebuild */ }
+
+  const grid = buildStopGrid(lat, lng);
+  const { minLat, minLng, cellDeg, cols, rows, start, items } = grid;
+  apiCachePut(url, JSON.stringify({
+    schema: GRID_SCHEMA, sig, minLat, minLng, cellDeg, cols, rows,
+    start: gridBase64(start), items: gridBase64(items),
+  }), Date.now());
+  return grid;
+}
@@ -1,5 +1,3 @@
-const API = 'https://api.ctan.es/v1/Consorcios';
-
 // ---- Parse URL params ----
 const params = new URLSearchParams(location.search);
 const CONSORCIO_ID = params.get('c');
@@ -24,6 +22,7 @@ const scanningIndicator = document.getElementById('scanning-indicator');
 const scanningText = document.getElementById('scanning-text');
 const liveClock = document.getElementById('live-clock');
 const liveLabel = document.getElementById('live-label');
+const refreshIndicator = document.getElementById('refresh-indicator');
 const refreshBtn = document.getElementById('refresh-btn');
 const ptrIndicator = document.getElementById('ptr-indicator');
 const qrToggle = document.getElementById('qr-toggle');
@@ -43,7 +42,7 @@ function applyLang() {
   const lang = getLang();
   langToggle.textContent = lang === 'en' ? 'ES' : 'EN';
   document.documentElement.lang = lang;
-  liveLabel.textContent = t('liveLabel');
+  updateLiveLabel();
   noServiceText.textContent = t('noService');
   noServiceHint.textContent = t('checkBack');
   if (scanningText) scanningText.textContent = t('scanningServices');
@@ -66,6 +65,25 @@ let qrGenerated = false;
 let lastServices = null;
 let lastNow = null;
 let isRefreshing = false;
+let liveUrl = null;       // servicios window behind the live label
+
+// The board's cards, keyed by line and time. Each row caches the scheduled
+// time (ms), its minutes label node and what the label shows.
+const departureList = createKeyedList(departuresBoard, {
+  name: 'departureList',
+  key: departureKey,
+  create(s, row) {
+    const card = makeDepartureCard(s);
+    row.minsEl = card.querySelector('.departure-mins');
+    row.scheduled = s._scheduled.getTime();
+    tickRow(row, Date.now());
+    return card;
+  },
+  update(row, s) {
+    row.scheduled = s._scheduled.getTime();
+    tickRow(row, Date.now());
+  },
+});
 
 // ---- Init ----
 applyTheme();
@@ -109,9 +127,29 @@ async function loadStopInfo() {
 
 // ---- Departures ----
 
-// Token to cancel any in-progress background sweep when a new load starts
+// Cancels any in-progress background sweep when a new load starts: an
+// AbortController (see supersede() in api.js) whose signal every request of
+// the sweep carries, so superseded windows leave the request queue too.
 let sweepToken = null;
 
+// Silent refreshes re-query only the next NEAR_TERM_MINS of windows and keep
+// the rest of lastServices — later scheduled times almost never change. The
+// full day is re-swept every FULL_SWEEP_MS, or when the date rolls over.
+const NEAR_TERM_MINS = 60;
+const FULL_SWEEP_MS = 15 * 60000;
+let fullSweepAt = 0;      // when lastServices last covered the rest of the day
+let fullSweepDay = null;  // toDateString() of that sweep
+
+function markFullSweep(now) {
+  fullSweepAt = Date.now();
+  fullSweepDay = now.toDateString();
+}
+
+function needsFullSweep(now) {
+  return !lastServices || fullSweepDay !== now.toDateString() ||
+    Date.now() - fullSweepAt >= FULL_SWEEP_MS;
+}
+
 async function loadDepartures(silent = false) {
   if (silent) {
     // Step 1: immediately trim cards that have already departed and tick labels.
@@ -119,25 +157,62 @@ async function loadDepartures(silent = false) {
     const now = new Date();
     pruneAndTick(now);
 
-    // Step 2: re-sweep the full day in the background.
-    //         patchDepartures is called with the growing collected set after
-    //         each window, so cards can only be added, never blanked mid-sweep.
-    sweepToken = {};
+    // Step 2: refresh in the background — the next hour of windows, or the
+    //         full day when the last full sweep is stale. patchDepartures is
+    //         called with the growing collected set after each window, so
+    //         cards can only be added, never blanked mid-sweep.
+    sweepToken = supersede(sweepToken);
     const token = sweepToken;
-    silentSweep(now, token);
+    if (DEPARTURES_BASE) silentAggregated(now, token);
+    else if (needsFullSweep(now)) silentSweep(now, token);
+    else silentNearTerm(now, token);
     return;
   }
 
   // Cancel any previous background sweep
-  sweepToken = {};
+  sweepToken = supersede(sweepToken);
   const token = sweepToken;
+  fullSweepAt = 0;
 
   const now = new Date();
 
-  departuresBoard.innerHTML = '<div class="loading-spinner"></div>';
+  clearBoard('<div class="loading-spinner"></div>');
   noService.classList.add('hidden');
   scanningIndicator.classList.add('hidden');
 
+  // Windows fetched ahead for a saved stop (nextbus.js) paint the board at
+  // once; the silent refresh then brings it up to date.
+  const warm = await warmDepartures(CONSORCIO_ID, STOP_ID, now);
+  if (token !== sweepToken) return;
+  if (warm?.services.length) {
+    lastServices = warm.services;
+    lastNow = now;
+    renderDepartures(warm.services, now);
+    if (DEPARTURES_BASE) silentAggregated(now, token);
+    else silentSweep(now, token);
+    return;
+  }
+
+  // One request for the whole day when an aggregator is configured;
+  // falls through to the window walk if it can't be reached.
+  if (DEPARTURES_BASE) {
+    try {
+      departuresEtag = null;
+      const services = await fetchAggregated(now, token);
+      if (token !== sweepToken) return;
+      lastServices = services;
+      lastNow = now;
+      markFullSweep(now);
+      if (!services.length) {
+        clearBoard();
+        noService.classList.remove('hidden');
+        return;
+      }
+      renderDepartures(services, now);
+      return;
+    } catch { /* window walk below */ }
+  }
+
   try {
     // Phase 1: find the first window that has services (fast path)
     const { services: initial, cursor: nextCursor } = await fetchFirstWindow(now, false, token);
@@ -145,10 +220,11 @@ async function loadDepartures(silent = false) {
     if (token !== sweepToken) return; // superseded
 
     if (!initial.length) {
-      departuresBoard.innerHTML = '';
+      clearBoard();
       noService.classList.remove('hidden');
       lastServices = [];
       lastNow = now;
+      markFullSweep(now);
       return;
     }
 
@@ -161,41 +237,66 @@ async function loadDepartures(silent = false) {
     sweepRestOfDay(initial, nextCursor, now, token);
 
   } catch (e) {
-    departuresBoard.innerHTML = `<p class="hint">${t('noServiceLoad')}</p>`;
+    if (token !== sweepToken) return; // superseded
+    clearBoard(`<p class="hint">${t('noServiceLoad')}</p>`);
   }
 }
 
-// Walk every visible card and update only its minute label — no fetch, no flicker.
+// "Live", or how old the board is when sw.js answered from its cache
+function updateLiveLabel(url = liveUrl) {
+  liveUrl = url;
+  const note = url ? cachedNote(url, 'cachedDepartures') : '';
+  liveLabel.textContent = note || t('liveLabel');
+  refreshIndicator.classList.toggle('offline', !!note);
+}
+
+// Update every card's minute label — no fetch, no flicker. Each row keeps its
+// scheduled time and label node from when it was made, and the label is only
+// written when its text or colour changes (once a minute, not every second).
 function tickMinuteLabels() {
-  const now = new Date();
-  const cards = departuresBoard.querySelectorAll('.departure-card[data-key]');
-  cards.forEach(card => {
-    const scheduled = parseServiceTime(card.dataset.servicio, now);
-    const mins = Math.round((scheduled - now) / 60000);
-    const minsEl = card.querySelector('.departure-mins');
-    if (!minsEl) return;
-    minsEl.textContent = formatMins(mins);
-    minsEl.className = `departure-mins ${mins <= 2 ? 'mins-now' : mins <= 10 ? 'mins-soon' : 'mins-later'}`;
-  });
+  const now = Date.now();
+  departureList.rows().forEach(row => tickRow(row, now));
 }
 
 // Remove cards that have already departed and tick remaining labels.
 // Called instantly at the start of every silent refresh — no network needed.
 function pruneAndTick(now) {
-  const cards = departuresBoard.querySelectorAll('.departure-card[data-key]');
-  cards.forEach(card => {
-    const scheduled = parseServiceTime(card.dataset.servicio, now);
-    const mins = Math.round((scheduled - now) / 60000);
-    if (mins < -1) {
-      card.remove();
-      return;
-    }
-    const minsEl = card.querySelector('.departure-mins');
-    if (minsEl) {
-      minsEl.textContent = formatMins(mins);
-      minsEl.className = `departure-mins ${mins <= 2 ? 'mins-now' : mins <= 10 ? 'mins-soon' : 'mins-later'}`;
-    }
-  });
+  const items = departureList.items();
+  const live = items.filter(s => minsUntil(s._scheduled, now) >= -1);
+  if (live.length < items.length) departureList.set(live);
+  tickMinuteLabels();
+}
+
+// ---- Aggregated departures (tools/departures.py) ----
+// The aggregator answers with the rest of the day in one response. The ETag
+// goes back as If-None-Match, so an unchanged board costs a 304 and no body.
+let departuresEtag = null;
+
+// Returns the full-day services, or null when the board hasn't changed.
+async function fetchAggregated(now, token, lane = 'visible') {
+  const res = await apiFetch(
+    `${DEPARTURES_BASE}/departures/${CONSORCIO_ID}/${STOP_ID}?horaIni=${formatDateForAPI(now)}`,
+    { cache: 'no-store', headers: departuresEtag ? { 'If-None-Match': departuresEtag } : {},
+      lane, signal: token.signal }
+  );
+  if (res.status === 304) return null;
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+  departuresEtag = res.headers.get('ETag');
+  return (await res.json()).servicios || [];
+}
+
+async function silentAggregated(now, token) {
+  let services;
+  try {
+    services = await fetchAggregated(now, token, 'background');
+  } catch {
+    return; // network error — leave board as-is
+  }
+  if (token !== sweepToken || !services) return;
+  lastServices = services;
+  lastNow = now;
+  markFullSweep(now);
+  patchDepartures(services, now);
 }
 
 // Full-day sweep that runs silently in the background.
@@ -219,10 +320,11 @@ async function silentSweep(now, token) {
     let data;
     try {
       data = await fetchJSON(
-        `${API}/${CONSORCIO_ID}/paradas/${STOP_ID}/servicios?horaIni=${formatDateForAPI(cursor)}`
+        `${API}/${CONSORCIO_ID}/paradas/${STOP_ID}/servicios?horaIni=${formatDateForAPI(cursor)}`,
+        { lane: 'background', signal: token.signal }
       );
     } catch {
-      break; // network error — leave board as-is
+      return; // network error or superseded — leave board as-is
     }
 
     if (token !== sweepToken) return;
@@ -246,101 +348,81 @@ async function silentSweep(now, token) {
 
     cursor = advanceCursor(cursor, data.horaFin);
   }
-}
 
-// Diff the new services against the current DOM cards and apply minimal changes.
-// Cards that are identical (same key = idLinea|servicio) stay in place.
-// Cards in the new list that are missing from the DOM are added.
-// Cards in the DOM whose key is NOT in the new list are only removed if their
-// departure time has passed — never removed just because the sweep hasn't
-// reached that window yet.
-function patchDepartures(services, now) {
-  const enriched = services
-    .map(s => ({ ...s, _scheduled: parseServiceTime(s.servicio, now) }))
-    .filter(s => Math.round((s._scheduled - now) / 60000) >= -1)
-    .sort((a, b) => a._scheduled - b._scheduled);
+  lastServices = [...collected];
+  lastNow = now;
+  markFullSweep(now);
+}
 
-  if (!enriched.length) {
-    departuresBoard.innerHTML = '';
-    noService.classList.remove('hidden');
-    return;
-  }
-  noService.classList.add('hidden');
+// Near-term refresh: re-query windows from now until NEAR_TERM_MINS ahead,
+// then swap that stretch of lastServices for the fresh set and keep the rest.
+async function silentNearTerm(now, token) {
+  const endOfDay = new Date(now);
+  endOfDay.setHours(23, 59, 0, 0);
+  const horizon = new Date(Math.min(now.getTime() + NEAR_TERM_MINS * 60000, endOfDay.getTime()));
 
-  // Index existing cards by key
-  const existingCards = {};
-  departuresBoard.querySelectorAll('.departure-card[data-key]').forEach(el => {
-    existingCards[el.dataset.key] = el;
-  });
+  let cursor = new Date(now);
+  const fresh = [];
+  const seen = new Set();
 
-  // Remove sentinel if present (sweepRestOfDay adds it; we'll re-add when needed)
-  const oldSentinel = document.getElementById('load-more-sentinel');
-  if (oldSentinel) oldSentinel.remove();
+  while (cursor <= horizon) {
+    if (token !== sweepToken) return;
 
-  // Build the set of keys that belong in the new sorted list
-  const newKeys = new Set(enriched.map(s => `${s.idLinea}|${s.servicio}`));
-
-  // Remove cards that are absent from the new list AND have already departed.
-  // Cards from future windows not yet fetched are kept in existingCards so they
-  // can be reused when those windows arrive (avoids mid-sweep blanking).
-  Object.entries(existingCards).forEach(([key, el]) => {
-    if (!newKeys.has(key)) {
-      const scheduled = parseServiceTime(el.dataset.servicio, now);
-      const mins = Math.round((scheduled - now) / 60000);
-      if (mins < -1) delete existingCards[key]; // mark as truly gone
+    const url = `${API}/${CONSORCIO_ID}/paradas/${STOP_ID}/servicios?horaIni=${formatDateForAPI(cursor)}`;
+    let data;
+    try {
+      data = await fetchJSON(url, { lane: 'background', signal: token.signal });
+    } catch {
+      return; // network error or superseded — leave board as-is
     }
-  });
 
-  // Build the desired ordered list of elements (reusing existing nodes, creating new ones).
-  // We do NOT use replaceChildren/fragment — that detaches every node and causes a repaint
-  // flash on all cards. Instead we surgically move only the nodes that are out of place.
-  const desiredOrder = [];
+    if (token !== sweepToken) return;
+    updateLiveLabel(url);
 
-  enriched.forEach(s => {
-    const key = `${s.idLinea}|${s.servicio}`;
-    if (existingCards[key]) {
-      // Card already exists — update its minute label in-place, no DOM move yet
-      const card = existingCards[key];
-      const mins = Math.round((s._scheduled - now) / 60000);
-      const minsEl = card.querySelector('.departure-mins');
-      if (minsEl) {
-        minsEl.textContent = formatMins(mins);
-        minsEl.className = `departure-mins ${mins <= 2 ? 'mins-now' : mins <= 10 ? 'mins-soon' : 'mins-later'}`;
+    (data.servicios || []).forEach(s => {
+      const key = `${s.idLinea}|${s.servicio}`;
+      if (!seen.has(key)) {
+        seen.add(key);
+        fresh.push(s);
       }
-      desiredOrder.push(card);
-    } else {
-      // Brand-new card — makeDepartureCard gives it .card-entering for fade-in
-      desiredOrder.push(makeDepartureCard(s, now));
-    }
-  });
+    });
 
-  // Append surviving future-window cards after the sorted block
-  Object.entries(existingCards).forEach(([key, el]) => {
-    if (!newKeys.has(key)) desiredOrder.push(el);
-  });
+    cursor = advanceCursor(cursor, data.horaFin);
+  }
 
-  // Remove cards that have truly departed (not in existingCards any more)
-  departuresBoard.querySelectorAll('.departure-card[data-key]').forEach(el => {
-    if (!existingCards[el.dataset.key]) el.remove();
+  // Everything before `cursor` was just re-queried; keep what lies beyond it
+  const kept = lastServices.filter(s => {
+    const key = `${s.idLinea}|${s.servicio}`;
+    return !seen.has(key) && parseServiceTime(s.servicio, now) >= cursor;
   });
+  const merged = [...fresh, ...kept];
+  lastServices = merged;
+  lastNow = now;
+  patchDepartures(merged, now);
+}
 
-  // Now walk desiredOrder and use insertBefore to place each card correctly.
-  // Only cards that are actually out of position get moved — cards already in
-  // the right spot are untouched (no detach → no repaint → no flash).
-  desiredOrder.forEach((card, i) => {
-    const current = departuresBoard.children[i];
-    if (current !== card) {
-      // insertBefore moves the node without detaching-then-reattaching existing
-      // neighbours, so they don't flash.
-      departuresBoard.insertBefore(card, current || null);
-    }
-  });
+// Diff the new services against the cards on the board (departureList).
+// Cards that are identical (same key = idLinea|servicio) stay in place.
+// Cards in the new list that are missing from the board are added.
+// Cards on the board whose key is NOT in the new list are only removed if their
+// departure time has passed — never removed just because the sweep hasn't
+// reached that window yet; they stay after the sorted block.
+function patchDepartures(services, now) {
+  const enriched = enrichDepartures(services, now);
 
-  // Remove any board children beyond desiredOrder length (shouldn't happen but safety net)
-  while (departuresBoard.children.length > desiredOrder.length) {
-    departuresBoard.lastElementChild.remove();
+  if (!enriched.length) {
+    clearBoard();
+    noService.classList.remove('hidden');
+    return;
   }
+  noService.classList.add('hidden');
+
+  const fresh = new Set(enriched.map(departureKey));
+  const kept = departureList.items()
+    .filter(s => !fresh.has(departureKey(s)) && minsUntil(s._scheduled, now) >= -1);
+  departureList.set([...enriched, ...kept]);
 }
+patchDepartures = perfWrap('render', patchDepartures);
 
 // Finds the first non-empty window starting from `now`.
 // Returns { services, cursor } where cursor is positioned just after that window.
@@ -354,14 +436,14 @@ async function fetchFirstWindow(now, silent, token) {
   while (cursor <= endOfDay) {
     if (token !== sweepToken) return { services: [], cursor };
 
-    const data = await fetchJSON(
-      `${API}/${CONSORCIO_ID}/paradas/${STOP_ID}/servicios?horaIni=${formatDateForAPI(cursor)}`
-    );
+    const url = `${API}/${CONSORCIO_ID}/paradas/${STOP_ID}/servicios?horaIni=${formatDateForAPI(cursor)}`;
+    const data = await fetchJSON(url, { signal: token.signal });
+    updateLiveLabel(url);
 
     if (data.servicios && data.servicios.length > 0) {
       if (!silent) {
         scanningIndicator.classList.add('hidden');
-        departuresBoard.innerHTML = '';
+        clearBoard();
       }
       const next = advanceCursor(cursor, data.horaFin);
       return { services: data.servicios, cursor: next };
@@ -370,7 +452,7 @@ async function fetchFirstWindow(now, silent, token) {
     // Show scanning indicator after first empty window
     if (!shownScanning && !silent) {
       shownScanning = true;
-      departuresBoard.innerHTML = '';
+      clearBoard();
       scanningText.textContent = t('scanningServices');
       scanningIndicator.classList.remove('hidden');
     }
@@ -400,9 +482,16 @@ async function sweepRestOfDay(collected, cursor, now, token) {
   while (cursor <= endOfDay) {
     if (token !== sweepToken) return;
 
-    const data = await fetchJSON(
-      `${API}/${CONSORCIO_ID}/paradas/${STOP_ID}/servicios?horaIni=${formatDateForAPI(cursor)}`
-    );
+    let data;
+    try {
+      data = await fetchJSON(
+        `${API}/${CONSORCIO_ID}/paradas/${STOP_ID}/servicios?horaIni=${formatDateForAPI(cursor)}`,
+        { lane: 'background', signal: token.signal }
+      );
+    } catch {
+      sentinel.remove();
+      return; // network error or superseded — keep what's on the board
+    }
 
     if (token !== sweepToken) return;
 
@@ -420,11 +509,7 @@ async function sweepRestOfDay(collected, cursor, now, token) {
       if (changed) {
         lastServices = [...collected];
         lastNow = now;
-        // Remove sentinel temporarily so patchDepartures doesn't see it
-        sentinel.remove();
-        patchDepartures(collected, now);
-        // Re-append sentinel after patch
-        departuresBoard.appendChild(sentinel);
+        patchDepartures(collected, now);   // cards go in before the sentinel
       }
     }
 
@@ -433,6 +518,7 @@ async function sweepRestOfDay(collected, cursor, now, token) {
 
   // Done — remove sentinel
   sentinel.remove();
+  markFullSweep(now);
 }
 
 function advanceCursor(cursor, horaFin) {
@@ -445,20 +531,49 @@ function advanceCursor(cursor, horaFin) {
   return new Date(cursor.getTime() + 15 * 60000);
 }
 
-function makeDepartureCard(s, now) {
-  const scheduled = parseServiceTime(s.servicio, now);
-  const mins = Math.round((scheduled - now) / 60000);
+function departureKey(s) {
+  return `${s.idLinea}|${s.servicio}`;
+}
+
+// Services from `now` on (departed up to a minute ago), soonest first, with
+// their scheduled time parsed once as _scheduled
+function enrichDepartures(services, now) {
+  return services
+    .map(s => ({ ...s, _scheduled: parseServiceTime(s.servicio, now) }))
+    .filter(s => minsUntil(s._scheduled, now) >= -1)
+    .sort((a, b) => a._scheduled - b._scheduled);
+}
+
+function minsUntil(scheduled, now) {
+  return Math.round((scheduled - now) / 60000);
+}
+
+function minsClass(mins) {
+  return mins <= 2 ? 'mins-now' : mins <= 10 ? 'mins-soon' : 'mins-later';
+}
+
+function tickRow(row, now) {
+  const mins = minsUntil(row.scheduled, now);
+  const label = formatMins(mins);
+  const cls = minsClass(mins);
+  if (label !== row.label) row.minsEl.textContent = row.label = label;
+  if (cls !== row.minsClass) row.minsEl.className = `departure-mins ${row.minsClass = cls}`;
+}
+
+// Empty the board (rows, spinner, hints), optionally leaving `html` in it
+function clearBoard(html = '') {
+  departureList.clear();
+  departuresBoard.innerHTML = html;
+}
 
+// The minutes label is filled in by tickRow
+function makeDepartureCard(s) {
   const card = document.createElement('div');
   card.className = 'departure-card card-entering';
   card.setAttribute('role', 'button');
   card.setAttribute('tabindex', '0');
-  card.dataset.key = `${s.idLinea}|${s.servicio}`;   // for diff-patching
-  card.dataset.servicio = s.servicio;                  // for tickMinuteLabels
-  card._mins = mins; // used for insertion sort in sweepRestOfDay
+  card.dataset.key = departureKey(s);
 
-  const minsLabel = formatMins(mins);
-  const minsClass = mins <= 2 ? 'mins-now' : mins <= 10 ? 'mins-soon' : 'mins-later';
   const routeName = s.nombre.length > 40 ? s.nombre.slice(0, 38) + '…' : s.nombre;
 
   card.innerHTML = `
@@ -469,7 +584,7 @@ function makeDepartureCard(s, now) {
     </div>
     <div class="departure-time-col">
       <span class="departure-sched">${escHtml(s.servicio)}</span>
-      <span class="departure-mins ${minsClass}">${minsLabel}</span>
+      <span class="departure-mins"></span>
     </div>
     <span class="departure-info-arrow">›</span>
   `;
@@ -492,28 +607,16 @@ function makeDepartureCard(s, now) {
 }
 
 function renderDepartures(services, now) {
-  if (!services.length) {
-    departuresBoard.innerHTML = '';
-    noService.classList.remove('hidden');
-    return;
-  }
-
-  noService.classList.add('hidden');
-
-  const enriched = services
-    .map(s => ({ ...s, _scheduled: parseServiceTime(s.servicio, now) }))
-    .filter(s => Math.round((s._scheduled - now) / 60000) >= -1)
-    .sort((a, b) => a._scheduled - b._scheduled);
-
+  const enriched = enrichDepartures(services, now);
+  clearBoard();
   if (!enriched.length) {
-    departuresBoard.innerHTML = '';
     noService.classList.remove('hidden');
     return;
   }
-
-  departuresBoard.innerHTML = '';
-  enriched.forEach(s => departuresBoard.appendChild(makeDepartureCard(s, now)));
+  noService.classList.add('hidden');
+  departureList.set(enriched);
 }
+renderDepartures = perfWrap('render', renderDepartures);
 
 function formatMins(mins) {
   if (mins <= 0) return t('now');
@@ -683,12 +786,6 @@ function parseServiceTime(timeStr, refDate) {
   return t;
 }
 
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;')
@@ -0,0 +1,79 @@
+// ===== tiles — offline basemap tiles, page side =====
+// sw.js keeps map tiles in their own cache under a byte budget (see its
+// "Map tiles" section). This file builds the tile URL for map.js — the
+// tileBase cookie points it at tools/tile_stub.py like apiBase does for the
+// API — asks the worker to prefetch a region's bounding box, and reads or
+// changes the cache for settings.js. Every call resolves to null when no
+// service worker is running.
+
+const TILE_LIVE             = 'https://{s}.basemaps.cartocdn.com';
+const TILE_PREFETCH_ZOOMS   = [8, 9, 10, 11, 12];
+const TILE_PREFETCH_MAX     = 1500;                       // tiles per region
+const TILE_PREFETCH_EVERY   = 30 * 24 * 60 * 60 * 1000;   // re-check a region monthly
+const TILE_PREFETCH_KEY     = 'tilePrefetch';             // localStorage: region|template → last run
+const TILE_REPLY_TIMEOUT    = 10 * 1000;
+
+const tilePrefetching = new Map();   // region|template → report promise
+
+// Leaflet template for the light or dark basemap; needs api.js
+function tileTemplate(dark) {
+  return `${baseOverride('tileBase', TILE_LIVE)}/${dark ? 'dark_all' : 'light_all'}/{z}/{x}/{y}{r}.png`;
+}
+
+// Post msg to the active worker and wait for its reply on a MessageChannel
+async function tileWorker(msg, timeout = TILE_REPLY_TIMEOUT) {
+  const reg = await navigator.serviceWorker?.getRegistration().catch(() => null);
+  if (!reg?.active) return null;
+  return new Promise(resolve => {
+    const timer = timeout && setTimeout(() => resolve(null), timeout);
+    const channel = new MessageChannel();
+    channel.port1.onmessage = e => { clearTimeout(timer); resolve(e.data); };
+    reg.active.postMessage(msg, [channel.port2]);
+  });
+}
+
+/** { tiles, bytes, budget } */
+function tileCacheUsage() {
+  return tileWorker({ type: 'tiles-usage' });
+}
+
+function setTileCacheBudget(bytes) {
+  return tileWorker({ type: 'tiles-budget', budget: bytes });
+}
+
+function purgeTileCache() {
+  localStorage.removeItem(TILE_PREFETCH_KEY);
+  return tileWorker({ type: 'tiles-purge' });
+}
+
+function tilePrefetchLog() {
+  try { return JSON.parse(localStorage.getItem(TILE_PREFETCH_KEY) || '{}'); } catch { return {}; }
+}
+
+/**
+ * Have the worker fetch the tiles covering bbox ([south, west, north, east])
+ * at TILE_PREFETCH_ZOOMS, at most once a month per region and style, and
+ * not at all under Save-Data. Resolves to the worker's report
+ * ({ total, fetched, failed, stopped, tiles, bytes, budget }) or null.
+ */
+async function prefetchRegionTiles(consorcioId, bbox, template, { force = false } = {}) {
+  if (navigator.connection?.saveData) return null;
+  const key = `${consorcioId}|${template}`;
+  if (!force && Date.now() - (tilePrefetchLog()[key] || 0) < TILE_PREFETCH_EVERY) return null;
+  if (tilePrefetching.has(key)) return tilePrefetching.get(key);
+
+  // Same retina rule as Leaflet's {r}
+  const retina = (window.devicePixelRatio || 1) > 1 ? '@2x' : '';
+  const running = tileWorker({
+    type: 'tiles-prefetch', template: template.replace('{r}', retina),
+    bbox, zooms: TILE_PREFETCH_ZOOMS, max: TILE_PREFETCH_MAX,
+  }, 0).then(report => {
+    tilePrefetching.delete(key);
+    if (report && !report.failed) {
+      localStorage.setItem(TILE_PREFETCH_KEY, JSON.stringify({ ...tilePrefetchLog(), [key]: Date.now() }));
+    }
+    return report;
+  });
+  tilePrefetching.set(key, running);
+  return running;
+}
@@ -1,5 +1,3 @@
-const API = 'https://api.ctan.es/v1/Consorcios';
-
 // ---- Parse URL params ----
 const params      = new URLSearchParams(location.search);
 const CONSORCIO_ID = params.get('c');
@@ -16,6 +14,7 @@ const ttMeta          = document.getElementById('tt-meta');
 const ttDirectionTabs = document.getElementById('tt-direction-tabs');
 const ttFreqTabs      = document.getElementById('tt-freq-tabs');
 const ttGridWrapper   = document.getElementById('tt-grid-wrapper');
+const ttCacheNote     = document.getElementById('tt-cache-note');
 const langToggle      = document.getElementById('lang-toggle');
 
 backBtn.href = BACK_URL;
@@ -61,6 +60,7 @@ let availableFreqs = [];  // from the response's own frecuencias list
 let activeFreqId   = null;
 let activeDir      = 'ida';  // 'ida' or 'vuelta'
 let ttData         = null;   // full horarios_lineas response
+let ttUrl          = null;   // the request ttData came from; keys its parsed grids
 
 langToggle.addEventListener('click', () => {
   setLang(getLang() === 'en' ? 'es' : 'en');
@@ -79,49 +79,9 @@ async function initPage() {
     const dia   = today.getDate();
     const mes   = today.getMonth() + 1;
 
-    // Fetch global frequency list, then probe all in parallel to find which
-    // have data for this line today (same approach as linetimetable.js)
-    const freqData   = await fetchJSON(`${API}/${CONSORCIO_ID}/frecuencias`);
-    const globalFreqs = freqData.frecuencias || [];
-
-    const probeResults = await Promise.all(
-      globalFreqs.map(async gf => {
-        try {
-          const d = await fetchJSON(
-            `${API}/${CONSORCIO_ID}/horarios_lineas` +
-            `?idLinea=${LINEA_ID}&idFrecuencia=${gf.idFreq}&dia=${dia}&mes=${mes}`
-          );
-          const hasData = (d.planificadores || []).length > 0;
-          const freqsInResp = d.frecuencias || [];
-          return hasData ? { idFreq: gf.idFreq, gf, freqsInResp } : null;
-        } catch { return null; }
-      })
-    );
-
-    // Build deduped freq list from those that returned data, using response
-    // labels when available, falling back to global freq labels
-    const seenIds = new Set();
-    for (const r of probeResults) {
-      if (!r) continue;
-      if (r.freqsInResp.length) {
-        for (const f of r.freqsInResp) {
-          if (!seenIds.has(f.idfrecuencia)) {
-            seenIds.add(f.idfrecuencia);
-            availableFreqs.push(f); // { idfrecuencia, acronimo, nombre }
-          }
-        }
-      } else {
-        // Response had planificadores but no frecuencias list — use global label
-        if (!seenIds.has(r.idFreq)) {
-          seenIds.add(r.idFreq);
-          availableFreqs.push({
-            idfrecuencia: r.idFreq,
-            acronimo: r.gf.codigo,
-            nombre: r.gf.nombre,
-          });
-        }
-      }
-    }
+    // The line frequency index answers without a request per frequency;
+    // probe horarios_lineas only when it can't
+    availableFreqs = (await indexedLineFreqs(CONSORCIO_ID, LINEA_ID)) || await probeLineFreqs(dia, mes);
 
     if (!availableFreqs.length) {
       showNoData();
@@ -140,6 +100,54 @@ async function initPage() {
   }
 }
 
+// Fallback: probe every global frequency in parallel to find which have data
+// for this line today (same approach as linetimetable.js)
+async function probeLineFreqs(dia, mes) {
+  const freqData    = await fetchJSON(`${API}/${CONSORCIO_ID}/frecuencias`);
+  const globalFreqs = freqData.frecuencias || [];
+
+  const probeResults = await Promise.all(
+    globalFreqs.map(async gf => {
+      try {
+        const d = await fetchJSON(
+          `${API}/${CONSORCIO_ID}/horarios_lineas` +
+          `?idLinea=${LINEA_ID}&idFrecuencia=${gf.idFreq}&dia=${dia}&mes=${mes}`
+        );
+        const hasData = (d.planificadores || []).length > 0;
+        const freqsInResp = d.frecuencias || [];
+        return hasData ? { idFreq: gf.idFreq, gf, freqsInResp } : null;
+      } catch { return null; }
+    })
+  );
+
+  // Build deduped freq list from those that returned data, using response
+  // labels when available, falling back to global freq labels
+  const freqs = [];
+  const seenIds = new Set();
+  for (const r of probeResults) {
+    if (!r) continue;
+    if (r.freqsInResp.length) {
+      for (const f of r.freqsInResp) {
+        if (!seenIds.has(f.idfrecuencia)) {
+          seenIds.add(f.idfrecuencia);
+          freqs.push(f); // { idfrecuencia, acronimo, nombre }
+        }
+      }
+    } else {
+      // Response had planificadores but no frecuencias list — use global label
+      if (!seenIds.has(r.idFreq)) {
+        seenIds.add(r.idFreq);
+        freqs.push({
+          idfrecuencia: r.idFreq,
+          acronimo: r.gf.codigo,
+          nombre: r.gf.nombre,
+        });
+      }
+    }
+  }
+  return freqs;
+}
+
 // ---- Frequency tabs ----
 function buildFreqTabs() {
   ttFreqTabs.innerHTML = '';
@@ -219,9 +227,11 @@ async function loadAndRender() {
     const dia   = String(today.getDate()).padStart(2, '0');
     const mes   = String(today.getMonth() + 1).padStart(2, '0');
 
-    ttData = await fetchJSON(
-      `${API}/${CONSORCIO_ID}/horarios_lineas?idLinea=${LINEA_ID}&idFrecuencia=${activeFreqId}&dia=${dia}&mes=${mes}`
-    );
+    const url = `${API}/${CONSORCIO_ID}/horarios_lineas?idLinea=${LINEA_ID}&idFrecuencia=${activeFreqId}&dia=${dia}&mes=${mes}`;
+    ttData = await fetchJSON(url);
+    ttUrl  = url;
+    ttCacheNote.textContent = cachedNote(url, 'cachedSchedule');
+    ttCacheNote.classList.toggle('hidden', !ttCacheNote.textContent);
 
     buildDirectionTabs();
     renderGrid();
@@ -231,89 +241,20 @@ async function loadAndRender() {
 }
 
 // ---- Render timetable grid ----
+// Parsed once per request and direction (ttgrid.js), so a tab switch only redraws
 function renderGrid() {
   const planificador = (ttData?.planificadores || [])[0];
-  if (!planificador) { showNoData(); return; }
-
-  const bloques = (activeDir === 'ida'
-    ? planificador.bloquesIda
-    : planificador.bloquesVuelta) || [];
-  const horario = (activeDir === 'ida'
-    ? planificador.horarioIda
-    : planificador.horarioVuelta) || [];
-
-  // Filter out the "Frecuencia" label rows (tipo === '1')
-  const stopRows = bloques.filter(b => b.tipo !== '1');
-
-  if (!stopRows.length || !horario.length) {
-    showNoData();
-    return;
-  }
-
-  // Build mapping: original index in bloques → display row index
-  // We need to know the indices in the original bloques array to address horas
-  const stopIndices = [];
-  bloques.forEach((b, i) => { if (b.tipo !== '1') stopIndices.push(i); });
-
-  const table = document.createElement('table');
-  table.className = 'tt-grid';
-
-  // --- Header: stop-name col + one col per trip ---
-  const thead = document.createElement('thead');
-  const hRow  = document.createElement('tr');
-
-  const hStop = document.createElement('th');
-  hStop.textContent = ts('stop');
-  hRow.appendChild(hStop);
-
-  horario.forEach(trip => {
-    const th = document.createElement('th');
-    // First stop time of the trip as column header
-    const firstTime = (trip.horas || []).find(h => h && h !== '--') || '';
-    th.textContent = firstTime;
-    hRow.appendChild(th);
-  });
-
-  thead.appendChild(hRow);
-  table.appendChild(thead);
-
-  // --- Body: one row per stop ---
-  const tbody = document.createElement('tbody');
-  stopIndices.forEach((origIdx, rowNum) => {
-    const stop = stopRows[rowNum];
-    const tr   = document.createElement('tr');
-
-    const tdName = document.createElement('td');
-    tdName.textContent = stop.nombre;
-    tr.appendChild(tdName);
-
-    horario.forEach(trip => {
-      const td   = document.createElement('td');
-      const time = (trip.horas || [])[origIdx];
-      td.textContent = (time && time !== '--') ? time : '';
-      tr.appendChild(td);
-    });
-
-    tbody.appendChild(tr);
-  });
-
-  table.appendChild(tbody);
-
-  ttGridWrapper.innerHTML = '';
-  ttGridWrapper.appendChild(table);
+  const grid = planificador && timetableGrid(ttUrl, activeDir, planificador);
+  if (!grid) { showNoData(); return; }
+  renderTimetableGrid(ttGridWrapper, grid, { corner: ts('stop') });
 }
+renderGrid = perfWrap('render', renderGrid);
 
 function showNoData() {
   ttGridWrapper.innerHTML = `<p class="tt-no-data">${ts('noData')}</p>`;
 }
 
 // ---- Helpers ----
-async function fetchJSON(url) {
-  const res = await fetch(url);
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
-  return res.json();
-}
-
 function escHtml(str) {
   return String(str)
     .replace(/&/g, '&amp;')
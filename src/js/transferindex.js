@@ -0,0 +1,34 @@
+// ===== transferindex — which nucleos can be transfer points =====
+// data/transfers-<c>.json is built daily by tools/transfer_index.py: the
+// lines serving each nucleo and the nucleos on each line. A nucleo can only
+// be a 1-transfer point between origin and destination if it shares a line
+// with both, so journey.js probes those instead of every nucleo, and probes
+// them all as before when this returns null.
+
+const TRANSFER_INDEX_SCHEMA  = 1;
+const TRANSFER_INDEX_MAX_AGE = 2 * 24 * 60 * MINUTE;   // two missed daily builds
+
+// Set of nucleo ids sharing a line with both origin and dest, or null when
+// the index is missing, stale, or doesn't list either of them.
+async function indexedTransferPoints(consorcioId, originId, destId) {
+  let index;
+  try {
+    index = await fetchJSON(`${DATA_BASE}/transfers-${consorcioId}.json`);
+  } catch {
+    return null;
+  }
+  if (index?.schema !== TRANSFER_INDEX_SCHEMA) return null;
+  if (!(Date.now() - Date.parse(index.built) < TRANSFER_INDEX_MAX_AGE)) return null;
+
+  const reach = id => {
+    const lines = index.nucleos?.[String(id)];
+    if (!lines) return null;
+    return new Set(lines.flatMap(l => index.lineas?.[l] || []));
+  };
+  const from = reach(originId), to = reach(destId);
+  if (!from || !to) return null;
+  const points = new Set([...from].filter(n => to.has(n)));
+  points.delete(String(originId));
+  points.delete(String(destId));
+  return points;
+}
@@ -0,0 +1,188 @@
+// ===== ttgrid — timetable grids: parsed once per line, frequency and direction, drawn virtually =====
+// A horarios_lineas planificador holds, per direction, the stop blocks (tipo
+// '1' blocks are "Frecuencia" labels, not stops) and one horas array per trip,
+// indexed by block. compileTimetable() turns one direction into a flat grid:
+// the stop names, a header time per trip and a rows × cols array of times (''
+// where the bus doesn't stop). timetableGrid() keeps each grid by request URL
+// and direction, so switching tabs never walks the raw JSON a second time.
+//
+// renderTimetableGrid() draws a grid into its scrolling wrapper with only the
+// cells in view, plus a few either side, in the DOM. The grid is a sizer as
+// big as the whole table with a sticky header row, a sticky stop column and
+// absolutely placed cells of a fixed size. A scroll or resize repaints in the
+// next frame, keeping the cells still in view and adding only the new ones.
+// Needs perf.js.
+
+const TT_ROW_H    = 32;    // px; row height and widths match .tt-cell in style.css
+const TT_COL_W    = 58;
+const TT_STOP_W   = 160;
+const TT_OVERSCAN = 4;     // rows and columns drawn past each edge of the view
+
+const ttGrids = new Map();      // `${url}#${dir}` → grid (null when the direction is empty)
+const ttViews = new WeakMap();  // wrapper → the view it shows
+
+function ttTime(h) {
+  return h && h !== '--' ? h : '';
+}
+
+// ---- Parse ----
+/**
+ * @param planificador  first entry of a horarios_lineas response's planificadores
+ * @param {'ida'|'vuelta'} dir
+ * @param {object} opts
+ *   head  'first'      → a trip's column header is its first time at any stop (default)
+ *         'first-stop' → its time at the first stop, '' when it doesn't stop there
+ * @returns {{ rows, cols, stops: string[], heads: string[], cells: string[] } | null}
+ */
+function compileTimetable(planificador, dir, { head = 'first' } = {}) {
+  const bloques = (dir === 'ida' ? planificador.bloquesIda   : planificador.bloquesVuelta) || [];
+  const horario = (dir === 'ida' ? planificador.horarioIda   : planificador.horarioVuelta) || [];
+  const stopIndices = [];
+  bloques.forEach((b, i) => { if (b.tipo !== '1') stopIndices.push(i); });
+  if (!stopIndices.length || !horario.length) return null;
+
+  const rows = stopIndices.length;
+  const cols = horario.length;
+  const cells = new Array(rows * cols);
+  const heads = horario.map((trip, c) => {
+    const horas = trip.horas || [];
+    stopIndices.forEach((origIdx, r) => { cells[r * cols + c] = ttTime(horas[origIdx]); });
+    return head === 'first-stop' ? ttTime(horas[stopIndices[0]]) : horas.find(ttTime) || '';
+  });
+  return { rows, cols, stops: stopIndices.map(i => bloques[i].nombre || ''), heads, cells };
+}
+compileTimetable = perfWrap('parse', compileTimetable);
+
+// The grid for one direction of the horarios_lineas response fetched from url
+function timetableGrid(url, dir, planificador, opts) {
+  const key = `${url}#${dir}`;
+  if (!ttGrids.has(key)) ttGrids.set(key, compileTimetable(planificador, dir, opts));
+  return ttGrids.get(key);
+}
+
+// ---- Render ----
+/**
+ * Replace the wrapper's content with a grid, drawn from its top-left corner.
+ * @param {Element} wrapper  a .tt-grid-wrapper (it is the scroll container)
+ * @param grid               from timetableGrid()
+ * @param {object} opts
+ *   corner  text of the stop column's header
+ *   empty   text of a cell (or header) with no time; default ''
+ */
+function renderTimetableGrid(wrapper, grid, { corner, empty = '' }) {
+  const root = document.createElement('div');
+  root.className = 'tt-grid';
+  root.style.width = `${TT_STOP_W + grid.cols * TT_COL_W}px`;
+
+  const head = document.createElement('div');
+  head.className = 'tt-head';
+  const cornerEl = document.createElement('div');
+  cornerEl.className = 'tt-cell tt-corner';
+  cornerEl.textContent = corner;
+  head.appendChild(cornerEl);
+
+  const body = document.createElement('div');
+  body.className = 'tt-body';
+  body.style.height = `${grid.rows * TT_ROW_H}px`;
+  const stopCol = document.createElement('div');
+  stopCol.className = 'tt-stop-col';
+  body.appendChild(stopCol);
+
+  root.append(head, body);
+
+  if (!ttViews.has(wrapper)) {
+    const schedule = () => {
+      const view = ttViews.get(wrapper);
+      if (view && !view.frame) view.frame = requestAnimationFrame(() => paintTimetableGrid(view, true));
+    };
+    wrapper.addEventListener('scroll', schedule, { passive: true });
+    new ResizeObserver(schedule).observe(wrapper);
+  }
+  const old = ttViews.get(wrapper);
+  if (old?.frame) cancelAnimationFrame(old.frame);
+
+  const view = {
+    wrapper, grid, empty, root, head, body, stopCol, frame: 0,
+    heads: new Map(),    // column → header cell
+    stops: new Map(),    // row → stop name cell
+    cells: new Map(),    // row * cols + column → cell
+    stats: { paints: 0, created: 0 },
+  };
+  ttViews.set(wrapper, view);
+  wrapper.innerHTML = '';
+  wrapper.appendChild(root);
+  wrapper.scrollTop = 0;
+  wrapper.scrollLeft = 0;
+  paintTimetableGrid(view, false);
+  return view;
+}
+
+// The view a wrapper shows, or undefined
+function timetableGridView(wrapper) {
+  return ttViews.get(wrapper);
+}
+
+// Bring the cells in the DOM in line with the scroll position
+function paintTimetableGrid(view, scrolled) {
+  view.frame = 0;
+  const { wrapper, grid, empty } = view;
+  if (ttViews.get(wrapper) !== view || !view.root.isConnected) return;
+  const end = scrolled ? perfStart('render', 'timetableScroll') : perfNoop;
+  view.stats.paints++;
+
+  // Row r sits below the header, column c right of the stop column; both cover part of the view
+  const top = wrapper.scrollTop;
+  const left = wrapper.scrollLeft;
+  const r0 = Math.max(0, Math.floor(top / TT_ROW_H) - TT_OVERSCAN);
+  const r1 = Math.min(grid.rows, Math.ceil((top + wrapper.clientHeight) / TT_ROW_H) - 1 + TT_OVERSCAN);
+  const c0 = Math.max(0, Math.floor(left / TT_COL_W) - TT_OVERSCAN);
+  const c1 = Math.min(grid.cols, Math.ceil((left + wrapper.clientWidth - TT_STOP_W) / TT_COL_W) + TT_OVERSCAN);
+  const inRows = r => r >= r0 && r < r1;
+  const inCols = c => c >= c0 && c < c1;
+
+  for (const [c, el] of view.heads) if (!inCols(c)) { el.remove(); view.heads.delete(c); }
+  for (const [r, el] of view.stops) if (!inRows(r)) { el.remove(); view.stops.delete(r); }
+  for (const [k, el] of view.cells) {
+    if (!inRows(Math.floor(k / grid.cols)) || !inCols(k % grid.cols)) { el.remove(); view.cells.delete(k); }
+  }
+
+  const made = document.createDocumentFragment();
+  const make = (map, k, cls, text, x, y) => {
+    if (map.has(k)) return null;
+    const el = document.createElement('div');
+    el.className = text ? cls : `${cls} tt-cell-empty`;
+    el.textContent = text || empty;
+    el.style.left = `${x}px`;
+    el.style.top = `${y}px`;
+    map.set(k, el);
+    view.stats.created++;
+    return el;
+  };
+
+  for (let c = c0; c < c1; c++) {
+    const el = make(view.heads, c, 'tt-cell tt-head-cell', grid.heads[c], TT_STOP_W + c * TT_COL_W, 0);
+    if (el) made.appendChild(el);
+  }
+  view.head.appendChild(made);
+
+  for (let r = r0; r < r1; r++) {
+    const alt = r % 2 ? ' tt-row-alt' : '';
+    const el = make(view.stops, r, `tt-cell tt-stop-name${alt}`, grid.stops[r], 0, r * TT_ROW_H);
+    if (el) {
+      el.title = grid.stops[r];
+      made.appendChild(el);
+    }
+  }
+  view.stopCol.appendChild(made);
+
+  for (let r = r0; r < r1; r++) {
+    const alt = r % 2 ? ' tt-row-alt' : '';
+    for (let c = c0; c < c1; c++) {
+      const k = r * grid.cols + c;
+      const el = make(view.cells, k, `tt-cell${alt}`, grid.cells[k], TT_STOP_W + c * TT_COL_W, r * TT_ROW_H);
+      if (el) made.appendChild(el);
+    }
+  }
+  view.body.appendChild(made);
+  end();
+}
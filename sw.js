@@ -1,5 +1,14 @@
 // CTAN Bus Tracker — Service Worker (offline shell cache)
 const CACHE = 'ctan-shell-v17';
+// Network snapshots live in their own cache so shell version bumps don't
+// throw them away — they're content-addressed and managed by the manifest.
+const DATA_CACHE = 'ctan-data';
+// API responses cached by the shared fetch layer (src/js/api.js)
+const API_CACHE = 'ctan-api';
+// Basemap tiles, under their own byte budget (see "Map tiles" below)
+const TILE_CACHE = 'ctan-tiles';
+// API responses the worker answers offline (see "API responses" below)
+const API_SW_CACHE = 'ctan-api-sw';
 const SHELL = [
   './index.html',
   './stops.html',
@@ -12,7 +21,24 @@ const SHELL = [
   './settings.html',
   './linetimetable.html',
   './src/style.css',
+  './src/data/holidays.json',
   './src/js/i18n.js',
+  './src/js/perf.js',
+  './src/js/keyedlist.js',
+  './src/js/api.js',
+  './src/js/freqindex.js',
+  './src/js/ttgrid.js',
+  './src/js/transferindex.js',
+  './src/js/snapshot.js',
+  './src/js/calendar.js',
+  './src/js/schedule.js',
+  './src/js/compute.js',
+  './src/js/raptor.js',
+  './src/js/spatial.js',
+  './src/js/polyline.js',
+  './src/js/tiles.js',
+  './src/js/nextbus.js',
+  './src/js/search.js',
   './src/js/home.js',
   './src/js/app.js',
   './src/js/station.js',
@@ -34,17 +60,57 @@ self.addEventListener('install', e =>
 self.addEventListener('activate', e =>
   e.waitUntil(
     caches.keys().then(keys =>
-      Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k)))
-    )
+      Promise.all(keys.filter(k => ![CACHE, DATA_CACHE, API_CACHE, TILE_CACHE, API_SW_CACHE].includes(k)).map(k => caches.delete(k)))
+    ).then(() => self.clients.claim())   // so the first map visit already caches its tiles
   )
 );
 
 self.addEventListener('fetch', e => {
   const url = e.request.url;
 
-  // Always go to network for API calls
+  // CTAN API reads follow a per-endpoint policy; anything else goes to network
+  if (e.request.method === 'GET' && API_PATH.test(new URL(url).pathname)) {
+    e.respondWith(serveApi(e, apiSwPolicy(url)));
+    return;
+  }
   if (url.includes('api.ctan.es')) return;
 
+  const tile = e.request.method === 'GET' && tileKey(url);
+  if (tile) {
+    e.respondWith(serveTile(e, tile));
+    return;
+  }
+
+  // Snapshot manifest: network-first, then sync cached snapshots to it
+  if (url.includes('/data/manifest.json')) {
+    e.respondWith(
+      fetch(e.request)
+        .then(res => {
+          if (res.ok) {
+            const clone = res.clone();
+            e.waitUntil(clone.json().then(m => syncSnapshots(e.request.url, m)).catch(() => {}));
+            caches.open(DATA_CACHE).then(cache => cache.put(e.request, res.clone()));
+          }
+          return res;
+        })
+        .catch(() => caches.open(DATA_CACHE).then(cache => cache.match(e.request)))
+    );
+    return;
+  }
+
+  // Snapshots are immutable (hash in the file name): cache-first, forever
+  if (url.includes('/data/snapshot-')) {
+    e.respondWith(
+      caches.open(DATA_CACHE).then(cache =>
+        cache.match(e.request).then(cached => cached || fetch(e.request).then(res => {
+          if (res.ok) cache.put(e.request, res.clone());
+          return res;
+        }))
+      )
+    );
+    return;
+  }
+
   // Network-first for HTML pages: ensures the latest page shell is always
   // fetched when online, so updates are visible immediately after SW activates.
   // Falls back to cache when offline.
@@ -68,7 +134,349 @@ self.addEventListener('fetch', e => {
   );
 });
 
+// Incremental snapshot update: for every consortium we already hold a
+// snapshot for, fetch the file the new manifest names (if it changed) and
+// drop hashes the manifest no longer lists. Untouched consortia cost nothing.
+async function syncSnapshots(manifestUrl, manifest) {
+  const cache = await caches.open(DATA_CACHE);
+  const base = manifestUrl.replace(/manifest\.json.*$/, '');
+  const wanted = new Set(Object.values(manifest.snapshots || {}).map(s => base + s.file));
+  const cached = (await cache.keys()).filter(r => r.url.startsWith(base + 'snapshot-'));
+
+  for (const req of cached) {
+    if (wanted.has(req.url)) continue;
+    const c = req.url.slice(base.length).match(/^snapshot-([^.]+)\./)?.[1];
+    const next = manifest.snapshots?.[c];
+    if (next) {
+      const res = await fetch(base + next.file).catch(() => null);
+      if (!res?.ok) continue;              // keep the old one until the new one lands
+      await cache.put(base + next.file, res);
+    }
+    await cache.delete(req);
+  }
+}
+
+// ---- API responses ----
+// CTAN API requests (matched by path, so tools/ctan_stub.py counts too — the
+// worker can't read the apiBase cookie) follow API_SW_POLICIES. Reference
+// data is stale-while-revalidate: answered from the cache, and refetched in
+// the background once older than maxAge. Live departures are network-first;
+// when the network fails or is slower than `timeout`, a cached window that
+// covers the requested time and is no older than `fallback` answers instead.
+// Other endpoints are network-first with any cached copy as the offline
+// fallback. Cached answers carry X-Cached-At (ms) and X-Cache (fresh, stale
+// or offline), which fetchJSON() passes on to the pages.
+const API_PATH           = /\/v1\/Consorcios(\/|$)/;
+const API_SW_MAX_ENTRIES = 600;
+const API_SW_POLICIES = [
+  { match: /\/servicios\/?$/,       strategy: 'network', timeout: 4000, fallback: 15 * 60 * 1000, windowed: true },
+  { match: /\/horarios_lineas\/?$/, strategy: 'swr', maxAge: 6 * 60 * 60 * 1000 },
+  { match: /\/(consorcios|paradas|lineas|nucleos|frecuencias)(\/[^/]+)?\/?$/, strategy: 'swr', maxAge: 7 * 24 * 60 * 60 * 1000 },
+];
+const API_SW_DEFAULT = { strategy: 'network' };
+
+let apiTrim = null;
+
+function apiSwPolicy(url) {
+  const path = new URL(url).pathname;
+  return API_SW_POLICIES.find(p => p.match.test(path)) || API_SW_DEFAULT;
+}
+
+function serveApi(e, policy) {
+  return policy.strategy === 'swr' ? apiStaleWhileRevalidate(e, policy) : apiNetworkFirst(e, policy);
+}
+
+async function apiStaleWhileRevalidate(e, policy) {
+  const cache = await caches.open(API_SW_CACHE);
+  const cached = await cache.match(e.request.url);
+  if (!cached) return apiNetworkFirst(e, policy);
+  const at = +cached.headers.get('X-Cached-At');
+  if (Date.now() - at < policy.maxAge) return apiTagged(cached, 'fresh');
+  e.waitUntil(fetch(e.request.url)
+    .then(res => res.ok && apiStore(e.request.url, res, policy))
+    .catch(() => {}));
+  return apiTagged(cached, 'stale');
+}
+
+async function apiNetworkFirst(e, policy) {
+  const url = e.request.url;
+  const network = fetch(e.request);
+  // Stored even when the fallback answered first
+  e.waitUntil(network.then(res => res.ok && apiStore(url, res.clone(), policy)).catch(() => {}));
+
+  const timeout = policy.timeout && new Promise(r => setTimeout(r, policy.timeout, 'timeout'));
+  const first = await Promise.race(timeout ? [network, timeout] : [network]).catch(() => null);
+  if (first instanceof Response && first.status < 500) return first;
+
+  const cached = await apiFallback(url, policy);
+  if (cached) return apiTagged(cached, 'offline');
+  return first instanceof Response ? first : network;
+}
+
+// The freshest cached answer for url within policy.fallback. Windowed
+// endpoints (servicios?horaIni=) also accept a window that covers horaIni.
+async function apiFallback(url, policy) {
+  const cache = await caches.open(API_SW_CACHE);
+  let candidates = [await cache.match(url)];
+  const want = policy.windowed && apiWindowStart(url);
+  if (want) {
+    candidates = candidates.concat((await cache.matchAll(url, { ignoreSearch: true })).filter(res => {
+      const [start, end] = (res.headers.get('X-Window') || '').split('|');
+      return start <= want && want <= end;
+    }));
+  }
+  const maxAge = policy.fallback ?? Infinity;
+  return candidates
+    .filter(res => res && Date.now() - +res.headers.get('X-Cached-At') <= maxAge)
+    .sort((a, b) => b.headers.get('X-Cached-At') - a.headers.get('X-Cached-At'))[0] || null;
+}
+
+// horaIni=dd-mm-yyyy+HH:MM → 'yyyy-mm-dd HH:MM', comparable with horaFin
+function apiWindowStart(url) {
+  const m = new URL(url).searchParams.get('horaIni')?.match(/^(\d\d)-(\d\d)-(\d{4})[+ ](\d\d:\d\d)/);
+  return m ? `${m[3]}-${m[2]}-${m[1]} ${m[4]}` : null;
+}
+
+function apiTagged(res, state) {
+  const headers = new Headers(res.headers);
+  headers.set('X-Cache', state);
+  return new Response(res.body, { status: res.status, headers });
+}
+
+async function apiStore(url, res, policy) {
+  const text = await res.text();
+  const headers = { 'Content-Type': 'application/json', 'X-Cached-At': String(Date.now()) };
+  if (policy.windowed) {
+    const start = apiWindowStart(url);
+    let end = null;
+    try { end = JSON.parse(text).horaFin?.slice(0, 16); } catch { /* not JSON */ }
+    if (start && end) headers['X-Window'] = `${start}|${end}`;
+  }
+  const cache = await caches.open(API_SW_CACHE);
+  await cache.put(url, new Response(text, { headers }));
+  apiTrim = apiTrim || new Promise(r => setTimeout(r, 1000)).then(trimApiCache);
+  return apiTrim;
+}
+
+// Cache keys come back oldest-written first, so this drops the stalest. The
+// saved stops' ledger (NEXTBUS_STATE) shares the cache but is never dropped.
+async function trimApiCache() {
+  apiTrim = null;
+  const cache = await caches.open(API_SW_CACHE);
+  const state = new URL(NEXTBUS_STATE, self.registration.scope).href;
+  const keys = (await cache.keys()).filter(k => k.url !== state);
+  await Promise.all(keys.slice(0, Math.max(0, keys.length - API_SW_MAX_ENTRIES)).map(k => cache.delete(k)));
+}
+
+// ---- Saved stops ----
+// Periodic background sync (registered by src/js/nextbus.js where granted)
+// refreshes the next servicios window of each saved stop. The stops, the API
+// base and the daily byte budget come from the state the pages keep in
+// NEXTBUS_STATE; the worker charges what it fetches to the same ledger.
+const NEXTBUS_STATE = './__nextbus__/state.json';
+
+self.addEventListener('periodicsync', e => {
+  if (e.tag === 'nextbus') e.waitUntil(syncSavedStops());
+});
+
+async function syncSavedStops() {
+  const cache = await caches.open(API_SW_CACHE);
+  const state = await cache.match(NEXTBUS_STATE).then(res => res && res.json()).catch(() => null);
+  if (!state?.api || !state.stops?.length) return;
+  const today = new Date().toDateString();
+  if (state.day !== today) Object.assign(state, { day: today, bytes: 0 });
+
+  const pad = n => String(n).padStart(2, '0');
+  const d = new Date();
+  const horaIni = `${pad(d.getDate())}-${pad(d.getMonth() + 1)}-${d.getFullYear()}+${pad(d.getHours())}:${pad(d.getMinutes())}`;
+  const policy = apiSwPolicy(`${state.api}/0/paradas/0/servicios`);
+  for (const { c, s } of state.stops) {
+    if (state.bytes >= state.budget) break;
+    const url = `${state.api}/${c}/paradas/${s}/servicios?horaIni=${horaIni}`;
+    const res = await fetch(url).catch(() => null);
+    if (!res?.ok) continue;
+    const text = await res.text();
+    state.bytes += text.length;
+    await apiStore(url, new Response(text), policy);
+  }
+  await cache.put(NEXTBUS_STATE, new Response(JSON.stringify(state), {
+    headers: { 'Content-Type': 'application/json' },
+  }));
+}
+
+// ---- Map tiles ----
+// Basemap tiles (CARTO, or tools/tile_stub.py through the tileBase cookie)
+// are served cache-first and revalidated in the background once older than
+// TILE_FRESH_MS. Cache keys drop the {a-d}. subdomain, so a tile fetched from
+// one subdomain is a hit from all of them. An index of [storedAt, lastUsed,
+// bytes] per tile, kept in the same cache, holds the cache to a byte budget
+// by evicting least-recently-used tiles. Pages talk to this section through
+// src/js/tiles.js (usage, budget, purge, per-region prefetch).
+const TILE_INDEX_KEY        = './__tiles__/index.json';
+const TILE_FRESH_MS         = 7 * 24 * 60 * 60 * 1000;
+const TILE_BUDGET_DEFAULT   = 50 * 1024 * 1024;
+const TILE_PATH             = /\/(light_all|dark_all)\/(\d+)\/(\d+)\/(\d+)(@2x)?\.png$/;
+const TILE_PREFETCH_WORKERS = 4;
+const TILE_PREFETCH_SHARE   = 0.8;   // prefetch stops here so browsing keeps some room
+
+let tileState = null;        // Promise of { budget, tiles: { key: [storedAt, lastUsed, bytes] } }
+let tileIndexWrite = null;
+
+function tileKey(url) {
+  const u = new URL(url);
+  const m = u.pathname.match(TILE_PATH);
+  if (!m) return null;
+  const host = u.host.replace(/^[a-d]\./, '');
+  return new URL(`./__tiles__/${host}/${m[1]}/${m[2]}/${m[3]}/${m[4]}${m[5] || ''}.png`, self.registration.scope).href;
+}
+
+function tileIndex() {
+  if (!tileState) {
+    tileState = caches.open(TILE_CACHE)
+      .then(cache => cache.match(TILE_INDEX_KEY))
+      .then(res => res ? res.json() : null)
+      .catch(() => null)
+      .then(doc => ({ budget: doc?.budget || TILE_BUDGET_DEFAULT, tiles: doc?.tiles || {} }));
+  }
+  return tileState;
+}
+
+// Coalesces index writes: one put per second at most
+function saveTileIndex() {
+  if (!tileIndexWrite) {
+    tileIndexWrite = new Promise(r => setTimeout(r, 1000)).then(async () => {
+      tileIndexWrite = null;
+      const index = await tileIndex();
+      const cache = await caches.open(TILE_CACHE);
+      await cache.put(TILE_INDEX_KEY, new Response(JSON.stringify(index), {
+        headers: { 'Content-Type': 'application/json' },
+      }));
+    });
+  }
+  return tileIndexWrite;
+}
+
+function tileUsage(index) {
+  const metas = Object.values(index.tiles);
+  return { tiles: metas.length, bytes: metas.reduce((n, m) => n + m[2], 0), budget: index.budget };
+}
+
+async function serveTile(e, key) {
+  const cache = await caches.open(TILE_CACHE);
+  const [cached, index] = await Promise.all([cache.match(key), tileIndex()]);
+  if (cached) {
+    const meta = index.tiles[key];
+    if (meta) meta[1] = Date.now();
+    if (!meta || Date.now() - meta[0] > TILE_FRESH_MS) {
+      e.waitUntil(fetch(e.request).then(res => storeTile(key, res)).catch(() => {}));
+    } else {
+      e.waitUntil(saveTileIndex());
+    }
+    return cached;
+  }
+  const res = await fetch(e.request);
+  e.waitUntil(storeTile(key, res.clone()).catch(() => {}));
+  return res;
+}
+
+// Opaque responses (no-cors) are passed through but not kept: their size is
+// unknowable and the browser charges them far more than their bytes.
+async function storeTile(key, res) {
+  if (!res.ok || res.type === 'opaque') return;
+  const body = await res.arrayBuffer();
+  const cache = await caches.open(TILE_CACHE);
+  await cache.put(key, new Response(body, {
+    headers: { 'Content-Type': res.headers.get('Content-Type') || 'image/png' },
+  }));
+  const index = await tileIndex();
+  const now = Date.now();
+  index.tiles[key] = [now, now, body.byteLength];
+  await evictTiles(index, cache, key);
+  return saveTileIndex();
+}
+
+async function evictTiles(index, cache, keep) {
+  let { bytes } = tileUsage(index);
+  if (bytes <= index.budget) return;
+  const lru = Object.keys(index.tiles).sort((a, b) => index.tiles[a][1] - index.tiles[b][1]);
+  for (const key of lru) {
+    if (bytes <= index.budget) break;
+    if (key === keep) continue;
+    bytes -= index.tiles[key][2];
+    delete index.tiles[key];
+    await cache.delete(key);
+  }
+}
+
+// Web Mercator tile ranges covering bbox at each zoom, lowest zoom first,
+// stopping before `max` tiles
+function tileRange([south, west, north, east], zooms, max) {
+  const x = (lng, n) => Math.min(n - 1, Math.max(0, Math.floor((lng + 180) / 360 * n)));
+  const y = (lat, n) => {
+    const r = lat * Math.PI / 180;
+    return Math.min(n - 1, Math.max(0, Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n)));
+  };
+  const out = [];
+  for (const z of [...zooms].sort((a, b) => a - b)) {
+    const n = 2 ** z;
+    const x0 = x(west, n), x1 = x(east, n), y0 = y(north, n), y1 = y(south, n);
+    if (out.length + (x1 - x0 + 1) * (y1 - y0 + 1) > max) break;
+    for (let tx = x0; tx <= x1; tx++) for (let ty = y0; ty <= y1; ty++) out.push({ z, x: tx, y: ty });
+  }
+  return out;
+}
+
+// template: a Leaflet URL template with {r} already filled in
+async function prefetchTiles({ template, bbox, zooms, max }) {
+  const index = await tileIndex();
+  const jobs = tileRange(bbox, zooms, max).map(({ z, x, y }) => {
+    const url = template.replace('{s}', 'abc'[(x + y) % 3]).replace('{z}', z).replace('{x}', x).replace('{y}', y);
+    return { url, key: tileKey(url) };
+  }).filter(j => j.key && !index.tiles[j.key]);
+
+  const result = { total: jobs.length, fetched: 0, failed: 0, stopped: false };
+  let next = 0;
+  const worker = async () => {
+    while (next < jobs.length) {
+      if (tileUsage(index).bytes >= index.budget * TILE_PREFETCH_SHARE) {
+        result.stopped = true;
+        return;
+      }
+      const { url, key } = jobs[next++];
+      try {
+        const res = await fetch(url, { mode: 'cors' });
+        if (!res.ok) throw new Error(res.status);
+        await storeTile(key, res);
+        result.fetched++;
+      } catch {
+        result.failed++;
+      }
+    }
+  };
+  await Promise.all(Array.from({ length: TILE_PREFETCH_WORKERS }, worker));
+  return { ...result, ...tileUsage(index) };
+}
+
+async function tileMessage(msg) {
+  const index = await tileIndex();
+  if (msg.type === 'tiles-budget' && msg.budget > 0) {
+    index.budget = msg.budget;
+    await evictTiles(index, await caches.open(TILE_CACHE), null);
+    await saveTileIndex();
+  } else if (msg.type === 'tiles-purge') {
+    await caches.delete(TILE_CACHE);
+    index.tiles = {};
+    await saveTileIndex();
+  } else if (msg.type === 'tiles-prefetch') {
+    return prefetchTiles(msg);
+  }
+  return tileUsage(index);
+}
+
 // Allow pages to trigger immediate activation of a waiting SW
 self.addEventListener('message', e => {
   if (e.data === 'skipWaiting') self.skipWaiting();
+  else if (String(e.data?.type).startsWith('tiles-')) {
+    e.waitUntil(tileMessage(e.data).then(reply => e.ports[0]?.postMessage(reply)));
+  }
 });
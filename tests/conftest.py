@@ -3,6 +3,7 @@ Shared fixtures and server setup for all test modules.
 """
 
 import os, sys, threading, time
+from urllib.parse import quote
 import requests
 import pytest
 from playwright.sync_api import sync_playwright
@@ -15,6 +16,12 @@ def pytest_addoption(parser):
         default=False,
         help="Run tests marked with @pytest.mark.network (skipped by default in CI)",
     )
+    parser.addoption(
+        "--update-budgets",
+        action="store_true",
+        default=False,
+        help="Rewrite bench/budgets.json from this run of tests/test_bench.py",
+    )
 
 
 def pytest_collection_modifyitems(config, items):
@@ -32,8 +39,18 @@ PORT     = 8787
 BASE_URL = f"http://localhost:{PORT}"
 TIMEOUT  = 15_000   # ms
 
+# Tests run against the local replay server (tools/ctan_stub.py) by default.
+# Set CTAN_LIVE_API=1 to hit api.ctan.es instead.
+STUB_PORT     = 8788
+LIVE_API      = os.environ.get("CTAN_LIVE_API") == "1"
+STUB_URL      = f"http://localhost:{STUB_PORT}"
+DEPARTURES_PORT = 8789   # tools/departures.py, started by tests that use it
+DEPARTURES_URL  = f"http://localhost:{DEPARTURES_PORT}"
+TILES_PORT      = 8790   # tools/tile_stub.py, started by tests that use it
+TILES_URL       = f"http://localhost:{TILES_PORT}"
+
 # Real reference data verified against live API 2026-02-19
-API           = "https://api.ctan.es/v1/Consorcios"
+API           = "https://api.ctan.es/v1/Consorcios" if LIVE_API else f"{STUB_URL}/v1/Consorcios"
 MALAGA_ID     = "4"
 STOP_MUELLE   = "149"    # Terminal Muelle Heredia
 NUCLEO_MALAGA      = "1"
@@ -65,11 +82,27 @@ def stop_server():
     if _server:
         _server.shutdown()
 
+# ── CTAN API stand-in ──────────────────────────────────────────────────────────
+_stub = None
+
+def start_stub():
+    global _stub
+    sys.path.insert(0, ROOT)
+    from tools.ctan_stub import serve_in_thread
+    _stub = serve_in_thread(STUB_PORT)
+
+def stop_stub():
+    if _stub:
+        _stub.shutdown()
+
 # ── Session-scoped fixtures ────────────────────────────────────────────────────
 @pytest.fixture(scope="session", autouse=True)
 def local_server():
     start_server()
+    if not LIVE_API:
+        start_stub()
     yield
+    stop_stub()
     stop_server()
 
 @pytest.fixture(scope="session")
@@ -77,6 +110,11 @@ def browser_ctx():
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         ctx = browser.new_context()
+        if not LIVE_API:
+            ctx.add_cookies([
+                {"name": "apiBase",  "value": quote(API, safe=""),               "url": BASE_URL},
+                {"name": "dataBase", "value": quote(f"{STUB_URL}/data", safe=""), "url": BASE_URL},
+            ])
         yield ctx
         browser.close()
 
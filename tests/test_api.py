@@ -1,6 +1,7 @@
 """
-API tests — hit the live CTAN API and validate response shapes + known data.
-These tests require network access and verify the upstream API contract.
+API tests — validate response shapes + known data.
+Run against the recorded fixtures served by tools/ctan_stub.py by default;
+set CTAN_LIVE_API=1 to verify the upstream API contract over the network.
 """
 
 import re
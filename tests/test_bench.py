@@ -0,0 +1,202 @@
+"""
+Page benchmarks — time to first departure (station.html), time to first
+itinerary (journey.html) and map-ready time (map.html), with the API requests
+and bytes each page costs, measured against the API stub with added latency,
+a throttled CPU and a fixed clock (the profile in bench/budgets.json). Every
+run opens a fresh context, so there is no service worker and nothing cached.
+
+Timings are the median of the runs, requests and bytes the largest. Results
+are written to bench_report.json (BENCH_REPORT overrides the path) and each
+page fails when a figure is over its budget — a journey search that doubles
+its fan-out, say. After an intended change, record new budgets from a run:
+
+    python3 run_tests.py bench --update-budgets
+
+Skipped when CTAN_LIVE_API=1.
+"""
+
+import json
+import math
+import os
+import re
+import statistics
+from urllib.parse import quote
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, API, STUB_URL, LIVE_API, ROOT, MALAGA_ID, STOP_MUELLE
+
+pytestmark = pytest.mark.skipif(LIVE_API, reason="measures requests through the API stub")
+
+BUDGETS_PATH = os.path.join(ROOT, "bench", "budgets.json")
+REPORT_PATH  = os.environ.get("BENCH_REPORT") or os.path.join(ROOT, "bench_report.json")
+
+with open(BUDGETS_PATH, encoding="utf-8") as f:
+    BUDGETS = json.load(f)
+PROFILE = BUDGETS["profile"]
+
+# No direct service; the journey goes through Málaga (as in test_journey.py)
+ORIGIN, DEST = "201", "107"
+
+# Date.now() and new Date() start from the profile's clock, so the station
+# sweep and the journey search cover the same hours whenever the suite runs.
+# Timers and performance.now() are left alone.
+FIXED_CLOCK = """(() => {
+  const RealDate = Date;
+  const offset = new RealDate('%s').getTime() - RealDate.now();
+  class BenchDate extends RealDate {
+    constructor(...args) { super(...(args.length ? args : [RealDate.now() + offset])); }
+    static now() { return RealDate.now() + offset; }
+  }
+  window.Date = BenchDate;
+})();"""
+
+
+# ── Fixtures ───────────────────────────────────────────────────────────────────
+@pytest.fixture(scope="module")
+def report():
+    pages = {}
+    yield pages
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump({"profile": PROFILE, "pages": pages}, f, indent=2)
+        f.write("\n")
+
+
+@pytest.fixture(autouse=True)
+def stub():
+    requests.post(f"{STUB_URL}/__stub__/config", json={
+        "latency": PROFILE["api_latency_ms"], "jitter": 0, "error_rate": 0.0, "fail_pattern": None}, timeout=5)
+    yield
+    requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0}, timeout=5)
+
+
+@pytest.fixture()
+def open_page(browser_ctx):
+    """Opens pages in fresh contexts with the throttled CPU and the fixed clock."""
+    contexts = []
+
+    def open_():
+        ctx = browser_ctx.browser.new_context()
+        ctx.add_cookies([
+            {"name": "apiBase",  "value": quote(API, safe=""),               "url": BASE_URL},
+            {"name": "dataBase", "value": quote(f"{STUB_URL}/data", safe=""), "url": BASE_URL},
+        ])
+        ctx.add_init_script(FIXED_CLOCK % PROFILE["clock"])
+        ctx.route(re.compile(r"basemaps\.cartocdn\.com"), lambda route: route.abort())   # tiles aren't measured
+        contexts.append(ctx)
+        page = ctx.new_page()
+        ctx.new_cdp_session(page).send("Emulation.setCPUThrottlingRate", {"rate": PROFILE["cpu_throttle"]})
+        return page
+
+    yield open_
+    for ctx in contexts:
+        ctx.close()
+
+
+# ── Stub counters ──────────────────────────────────────────────────────────────
+def reset_stats():
+    requests.post(f"{STUB_URL}/__stub__/reset", json={}, timeout=5)
+
+
+def api_usage():
+    stats = requests.get(f"{STUB_URL}/__stub__/stats", timeout=5).json()
+    return {"api_requests": stats["total"], "api_bytes": stats["bytes"]}
+
+
+def painted_at(page, condition, timeout=TIMEOUT):
+    """performance.now() at the first check where `condition` holds (checked every 10 ms)."""
+    return round(page.wait_for_function(f"() => ({condition}) && performance.now()",
+                                        polling=10, timeout=timeout).json_value())
+
+
+# ── Pages ──────────────────────────────────────────────────────────────────────
+def bench_station(page):
+    """First card on the board; requests once the rest of the day is swept."""
+    reset_stats()
+    page.goto(f"{BASE_URL}/station.html?c={MALAGA_ID}&s={STOP_MUELLE}", timeout=TIMEOUT)
+    first = painted_at(page, "document.querySelector('.departure-card')")
+    page.wait_for_function("() => !document.getElementById('load-more-sentinel')", timeout=60_000)
+    return {"first_departure_ms": first, **api_usage()}
+
+
+def bench_journey(page):
+    """Transfer search with every nucleo probed, counted from the search alone."""
+    page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+    expect(page.locator("#journey-region-list .card").first).to_be_visible(timeout=TIMEOUT)
+    page.evaluate(f"""async () => {{
+        loadSnapshot = () => Promise.resolve(null);
+        indexedTransferPoints = () => Promise.resolve(null);
+        const {{ consorcios }} = await fetchJSON(`${{API}}/consorcios`);
+        await selectRegion(consorcios.find(c => String(c.idConsorcio) === '{MALAGA_ID}'));
+        setDateMode('tomorrow');
+        selectedFrom = allNucleos.find(n => String(n.idNucleo) === '{ORIGIN}');
+        selectedTo   = allNucleos.find(n => String(n.idNucleo) === '{DEST}');
+    }}""")
+    reset_stats()
+    timing = page.evaluate("async () => { await runSearch(); return lastSearchTiming; }")
+    assert timing["firstMs"] is not None, "the search found nothing"
+    return {"first_itinerary_ms": round(timing["firstMs"]), "probes": timing["probes"], **api_usage()}
+
+
+def bench_map(page):
+    """The region's stops loaded and the loading veil gone."""
+    reset_stats()
+    page.goto(f"{BASE_URL}/map.html?c={MALAGA_ID}", timeout=TIMEOUT)
+    ready = painted_at(page, f"regionStops?.id === '{MALAGA_ID}' && "
+                             "document.getElementById('map-loading').classList.contains('hidden')")
+    page.wait_for_load_state("networkidle")
+    return {"ready_ms": ready, **api_usage()}
+
+
+PAGES = {"station": bench_station, "journey": bench_journey, "map": bench_map}
+
+
+# ── Budgets ────────────────────────────────────────────────────────────────────
+def summarize(runs):
+    """Median of the timings (*_ms), largest of everything else."""
+    return {k: round(statistics.median(r[k] for r in runs)) if k.endswith("_ms") else max(r[k] for r in runs)
+            for k in runs[0]}
+
+
+def with_headroom(key, value):
+    if key.endswith("_ms"):
+        return math.ceil(value * 1.5 / 100) * 100
+    if key.endswith("_bytes"):
+        return math.ceil(value * 1.25 / 1000) * 1000
+    return math.ceil(value * 1.25)
+
+
+def update_budget(name, result):
+    with open(BUDGETS_PATH, encoding="utf-8") as f:
+        budgets = json.load(f)
+    budgets[name] = {k: with_headroom(k, result[k]) for k in budgets[name]}
+    with open(BUDGETS_PATH, "w", encoding="utf-8") as f:
+        json.dump(budgets, f, indent=2)
+        f.write("\n")
+
+
+class TestBudgets:
+    def test_every_page_has_a_budget(self):
+        assert set(BUDGETS) - {"profile"} == set(PAGES)
+        assert all(k in ("api_requests", "api_bytes") or k.endswith("_ms")
+                   for name in PAGES for k in BUDGETS[name])
+
+    def test_headroom(self):
+        assert summarize([{"ready_ms": 900, "api_requests": 3}, {"ready_ms": 1200, "api_requests": 4},
+                          {"ready_ms": 1000, "api_requests": 3}]) == {"ready_ms": 1000, "api_requests": 4}
+        assert [with_headroom(k, v) for k, v in [("ready_ms", 1010), ("api_requests", 17), ("api_bytes", 15823)]] \
+            == [1600, 22, 20000]
+
+
+class TestPages:
+    @pytest.mark.parametrize("name", list(PAGES))
+    def test_within_budget(self, name, open_page, report, request):
+        runs = [PAGES[name](open_page()) for _ in range(PROFILE["runs"])]
+        result = summarize(runs)
+        budget = BUDGETS[name]
+        report[name] = {**result, "budget": budget, "runs": runs}
+        if request.config.getoption("--update-budgets"):
+            update_budget(name, result)
+            return
+        over = {k: f"{result[k]} > {budget[k]}" for k in budget if result[k] > budget[k]}
+        assert not over, f"{name} over budget: {over}"
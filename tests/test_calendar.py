@@ -0,0 +1,121 @@
+"""
+Service calendar tests — src/js/calendar.js and its Python twin
+tools/service_calendar.py. The holidays data file, day types on holidays,
+frecuencia masks resolved against them, year bitsets identical in both
+implementations, and the planner's picked date filtering trips through them
+and stopping where the data does.
+"""
+
+import json, os
+from datetime import date
+import pytest
+from tests.conftest import ROOT, BASE_URL, TIMEOUT
+from tools.schedule import DAY_SAT, DAY_SUN, freq_day_mask
+from tools.service_calendar import (DAY_HOLIDAY, day_type, holiday_years, last_listed_day, load_holidays, runs_on,
+                                    year_bits, year_days)
+
+HOLIDAYS_PATH = os.path.join(ROOT, "src", "data", "holidays.json")
+with open(HOLIDAYS_PATH, encoding="utf-8") as f:
+    HOLIDAYS = json.load(f)
+
+WEEKDAYS = freq_day_mask("Monday to friday working days")
+SDF = freq_day_mask("Saturdays, sundays and holidays")
+SATURDAYS = freq_day_mask("Saturdays")
+DAILY = freq_day_mask("Daily")
+
+
+class TestHolidayData:
+    def test_dates_belong_to_their_year(self):
+        for year, holidays in HOLIDAYS["years"].items():
+            for h in holidays:
+                assert date.fromisoformat(h["date"]).year == int(year)
+                assert h["name"] and h["scope"] in ("national", "andalucia")
+
+    def test_twelve_paid_holidays_a_year(self):
+        # Estatuto de los Trabajadores: 12 national/regional days, plus 2 local ones not listed here
+        for holidays in HOLIDAYS["years"].values():
+            assert len({h["date"] for h in holidays}) == 12
+
+
+class TestDayTypes:
+    def test_holiday_replaces_weekday(self):
+        assert day_type(date(2026, 4, 2)) == DAY_HOLIDAY     # Jueves Santo
+        assert day_type(date(2026, 4, 9)) == 1 << 4         # an ordinary Thursday
+        assert day_type(date(2026, 2, 28)) == DAY_HOLIDAY    # Día de Andalucía, a Saturday
+
+    @pytest.mark.parametrize("day,weekdays,sdf,saturdays", [
+        (date(2026, 4, 1), True, False, False),     # Wednesday
+        (date(2026, 4, 2), False, True, False),     # Thursday holiday
+        (date(2026, 2, 28), False, True, False),    # Saturday holiday
+        (date(2026, 3, 7), False, True, True),      # ordinary Saturday
+        (date(2026, 12, 7), False, True, False),    # moved Constitution day, a Monday
+        (date(2027, 1, 6), False, True, False),     # Epifanía, a Wednesday
+        (date(2027, 8, 16), False, True, False),    # moved Asunción, a Monday
+    ])
+    def test_masks_on_holidays(self, day, weekdays, sdf, saturdays):
+        assert runs_on(WEEKDAYS, day) is weekdays
+        assert runs_on(SDF, day) is sdf
+        assert runs_on(SATURDAYS, day) is saturdays
+        assert runs_on(DAILY, day)
+
+    def test_unlisted_year_has_no_holidays(self):
+        assert day_type(date(2031, 1, 1)) == 1 << 3          # a Wednesday
+        assert not any(d.year == 2031 for d in load_holidays())
+        assert 2031 not in holiday_years()
+        assert last_listed_day() == date(holiday_years()[-1], 12, 31) < date(2031, 1, 1)
+
+
+class TestYearBits:
+    def test_bit_per_day(self):
+        bits = year_bits(2026, SDF)
+        days = year_days(2026)
+        assert len(days) == 365 and len(bits) == 12
+        assert [bool(bits[d >> 5] >> (d & 31) & 1) for d in range(len(days))] == \
+               [runs_on(SDF, day) for day in days]
+
+    def test_leap_year_without_holidays(self):
+        bits = year_bits(2024, DAY_SAT | DAY_SUN | DAY_HOLIDAY)
+        assert len(bits) == 12 and bits[11] >> 14 == 0               # 366 days, nothing past the last
+        assert sum(bin(w).count("1") for w in bits) == 2 * 52        # 2024 isn't listed: weekends only
+
+
+class TestBrowserCalendar:
+    MASKS = [WEEKDAYS, SDF, SATURDAYS, DAILY, DAY_SUN | DAY_HOLIDAY]
+
+    def test_js_matches_python(self, page):
+        page.goto(f"{BASE_URL}/planner.html", timeout=TIMEOUT)
+        got = page.evaluate("""async masks => {
+            await loadServiceCalendar();
+            return Object.fromEntries([2025, 2026, 2027].flatMap(y =>
+                masks.map(m => [`${y}:${m}`, Array.from(serviceYearBits(y, m))])));
+        }""", self.MASKS)
+        assert got == {f"{y}:{m}": year_bits(y, m) for y in (2025, 2026, 2027) for m in self.MASKS}
+
+    def test_holiday_date_runs_holiday_service(self, page):
+        page.goto(f"{BASE_URL}/planner.html", timeout=TIMEOUT)
+        dias = page.evaluate("""async data => {
+            await loadServiceCalendar();
+            const table = compileSchedule(data);
+            const days = d => [...new Set(scheduleTrips(table, d).map(i => table.dias[i]))].sort();
+            return { holiday: days(new Date(2026, 3, 2)), thursday: days(new Date(2026, 3, 9)) };
+        }""", {
+            "horario": [{"codigo": "A", "dias": "L-V", "horas": ["08:00", "09:00"]},
+                        {"codigo": "B", "dias": "sdf", "horas": ["10:00", "11:00"]},
+                        {"codigo": "C", "dias": "diari", "horas": ["12:00", "13:00"]}],
+            "frecuencias": [{"acronimo": "L-V", "nombre": "Monday to friday working days"},
+                            {"acronimo": "sdf", "nombre": "Saturdays, sundays and holidays"},
+                            {"acronimo": "diari", "nombre": "Daily"}],
+        })
+        assert dias == {"holiday": ["diari", "sdf"], "thursday": ["L-V", "diari"]}
+
+    def test_picker_stops_at_the_last_listed_year(self, page):
+        page.goto(f"{BASE_URL}/planner.html", timeout=TIMEOUT)
+        last = last_listed_day().isoformat()
+        page.wait_for_function(f"() => datePickerInput.max === '{last}'", timeout=TIMEOUT)
+        picked = page.evaluate("""() => {
+            datePickerInput.value = '2031-01-01';   // no holiday data: typed past the picker's max
+            datePickerInput.dispatchEvent(new Event('change'));
+            return [datePickerInput.value, selectedPickedDate.getFullYear(), selectedPickedDate.getMonth(),
+                    selectedPickedDate.getDate()];
+        }""")
+        assert picked == [last, int(last[:4]), 11, 31]
@@ -0,0 +1,149 @@
+"""
+Compute worker tests — src/js/compute.js: horarios responses fetched raw and
+handed to a dedicated worker that parses, compiles and matches them, answering
+journey.js and planner.js through a small RPC client with typed arrays. Each
+body is posted once, the operations give the same answers run on the page, and
+the benchmark page (bench/compute.html) measures the long tasks this takes off
+the main thread. Skipped when CTAN_LIVE_API=1.
+"""
+
+import pytest
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, LIVE_API, MALAGA_ID, NUCLEO_COIN, NUCLEO_ALHAURIN, NUCLEO_MALAGA
+
+pytestmark = pytest.mark.skipif(LIVE_API, reason="Needs the stub's recorded timetables")
+
+# Coín → Málaga runs direct; Málaga → Alhaurín is the second leg of a transfer
+OD = f"`${{API}}/{MALAGA_ID}/horarios_origen_destino?idNucleoOrigen=${{o}}&idNucleoDestino=${{d}}`"
+
+# Whether the page itself ever parsed the body fetchJSON() holds for a request
+UNPARSED = f"""([o, d]) => {{
+    const entry = apiMemory.get({OD});
+    return !!entry && !!Object.getOwnPropertyDescriptor(entry, 'data').get;
+}}"""
+
+
+@pytest.fixture()
+def journey(page):
+    """journey.html on consortium 4, searching tomorrow, without the snapshot router."""
+    page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+    expect(page.locator("#journey-region-list .card").first).to_be_visible(timeout=TIMEOUT)
+    page.evaluate(f"""async () => {{
+        apiMemory.clear();
+        loadSnapshot = () => Promise.resolve(null);
+        const {{ consorcios }} = await fetchJSON(`${{API}}/consorcios`);
+        await selectRegion(consorcios.find(c => String(c.idConsorcio) === '{MALAGA_ID}'));
+        setDateMode('tomorrow');
+    }}""")
+    return page
+
+
+class TestOperations:
+    def test_worker_answers_like_the_page(self, journey):
+        same = journey.evaluate(f"""async () => {{
+            const od = (o, d) => {OD};
+            const leg1 = od('{NUCLEO_COIN}', '{NUCLEO_MALAGA}'), leg2 = od('{NUCLEO_MALAGA}', '{NUCLEO_ALHAURIN}');
+            const texts = {{ [leg1]: await fetchJSON(leg1, {{ raw: true }}), [leg2]: await fetchJSON(leg2, {{ raw: true }}) }};
+            const args = {{ leg1, leg2, date: getSearchDate().getTime(), realNow: Date.now(), minTransfer: 5, limit: 5 }};
+            const [worker, inline] = await Promise.all([
+                computeCall('transfers', args, {{ texts }}),
+                createComputeClient({{ inline: true }}).call('transfers', args, {{ texts }}),
+            ]);
+            const describe = r => JSON.stringify([r.count, [...r.k], [...r.wait], [...r.leg1.row], [...r.leg2.row],
+                                                  r.leg1.codigo, r.leg2.dias]);
+            return [computeClient.inline, worker.k instanceof Uint16Array, worker.leg1.dep instanceof Int16Array,
+                    worker.k.length > 0, describe(worker) === describe(inline)];
+        }}""")
+        assert same == [False, True, True, True, True]
+
+    def test_bodies_are_posted_once(self, journey):
+        sent = journey.evaluate(f"""async () => {{
+            const o = '{NUCLEO_COIN}', d = '{NUCLEO_MALAGA}', url = {OD};
+            const text = await fetchJSON(url, {{ raw: true }});
+            const args = {{ url, date: getSearchDate().getTime(), realNow: Date.now(), allDay: true }};
+            const before = computeClient.stats.textsSent;
+            const first = await computeCall('trips', args, {{ texts: {{ [url]: text }} }});
+            const again = await computeCall('trips', args, {{ texts: {{ [url]: text }} }});
+            return [computeClient.stats.textsSent - before, first.row.length > 0, [...first.row].join() === [...again.row].join()];
+        }}""")
+        assert sent == [1, True, True]
+
+    def test_least_recently_used_bodies_are_dropped(self, journey):
+        evicted = journey.evaluate("""async () => {
+            const client = createComputeClient({ inline: true });
+            const call = url => client.call('trips', { url, date: Date.now(), realNow: Date.now() },
+                                            { texts: { [url]: '{"horario": []}' } });
+            for (let i = 0; i <= COMPUTE_MAX_RESPONSES; i++) await call(`scratch:${i}`);
+            const sent = client.stats.textsSent;
+            await call(`scratch:${COMPUTE_MAX_RESPONSES}`);   // still held
+            await call('scratch:0');                          // dropped, so posted again
+            return [sent - COMPUTE_MAX_RESPONSES, client.stats.textsSent - sent, computeResponses.has('scratch:1')];
+        }""")
+        assert evicted == [1, 1, False]
+
+    def test_failures_reject(self, journey):
+        errors = journey.evaluate("""async () => {
+            const args = url => ({ url, date: Date.now(), realNow: Date.now() });
+            const aborted = new AbortController();
+            aborted.abort();
+            return Promise.all([
+                computeCall('trips', args('scratch:a'), { texts: { 'scratch:a': '{}' }, signal: aborted.signal }).catch(e => e.name),
+                computeCall('trips', args('scratch:none')).catch(e => e.message),
+                computeCall('trips', args('scratch:bad'), { texts: { 'scratch:bad': '{' } }).then(() => 'ok', () => 'rejected'),
+                computeCall('nothing', {}).catch(e => e.message),
+            ]);
+        }""")
+        assert errors == ["AbortError", "No response for scratch:none", "rejected", "Unknown compute operation nothing"]
+
+    def test_runs_on_the_page_without_workers(self, journey):
+        result = journey.evaluate(f"""async () => {{
+            const o = '{NUCLEO_COIN}', d = '{NUCLEO_MALAGA}', url = {OD};
+            const text = await fetchJSON(url, {{ raw: true }});
+            const worker = window.Worker;
+            window.Worker = undefined;
+            const client = createComputeClient();
+            const list = await client.call('trips', {{ url, date: getSearchDate().getTime(), realNow: Date.now(), allDay: true }},
+                                           {{ texts: {{ [url]: text }} }});
+            window.Worker = worker;
+            return [client.inline, client.stats.inline, list.row.length > 0];
+        }}""")
+        assert result == [True, 1, True]
+
+
+class TestPages:
+    def test_journey_search_parses_in_the_worker(self, journey):
+        result = journey.evaluate(f"""async () => {{
+            const byId = id => allNucleos.find(n => String(n.idNucleo) === id);
+            const itineraries = await findJourneys(byId('{NUCLEO_COIN}'), byId('{NUCLEO_MALAGA}'), getSearchDate());
+            return [itineraries.length, itineraries.every(i => i.type === 'direct' && i.legs[0].depTime instanceof Date),
+                    computeClient.stats.calls > 0, computeClient.stats.inline];
+        }}""")
+        assert result[0] > 0 and result[1:] == [True, True, 0]
+        assert journey.evaluate(UNPARSED, [NUCLEO_COIN, NUCLEO_MALAGA])
+
+    def test_planner_results_come_from_the_worker(self, page):
+        page.goto(f"{BASE_URL}/planner.html"
+                  f"?c={MALAGA_ID}&fromN={NUCLEO_COIN}&toN={NUCLEO_ALHAURIN}&date=tomorrow", timeout=TIMEOUT)
+        expect(page.locator(".planner-result-card").first).to_be_visible(timeout=TIMEOUT)
+        stats = page.evaluate("() => [computeClient.inline, computeClient.stats.calls, computeClient.stats.inline]")
+        assert stats == [False, 1, 0]
+        assert page.evaluate(UNPARSED, [NUCLEO_COIN, NUCLEO_ALHAURIN])
+        # The direct connections list is the whole day, the cards its first 12
+        counts = page.evaluate("() => [lastResults.trips.length, lastResults.results.length]")
+        assert page.locator(".direct-result-card").count() == counts[0] >= counts[1] > 0
+        assert page.locator(".planner-result-card").count() == counts[1]
+
+
+class TestBenchmark:
+    def test_long_tasks_move_off_the_page(self, page):
+        page.goto(f"{BASE_URL}/bench/compute.html", timeout=TIMEOUT)
+        page.wait_for_function("() => window.benchResult", timeout=120_000)
+        result = page.evaluate("() => window.benchResult")
+        assert "error" not in result, result
+        assert result["same"] and result["itineraries"] == 5
+        worker, inline = result["runs"]["worker"], result["runs"]["page"]
+        assert [worker["inline"], inline["inline"]] == [False, True]
+        assert worker["textsSent"] == inline["textsSent"] == 2 * result["probes"] + 1
+        assert inline["longTasks"] > 0
+        assert worker["longTaskMs"] < inline["longTaskMs"] / 2
+        assert worker["maxLateMs"] < inline["maxLateMs"]
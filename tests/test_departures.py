@@ -0,0 +1,151 @@
+"""
+Departures aggregator tests — tools/departures.py in front of the API stub:
+full-day merge, gap filling, ETag/304, concurrency, and station.html using it.
+"""
+
+import json, os, time
+from datetime import datetime
+from urllib.parse import quote
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import (ROOT, API, BASE_URL, TIMEOUT, STUB_URL, LIVE_API,
+                            DEPARTURES_PORT, DEPARTURES_URL, MALAGA_ID, STOP_MUELLE)
+from tools import departures
+from tools.departures import Upstream, serve_in_thread, collect, merge, etag_matches
+
+DAY = "16-02-2026"
+
+
+@pytest.fixture(scope="module")
+def aggregator():
+    server = serve_in_thread(DEPARTURES_PORT, upstream=API, ttl=0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def clean_stub():
+    yield
+    if not LIVE_API:
+        requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0}, timeout=5)
+
+
+def board(stop=STOP_MUELLE, at="00:00", **headers):
+    return requests.get(f"{DEPARTURES_URL}/departures/{MALAGA_ID}/{stop}?horaIni={DAY}+{at}",
+                        headers=headers, timeout=20)
+
+
+def recorded_day(stop=STOP_MUELLE):
+    path = os.path.join(ROOT, "tests", "fixtures", "ctan", "v1", MALAGA_ID, "paradas", stop, "servicios.json")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["servicios"]
+
+
+class FakeUpstream:
+    """Upstream whose first window is `first` minutes wide and the rest `size`."""
+
+    def __init__(self, services, first, size):
+        self.services, self.first, self.size, self.calls = services, first, size, 0
+
+    def window(self, consorcio, stop, start):
+        width = self.first if not self.calls else self.size
+        self.calls += 1
+        lo = start.hour * 60 + start.minute
+        hi = min(lo + width, 24 * 60)
+        fin = start.replace(hour=(hi - 1) // 60, minute=(hi - 1) % 60)
+        return {"servicios": [s for s in self.services if lo <= minutes(s["servicio"]) < hi],
+                "horaFin": fin.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def minutes(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[3:])
+
+
+SERVICES = [{"idLinea": "1", "servicio": f"{h:02d}:{m:02d}"} for h in range(6, 24) for m in (5, 25, 45)]
+
+
+class TestMerge:
+    def test_gaps_are_walked(self):
+        """Stride is learned from a 60-minute first window but the rest are 20 minutes wide."""
+        up = FakeUpstream(SERVICES, 60, 20)
+        windows = collect(up, MALAGA_ID, STOP_MUELLE, datetime(2026, 2, 16, 6, 0))
+        assert merge(windows) == SERVICES
+
+    def test_overlapping_windows(self):
+        up = FakeUpstream(SERVICES, 30, 90)
+        assert merge(collect(up, MALAGA_ID, STOP_MUELLE, datetime(2026, 2, 16, 6, 0))) == SERVICES
+
+    def test_dedup_on_line_and_time(self):
+        svc = {"idLinea": "1", "servicio": "07:00"}
+        merged = merge({datetime(2026, 2, 16, 6): {"servicios": [svc]},
+                        datetime(2026, 2, 16, 7): {"servicios": [svc, {"idLinea": "2", "servicio": "07:00"}]}})
+        assert len(merged) == 2
+
+    def test_etag_matching(self):
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('"x", W/"abc"', '"abc"')
+        assert not etag_matches(None, '"abc"')
+
+
+@pytest.mark.skipif(LIVE_API, reason="Compares against the recorded day schedule")
+class TestServer:
+    def test_full_day_in_one_response(self, aggregator):
+        r = board()
+        assert r.status_code == 200
+        got = [(s["idLinea"], s["servicio"]) for s in r.json()["servicios"]]
+        want = sorted({(s["idLinea"], s["servicio"]) for s in recorded_day()}, key=lambda k: k[1])
+        assert sorted(got) == sorted(want)
+        assert [t for _, t in got] == sorted(t for _, t in got)
+
+    def test_starts_at_hora_ini(self, aggregator):
+        times = [s["servicio"] for s in board(at="12:00").json()["servicios"]]
+        assert times and min(times) >= "12:00"
+
+    def test_unchanged_board_is_304(self, aggregator):
+        first = board()
+        etag = first.headers["ETag"]
+        again = board(**{"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert board(at="12:00", **{"If-None-Match": etag}).status_code == 200
+
+    def test_unknown_stop_is_404(self, aggregator):
+        assert board(stop="999999").status_code == 404
+
+    def test_windows_fetched_concurrently(self, aggregator):
+        """24 one-hour windows at 100 ms each would take 2.4 s one after another."""
+        requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 100}, timeout=5)
+        t0 = time.monotonic()
+        assert board().status_code == 200
+        assert time.monotonic() - t0 < 1.2
+
+
+class TestUpstreamCache:
+    def test_expired_windows_are_dropped(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(departures.time, "monotonic", lambda: clock[0])
+        up = Upstream(API, ttl=60)
+        for minute in range(5):   # a board refreshed every minute
+            up.window(MALAGA_ID, STOP_MUELLE, datetime(2026, 2, 16, 8, minute))
+            clock[0] += 30
+        assert len(up._cache) == 2 and up.calls == 5
+        clock[0] += 60
+        up.window(MALAGA_ID, STOP_MUELLE, datetime(2026, 2, 16, 9, 0))
+        assert len(up._cache) == 1
+
+
+@pytest.mark.skipif(LIVE_API, reason="Aggregator runs against the stub")
+class TestStationUsesAggregator:
+    def test_one_request_per_load(self, page, aggregator):
+        page.context.add_cookies([{"name": "departuresBase", "value": quote(DEPARTURES_URL, safe=""), "url": BASE_URL}])
+        try:
+            calls = {"departures": 0, "servicios": 0}
+            page.on("request", lambda r: calls.update(
+                {k: calls[k] + 1 for k in calls if f"/{k}" in r.url and r.method == "GET"}))
+            page.goto(f"{BASE_URL}/station.html?c={MALAGA_ID}&s={STOP_MUELLE}", timeout=TIMEOUT)
+            expect(page.locator(".departure-card, #no-service:not(.hidden)").first).to_be_visible(timeout=TIMEOUT)
+            page.wait_for_timeout(500)
+            assert calls == {"departures": 1, "servicios": 0}
+        finally:
+            page.context.clear_cookies(name="departuresBase")
@@ -0,0 +1,86 @@
+"""
+Line frequency index tests — tools/freq_index.py built from the recorded
+fixtures, served through the API stub, and read by timetable.html instead of
+probing horarios_lineas once per frequency.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, STUB_URL, LIVE_API, MALAGA_ID
+from tools.build_snapshot import FixtureSource
+from tools.freq_index import crawl, build, serialize, write
+
+M230 = "3"   # runs L-V and sábados/domingos/festivos
+
+
+@pytest.fixture(scope="module")
+def index():
+    return crawl(FixtureSource(), MALAGA_ID)
+
+
+def probed(line_id):
+    """The frequency ids the page's own probe would keep for a line."""
+    source = FixtureSource()
+    ids = []
+    for gf in source.get(f"{MALAGA_ID}/frecuencias")["frecuencias"]:
+        d = source.get(f"{MALAGA_ID}/horarios_lineas?idLinea={line_id}&idFrecuencia={gf['idFreq']}")
+        if d and d.get("planificadores"):
+            ids += [f["idfrecuencia"] for f in d.get("frecuencias") or []] or [gf["idFreq"]]
+    return ids
+
+
+class TestCrawl:
+    def test_matches_probe_for_every_line(self, index):
+        lines = FixtureSource().get(f"{MALAGA_ID}/lineas")["lineas"]
+        for l in lines:
+            got = [f["idfrecuencia"] for f in index.get(l["idLinea"], [])]
+            assert got == probed(l["idLinea"]), l["idLinea"]
+
+    def test_labels_come_from_response(self, index):
+        assert [f["acronimo"] for f in index[M230]] == ["L-V", "sdf"]
+
+    def test_write(self, index, tmp_path):
+        built = datetime(2026, 2, 16, 4, 0, tzinfo=timezone.utc)
+        write([build(MALAGA_ID, index, built)], tmp_path)
+        doc = json.loads((tmp_path / f"freqs-{MALAGA_ID}.json").read_text(encoding="utf-8"))
+        assert doc["built"] == "2026-02-16T04:00:00Z"
+        assert doc["lineas"][M230] == index[M230]
+
+    def test_deterministic(self, index):
+        built = datetime(2026, 2, 16, tzinfo=timezone.utc)
+        assert serialize(build(MALAGA_ID, index, built)) == serialize(build(MALAGA_ID, dict(index), built))
+
+
+@pytest.mark.skipif(LIVE_API, reason="Index is only served by the stub")
+class TestTimetableUsesIndex:
+    def _url(self):
+        return f"{BASE_URL}/timetable.html?c={MALAGA_ID}&l={M230}&code=M-230"
+
+    def _horarios(self, page):
+        calls = []
+        page.on("request", lambda r: calls.append(r.url) if "horarios_lineas" in r.url else None)
+        return calls
+
+    def test_served_by_stub(self):
+        doc = requests.get(f"{STUB_URL}/data/freqs-{MALAGA_ID}.json", timeout=10).json()
+        assert [f["idfrecuencia"] for f in doc["lineas"][M230]] == ["1", "6"]
+
+    def test_no_probe_fan_out(self, page):
+        calls = self._horarios(page)
+        page.goto(self._url(), timeout=TIMEOUT)
+        expect(page.locator(".tt-freq-tab")).to_have_count(2, timeout=TIMEOUT)
+        expect(page.locator(".tt-grid").first).to_be_visible(timeout=TIMEOUT)
+        assert len(calls) == 1, calls   # the grid itself
+
+    def test_stale_index_falls_back_to_probe(self, page):
+        stale = datetime.now(timezone.utc) - timedelta(days=3)
+        body = serialize(build(MALAGA_ID, {M230: [{"idfrecuencia": "1"}]}, stale))
+        page.route(f"**/data/freqs-{MALAGA_ID}.json",
+                   lambda route: route.fulfill(status=200, body=body, content_type="application/json"))
+        calls = self._horarios(page)
+        page.goto(self._url(), timeout=TIMEOUT)
+        expect(page.locator(".tt-freq-tab")).to_have_count(2, timeout=TIMEOUT)
+        assert len(calls) > 2
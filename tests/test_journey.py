@@ -0,0 +1,176 @@
+"""
+Journey search tests — the streaming transfer phase of findJourneys() in
+src/js/journey.js: the bounded heap of best itineraries, results rendered
+before the slowest probe answers, the deadline cutting off stragglers, and the
+time-to-first-itinerary benchmark page. The snapshot router and the transfer
+index are switched off so every nucleo is probed, except where a snapshot that
+routes nothing must still let the API answer. Skipped when CTAN_LIVE_API=1.
+"""
+
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, STUB_URL, LIVE_API, MALAGA_ID
+
+pytestmark = pytest.mark.skipif(LIVE_API, reason="Needs the stub's recorded nucleos")
+
+# No direct service; the only connection is via Málaga (nucleo 1). Nucleo 90
+# is one of the probes that finds nothing, and the one the tests hold back.
+ORIGIN, DEST, VIA, SLOW = "201", "107", "1", "90"
+
+
+@pytest.fixture(autouse=True)
+def stub():
+    requests.post(f"{STUB_URL}/__stub__/config", json={
+        "latency": 0, "jitter": 0, "error_rate": 0.0, "fail_pattern": None})
+    yield
+
+
+def open_region(page):
+    """journey.html on consortium 4 with nothing cached, no snapshot and no transfer index."""
+    page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+    expect(page.locator("#journey-region-list .card").first).to_be_visible(timeout=TIMEOUT)
+    page.evaluate(f"""async () => {{
+        await caches.delete(API_CACHE);
+        localStorage.removeItem(API_CACHE_INDEX);
+        apiIndex = null;
+        apiMemory.clear();
+        loadSnapshot = () => Promise.resolve(null);
+        indexedTransferPoints = () => Promise.resolve(null);
+        const {{ consorcios }} = await fetchJSON(`${{API}}/consorcios`);
+        await selectRegion(consorcios.find(c => String(c.idConsorcio) === '{MALAGA_ID}'));
+        setDateMode('tomorrow');
+    }}""")
+
+
+def hold_back(page, nucleo, ms=None):
+    """Delay the probes from `nucleo` by `ms`, or until they are aborted."""
+    page.evaluate("""([nucleo, ms]) => {
+        const fetchOriginal = fetchJSON;
+        fetchJSON = (url, opts = {}) => !url.includes(`idNucleoOrigen=${nucleo}&`)
+            ? fetchOriginal(url, opts)
+            : new Promise((resolve, reject) => {
+                const abort = () => reject(new DOMException('Aborted', 'AbortError'));
+                if (ms !== null) setTimeout(() => fetchOriginal(url, opts).then(resolve, reject), ms);
+                opts.signal?.addEventListener('abort', abort, { once: true });
+            });
+    }""", [nucleo, ms])
+
+
+def find(page, deadline=None):
+    return page.evaluate(f"""async deadline => {{
+        const byId = id => allNucleos.find(n => String(n.idNucleo) === id);
+        const t0 = performance.now();
+        const updates = [];
+        const timing = {{}};
+        const result = await findJourneys(byId('{ORIGIN}'), byId('{DEST}'), getSearchDate(), {{
+            timing, ...(deadline === null ? {{}} : {{ deadline }}),
+            onUpdate: list => updates.push({{ at: performance.now() - t0, count: list.length }}),
+        }});
+        const describe = i => [i.transfers.map(t => String(t.nucleo.idNucleo)), i.totalArrival.getTime()];
+        return {{ result: result.map(describe), updates, timing, doneAt: performance.now() - t0 }};
+    }}""", deadline)
+
+
+class TestItineraryHeap:
+    def test_keeps_earliest_arrivals_in_order(self, page):
+        page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+        result = page.evaluate("""() => {
+            const heap = createItineraryHeap(3);
+            const itin = (t, name) => ({ name, totalArrival: new Date(t) });
+            const pushed = [[5, 'a'], [1, 'b'], [9, 'c'], [3, 'd'], [3, 'e'], [0, 'f'], [7, 'g']]
+                .map(([t, name], k) => heap.push(itin(t, name), k));
+            return { pushed, size: heap.size, names: heap.sorted().map(i => i.name) };
+        }""")
+        assert result["pushed"] == [True, True, True, True, True, True, False]
+        assert result["size"] == 3
+        assert result["names"] == ["f", "b", "d"]   # 'd' before 'e': ties keep push order
+
+    def test_falls_back_to_departure(self, page):
+        page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+        names = page.evaluate("""() => {
+            const heap = createItineraryHeap(5);
+            heap.push({ name: 'late', totalArrival: new Date(20) });
+            heap.push({ name: 'open', totalArrival: null, totalDeparture: new Date(10) });
+            return heap.sorted().map(i => i.name);
+        }""")
+        assert names == ["open", "late"]
+
+
+class TestStreaming:
+    def test_first_itineraries_before_the_slowest_probe(self, page):
+        open_region(page)
+        baseline = find(page)
+        assert baseline["result"] and len(baseline["result"]) <= 5
+        assert all(r[0] == [VIA] for r in baseline["result"])
+
+        hold_back(page, SLOW, 1500)
+        streamed = find(page)
+        assert streamed["result"] == baseline["result"]
+        assert streamed["updates"] and streamed["updates"][0]["count"] == len(baseline["result"])
+        assert streamed["updates"][0]["at"] < 1000 < streamed["doneAt"]
+        assert streamed["timing"] == {"indexed": False, "probes": 8, "settled": 8, "cutOff": False}
+
+    def test_deadline_cuts_off_stragglers(self, page):
+        open_region(page)
+        hold_back(page, SLOW)   # never answers unless aborted
+        found = find(page, deadline=300)
+        assert found["result"]
+        assert found["timing"] == {"indexed": False, "probes": 8, "settled": 7, "cutOff": True}
+
+    def test_deadline_waits_for_a_first_itinerary(self, page):
+        open_region(page)
+        hold_back(page, VIA, 800)   # the only useful probe is late
+        found = find(page, deadline=100)
+        assert found["result"] and found["doneAt"] >= 800
+        assert found["timing"]["cutOff"] is False
+
+    def test_results_render_while_searching(self, page):
+        open_region(page)
+        hold_back(page, SLOW, 2000)
+        page.evaluate(f"""() => {{
+            selectedFrom = allNucleos.find(n => String(n.idNucleo) === '{ORIGIN}');
+            selectedTo   = allNucleos.find(n => String(n.idNucleo) === '{DEST}');
+            window.searchDone = runSearch();
+        }}""")
+        expect(page.locator("#itinerary-list .journey-card").first).to_be_visible(timeout=TIMEOUT)
+        expect(page.locator(".journey-searching-more")).to_be_visible()
+        page.evaluate("() => window.searchDone")
+        expect(page.locator(".journey-searching-more")).to_have_count(0)
+        timing = page.evaluate("() => lastSearchTiming")
+        assert timing["firstMs"] < 2000 <= timing["doneMs"]
+
+
+class TestSnapshotFallback:
+    def test_api_answers_when_the_snapshot_finds_nothing(self, page):
+        open_region(page)
+        # The stub's snapshot with none of its frecuencias running: it knows both ends but routes nothing
+        known = page.evaluate(f"""async () => {{
+            const manifest = await loadSnapshotManifest();
+            const entry = manifest.snapshots['{MALAGA_ID}'];
+            const snap = decodeSnapshot(await (await fetch(`${{DATA_BASE}}/${{entry.file}}`)).json(), entry);
+            loadSnapshot = () => Promise.resolve({{ ...snap, freqs: {{ ...snap.freqs, id: [] }} }});
+            const byId = id => allNucleos.find(n => String(n.idNucleo) === id);
+            return [routeOnSnapshot(await loadSnapshot(), byId('{ORIGIN}'), byId('{DEST}'), getSearchDate())?.length,
+                    ['{ORIGIN}', '{DEST}'].every(id => snap.nucleos.id.includes(Number(id)))];
+        }}""")
+        assert known == [0, True]
+        found = find(page)["result"]
+        assert found and all(transfers == [VIA] for transfers, _ in found)
+
+
+class TestBenchmark:
+    def test_reports_time_to_first_itinerary(self, page):
+        requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 60, "jitter": 60})
+        try:
+            page.goto(f"{BASE_URL}/bench/journey.html?c={MALAGA_ID}&index=0", timeout=TIMEOUT)
+            page.wait_for_function("() => window.benchResult", timeout=90_000)
+            result = page.evaluate("() => window.benchResult")
+        finally:
+            requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0, "jitter": 0})
+        assert "error" not in result, result.get("error")
+        assert [r["pair"] for r in result["pairs"]] == ["201-107", "51-201", "120-107"]
+        for r in result["pairs"]:
+            assert r["itineraries"] > 0 and r["probes"] == 8
+            assert 0 < r["firstMs"] <= r["doneMs"]
+        assert 0 < result["firstP50Ms"] <= result["doneP50Ms"]
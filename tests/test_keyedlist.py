@@ -0,0 +1,165 @@
+"""
+Keyed list rendering — src/js/keyedlist.js: rows kept by key from one render
+to the next, only the rows outside the longest run already in order moved,
+and every set() before a frame applied in that one frame. The station board,
+the journey results and the planner results render through it; the board
+benchmark (bench/board.html) plays a 500-departure day through it and through
+the patch it replaced.
+"""
+
+import pytest
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, LIVE_API, MALAGA_ID, STOP_MUELLE, NUCLEO_COIN, NUCLEO_ALHAURIN
+
+# A keyed list of <i> elements in a scratch container, on a page that loads keyedlist.js
+SCRATCH = """() => {
+    const box = document.createElement('div');
+    document.body.appendChild(box);
+    window.scratch = {
+        box,
+        list: createKeyedList(box, { key: x => String(x), create: x => {
+            const el = document.createElement('i');
+            el.textContent = x;
+            return el;
+        } }),
+        order: () => [...box.children].map(el => el.textContent).join(','),
+    };
+}"""
+
+
+@pytest.fixture()
+def scratch(page):
+    page.goto(f"{BASE_URL}/bench/board.html?n=20", timeout=TIMEOUT)
+    page.wait_for_function("() => window.benchResult", timeout=TIMEOUT)
+    page.evaluate(SCRATCH)
+    return page
+
+
+class TestReconcile:
+    def test_moves_only_rows_out_of_order(self, scratch):
+        moves = scratch.evaluate("""() => {
+            const { list, order } = scratch;
+            const step = items => { list.set(items); list.flush(); return [order(), list.stats.moved]; };
+            const first = step([1, 2, 3, 4, 5]);
+            const node = list.get('3').node;
+            return [first, step([5, 4, 3, 2, 1]), step([5, 4, 3, 2, 1, 6]), step([4, 3, 2, 1, 5, 6]),
+                    step([4, 2, 1, 5]), list.get('3') === undefined, list.stats.created,
+                    step([3, 4, 2, 1, 5]), list.get('3').node !== node];
+        }""")
+        assert moves == [["1,2,3,4,5", 0], ["5,4,3,2,1", 4], ["5,4,3,2,1,6", 4], ["4,3,2,1,5,6", 5],
+                         ["4,2,1,5", 5], True, 6, ["3,4,2,1,5", 5], True]
+
+    def test_one_frame_per_batch(self, scratch):
+        frames = scratch.evaluate("""async () => {
+            const { list, order } = scratch;
+            list.set([1, 2]);
+            list.set([3, 1, 2]);
+            list.set([3, 2, 1]);
+            const before = order();
+            await new Promise(requestAnimationFrame);
+            return [before, order(), list.stats.frames, list.stats.created];
+        }""")
+        assert frames == ["", "3,2,1", 1, 3]
+
+    def test_rows_stay_before_other_content(self, scratch):
+        result = scratch.evaluate("""() => {
+            const { box, list, order } = scratch;
+            const sentinel = document.createElement('b');
+            sentinel.textContent = 'S';
+            box.appendChild(sentinel);
+            list.set([1, 2]); list.flush();
+            list.set([0, 1, 2, 3]); list.flush();
+            const grown = order();
+            list.get('1').node.remove();        // taken out behind the list's back
+            list.set([1, 2]); list.flush();
+            const back = order();
+            list.set([9]);
+            list.clear();                       // drops the pending set() too
+            list.flush();
+            return [grown, back, order(), list.items().length];
+        }""")
+        assert result == ["0,1,2,3,S", "1,2,S", "S", 0]
+
+
+@pytest.mark.skipif(LIVE_API, reason="needs the stub's recorded stop")
+class TestStationBoard:
+    def open_board(self, page):
+        page.goto(f"{BASE_URL}/station.html?c={MALAGA_ID}&s={STOP_MUELLE}", timeout=TIMEOUT)
+        page.wait_for_selector(".departure-card, #no-service:not(.hidden)", timeout=TIMEOUT)
+        page.wait_for_function("() => !document.getElementById('load-more-sentinel')", timeout=TIMEOUT)
+        if not page.locator(".departure-card").count():
+            pytest.skip("no departures at the stop for the rest of the day")
+
+    def test_rows_cache_time_and_label(self, page):
+        self.open_board(page)
+        rows = page.evaluate("""() => {
+            departureList.flush();
+            const cards = [...document.querySelectorAll('.departure-card')];
+            const rows = departureList.rows();
+            return [rows.length === cards.length,
+                    rows.every((row, i) => row.node === cards[i] && row.minsEl === cards[i].querySelector('.departure-mins')),
+                    rows.every(row => typeof row.scheduled === 'number')];
+        }""")
+        assert rows == [True, True, True]
+
+    def test_tick_and_prune_parse_nothing(self, page):
+        self.open_board(page)
+        ticked = page.evaluate("""async () => {
+            departureList.flush();
+            let parsed = 0;
+            const parse = parseServiceTime;
+            parseServiceTime = (...args) => { parsed++; return parse(...args); };
+            tickMinuteLabels();
+            const observer = new MutationObserver(() => {});
+            observer.observe(departuresBoard, { subtree: true, childList: true, characterData: true, attributes: true });
+            tickMinuteLabels();                 // same minute: nothing to write
+            pruneAndTick(new Date());
+            departureList.flush();
+            const writes = observer.takeRecords().length;
+            parseServiceTime = parse;
+            return [parsed, writes];
+        }""")
+        assert ticked == [0, 0]
+
+    def test_repatch_keeps_every_card(self, page):
+        self.open_board(page)
+        kept = page.evaluate("""() => {
+            departureList.flush();
+            const before = [...document.querySelectorAll('.departure-card')];
+            const { moved, created } = departureList.stats;
+            patchDepartures(lastServices, new Date());
+            departureList.flush();
+            const after = [...document.querySelectorAll('.departure-card')];
+            return [after.length === before.length && after.every((el, i) => el === before[i]),
+                    departureList.stats.moved - moved, departureList.stats.created - created];
+        }""")
+        assert kept == [True, 0, 0]
+
+
+class TestPlannerResults:
+    def test_language_toggle_keeps_the_cards(self, page):
+        page.goto(f"{BASE_URL}/planner.html"
+                  f"?c={MALAGA_ID}&fromN={NUCLEO_COIN}&toN={NUCLEO_ALHAURIN}&date=tomorrow", timeout=TIMEOUT)
+        expect(page.locator(".planner-result-card").first).to_be_visible(timeout=TIMEOUT)
+        page.evaluate("() => { window.firstCard = document.querySelector('.planner-result-card'); }")
+        created = page.evaluate("() => resultCards.stats.created")
+        lang = page.evaluate("() => document.documentElement.lang")
+        page.locator("#lang-toggle").click()
+        page.wait_for_function(f"() => document.documentElement.lang !== '{lang}'", timeout=TIMEOUT)
+        page.evaluate("() => resultCards.flush()")
+        assert page.evaluate("() => document.querySelector('.planner-result-card') === window.firstCard")
+        assert page.evaluate("() => resultCards.stats.created") == created
+
+
+class TestBoardBenchmark:
+    def test_500_departures(self, page):
+        page.goto(f"{BASE_URL}/bench/board.html", timeout=TIMEOUT)
+        page.wait_for_function("() => window.benchResult", timeout=90_000)
+        result = page.evaluate("() => window.benchResult")
+        assert "error" not in result, result
+        assert result["departures"] == 500 and result["same"]
+        keyed, legacy = result["runs"]["keyed"], result["runs"]["legacy"]
+        assert keyed["cards"] == legacy["cards"] > 400
+        assert keyed["windows"] > 10
+        # The near-term refreshes move a handful of cards, not the rest of the board
+        assert keyed["moves"] - keyed["sweepMoves"] < (legacy["moves"] - legacy["sweepMoves"]) / 4
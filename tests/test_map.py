@@ -1,10 +1,11 @@
 """
 UI tests — map.html (interactive Leaflet stop map).
-Covers region overlay, marker rendering, popups, and region switching.
+Covers region overlay, marker rendering, popups, region switching, the
+viewport-driven stop layer and the frame-time benchmark page.
 """
 
 from playwright.sync_api import expect
-from tests.conftest import BASE_URL, TIMEOUT
+from tests.conftest import BASE_URL, TIMEOUT, MALAGA_ID
 
 
 class TestMapUI:
@@ -77,3 +78,83 @@ class TestMapUI:
         self._open_malaga_map(page)
         page.locator("#region-btn").click()
         expect(page.locator("#region-overlay")).to_be_visible(timeout=TIMEOUT)
+
+
+class TestStopLayer:
+    def _open(self, page):
+        page.goto(f"{BASE_URL}/map.html?c={MALAGA_ID}", timeout=TIMEOUT)
+        page.wait_for_selector(".map-stop-dot", timeout=20_000)
+        return page.evaluate("() => regionStops.stops.length")
+
+    def test_grid_query_matches_scan(self, page):
+        self._open(page)
+        mismatches = page.evaluate("""() => {
+            const { grid, lat, lng } = regionStops;
+            let bad = 0;
+            for (let q = 0; q < 200; q++) {
+                const s = 36.3 + (q % 17) * 0.05, w = -5.2 + (q % 13) * 0.08;
+                const n = s + 0.02 + (q % 5) * 0.06, e = w + 0.03 + (q % 7) * 0.05;
+                const got = gridQuery(grid, s, w, n, e).sort((a, b) => a - b).join();
+                const want = [];
+                for (let i = 0; i < lat.length; i++)
+                    if (lat[i] >= s && lat[i] <= n && lng[i] >= w && lng[i] <= e) want.push(i);
+                if (got !== want.join()) bad++;
+            }
+            return bad;
+        }""")
+        assert mismatches == 0
+
+    def test_clusters_keep_every_stop(self, page):
+        total = self._open(page)
+        sizes = page.evaluate("""() => {
+            const ids = [...regionStops.stops.keys()];
+            return [8, 18].map(z => clusterStops(regionStops.grid, ids, z, 60).map(c => c.ids.length));
+        }""")
+        low, high = sizes
+        assert sum(low) == sum(high) == total
+        assert len(low) < len(high)
+
+    def test_zoomed_in_renders_only_visible_stops(self, page):
+        total = self._open(page)
+        page.evaluate("""() => {
+            const i = regionStops.stops.findIndex(s => s.idParada === '149');
+            leafletMap.setView([regionStops.lat[i], regionStops.lng[i]], 17, { animate: false });
+        }""")
+        page.wait_for_timeout(300)
+        assert 0 < page.locator(".map-stop-dot").count() < total
+
+    def test_popup_built_on_open(self, page):
+        self._open(page)
+        assert page.evaluate("() => typeof [...liveMarkers.values()][0].getPopup()._content") == "function"
+
+    def test_canvas_renderer_draws_without_markers(self, page):
+        page.goto(f"{BASE_URL}/map.html?c={MALAGA_ID}&renderer=canvas", timeout=TIMEOUT)
+        page.wait_for_selector(".map-stop-canvas", state="attached", timeout=20_000)
+        assert page.locator(".map-stop-dot").count() == 0
+
+    def test_canvas_tap_opens_popup(self, page):
+        page.goto(f"{BASE_URL}/map.html?c={MALAGA_ID}&renderer=canvas", timeout=TIMEOUT)
+        page.wait_for_selector(".map-stop-canvas", state="attached", timeout=20_000)
+        point = page.evaluate("""() => {
+            const i = regionStops.stops.findIndex(s => s.idParada === '149');
+            leafletMap.setView([regionStops.lat[i], regionStops.lng[i]], 17, { animate: false });
+            return leafletMap.latLngToContainerPoint([regionStops.lat[i], regionStops.lng[i]]);
+        }""")
+        page.wait_for_timeout(300)
+        box = page.locator("#leaflet-map").bounding_box()
+        page.mouse.click(box["x"] + point["x"] + 3, box["y"] + point["y"] - 2)
+        expect(page.locator(".map-popup-name")).to_have_text("Terminal Muelle Heredia", timeout=TIMEOUT)
+
+
+class TestMapBenchmark:
+    def test_reports_both_renderers(self, page):
+        page.goto(f"{BASE_URL}/bench/map.html", timeout=TIMEOUT)
+        page.wait_for_function("() => window.benchResult", timeout=90_000)
+        result = page.evaluate("() => window.benchResult")
+        assert "error" not in result, result
+        assert result["consorcio"] == MALAGA_ID
+        assert result["stops"] > 100 and result["steps"] > 10
+        assert set(result["runs"]) == {"dom", "canvas"}
+        assert result["runs"]["dom"]["maxMarkers"] > 0
+        assert result["runs"]["canvas"]["maxMarkers"] == 0
+        assert all(r["frames"] > 0 for r in result["runs"].values())
@@ -0,0 +1,113 @@
+"""
+Nearest-stop tests — the haversine radius and k-nearest queries in
+src/js/spatial.js checked against a scan of every stop, the grid persisted by
+loadStopGrid(), and the "Stops near me" list on stops.html with a faked
+device location.
+"""
+
+import json, math, os
+import pytest
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, LIVE_API, MALAGA_ID
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "ctan", "v1")
+HEREDIA = {"latitude": 36.7165, "longitude": -4.4210}   # by Terminal Muelle Heredia (149)
+
+
+def fixture_stops():
+    with open(os.path.join(FIXTURES, MALAGA_ID, "paradas.json"), encoding="utf-8") as f:
+        return [p for p in json.load(f)["paradas"] if p.get("latitud") and p.get("longitud")]
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    rad = math.pi / 180
+    h = (math.sin((lat2 - lat1) * rad / 2) ** 2 +
+         math.cos(lat1 * rad) * math.cos(lat2 * rad) * math.sin((lng2 - lng1) * rad / 2) ** 2)
+    return 2 * 6371008.8 * math.asin(math.sqrt(min(1, h)))
+
+
+class TestQueries:
+    def _open(self, page):
+        page.goto(f"{BASE_URL}/map.html?c={MALAGA_ID}", timeout=TIMEOUT)
+        page.wait_for_selector(".map-stop-dot", timeout=20_000)
+
+    def test_nearest_matches_scan(self, page):
+        self._open(page)
+        mismatches = page.evaluate("""() => {
+            const { grid, lat, lng } = regionStops;
+            let bad = 0;
+            for (let q = 0; q < 200; q++) {
+                const y = 36.3 + (q % 17) * 0.05, x = -5.2 + (q % 13) * 0.08;
+                const k = 1 + q % 12, maxM = q % 3 ? Infinity : 500 + (q % 7) * 2000;
+                const got = gridNearest(grid, y, x, k, maxM).map(r => r.i).join();
+                const want = Array.from(lat, (_, i) => ({ i, m: haversineM(y, x, lat[i], lng[i]) }))
+                    .filter(r => r.m <= maxM)
+                    .sort((a, b) => a.m - b.m || a.i - b.i)
+                    .slice(0, k).map(r => r.i).join();
+                if (got !== want) bad++;
+            }
+            return bad;
+        }""")
+        assert mismatches == 0
+
+    def test_within_is_sorted_and_bounded(self, page):
+        self._open(page)
+        found = page.evaluate(f"""() => gridWithin(regionStops.grid, {HEREDIA['latitude']}, {HEREDIA['longitude']}, 1500)""")
+        metres = [r["m"] for r in found]
+        assert found and metres == sorted(metres) and metres[-1] <= 1500
+
+    def test_haversine(self, page):
+        page.goto(f"{BASE_URL}/map.html", timeout=TIMEOUT)
+        m = page.evaluate("() => haversineM(36.7162, -4.4205, 36.6217, -4.4998)")
+        assert abs(m - haversine_m(36.7162, -4.4205, 36.6217, -4.4998)) < 0.01
+        assert 12_000 < m < 13_000   # Málaga → Torremolinos
+
+    def test_grid_is_persisted(self, page):
+        self._open(page)
+        result = page.evaluate("""async () => {
+            const { lat, lng } = regionStops;
+            const built = await loadStopGrid('test-stops', lat, lng);
+            await new Promise(r => setTimeout(r, 100));
+            buildStopGrid = () => { throw new Error('rebuilt'); };
+            const loaded = await loadStopGrid('test-stops', lat, lng);
+            return {
+                same: built.start.join() === loaded.start.join() && built.items.join() === loaded.items.join(),
+                nearest: gridNearest(loaded, 36.7165, -4.4210, 5).map(r => r.i).join() ===
+                         gridNearest(built, 36.7165, -4.4210, 5).map(r => r.i).join(),
+                stale: await loadStopGrid('test-stops', lat.slice(1), lng.slice(1)).then(() => false, e => e.message),
+            };
+        }""")
+        assert result == {"same": True, "nearest": True, "stale": "rebuilt"}
+
+
+@pytest.mark.skipif(LIVE_API, reason="Distances are checked against the recorded stops")
+class TestStopsNearMe:
+    def _open(self, page, where):
+        if where:
+            page.context.grant_permissions(["geolocation"], origin=BASE_URL)
+            page.context.set_geolocation(where)
+        page.goto(f"{BASE_URL}/stops.html", timeout=TIMEOUT)
+        page.locator("#near-me-btn").click()
+
+    def test_lists_nearest_stops(self, page):
+        try:
+            self._open(page, HEREDIA)
+            cards = page.locator("#near-me-list .near-me-card")
+            expect(cards.first).to_be_visible(timeout=TIMEOUT)
+            hrefs = cards.evaluate_all("els => els.map(a => a.getAttribute('href'))")
+            distances = cards.locator(".near-me-distance").all_inner_texts()
+        finally:
+            page.context.clear_permissions()
+
+        want = sorted((haversine_m(HEREDIA["latitude"], HEREDIA["longitude"],
+                                   float(s["latitud"]), float(s["longitud"])), s["idParada"])
+                      for s in fixture_stops())
+        want = [(m, s) for m, s in want if m <= 2000][:10]
+        assert [h.split("&s=")[1].split("&")[0] for h in hrefs] == [s for _, s in want]
+        assert all(h.startswith(f"station.html?c={MALAGA_ID}&") for h in hrefs)
+        assert distances[0].endswith(" m")
+
+    def test_no_location(self, page):
+        self._open(page, None)
+        expect(page.locator("#near-me-list .hint")).to_have_text("Location is unavailable — allow it to see nearby stops.",
+                                                                 timeout=TIMEOUT)
@@ -0,0 +1,125 @@
+"""
+Saved stops' next departures — src/js/nextbus.js: the home screen fetches
+the next servicios windows of each saved stop in the background, shows the
+next bus on each saved stop, and station.html paints a saved stop from those
+windows before its own sweep. Each test gets its own context so it starts
+with no service worker and nothing cached.
+"""
+
+import json
+import os
+from datetime import datetime
+from urllib.parse import quote
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, API, STUB_URL, LIVE_API, ROOT, MALAGA_ID, STOP_MUELLE
+
+pytestmark = pytest.mark.skipif(LIVE_API, reason="counts requests through the API stub")
+
+SAVED = [{"idConsorcio": MALAGA_ID, "idParada": STOP_MUELLE, "nombre": "Muelle Heredia", "nucleo": "Málaga"}]
+
+
+@pytest.fixture(autouse=True)
+def stub():
+    requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0}, timeout=5)
+    requests.post(f"{STUB_URL}/__stub__/reset", json={}, timeout=5)
+    yield
+    requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0}, timeout=5)
+
+
+@pytest.fixture()
+def home(browser_ctx):
+    """index.html with one saved stop, controlled by the service worker."""
+    ctx = browser_ctx.browser.new_context()
+    ctx.add_cookies([
+        {"name": "apiBase",    "value": quote(API, safe=""),               "url": BASE_URL},
+        {"name": "dataBase",   "value": quote(f"{STUB_URL}/data", safe=""), "url": BASE_URL},
+        {"name": "savedStops", "value": quote(json.dumps(SAVED), safe=""),  "url": BASE_URL},
+    ])
+    page = ctx.new_page()
+    page.goto(f"{BASE_URL}/index.html", timeout=TIMEOUT)
+    page.wait_for_function("() => navigator.serviceWorker.controller", timeout=TIMEOUT)
+    yield page
+    ctx.close()
+
+
+def servicios_count():
+    stats = requests.get(f"{STUB_URL}/__stub__/stats", timeout=5).json()
+    return stats["endpoints"].get("paradas/:id/servicios", {}).get("count", 0)
+
+
+def upcoming(within_mins=120):
+    """Fixture departures at the stop in the next two stub windows, soonest first."""
+    path = os.path.join(ROOT, "tests", "fixtures", "ctan", "v1", MALAGA_ID, "paradas", STOP_MUELLE, "servicios.json")
+    with open(path, encoding="utf-8") as f:
+        services = json.load(f)["servicios"]
+    now = datetime.now()
+    now_mins = now.hour * 60 + now.minute
+    def mins(s):
+        hh, mm = map(int, s["servicio"].split(":"))
+        return hh * 60 + mm - now_mins
+    return sorted((s for s in services if 1 <= mins(s) < within_mins - 1), key=mins)
+
+
+def prefetch(page):
+    return page.evaluate("() => prefetchSavedStops(getSavedStops())")
+
+
+class TestPrefetch:
+    def test_fetches_each_saved_stop_once(self, home):
+        report = prefetch(home)
+        assert report["stops"] in (0, 1)        # the idle prefetch may have run already
+        before = servicios_count()
+        again = prefetch(home)
+        assert again["stops"] == again["fetched"] == 0
+        assert servicios_count() == before
+        assert 0 < again["bytes"] <= 512 * 1024
+
+    def test_budget_stops_prefetch(self, home):
+        home.evaluate("""async () => {
+            await caches.delete(NEXTBUS_CACHE);   // no windows: the stop is due
+            await saveNextBusState({ ...(await nextBusState()), bytes: NEXTBUS_DAILY_BYTES });
+        }""")
+        requests.post(f"{STUB_URL}/__stub__/reset", json={}, timeout=5)
+        report = prefetch(home)
+        assert report["stopped"] and report["fetched"] == 0
+        assert servicios_count() == 0
+
+    def test_ledger_survives_the_trim(self, home):
+        prefetch(home)   # the ledger lists the saved stop
+        home.evaluate("""async () => {
+            await saveNextBusState({ ...(await nextBusState()), bytes: 1234 });
+            const cache = await caches.open(NEXTBUS_CACHE);
+            for (let i = 0; i < 600; i++) await cache.put(`/__scratch__/${i}`, new Response('{}'));   // sw.js API_SW_MAX_ENTRIES
+        }""")
+        # One more response through the worker, which trims the cache a second later
+        home.evaluate(f"() => fetch('{API}/{MALAGA_ID}/paradas/{STOP_MUELLE}/servicios')")
+        home.wait_for_function("async () => (await (await caches.open(NEXTBUS_CACHE)).keys()).length <= 601",
+                               timeout=TIMEOUT)
+        state = home.evaluate("async () => { const { bytes, stops } = await nextBusState(); return [bytes, stops.length]; }")
+        assert state == [1234, 1]
+
+    def test_home_tile_shows_next_bus(self, home):
+        buses = upcoming()
+        if not buses:
+            pytest.skip("no departures at the stop in the next two hours")
+        prefetch(home)
+        home.reload()   # painted from the worker's cached windows
+        tile = home.locator(".saved-stop-card-next")
+        expect(tile).to_contain_text(" to ", timeout=TIMEOUT)
+        lines = {b["linea"] for b in buses if b["servicio"] == buses[0]["servicio"]}
+        assert any(line in tile.text_content() for line in lines)
+
+
+class TestWarmStation:
+    def test_saved_stop_paints_before_the_network_answers(self, home):
+        if not upcoming():
+            pytest.skip("no departures at the stop in the next two hours")
+        prefetch(home)
+        requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 3000}, timeout=5)
+        home.locator(".saved-stop-card").click()
+        home.wait_for_url("**/station.html**", timeout=TIMEOUT)
+        expect(home.locator(".departure-card").first).to_be_visible(timeout=1500)
+        painted = home.evaluate("() => performance.now()")
+        assert painted < 2500, "board waited for the network"
@@ -0,0 +1,158 @@
+"""
+Offline API tests — the service worker's per-endpoint API policy (sw.js "API
+responses"): reference data stale-while-revalidate, live departures network-
+first with a short fallback, and the X-Cached-At / X-Cache headers pages use
+to say how old what they show is. Each test gets its own context so it starts
+with no service worker and nothing cached.
+"""
+
+from urllib.parse import quote
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, API, STUB_URL, LIVE_API, MALAGA_ID, STOP_MUELLE
+
+pytestmark = pytest.mark.skipif(LIVE_API, reason="injects failures through the API stub")
+
+HOUR = 60 * 60 * 1000
+M230 = "3"
+
+
+@pytest.fixture(autouse=True)
+def stub():
+    requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0, "fail_pattern": None}, timeout=5)
+    requests.post(f"{STUB_URL}/__stub__/reset", json={}, timeout=5)
+    yield
+    requests.post(f"{STUB_URL}/__stub__/config", json={"fail_pattern": None}, timeout=5)
+
+
+@pytest.fixture()
+def sw_page(browser_ctx):
+    ctx = browser_ctx.browser.new_context()
+    ctx.add_cookies([
+        {"name": "apiBase",  "value": quote(API, safe=""),               "url": BASE_URL},
+        {"name": "dataBase", "value": quote(f"{STUB_URL}/data", safe=""), "url": BASE_URL},
+    ])
+    page = ctx.new_page()
+    yield page
+    ctx.close()
+
+
+def controlled(page, path):
+    """Open `path`, wait until the service worker controls it, and load it again through the worker."""
+    page.goto(f"{BASE_URL}/{path}", timeout=TIMEOUT)
+    page.wait_for_function("() => navigator.serviceWorker.controller", timeout=TIMEOUT)
+    page.reload()
+
+
+def fail(pattern):
+    requests.post(f"{STUB_URL}/__stub__/config", json={"fail_pattern": pattern}, timeout=5)
+
+
+def stub_count(endpoint):
+    stats = requests.get(f"{STUB_URL}/__stub__/stats", timeout=5).json()
+    return stats["endpoints"].get(endpoint, {}).get("count", 0)
+
+
+def get(page, url):
+    """fetch() through the worker → { status, cache, at }"""
+    return page.evaluate("""async url => {
+        const res = await fetch(url);
+        return { status: res.status, cache: res.headers.get('X-Cache'), at: +res.headers.get('X-Cached-At') };
+    }""", url)
+
+
+def age_cached(page, part, age_ms):
+    """Backdate the worker's cached responses whose URL contains `part`."""
+    page.evaluate("""async ([part, age]) => {
+        const cache = await caches.open('ctan-api-sw');
+        for (const req of await cache.keys()) {
+            if (!req.url.includes(part)) continue;
+            const res = await cache.match(req);
+            const headers = new Headers(res.headers);
+            headers.set('X-Cached-At', String(Date.now() - age));
+            await cache.put(req, new Response(await res.text(), { headers }));
+        }
+    }""", [part, age_ms])
+
+
+def forget_page_cache(page):
+    page.evaluate("""async () => {
+        await caches.delete(API_CACHE);
+        localStorage.removeItem(API_CACHE_INDEX);
+    }""")
+
+
+def servicios(hhmm):
+    return f"{API}/{MALAGA_ID}/paradas/{STOP_MUELLE}/servicios?horaIni=01-06-2026+{hhmm}"
+
+
+class TestReferenceData:
+    def test_second_request_never_leaves_the_device(self, sw_page):
+        controlled(sw_page, "settings.html")
+        url = f"{API}/{MALAGA_ID}/lineas/{M230}"
+        first, second = get(sw_page, url), get(sw_page, url)
+        assert first["status"] == second["status"] == 200
+        assert first["cache"] is None and second["cache"] == "fresh" and second["at"] > 0
+        assert stub_count("lineas/:id") == 1
+
+    def test_stale_copy_answers_then_revalidates(self, sw_page):
+        controlled(sw_page, "settings.html")
+        url = f"{API}/{MALAGA_ID}/lineas/{M230}"
+        get(sw_page, url)
+        age_cached(sw_page, f"/lineas/{M230}", 8 * 24 * HOUR)
+
+        stale = get(sw_page, url)
+        assert stale["cache"] == "stale"
+        assert sw_page.evaluate("at => Date.now() - at", stale["at"]) > 7 * 24 * HOUR
+        sw_page.wait_for_function("""async url => (await (await caches.open('ctan-api-sw')).match(url))
+            .headers.get('X-Cached-At') > Date.now() - 60000""", arg=url, timeout=TIMEOUT)
+        assert stub_count("lineas/:id") == 2
+        assert get(sw_page, url)["cache"] == "fresh"
+
+    def test_timetable_says_how_old_it_is(self, sw_page):
+        controlled(sw_page, f"timetable.html?c={MALAGA_ID}&l={M230}&code=M-230")
+        expect(sw_page.locator(".tt-grid")).to_be_visible(timeout=TIMEOUT)
+        expect(sw_page.locator("#tt-cache-note")).to_be_hidden()
+
+        age_cached(sw_page, "/horarios_lineas", 8 * HOUR)
+        forget_page_cache(sw_page)
+        fail("horarios_lineas")
+        sw_page.reload()
+        expect(sw_page.locator(".tt-grid")).to_be_visible(timeout=TIMEOUT)
+        expect(sw_page.locator("#tt-cache-note")).to_have_text("Schedule from cache, 8 h old")
+
+
+class TestLiveDepartures:
+    def test_network_first(self, sw_page):
+        controlled(sw_page, "settings.html")
+        assert get(sw_page, servicios("10:00"))["cache"] is None
+        assert get(sw_page, servicios("10:00"))["cache"] is None
+        assert stub_count("paradas/:id/servicios") == 2
+
+    def test_falls_back_to_a_covering_window(self, sw_page):
+        controlled(sw_page, "settings.html")
+        get(sw_page, servicios("10:00"))          # the stub answers one-hour windows
+        fail("servicios")
+        assert get(sw_page, servicios("10:00"))["cache"] == "offline"
+        assert get(sw_page, servicios("10:40"))["cache"] == "offline"
+        assert get(sw_page, servicios("11:30"))["status"] == 503
+
+    def test_fallback_expires(self, sw_page):
+        controlled(sw_page, "settings.html")
+        get(sw_page, servicios("10:00"))
+        age_cached(sw_page, "/servicios", HOUR)
+        fail("servicios")
+        assert get(sw_page, servicios("10:00"))["status"] == 503
+
+    def test_station_board_offline(self, sw_page):
+        station = f"station.html?c={MALAGA_ID}&s={STOP_MUELLE}"
+        controlled(sw_page, station)
+        sw_page.wait_for_selector(".departure-card, #no-service:not(.hidden)", timeout=TIMEOUT)
+        expect(sw_page.locator("#live-label")).to_have_text("Live")
+
+        fail("servicios")
+        sw_page.reload()
+        sw_page.wait_for_selector(".departure-card, #no-service:not(.hidden)", timeout=TIMEOUT)
+        expect(sw_page.locator("#live-label")).to_have_text("Offline · 1 min old")
+        expect(sw_page.locator("#refresh-indicator")).to_have_class("refresh-indicator offline")
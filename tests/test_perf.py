@@ -0,0 +1,150 @@
+"""
+Performance trace tests — src/js/perf.js: User Timing spans around fetchJSON()
+(by endpoint), parsing and rendering, the per-span histograms every page adds
+to, and the Diagnostics panel in settings.html that shows and exports them.
+Each test gets its own context so the trace starts empty.
+"""
+
+import json
+from urllib.parse import quote
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, API, STUB_URL, LIVE_API, MALAGA_ID, STOP_MUELLE
+
+STATION = f"{BASE_URL}/station.html?c={MALAGA_ID}&s={STOP_MUELLE}"
+
+
+def new_page(browser_ctx, trace):
+    ctx = browser_ctx.browser.new_context(accept_downloads=True)
+    cookies = [{"name": "perfTrace", "value": "1", "url": BASE_URL}] if trace else []
+    if not LIVE_API:
+        cookies += [{"name": "apiBase",  "value": quote(API, safe=""),               "url": BASE_URL},
+                    {"name": "dataBase", "value": quote(f"{STUB_URL}/data", safe=""), "url": BASE_URL}]
+    ctx.add_cookies(cookies)
+    return ctx, ctx.new_page()
+
+
+@pytest.fixture()
+def traced(browser_ctx):
+    ctx, page = new_page(browser_ctx, trace=True)
+    yield page
+    ctx.close()
+
+
+@pytest.fixture()
+def untraced(browser_ctx):
+    ctx, page = new_page(browser_ctx, trace=False)
+    yield page
+    ctx.close()
+
+
+def open_station(page):
+    page.goto(STATION, timeout=TIMEOUT)
+    page.wait_for_selector(".departure-card, #no-service:not(.hidden)", timeout=TIMEOUT)
+
+
+class TestHelpers:
+    def test_endpoint_names_match_the_stub(self, untraced):
+        untraced.goto(f"{BASE_URL}/settings.html", timeout=TIMEOUT)
+        names = untraced.evaluate("""() => [
+            `${API}/consorcios`,
+            `${API}/4/paradas/149/servicios?horaIni=01-06-2026+10:00`,
+            `${API}/4/horarios_origen_destino?idNucleoOrigen=201&idNucleoDestino=1`,
+            `${API}/4/lineas/3/paradas`,
+            'data/freqs-4.json',
+        ].map(perfEndpoint)""")
+        assert names == ["consorcios", "paradas/:id/servicios", "horarios_origen_destino",
+                         "lineas/:id/paradas", "data/freqs-4.json"]
+
+    def test_quantile_is_a_bucket_bound(self, untraced):
+        untraced.goto(f"{BASE_URL}/settings.html", timeout=TIMEOUT)
+        q = untraced.evaluate("""() => {
+            const stats = {};
+            [3, 40, 40, 60, 90, 120, 7000].forEach(ms => perfAdd(stats, 'x', ms));
+            const s = stats.x;
+            return [perfQuantile(s, 0.5), perfQuantile(s, 0.95) === Infinity, s.count, Math.round(s.maxMs)];
+        }""")
+        assert q == [100, True, 7, 7000]
+
+
+class TestDisabled:
+    def test_no_spans_and_nothing_wrapped(self, untraced):
+        open_station(untraced)
+        off = untraced.evaluate("""() => ({
+            enabled: PERF_ENABLED,
+            noop: perfStart('render', 'x') === perfNoop && perfFetch(`${API}/consorcios`) === perfNoop,
+            same: perfWrap('render', renderDepartures) === renderDepartures,
+            measures: performance.getEntriesByType('measure').length,
+            stats: Object.keys(perfSnapshot().stats).length,
+        })""")
+        assert off == {"enabled": False, "noop": True, "same": True, "measures": 0, "stats": 0}
+
+
+@pytest.mark.skipif(LIVE_API, reason="compares counts with the API stub")
+class TestTrace:
+    def test_station_fetches_and_renders_are_spans(self, traced):
+        requests.post(f"{STUB_URL}/__stub__/reset", json={}, timeout=5)
+        open_station(traced)
+        traced.wait_for_function("() => !document.getElementById('load-more-sentinel')", timeout=TIMEOUT)
+        stats = traced.evaluate("() => perfSnapshot().stats")
+        served = requests.get(f"{STUB_URL}/__stub__/stats", timeout=5).json()["endpoints"]
+
+        servicios = stats["fetch:paradas/:id/servicios"]
+        assert servicios["tags"].get("network") == served["paradas/:id/servicios"]["count"]
+        assert sum(servicios["buckets"]) == servicios["count"]
+        assert stats["fetch:paradas/:id"]["count"] >= 1
+        assert stats["render:renderDepartures"]["count"] >= 1
+
+        names = traced.evaluate("() => new Set(performance.getEntriesByType('measure').map(m => m.name)).size")
+        assert names == len(stats)
+
+    def test_memory_hits_are_tagged(self, traced):
+        open_station(traced)
+        tags = traced.evaluate(f"""async () => {{
+            const url = `${{API}}/{MALAGA_ID}/paradas/{STOP_MUELLE}`;
+            await fetchJSON(url);
+            await fetchJSON(url);
+            return perfSnapshot().stats['fetch:paradas/:id'].tags;
+        }}""")
+        assert tags.get("memory", 0) >= 1
+
+    def test_compute_spans_in_the_journey_planner(self, traced):
+        traced.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+        expect(traced.locator("#journey-region-list .card").first).to_be_visible(timeout=TIMEOUT)
+        count = traced.evaluate(f"""async () => {{
+            const url = `${{API}}/{MALAGA_ID}/horarios_origen_destino?idNucleoOrigen=201&idNucleoDestino=1`;
+            const text = await fetchJSON(url, {{ raw: true }});
+            await computeCall('trips', {{ url, date: Date.now(), realNow: Date.now(), allDay: true }}, {{ texts: {{ [url]: text }} }});
+            return perfSnapshot().stats['compute:trips'].count;
+        }}""")
+        assert count == 1
+
+
+@pytest.mark.skipif(LIVE_API, reason="needs the stub's recorded stop")
+class TestPanel:
+    def test_other_pages_show_up_in_settings(self, traced):
+        open_station(traced)
+        traced.goto(f"{BASE_URL}/settings.html", timeout=TIMEOUT)
+        expect(traced.locator("#perf-seg .settings-seg-btn.active")).to_have_attribute("data-val", "on")
+        expect(traced.locator(".perf-table .perf-span", has_text="fetch:paradas/:id/servicios")).to_be_visible()
+        expect(traced.locator("#settings-perf-summary")).to_contain_text("spans of")
+
+        with traced.expect_download() as download:
+            traced.locator("#perf-export-btn").click()
+        with open(download.value.path(), encoding="utf-8") as f:
+            trace = json.load(f)
+        assert trace["enabled"] and "fetch:paradas/:id/servicios" in trace["stats"]
+        assert trace["buckets"][-1] == 5000
+
+        traced.locator("#perf-reset-btn").click()
+        expect(traced.locator(".perf-table")).to_have_count(0)
+        expect(traced.locator("#settings-perf-summary")).to_have_text("Nothing recorded yet")
+
+    def test_toggle_sets_the_cookie(self, untraced):
+        untraced.goto(f"{BASE_URL}/settings.html", timeout=TIMEOUT)
+        expect(untraced.locator("#settings-perf-summary")).to_have_text("Turn the trace on, then use the app")
+        untraced.locator("#perf-seg .settings-seg-btn[data-val='on']").click()
+        assert untraced.evaluate("() => getCookie('perfTrace')") == "1"
+        open_station(untraced)
+        assert untraced.evaluate("() => PERF_ENABLED")
@@ -0,0 +1,137 @@
+"""
+Polyline tests — src/js/polyline.js: the encoded polyline codec, Douglas-
+Peucker zoom levels, the per-line sessionStorage cache, and map.html drawing
+a route from it after route.html's "View route on map".
+"""
+
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, MALAGA_ID
+
+LINE = "1"
+
+
+def open_route(page):
+    page.goto(f"{BASE_URL}/route.html?c={MALAGA_ID}&l={LINE}&code=M-110", timeout=TIMEOUT)
+    expect(page.locator("#polyline-map-btn")).to_be_visible(timeout=TIMEOUT)
+
+
+class TestCodec:
+    def test_reference_encoding(self, page):
+        page.goto(f"{BASE_URL}/route.html", timeout=TIMEOUT)
+        result = page.evaluate("""() => {
+            const enc = encodePolyline([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]);
+            const { lat, lng } = decodePolyline(enc, 3);
+            return { enc, lat: [...lat], lng: [...lng] };
+        }""")
+        assert result == {"enc": "_p~iF~ps|U_ulLnnqC_mqNvxq`@",
+                          "lat": [38.5, 40.7, 43.252], "lng": [-120.2, -120.95, -126.453]}
+
+    def test_round_trip_within_precision(self, page):
+        page.goto(f"{BASE_URL}/route.html", timeout=TIMEOUT)
+        err = page.evaluate("""() => {
+            const n = 3000, lat = new Float64Array(n), lng = new Float64Array(n);
+            for (let i = 0; i < n; i++) { lat[i] = 36 + Math.sin(i) * 0.8; lng[i] = -5 + Math.cos(i * 0.7) * 1.3; }
+            const back = decodePolyline(encodePolyline(lat, lng), n);
+            let err = 0;
+            for (let i = 0; i < n; i++) err = Math.max(err, Math.abs(back.lat[i] - lat[i]), Math.abs(back.lng[i] - lng[i]));
+            return err;
+        }""")
+        assert err <= 0.5e-5 + 1e-12
+
+
+class TestSimplification:
+    def test_levels_are_douglas_peucker(self, page):
+        """Keeping the points above ε is Douglas-Peucker at ε, for every ε at once."""
+        page.goto(f"{BASE_URL}/route.html", timeout=TIMEOUT)
+        bad = page.evaluate("""() => {
+            function dp(lat, lng, eps) {
+                const n = lat.length, keep = new Array(n).fill(false);
+                keep[0] = keep[n - 1] = true;
+                let mean = 0; lat.forEach(v => mean += v);
+                const kx = POLYLINE_DEG_M * Math.cos(mean / n * Math.PI / 180), ky = POLYLINE_DEG_M;
+                (function split(a, b) {
+                    if (b - a < 2) return;
+                    const ax = lng[a] * kx, ay = lat[a] * ky, dx = lng[b] * kx - ax, dy = lat[b] * ky - ay;
+                    const len2 = dx * dx + dy * dy;
+                    let far = a + 1, farD = -1;
+                    for (let i = a + 1; i < b; i++) {
+                        const px = lng[i] * kx - ax, py = lat[i] * ky - ay;
+                        const t = len2 ? Math.max(0, Math.min(1, (px * dx + py * dy) / len2)) : 0;
+                        const d = Math.hypot(px - t * dx, py - t * dy);
+                        if (d > farD) { farD = d; far = i; }
+                    }
+                    if (farD > eps) { keep[far] = true; split(a, far); split(far, b); }
+                })(0, n - 1);
+                return keep;
+            }
+            let seed = 7, bad = 0;
+            const rnd = () => (seed = seed * 16807 % 2147483647) / 2147483647;
+            for (let q = 0; q < 30; q++) {
+                const n = 40 + q * 50, lat = new Float64Array(n), lng = new Float64Array(n);
+                let y = 36.7, x = -4.4;
+                for (let i = 0; i < n; i++) { y += (rnd() - 0.5) * 0.002; x += (rnd() - 0.3) * 0.002; lat[i] = y; lng[i] = x; }
+                const imp = polylineImportance(lat, lng);
+                for (const eps of [0.5, 5, 50, 500]) {
+                    const keep = dp(lat, lng, eps);
+                    for (let i = 0; i < n; i++) if (keep[i] !== imp[i] > eps) bad++;
+                }
+            }
+            return bad;
+        }""")
+        assert bad == 0
+
+    def test_fewer_points_when_zoomed_out(self, page):
+        page.goto(f"{BASE_URL}/route.html", timeout=TIMEOUT)
+        counts = page.evaluate(f"""async () => {{
+            const {{ polilinea }} = await fetchJSON(`${{API}}/{MALAGA_ID}/lineas/{LINE}`);
+            const poly = unpackPolyline(packPolyline(polilinea));
+            const counts = [8, 11, 14, 17, 19].map(z => polylineLatLngs(poly, z).length);
+            return {{ raw: polilinea.length, counts, ends: polylineLatLngs(poly, 0).length }};
+        }}""")
+        assert counts["ends"] == 2
+        assert counts["counts"] == sorted(counts["counts"])
+        assert counts["counts"][0] < counts["counts"][-1] <= counts["raw"]
+
+    def test_long_line_packs_small(self, page):
+        page.goto(f"{BASE_URL}/route.html", timeout=TIMEOUT)
+        sizes = page.evaluate("""() => {
+            const points = [];
+            let y = 36.7, x = -4.4;
+            for (let i = 0; i < 5000; i++) {
+                y += Math.sin(i / 50) * 0.0001; x += 0.0001;
+                points.push([`${y.toFixed(6)},${x.toFixed(6)},0`]);
+            }
+            return { raw: JSON.stringify(points).length, packed: packPolyline(points).length };
+        }""")
+        assert sizes["packed"] * 10 < sizes["raw"]
+
+
+class TestLineCache:
+    def test_route_stores_packed_line_once(self, page):
+        open_route(page)
+        result = page.evaluate(f"""() => {{
+            let packs = 0;
+            const packOriginal = packPolyline;
+            packPolyline = points => (packs++, packOriginal(points));
+            storeLinePolyline('{MALAGA_ID}', '{LINE}', lineaData.polilinea);
+            const text = sessionStorage.getItem('polyline:{MALAGA_ID}:{LINE}');
+            return {{ packs, stored: !!text, raw: sessionStorage.getItem('routePolyline'),
+                      points: loadLinePolyline('{MALAGA_ID}', '{LINE}').lat.length,
+                      lineaId: sessionStorage.getItem('routeLineaId') }};
+        }}""")
+        assert result["packs"] == 0          # already packed by initPolylineButton()
+        assert result["stored"] and result["raw"] is None
+        assert result["points"] > 2 and result["lineaId"] == LINE
+
+    def test_map_draws_cached_line(self, page):
+        open_route(page)
+        page.locator("#polyline-map-btn").click()
+        page.wait_for_url("**/map.html**", timeout=TIMEOUT)
+        expect(page.locator("#region-pill-name")).to_have_text("M-110", timeout=TIMEOUT)
+        expect(page.locator(".leaflet-overlay-pane path").first).to_be_attached(timeout=TIMEOUT)
+        drawn = page.evaluate("""() => {
+            const { layer, poly } = shapeLayers[0];
+            return { drawn: layer.getLatLngs().length, zoom: leafletMap.getZoom(),
+                     want: polylineLatLngs(poly, leafletMap.getZoom()).length };
+        }""")
+        assert drawn["drawn"] == drawn["want"] > 1
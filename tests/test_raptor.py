@@ -0,0 +1,188 @@
+"""
+Router tests — src/js/raptor.js and its Python twin tools/raptor.py.
+The reference router must reproduce the shared corpus, agree with the
+horarios_origen_destino probe + matchLegs() path it replaces, and the browser
+implementation must give the same answers as the reference.
+"""
+
+import json, os
+from datetime import date
+import pytest
+from playwright.sync_api import expect
+from tests.conftest import ROOT, BASE_URL, TIMEOUT, MALAGA_ID, LIVE_API
+from tools.build_snapshot import FixtureSource
+from tools.raptor import Network, load_fixture_snapshot, run_case, query, active_freq_rows, freq_runs, to_mins
+
+CORPUS_PATH = os.path.join(ROOT, "tests", "fixtures", "raptor", "cases.json")
+with open(CORPUS_PATH, encoding="utf-8") as f:
+    CORPUS = json.load(f)
+CASES = CORPUS["cases"]
+
+
+@pytest.fixture(scope="module")
+def net():
+    return Network(load_fixture_snapshot(CORPUS["consorcio"]))
+
+
+class TestReferenceCorpus:
+    @pytest.mark.parametrize("case", CASES, ids=[c["name"] for c in CASES])
+    def test_case(self, net, case):
+        assert run_case(net, case) == case["expected"]
+
+    def test_corpus_covers_two_transfers(self):
+        assert any(j["transfers"] == 2 for c in CASES for j in c["expected"]["pareto"])
+
+    def test_pareto_front_improves_arrival(self):
+        for c in CASES:
+            arrs = [to_mins(j["arr"]) for j in c["expected"]["pareto"]]
+            assert arrs == sorted(arrs, reverse=True) and len(set(arrs)) == len(arrs), c["name"]
+
+    def test_corpus_covers_walking_transfers(self):
+        walks = [l for c in CASES for j in c["expected"]["pareto"] for l in j["legs"] if l.get("walk")]
+        assert walks and all(l["from"] != l["to"] for l in walks)
+
+
+class TestWalkingTransfers:
+    def test_footpaths_between_neighbouring_towns(self, net):
+        ids = net.snap.nucleo_ids
+        found = {(ids[a], ids[b]): mins for a, w in enumerate(net.walks) for b, mins in w}
+        # Arroyo de la Miel's stops are 91 m from Torremolinos' and 115 m from Benalmádena Costa's
+        assert found == {(51, 107): 2, (107, 51): 2, (51, 60): 2, (60, 51): 2}
+
+    def test_walk_joins_two_rides(self, net):
+        snap = net.snap
+        freqs = active_freq_rows(snap, date(2026, 2, 16))
+        for o in range(len(snap.nucleo_ids)):
+            for d in range(len(snap.nucleo_ids)):
+                for j in query(net, o, d, to_mins("06:00"), freqs) if o != d else []:
+                    kinds = ["walk" if l.get("walk") else "ride" for l in j["legs"]]
+                    assert kinds[0] == kinds[-1] == "ride" and "walk walk" not in " ".join(kinds)
+                    assert j["transfers"] == kinds.count("ride") - 1
+
+    def test_no_walks_without_radius(self):
+        net = Network(load_fixture_snapshot(CORPUS["consorcio"]), walk_m=0)
+        assert not any(net.walks)
+
+
+# ── matchLegs() port ───────────────────────────────────────────────────────────
+# Same column logic as scheduleColumns() / extractTrips() / matchLegs() in
+# compute.js, run over the recorded horarios_origen_destino fixtures.
+# extractTrips() takes the last filled destination column as the arrival, which
+# is the bus's last call in town when the columns follow its stop order. Where
+# two lines cross a town in different orders the columns can't follow both, so
+# the port takes the latest time instead — the raptor.js definition.
+def od_trips(source, origin, dest, day, depart=0):
+    data = source.get(f"{MALAGA_ID}/horarios_origen_destino?idNucleoOrigen={origin}&idNucleoDestino={dest}") or {}
+    horario = data.get("horario") or []
+    if not horario:
+        return []
+
+    col, origin_idx, dest_idx = 0, [], []
+    for i, n in enumerate(data.get("nucleos") or []):
+        span = n.get("colspan") or 1
+        if i == 0:
+            continue
+        if i == 1:
+            origin_idx = list(range(col, col + span))
+        elif i == 2:
+            dest_idx = list(range(col, col + span))
+        col += span
+
+    dow = day.isoweekday() % 7
+    runs = {f["acronimo"].strip(): freq_runs(f["nombre"], 1 <= dow <= 5, dow == 6, dow == 0)
+            for f in data.get("frecuencias") or []}
+
+    trips = []
+    for trip in horario:
+        horas = trip.get("horas") or []
+        dep = next((horas[i] for i in origin_idx if i < len(horas) and horas[i] != "--"), None)
+        arr = max((horas[i] for i in dest_idx if i < len(horas) and horas[i] != "--"), default=None)
+        if not dep or not arr or not runs.get(trip.get("dias", "").strip(), True):
+            continue
+        d, a = to_mins(dep), to_mins(arr)
+        if a < d:
+            a += 1440
+        if d >= depart:
+            trips.append((d, a))
+    return sorted(trips)
+
+
+def match_legs(leg1, leg2, min_transfer):
+    arrivals = []
+    for _, arr in leg1:
+        nxt = next((a2 for d2, a2 in leg2 if d2 >= arr + min_transfer), None)
+        if nxt is not None:
+            arrivals.append(nxt)
+    return arrivals
+
+
+DAYS = [date(2026, 2, 16), date(2026, 2, 21), date(2026, 2, 22)]   # Mon, Sat, Sun
+
+
+class TestAgainstMatchLegs:
+    @pytest.mark.parametrize("day", DAYS, ids=[d.strftime("%a") for d in DAYS])
+    @pytest.mark.parametrize("depart", ["06:00", "13:00"])
+    def test_same_best_arrival_with_one_transfer(self, net, day, depart):
+        snap, source = net.snap, FixtureSource()
+        freqs = active_freq_rows(snap, day)
+        t0 = to_mins(depart)
+        ids = [str(n) for n in snap.nucleo_ids]
+        checked = 0
+
+        for o in ids:
+            for d in ids:
+                if o == d:
+                    continue
+                direct = [a for _, a in od_trips(source, o, d, day, t0)]
+                via = [a for n in ids if n not in (o, d)
+                       for a in match_legs(od_trips(source, o, n, day, t0), od_trips(source, n, d, day), 10)]
+
+                found = query(net, snap.nucleo_row(o), snap.nucleo_row(d), t0, freqs,
+                              max_transfers=1, min_transfer=10)
+                rides = {j["transfers"]: j["arr"] for j in found}
+                assert rides.get(0) == (min(direct) if direct else None), (o, d)
+                best = min(direct + via) if direct + via else None
+                assert (min(rides.values()) if rides else None) == best, (o, d)
+                checked += bool(rides)
+        assert checked
+
+
+@pytest.mark.skipif(LIVE_API, reason="Snapshot is only served by the stub")
+class TestBrowserParity:
+    def test_js_matches_reference(self, page):
+        """raptor.js on the snapshot from snapshot.js answers every corpus case like tools/raptor.py."""
+        page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+        expect(page.locator("#journey-region-list .card").first).to_be_visible(timeout=TIMEOUT)
+        got = page.evaluate("""async ([c, cases]) => {
+            const snap = await loadSnapshot(c);
+            const net = buildRaptorNetwork(snap);
+            const hhmm = m => `${String(Math.floor(m / 60)).padStart(2, '0')}:${String(m % 60).padStart(2, '0')}`;
+            const describe = j => ({
+                transfers: j.transfers, dep: hhmm(j.dep), arr: hhmm(j.arr),
+                legs: j.legs.map(l => ({
+                    ...(l.walk ? { walk: true } : {
+                        line: snap.strings[snap.lines.code[net.routes[l.route].line]],
+                        dias: snap.strings[snap.freqs.code[net.routes[l.route].freq]],
+                    }),
+                    from: String(snap.nucleos.id[l.from]),
+                    to: String(snap.nucleos.id[l.to]),
+                    dep: hhmm(l.dep), arr: hhmm(l.arr),
+                })),
+            });
+            return cases.map(k => {
+                const [h, m] = k.depart.split(':').map(Number);
+                const q = {
+                    origin: snap.nucleos.id.indexOf(Number(k.from)),
+                    dest: snap.nucleos.id.indexOf(Number(k.to)),
+                    depart: h * 60 + m,
+                    freqs: activeFreqRows(snap, new Date(`${k.date}T12:00:00`)),
+                    maxTransfers: k.maxTransfers, minTransfer: k.minTransfer,
+                };
+                return {
+                    pareto: raptorQuery(net, q).map(describe),
+                    profile: raptorProfile(net, q, k.count ?? 5).map(describe),
+                };
+            });
+        }""", [CORPUS["consorcio"], CASES])
+        for case, result in zip(CASES, got):
+            assert result == case["expected"], case["name"]
@@ -0,0 +1,117 @@
+"""
+Timetable compiler tests — src/js/schedule.js and its Python twin
+tools/schedule.py. Day-type rules, column mapping and trip order on the
+recorded horarios_origen_destino responses, byte-identical goldens, and the
+browser compiler producing the same bytes.
+"""
+
+import base64, json, os, struct
+from datetime import date
+import pytest
+from tests.conftest import ROOT, BASE_URL, TIMEOUT, MALAGA_ID
+from tools.schedule import (DAY_HOLIDAY, DAY_SAT, DAY_SUN, DAYS_ALL, DAYS_WEEKDAYS, compile_od,
+                            fixture_responses, freq_day_mask, golden, serialize, trips_on)
+
+GOLDEN_PATH = os.path.join(ROOT, "tests", "fixtures", "schedule", "golden.json")
+with open(GOLDEN_PATH, encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+
+RESPONSES = fixture_responses()
+TORREMOLINOS_MALAGA = f"{MALAGA_ID}/horarios_origen_destino/idNucleoDestino=1&idNucleoOrigen=107.json"
+
+
+class TestDayMasks:
+    @pytest.mark.parametrize("name,days", [
+        ("Monday to friday working days", DAYS_WEEKDAYS),
+        ("De lunes a viernes laborables", DAYS_WEEKDAYS),
+        ("Monday to Saturday", DAYS_WEEKDAYS | DAY_SAT),
+        ("Lunes a sabado", DAYS_WEEKDAYS | DAY_SAT),
+        ("Saturdays, sundays and holidays", DAY_SAT | DAY_SUN | DAY_HOLIDAY),
+        ("Sábados, domingos y festivos", DAY_SAT | DAY_SUN | DAY_HOLIDAY),
+        ("Saturdays", DAY_SAT),
+        ("Domingos y festivos", DAY_SUN | DAY_HOLIDAY),
+        ("Festivos", DAY_HOLIDAY),
+        ("Lunes a viernes no festivos", DAYS_WEEKDAYS),
+        ("Daily", DAYS_ALL),
+        (None, DAYS_ALL),
+    ])
+    def test_rules(self, name, days):
+        assert freq_day_mask(name) == days
+
+
+class TestCompile:
+    def test_columns_follow_nucleos_colspans(self):
+        table = compile_od(RESPONSES[TORREMOLINOS_MALAGA])
+        assert table["origin"] == list(range(0, 6))
+        assert table["dest"] == list(range(6, 13))
+        assert table["cols"] == 13
+
+    def test_first_origin_and_last_destination_call(self):
+        table = compile_od(RESPONSES[TORREMOLINOS_MALAGA])
+        # M-110 07:03 … 07:43, no call at the last destination column
+        assert table["codigo"][0] == "M-110"
+        assert (table["dep"][0], table["arr"][0]) == (7 * 60 + 3, 7 * 60 + 43)
+        assert table["times"][4] == -1
+
+    def test_order_is_by_departure(self):
+        for data in RESPONSES.values():
+            table = compile_od(data)
+            deps = [table["dep"][i] for i in table["order"]]
+            assert deps == sorted(deps) and min(deps, default=0) >= 0
+
+    def test_day_type_selects_trips(self):
+        table = compile_od(RESPONSES[TORREMOLINOS_MALAGA])
+        monday = {table["dias"][i] for i in trips_on(table, date(2026, 2, 16))}
+        sunday = {table["dias"][i] for i in trips_on(table, date(2026, 2, 22))}
+        assert "L-V" in monday and "sdf" not in monday
+        assert "sdf" in sunday and "L-V" not in sunday
+
+    def test_holiday_runs_holiday_service(self):
+        table = compile_od(RESPONSES[TORREMOLINOS_MALAGA])
+        good_thursday = {table["dias"][i] for i in trips_on(table, date(2026, 4, 2))}
+        assert "sdf" in good_thursday and "L-V" not in good_thursday
+
+    def test_without_header_first_column_departs_last_arrives(self):
+        table = compile_od({
+            "horario": [{"codigo": "X", "dias": "??", "horas": ["08:00", "bad", "--", "09:10"]},
+                        {"codigo": "Y", "horas": ["--", "07:30"]}],
+        })
+        assert (table["origin"], table["dest"]) == ([0], [3])
+        assert table["times"][:4] == [480, -1, -1, 550]
+        assert table["dep"] == [480, -1] and table["arr"] == [550, -1]
+        assert table["days"] == [DAYS_ALL, DAYS_ALL]
+        assert table["order"] == [0]
+
+    def test_empty_response(self):
+        table = compile_od({})
+        assert table["trips"] == table["cols"] == 0
+        assert json.loads(serialize(table))["times"] == ""
+
+
+class TestGolden:
+    def test_covers_every_fixture(self):
+        assert set(GOLDEN) == set(RESPONSES)
+
+    def test_python_matches_golden(self):
+        assert golden(RESPONSES) == GOLDEN
+
+    def test_times_are_little_endian_int16(self):
+        doc = json.loads(GOLDEN[TORREMOLINOS_MALAGA])
+        raw = base64.b64decode(doc["times"])
+        times = struct.unpack(f"<{len(raw) // 2}h", raw)
+        assert list(times) == compile_od(RESPONSES[TORREMOLINOS_MALAGA])["times"]
+
+
+class TestBrowserParity:
+    def test_js_matches_golden(self, page):
+        """serializeSchedule(compileSchedule()) writes the golden bytes for every fixture."""
+        page.goto(f"{BASE_URL}/planner.html", timeout=TIMEOUT)
+        got = page.evaluate("""responses => Object.fromEntries(Object.entries(responses).map(
+            ([path, data]) => [path, serializeSchedule(compileSchedule(data))]))""", RESPONSES)
+        assert got == GOLDEN
+
+    def test_compiled_once_per_response(self, page):
+        page.goto(f"{BASE_URL}/planner.html", timeout=TIMEOUT)
+        same = page.evaluate("""data => compileSchedule(data) === compileSchedule(data)""",
+                             RESPONSES[TORREMOLINOS_MALAGA])
+        assert same
@@ -0,0 +1,133 @@
+"""
+Request scheduler tests — the queue in src/js/api.js that every fetchJSON()
+goes through: the global concurrency cap (checked on both sides, by the
+page's counters and the stub's peak of concurrent requests), lane priority,
+cancellation, retries with backoff, and a superseded station sweep leaving
+the queue. Skipped when CTAN_LIVE_API=1.
+"""
+
+import pytest
+import requests
+from tests.conftest import API, BASE_URL, TIMEOUT, STUB_URL, LIVE_API, MALAGA_ID, STOP_MUELLE
+
+pytestmark = pytest.mark.skipif(LIVE_API, reason="Needs the stub's latency and fault injection")
+
+
+@pytest.fixture(autouse=True)
+def slow_stub():
+    requests.post(f"{STUB_URL}/__stub__/config", json={
+        "latency": 150, "jitter": 0, "error_rate": 0.0, "fail_pattern": None, "error_status": 503})
+    requests.post(f"{STUB_URL}/__stub__/reset", json={})
+    yield
+    requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0, "fail_pattern": None})
+
+
+def stub_stats():
+    return requests.get(f"{STUB_URL}/__stub__/stats", timeout=5).json()
+
+
+def open_page(page):
+    """stops.html with nothing cached, so every fetchJSON() goes to the network."""
+    page.goto(f"{BASE_URL}/stops.html", timeout=TIMEOUT)
+    page.wait_for_selector(".consortium-card", timeout=TIMEOUT)
+    page.evaluate("""async () => {
+        await caches.delete(API_CACHE);
+        await caches.delete('ctan-api-sw');   // the service worker's offline copies
+        localStorage.removeItem(API_CACHE_INDEX);
+        apiIndex = null;
+        apiMemory.clear();
+    }""")
+    requests.post(f"{STUB_URL}/__stub__/reset", json={})   # forget the page's own requests
+
+
+class TestConcurrencyCap:
+    def test_fan_out_is_capped(self, page):
+        open_page(page)
+        stats = page.evaluate(f"""async () => {{
+            await Promise.all(Array.from({{ length: 16 }}, (_, i) =>
+                fetchJSON('{API}/{MALAGA_ID}/horarios_origen_destino?idNucleoOrigen=' + i + '&idNucleoDestino=1')
+                  .catch(() => null)));
+            return apiSchedulerStats();
+        }}""")
+        assert stats["peakActive"] == stats["maxConcurrent"] == 4
+        assert stats["lanes"]["visible"]["peakQueued"] == 12
+        assert stats["lanes"]["visible"]["avgWaitMs"] > 100
+        assert stub_stats()["peak_inflight"] <= 4
+
+    def test_visible_overtakes_queued_prefetches(self, page):
+        open_page(page)
+        order = page.evaluate(f"""async () => {{
+            const done = [];
+            const get = (name, lane) => apiFetch('{API}/{MALAGA_ID}/lineas/' + name, {{ lane }})
+                .then(() => done.push(name));
+            const prefetches = Array.from({{ length: 12 }}, (_, i) => get('p' + i, 'prefetch'));
+            const background = get('b', 'background');
+            await get('v', 'visible');
+            await Promise.all([...prefetches, background]);
+            return done;
+        }}""")
+        # The first four prefetches were already on the wire; 'v' and then 'b' go next
+        assert order.index("v") < order.index("b") < order.index("p4")
+        assert order.index("v") <= 4
+
+
+class TestCancellation:
+    def test_aborted_requests_leave_the_queue(self, page):
+        open_page(page)
+        result = page.evaluate(f"""async () => {{
+            const token = supersede(null);
+            const calls = Array.from({{ length: 10 }}, (_, i) =>
+                fetchJSON('{API}/{MALAGA_ID}/lineas/' + (900 + i), {{ lane: 'background', signal: token.signal }})
+                  .then(() => 'ok', e => e.name));
+            await new Promise(r => setTimeout(r, 50));
+            const next = supersede(token);
+            return {{ results: await Promise.all(calls), aborted: token.signal.aborted && !next.signal.aborted,
+                      stats: apiSchedulerStats().lanes.background }};
+        }}""")
+        assert result["aborted"]
+        assert set(result["results"]) == {"AbortError"}
+        assert result["stats"]["cancelled"] == 10 and result["stats"]["done"] == 0
+        page.wait_for_timeout(300)
+        assert stub_stats()["total"] <= 4   # only what was already on the wire reached the API
+
+    def test_shared_request_survives_one_caller_aborting(self, page):
+        open_page(page)
+        result = page.evaluate(f"""async () => {{
+            const url = '{API}/{MALAGA_ID}/paradas/{STOP_MUELLE}';
+            const token = new AbortController();
+            const a = fetchJSON(url, {{ signal: token.signal }}).then(() => 'ok', e => e.name);
+            const b = fetchJSON(url).then(d => d.idParada ? 'ok' : 'empty', e => e.name);
+            token.abort();
+            return [await a, await b];
+        }}""")
+        assert result == ["AbortError", "ok"]
+        assert stub_stats()["total"] == 1
+
+
+class TestRetries:
+    def test_transient_errors_are_retried(self, page):
+        open_page(page)
+        requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 0, "fail_pattern": "frecuencias"})
+        result = page.evaluate(f"""async () => {{
+            const error = await fetchJSON('{API}/{MALAGA_ID}/frecuencias').then(() => null, e => e.message);
+            return {{ error, stats: apiSchedulerStats().lanes.visible }};
+        }}""")
+        assert result["error"] == "HTTP 503"
+        assert result["stats"]["retries"] == 2 and result["stats"]["failed"] == 1
+        assert stub_stats()["endpoints"]["frecuencias"]["count"] == 3
+
+    def test_client_errors_are_not_retried(self, page):
+        open_page(page)
+        page.evaluate(f"() => fetchJSON('{API}/{MALAGA_ID}/lineas/99999').catch(() => null)")
+        assert stub_stats()["endpoints"]["lineas/:id"]["count"] == 1
+
+
+class TestStationSweep:
+    def test_reload_cancels_background_sweep(self, page):
+        page.goto(f"{BASE_URL}/station.html?c={MALAGA_ID}&s={STOP_MUELLE}", timeout=TIMEOUT)
+        page.wait_for_selector(".departure-card", timeout=TIMEOUT)
+        page.evaluate("() => loadDepartures()")
+        page.wait_for_selector(".departure-card", timeout=TIMEOUT)
+        background = page.evaluate("() => apiSchedulerStats().lanes.background")
+        assert background["started"] > 0
+        assert background["cancelled"] >= 1     # the first sweep's window in flight
@@ -0,0 +1,103 @@
+"""
+Search index tests — src/js/search.js behind the stop, nucleo and line
+autocompletes: ranking, parity with the old linear scan, the persisted index
+and the worst-case query benchmark page.
+"""
+
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, MALAGA_ID
+
+# Same filter app.js ran on every keystroke before the index
+LINEAR_SCAN = """q => {
+    const norm = s => s.toLowerCase().normalize('NFD').replace(/[\\u0300-\\u036f]/g, '');
+    const n = norm(q.trim());
+    return allStops.filter(s => [s.nombre, s.municipio, s.nucleo].some(f => f && norm(f).includes(n)))
+                   .map(s => s.idParada).sort();
+}"""
+
+QUERIES = ["a", "de", "mal", "Málaga", "muelle", "Muelle Heredia", "alhaurin", "c/", "zzz", "  coin  "]
+
+
+def open_malaga_stops(page):
+    page.goto(f"{BASE_URL}/stops.html", timeout=TIMEOUT)
+    expect(page.locator(".consortium-card").first).to_be_visible(timeout=TIMEOUT)
+    page.locator(".consortium-card").filter(has_text="Málaga").click()
+    page.wait_for_function("() => stopSearchList && allStops.length", timeout=20_000)
+
+
+class TestSearchIndex:
+    def test_ranked_prefix_word_start_substring(self, page):
+        page.goto(f"{BASE_URL}/stops.html", timeout=TIMEOUT)
+        names = page.evaluate("""() => {
+            const items = ['Casanova', 'Plaza San Juan', 'Sanlúcar', 'Hospital', 'Santa Ana'].map(nombre => ({ nombre }));
+            const index = buildSearchIndex(items, [i => i.nombre]);
+            return searchIndex(index, 'san').map(i => items[i].nombre);
+        }""")
+        assert names == ["Sanlúcar", "Santa Ana", "Plaza San Juan", "Casanova"]
+
+    def test_earlier_field_wins_within_a_rank(self, page):
+        page.goto(f"{BASE_URL}/stops.html", timeout=TIMEOUT)
+        ids = page.evaluate("""() => {
+            const items = [{ id: 1, nombre: 'Centro', municipio: 'Coín' }, { id: 2, nombre: 'Coín', municipio: 'Coín' }];
+            const index = buildSearchIndex(items, [i => i.nombre, i => i.municipio]);
+            return searchIndex(index, 'coin').map(i => items[i].id);
+        }""")
+        assert ids == [2, 1]
+
+    def test_same_stops_as_linear_scan(self, page):
+        open_malaga_stops(page)
+        for q in QUERIES:
+            got = page.evaluate("q => stopSearchList.search(q, Infinity).map(s => s.idParada).sort()", q)
+            assert got == page.evaluate(LINEAR_SCAN, q), q
+
+    def test_limit_and_accents(self, page):
+        open_malaga_stops(page)
+        assert len(page.evaluate("() => stopSearchList.search('a', 30)")) == 30
+        assert page.evaluate("() => stopSearchList.search('MÁLAGA', 5).length") == 5
+
+
+class TestPersistedIndex:
+    def test_index_stored_alongside_stops(self, page):
+        open_malaga_stops(page)
+        url = f"{BASE_URL}/search-index/stops-{MALAGA_ID}"
+        page.wait_for_function(f"() => apiCacheIndex()['{url}']", timeout=TIMEOUT)
+        stored = page.evaluate(f"""async () => {{
+            const res = await (await caches.open(API_CACHE)).match('{url}');
+            return res.json();
+        }}""")
+        assert stored["n"] == page.evaluate("() => allStops.length")
+        assert stored["sig"] == page.evaluate("() => searchSignature(allStops, [s => s.nombre, s => s.municipio, s => s.nucleo])")
+
+    def test_reload_uses_stored_index(self, page):
+        open_malaga_stops(page)
+        url = f"{BASE_URL}/search-index/stops-{MALAGA_ID}"
+        page.wait_for_function(f"() => apiCacheIndex()['{url}']", timeout=TIMEOUT)
+        page.evaluate("() => saveApiCacheIndex(true)")
+        page.reload()
+        page.evaluate("""() => {
+            window.__builds = 0;
+            const build = buildSearchIndex;
+            buildSearchIndex = (...args) => { window.__builds++; return build(...args); };
+        }""")
+        expect(page.locator(".consortium-card").first).to_be_visible(timeout=TIMEOUT)
+        page.locator(".consortium-card").filter(has_text="Málaga").click()
+        page.wait_for_function("() => stopSearchList && allStops.length", timeout=20_000)
+        page.wait_for_timeout(300)
+        page.locator("#stop-search").fill("muelle")
+        expect(page.locator("#stop-list .card").first).to_contain_text("Muelle", timeout=TIMEOUT)
+        assert page.evaluate("() => window.__builds") == 0
+
+
+class TestSearchBenchmark:
+    def test_worst_case_queries(self, page):
+        page.goto(f"{BASE_URL}/bench/search.html?scale=20", timeout=TIMEOUT)
+        page.wait_for_function("() => window.benchResult", timeout=90_000)
+        result = page.evaluate("() => window.benchResult")
+        assert "error" not in result, result
+        assert result["consorcio"] == MALAGA_ID
+        assert result["stops"] > 2000
+        assert result["storedBytes"] > 0
+        assert all(q["same"] for q in result["queries"]), result["queries"]
+        by_query = {q["query"]: q for q in result["queries"]}
+        assert by_query["zzz"]["matches"] == 0
+        assert by_query["a"]["matches"] > by_query["mal"]["matches"] > 0
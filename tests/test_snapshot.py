@@ -0,0 +1,120 @@
+"""
+Snapshot tests — tools/build_snapshot.py built from the recorded fixtures:
+columnar round-trip, content addressing, serving through the API stub, and
+src/js/snapshot.js turning down a snapshot built too long ago.
+"""
+
+import json, math, os
+from datetime import datetime, timedelta, timezone
+import pytest
+import requests
+from tests.conftest import BASE_URL, TIMEOUT, STUB_URL, LIVE_API, MALAGA_ID, STOP_MUELLE
+from tools.build_snapshot import FixtureSource, crawl, build, serialize, write, unpack
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return crawl(FixtureSource(), MALAGA_ID)
+
+
+@pytest.fixture(scope="module")
+def snap(raw):
+    return build(MALAGA_ID, raw)
+
+
+def column(snap, table, name, fmt):
+    return unpack(fmt, snap[table][name])
+
+
+class TestColumns:
+    def test_counts_match_fixtures(self, raw, snap):
+        assert snap["counts"]["stops"] == len(raw["paradas"])
+        assert snap["counts"]["lines"] == len(raw["lineas"])
+        assert snap["counts"]["nucleos"] == len(raw["nucleos"])
+
+    def test_stop_round_trip(self, snap):
+        ids = column(snap, "stops", "id", "i")
+        names = column(snap, "stops", "nameStr", "H")
+        zones = column(snap, "stops", "zoneStr", "H")
+        lat = column(snap, "stops", "lat", "f")
+        i = ids.index(int(STOP_MUELLE))
+        assert snap["strings"][names[i]] == "Terminal Muelle Heredia"
+        assert snap["strings"][zones[i]] == "A"
+        assert abs(lat[i] - 36.7162) < 1e-5
+
+    def test_stops_without_gps_are_nan(self, snap):
+        lat = column(snap, "stops", "lat", "f")
+        assert any(math.isnan(v) for v in lat)
+
+    def test_strings_are_interned(self, snap):
+        assert len(snap["strings"]) == len(set(snap["strings"]))
+
+    def test_m230_weekday_trip_times(self, snap):
+        """M-230 (idLinea 3) dir 1 on L-V leaves Coín at 06:20 and reaches Alhaurín at 06:38."""
+        lines = column(snap, "lines", "id", "i")
+        p_line = column(snap, "patterns", "line", "H")
+        p_dir = column(snap, "patterns", "sentido", "B")
+        freqs = column(snap, "freqs", "id", "i")
+        t_pat = column(snap, "timetables", "pattern", "H")
+        t_freq = column(snap, "timetables", "freq", "H")
+        t_start = column(snap, "timetables", "timeStart", "I")
+        times = column(snap, "timetables", "times", "h")
+
+        pat = next(p for p in range(len(p_line)) if lines[p_line[p]] == 3 and p_dir[p] == 1)
+        tt = next(t for t in range(len(t_pat)) if t_pat[t] == pat and freqs[t_freq[t]] == 1)
+        first_trip = times[t_start[tt]:t_start[tt] + 3]
+        assert first_trip == [6 * 60 + 20, 6 * 60 + 27, 6 * 60 + 38]
+
+    def test_nucleo_lines_come_from_endpoint(self, snap, raw):
+        nuc_ids = column(snap, "nucleos", "id", "i")
+        start = column(snap, "nucleos", "lineStart", "I")
+        rows = column(snap, "nucleos", "nucleoLines", "H")
+        lines = column(snap, "lines", "id", "i")
+        i = nuc_ids.index(83)
+        got = sorted(str(lines[r]) for r in rows[start[i]:start[i + 1]])
+        assert got == sorted(l["idLinea"] for l in raw["nucleoLines"]["83"])
+
+
+class TestContentAddressing:
+    def test_build_is_deterministic(self, raw, snap):
+        assert serialize(build(MALAGA_ID, raw)) == serialize(snap)
+
+    def test_write_prunes_stale_snapshots(self, snap, tmp_path):
+        stale = tmp_path / "snapshot-4.000000000000.json"
+        stale.write_text("{}")
+        manifest = write([snap], str(tmp_path))
+        entry = manifest["snapshots"][MALAGA_ID]
+        assert not stale.exists()
+        assert sorted(os.listdir(tmp_path)) == sorted(["manifest.json", entry["file"]])
+        assert entry["file"].startswith(f"snapshot-{MALAGA_ID}.{entry['hash'][:12]}")
+
+
+@pytest.mark.skipif(LIVE_API, reason="Stub not running against live API")
+class TestServedByStub:
+    def test_manifest_and_file(self):
+        manifest = requests.get(f"{STUB_URL}/data/manifest.json", timeout=10).json()
+        entry = manifest["snapshots"][MALAGA_ID]
+        r = requests.get(f"{STUB_URL}/data/{entry['file']}", timeout=10)
+        assert r.status_code == 200
+        assert len(r.content) == entry["bytes"]
+        assert json.loads(r.content)["consorcio"] == MALAGA_ID
+        built = datetime.strptime(manifest["built"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        assert datetime.now(timezone.utc) - built < timedelta(days=1)
+
+    def test_unknown_snapshot_is_404(self):
+        assert requests.get(f"{STUB_URL}/data/snapshot-9.deadbeef.json", timeout=5).status_code == 404
+
+    def test_old_snapshot_falls_back_to_the_api(self, page):
+        page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+        loaded = page.evaluate(f"""async () => {{
+            const manifest = await loadSnapshotManifest();
+            const load = async built => {{
+                snapshotManifest = Promise.resolve({{ ...manifest, built }});
+                delete snapshots['{MALAGA_ID}'];
+                return !!(await loadSnapshot('{MALAGA_ID}'));
+            }};
+            const ago = ms => new Date(Date.now() - ms).toISOString();
+            return [await load(manifest.built), await load(ago(SNAPSHOT_MAX_AGE_MS - 60000)),
+                    await load(ago(SNAPSHOT_MAX_AGE_MS + 60000)), await load(undefined)];
+        }}""")
+        assert loaded == [True, True, False, False]
@@ -0,0 +1,97 @@
+"""
+Stub tests — the local CTAN replay server (tools/ctan_stub.py) that the other
+suites run against. Skipped when CTAN_LIVE_API=1.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import requests
+from tests.conftest import API, STUB_URL, LIVE_API, MALAGA_ID, STOP_MUELLE
+from tools.ctan_stub import fixture_key, endpoint_name
+
+pytestmark = pytest.mark.skipif(LIVE_API, reason="Stub not running against live API")
+
+
+@pytest.fixture(autouse=True)
+def clean_stub():
+    requests.post(f"{STUB_URL}/__stub__/config", json={
+        "latency": 0, "jitter": 0, "error_rate": 0.0, "fail_pattern": None})
+    requests.post(f"{STUB_URL}/__stub__/reset", json={})
+    yield
+
+
+class TestFixtureKeys:
+    def test_plain_path(self):
+        assert fixture_key("4/paradas/149", "") == "4/paradas/149.json"
+
+    def test_trailing_slash_is_ignored(self):
+        assert fixture_key("4/paradas/", "") == "4/paradas.json"
+
+    def test_query_is_sorted_and_dates_dropped(self):
+        key = fixture_key("4/horarios_lineas", "idLinea=3&idFrecuencia=1&dia=19&mes=2")
+        assert key == "4/horarios_lineas/idFrecuencia=1&idLinea=3.json"
+
+    def test_endpoint_names_collapse_ids(self):
+        assert endpoint_name("4/paradas/149/servicios") == "paradas/:id/servicios"
+        assert endpoint_name("consorcios") == "consorcios"
+
+
+class TestReplay:
+    def test_cors_headers(self):
+        r = requests.get(f"{API}/consorcios", timeout=5)
+        assert r.headers["Access-Control-Allow-Origin"] == "*"
+        assert "X-Stub-Version" in r.headers
+
+    def test_unknown_path_is_404(self):
+        r = requests.get(f"{API}/{MALAGA_ID}/lineas/99999", timeout=5)
+        assert r.status_code == 404
+
+    def test_services_are_windowed(self):
+        r = requests.get(f"{API}/{MALAGA_ID}/paradas/{STOP_MUELLE}/servicios"
+                         f"?horaIni=19-02-2026+14:30", timeout=5)
+        assert r.status_code == 200
+        data = r.json()
+        assert data["horaFin"] == "2026-02-19 15:29:00"
+        assert data["servicios"]
+        for s in data["servicios"]:
+            assert "14:30" <= s["servicio"] < "15:30"
+
+    def test_services_window_stops_at_midnight(self):
+        r = requests.get(f"{API}/{MALAGA_ID}/paradas/{STOP_MUELLE}/servicios"
+                         f"?horaIni=19-02-2026+23:45", timeout=5)
+        data = r.json()
+        assert data["horaFin"] == "2026-02-20 00:44:00"
+        assert all(s["servicio"] >= "23:45" for s in data["servicios"])
+
+
+class TestFaultInjection:
+    def test_fail_pattern(self):
+        requests.post(f"{STUB_URL}/__stub__/config",
+                      json={"fail_pattern": "horarios_origen_destino", "error_status": 503})
+        r = requests.get(f"{API}/{MALAGA_ID}/horarios_origen_destino"
+                         f"?idNucleoOrigen=1&idNucleoDestino=111", timeout=5)
+        assert r.status_code == 503
+        assert requests.get(f"{API}/consorcios", timeout=5).status_code == 200
+
+    def test_latency(self):
+        requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 200})
+        r = requests.get(f"{API}/consorcios", timeout=5)
+        assert r.elapsed.total_seconds() >= 0.2
+
+    def test_stats_count_requests_per_endpoint(self):
+        for stop in ("149", "460"):
+            requests.get(f"{API}/{MALAGA_ID}/paradas/{stop}", timeout=5)
+        requests.get(f"{API}/{MALAGA_ID}/lineas/99999", timeout=5)
+        stats = requests.get(f"{STUB_URL}/__stub__/stats", timeout=5).json()
+        assert stats["total"] == 3
+        assert stats["errors"] == 1
+        assert stats["endpoints"]["paradas/:id"]["count"] == 2
+        assert stats["endpoints"]["lineas/:id"]["errors"] == 1
+        assert stats["bytes"] > 0
+
+    def test_stats_peak_inflight(self):
+        requests.post(f"{STUB_URL}/__stub__/config", json={"latency": 200})
+        with ThreadPoolExecutor(3) as pool:
+            list(pool.map(lambda _: requests.get(f"{API}/consorcios", timeout=5), range(3)))
+        stats = requests.get(f"{STUB_URL}/__stub__/stats", timeout=5).json()
+        assert stats["peak_inflight"] == 3
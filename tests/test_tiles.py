@@ -0,0 +1,163 @@
+"""
+Tile cache tests — the service worker's basemap tile cache (sw.js "Map tiles",
+src/js/tiles.js) against the local tile stand-in (tools/tile_stub.py):
+cache-first serving with the stand-in offline, per-region prefetch, the LRU
+byte budget, and the settings panel. Each browser test gets its own context so
+it starts with no service worker and no cached tiles.
+"""
+
+import math
+from urllib.parse import quote
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, API, STUB_URL, LIVE_API, MALAGA_ID, TILES_PORT, TILES_URL
+from tools.tile_stub import render_tile, serve_in_thread
+
+AROUND_MALAGA = [36.70, -4.45, 36.74, -4.40]   # south, west, north, east
+ZOOMS = [8, 9, 10, 11, 12]
+
+
+@pytest.fixture(scope="module")
+def tiles():
+    server = serve_in_thread(TILES_PORT)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def clean_tiles(tiles):
+    tile_config(latency=0, tile_bytes=0, offline=False)
+    requests.post(f"{TILES_URL}/__tiles__/reset", timeout=5)
+    yield
+
+
+@pytest.fixture()
+def tile_page(browser_ctx, tiles):
+    """A page in a fresh context with the tile stand-in as the basemap."""
+    ctx = browser_ctx.browser.new_context()
+    cookies = [{"name": "tileBase", "value": quote(TILES_URL, safe=""), "url": BASE_URL}]
+    if not LIVE_API:
+        cookies += [{"name": "apiBase", "value": quote(API, safe=""), "url": BASE_URL},
+                    {"name": "dataBase", "value": quote(f"{STUB_URL}/data", safe=""), "url": BASE_URL}]
+    ctx.add_cookies(cookies)
+    page = ctx.new_page()
+    yield page
+    ctx.close()
+
+
+def tile_config(**values):
+    requests.post(f"{TILES_URL}/__tiles__/config", json=values, timeout=5)
+
+
+def tile_stats():
+    return requests.get(f"{TILES_URL}/__tiles__/stats", timeout=5).json()
+
+
+def controlled(page, path):
+    """Open `path` and wait until the service worker controls the page."""
+    page.goto(f"{BASE_URL}/{path}", timeout=TIMEOUT)
+    page.wait_for_function("() => navigator.serviceWorker.controller", timeout=TIMEOUT)
+
+
+def tile_count(bbox, zooms):
+    """Same ranges as tileRange() in sw.js."""
+    south, west, north, east = bbox
+    def x(lng, n): return min(n - 1, max(0, math.floor((lng + 180) / 360 * n)))
+    def y(lat, n):
+        r = math.radians(lat)
+        return min(n - 1, max(0, math.floor((1 - math.log(math.tan(r) + 1 / math.cos(r)) / math.pi) / 2 * n)))
+    return sum((x(east, 2 ** z) - x(west, 2 ** z) + 1) * (y(south, 2 ** z) - y(north, 2 ** z) + 1) for z in zooms)
+
+
+def prefetch(page, bbox=AROUND_MALAGA):
+    template = f"{TILES_URL}/light_all/{{z}}/{{x}}/{{y}}{{r}}.png"
+    return page.evaluate("([bbox, template]) => prefetchRegionTiles('test', bbox, template, { force: true })",
+                         [bbox, template])
+
+
+class TestTileStub:
+    def test_tiles_are_png_padded_to_size(self):
+        body = render_tile("light_all", 12, 2004, 1607, 20000)
+        assert body.startswith(b"\x89PNG\r\n\x1a\n") and body.endswith(b"IEND\xaeB`\x82")
+        assert len(body) == 20000
+        assert render_tile("light_all", 12, 2004, 1607) != render_tile("dark_all", 12, 2004, 1607)
+
+    def test_serves_and_counts(self):
+        tile_config(tile_bytes=4096)
+        res = requests.get(f"{TILES_URL}/light_all/12/2004/1607@2x.png", timeout=5)
+        assert res.status_code == 200 and res.headers["Content-Type"] == "image/png"
+        assert len(res.content) == 4096 and res.headers["Access-Control-Allow-Origin"] == "*"
+        assert requests.get(f"{TILES_URL}/light_all/2/9/0.png", timeout=5).status_code == 404
+        stats = tile_stats()
+        assert stats["total"] == 1 and stats["zooms"] == {"12": 1} and stats["bytes"] == 4096
+
+    def test_offline(self):
+        tile_config(offline=True)
+        assert requests.get(f"{TILES_URL}/light_all/12/2004/1607.png", timeout=5).status_code == 503
+        assert tile_stats()["total"] == 0
+
+
+class TestTileCache:
+    def test_map_works_with_tile_server_down(self, tile_page):
+        controlled(tile_page, f"map.html?c={MALAGA_ID}")
+        tile_page.reload()
+        expect(tile_page.locator("img.leaflet-tile-loaded").first).to_be_visible(timeout=TIMEOUT)
+        tile_page.wait_for_timeout(1500)   # tiles reach the cache after they are served
+        src = tile_page.locator("img.leaflet-tile-loaded").first.get_attribute("src")
+        assert src.startswith(TILES_URL)
+
+        tile_config(offline=True)
+        tile_page.reload()
+        expect(tile_page.locator(f"img.leaflet-tile-loaded[src='{src}']")).to_be_visible(timeout=TIMEOUT)
+
+    def test_prefetch_fetches_each_tile_once(self, tile_page):
+        controlled(tile_page, "settings.html")
+        first = prefetch(tile_page)
+        want = tile_count(AROUND_MALAGA, ZOOMS)
+        assert first["total"] == first["fetched"] == first["tiles"] == want
+        assert first["failed"] == 0 and not first["stopped"]
+        stats = tile_stats()
+        assert stats["total"] == want and sorted(map(int, stats["zooms"])) == ZOOMS
+
+        again = prefetch(tile_page)
+        assert again["total"] == again["fetched"] == 0
+        assert tile_stats()["total"] == want
+
+    def test_prefetch_stops_short_of_budget(self, tile_page):
+        tile_config(tile_bytes=20_000)
+        controlled(tile_page, "settings.html")
+        assert tile_page.evaluate("() => setTileCacheBudget(300_000)")["budget"] == 300_000
+        report = prefetch(tile_page, [36.3, -5.2, 37.2, -3.8])
+        assert report["stopped"] and 240_000 <= report["bytes"] <= 300_000
+        assert report["fetched"] < report["total"]
+
+    def test_budget_evicts_least_recently_used(self, tile_page):
+        tile_config(tile_bytes=20_000)
+        controlled(tile_page, "settings.html")
+        kept = tile_page.evaluate(f"""async () => {{
+            const url = x => `{TILES_URL}/light_all/12/${{x}}/1607.png`;
+            const pause = () => new Promise(r => setTimeout(r, 50));
+            for (let x = 2000; x < 2006; x++) {{ await fetch(url(x)); await pause(); }}
+            await fetch(url(2000));                  // touched: now the most recent
+            await pause();
+            const usage = await setTileCacheBudget(60_000);
+            const keys = (await (await caches.open('ctan-tiles')).keys()).map(r => r.url);
+            return {{ usage, keys: keys.filter(k => k.endsWith('/1607.png')).map(k => +k.split('/').at(-2)) }};
+        }}""")
+        assert kept["usage"] == {"tiles": 3, "bytes": 60_000, "budget": 60_000}
+        assert sorted(kept["keys"]) == [2000, 2004, 2005]
+        assert tile_stats()["total"] == 6      # the touch was a cache hit
+
+    def test_settings_panel_usage_and_purge(self, tile_page):
+        controlled(tile_page, "settings.html")
+        prefetch(tile_page)
+        tile_page.reload()
+        usage = tile_page.locator("#settings-tiles-usage")
+        expect(usage).to_contain_text(f"{tile_count(AROUND_MALAGA, ZOOMS)} tiles", timeout=TIMEOUT)
+        expect(tile_page.locator("#tiles-budget-seg .settings-seg-btn.active")).to_have_text("50")
+
+        tile_page.locator("#tiles-budget-seg .settings-seg-btn[data-val='100']").click()
+        expect(usage).to_contain_text("of 100 MB", timeout=TIMEOUT)
+        tile_page.locator("#purge-tiles-btn").click()
+        expect(usage).to_have_text("0.0 MB of 100 MB · 0 tiles", timeout=TIMEOUT)
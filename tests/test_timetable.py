@@ -84,6 +84,34 @@ class TestStationUI:
         page.wait_for_timeout(500)
         assert len(api_calls) == 0, "Language toggle triggered an API call"
 
+    def test_stop_info_cached_across_loads(self, page):
+        """Stop details come from the shared fetch layer's persistent cache on the next visit."""
+        page.goto(self._url(), timeout=TIMEOUT)
+        expect(page.locator("#station-meta")).not_to_be_empty(timeout=TIMEOUT)
+        page.wait_for_timeout(800)   # let the LRU index reach localStorage
+
+        stop_calls = []
+        page.on("request", lambda r: stop_calls.append(r.url)
+                if r.url.rstrip("/").endswith(f"/paradas/{STOP_MUELLE}") else None)
+        page.reload(timeout=TIMEOUT)
+        expect(page.locator("#station-meta")).not_to_be_empty(timeout=TIMEOUT)
+        assert stop_calls == [], "Stop details were fetched again"
+
+    def test_refresh_only_requeries_near_term(self, page):
+        """After a full sweep, a refresh walks only the next hour of windows."""
+        page.goto(self._url(), timeout=TIMEOUT)
+        self._wait_for_content(page)
+        page.wait_for_function("() => fullSweepAt > 0", timeout=TIMEOUT)
+        cards = page.locator(".departure-card").count()
+
+        page.evaluate("() => apiMemory.clear()")   # bypass the 20 s servicios memo
+        calls = []
+        page.on("request", lambda r: calls.append(r.url) if "/servicios" in r.url else None)
+        page.locator("#refresh-btn").click()
+        page.wait_for_timeout(1000)
+        assert 1 <= len(calls) <= 2, calls
+        assert page.locator(".departure-card").count() >= cards - 1
+
     def test_departure_card_navigates_to_route(self, page):
         page.goto(self._url(), timeout=TIMEOUT)
         # Only test if actual departure cards are present
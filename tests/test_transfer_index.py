@@ -0,0 +1,123 @@
+"""
+Transfer index tests — tools/transfer_index.py built from the recorded
+fixtures, served through the API stub, and read by journey.html to probe only
+the nucleos that share a line with both ends instead of every nucleo.
+"""
+
+import json
+from datetime import date, datetime, timedelta, timezone
+import pytest
+import requests
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, STUB_URL, LIVE_API, MALAGA_ID
+from tests.test_raptor import od_trips, match_legs
+from tools.build_snapshot import FixtureSource
+from tools.transfer_index import crawl, build, serialize, transfer_points, write
+
+ORIGIN, DEST = "201", "107"   # Coín → Torremolinos, only via Málaga
+
+
+@pytest.fixture(scope="module")
+def index():
+    return crawl(FixtureSource(), MALAGA_ID)
+
+
+@pytest.fixture(scope="module")
+def nucleo_ids():
+    return [n["idNucleo"] for n in FixtureSource().get(f"{MALAGA_ID}/nucleos")["nucleos"]]
+
+
+class TestCrawl:
+    def test_adjacency_is_symmetric(self, index):
+        nucleos, lineas = index
+        assert {(n, l) for n, ls in nucleos.items() for l in ls} == \
+               {(n, l) for l, ns in lineas.items() for n in ns}
+
+    def test_matches_nucleo_lines(self, index):
+        source = FixtureSource()
+        for n, lines in index[0].items():
+            listed = {l["idLinea"] for l in source.get(f"{MALAGA_ID}/nucleos/{n}/lineas")["lineas"]}
+            assert listed <= set(lines), n
+
+    def test_transfer_points(self, index):
+        assert transfer_points(*index, ORIGIN, DEST) == {"1"}
+        assert transfer_points(*index, "120", "107") == {"111"}
+
+    def test_keeps_every_connecting_nucleo(self, index, nucleo_ids):
+        """Pruning never drops a nucleo the full probe would have found an itinerary through."""
+        source, day = FixtureSource(), date(2026, 4, 8)
+        probed = pruned = 0
+        for o in nucleo_ids:
+            for d in nucleo_ids:
+                if o == d:
+                    continue
+                useful = {n for n in nucleo_ids if n not in (o, d)
+                          and match_legs(od_trips(source, o, n, day), od_trips(source, n, d, day), 10)}
+                points = transfer_points(*index, o, d)
+                assert useful <= points, (o, d)
+                probed += len(nucleo_ids) - 2
+                pruned += len(points)
+        assert pruned * 4 < probed
+
+    def test_write(self, index, tmp_path):
+        built = datetime(2026, 2, 16, 4, 0, tzinfo=timezone.utc)
+        write([build(MALAGA_ID, index, built)], tmp_path)
+        doc = json.loads((tmp_path / f"transfers-{MALAGA_ID}.json").read_text(encoding="utf-8"))
+        assert doc["built"] == "2026-02-16T04:00:00Z"
+        assert doc["nucleos"][ORIGIN] == index[0][ORIGIN]
+
+    def test_deterministic(self, index):
+        built = datetime(2026, 2, 16, tzinfo=timezone.utc)
+        assert serialize(build(MALAGA_ID, index, built)) == \
+               serialize(build(MALAGA_ID, (dict(index[0]), dict(index[1])), built))
+
+
+@pytest.mark.skipif(LIVE_API, reason="Index is only served by the stub")
+class TestJourneyUsesIndex:
+    def _probes(self, page):
+        calls = []
+        page.on("request", lambda r: calls.append(r.url) if "horarios_origen_destino" in r.url else None)
+        return calls
+
+    def _find(self, page):
+        """findJourneys() for ORIGIN → DEST without the snapshot, nothing cached."""
+        page.goto(f"{BASE_URL}/journey.html", timeout=TIMEOUT)
+        expect(page.locator("#journey-region-list .card").first).to_be_visible(timeout=TIMEOUT)
+        return page.evaluate(f"""async () => {{
+            await caches.delete(API_CACHE);
+            localStorage.removeItem(API_CACHE_INDEX);
+            apiIndex = null;
+            apiMemory.clear();
+            loadSnapshot = () => Promise.resolve(null);
+            const {{ consorcios }} = await fetchJSON(`${{API}}/consorcios`);
+            await selectRegion(consorcios.find(c => String(c.idConsorcio) === '{MALAGA_ID}'));
+            setDateMode('tomorrow');
+            const byId = id => allNucleos.find(n => String(n.idNucleo) === id);
+            const timing = {{}};
+            const found = await findJourneys(byId('{ORIGIN}'), byId('{DEST}'), getSearchDate(), {{ timing }});
+            return {{ timing, found: found.map(i => [i.transfers.map(t => String(t.nucleo.idNucleo)),
+                                                     i.totalArrival.getTime()]) }};
+        }}""")
+
+    def test_served_by_stub(self):
+        doc = requests.get(f"{STUB_URL}/data/transfers-{MALAGA_ID}.json", timeout=10).json()
+        assert doc["nucleos"][ORIGIN] == ["3", "4"]
+
+    def test_probes_only_transfer_points(self, page):
+        calls = self._probes(page)
+        result = self._find(page)
+        assert result["timing"]["indexed"] and result["timing"]["probes"] == 1
+        assert len(calls) == 3, calls   # direct + both legs via Málaga
+        assert result["found"] and all(t == ["1"] for t, _ in result["found"])
+
+    def test_stale_index_falls_back_to_probe(self, page):
+        fresh = self._find(page)
+        stale = datetime.now(timezone.utc) - timedelta(days=3)
+        body = serialize(build(MALAGA_ID, ({ORIGIN: ["3"]}, {"3": [ORIGIN]}), stale))
+        page.route(f"**/data/transfers-{MALAGA_ID}.json",
+                   lambda route: route.fulfill(status=200, body=body, content_type="application/json"))
+        calls = self._probes(page)
+        result = self._find(page)
+        assert not result["timing"]["indexed"] and result["timing"]["probes"] == 8
+        assert len(calls) == 1 + 2 * 8
+        assert result["found"] == fresh["found"]
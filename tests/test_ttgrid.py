@@ -0,0 +1,134 @@
+"""
+Timetable grid tests — src/js/ttgrid.js: one direction of a horarios_lineas
+response parsed into a flat grid once per request and direction, and drawn
+with only the cells in view in the DOM under a sticky header row and stop
+column. timetable.html and linetimetable.html both render through it.
+"""
+
+import pytest
+from playwright.sync_api import expect
+from tests.conftest import BASE_URL, TIMEOUT, LIVE_API, MALAGA_ID
+from tools.build_snapshot import FixtureSource
+
+M110 = "1"   # 15 stops × 49 trips on L-V, 31 on sábados/domingos/festivos
+
+# A synthetic 80-stop × 300-trip direction (one "Frecuencia" label block), drawn
+# into a 400 × 300 scratch wrapper
+SCRATCH = """() => {
+    const bloquesIda = Array.from({ length: 81 }, (_, i) => ({ tipo: i === 3 ? '1' : '0', nombre: `Parada ${i}` }));
+    const horarioIda = Array.from({ length: 300 }, (_, c) =>
+        ({ horas: bloquesIda.map((_, r) => (r + c) % 7 ? `${c}.${r}` : '--') }));
+    const wrapper = document.createElement('div');
+    wrapper.className = 'tt-grid-wrapper';
+    wrapper.style.cssText = 'width: 400px; height: 300px; max-height: none';
+    document.body.prepend(wrapper);
+    const grid = compileTimetable({ bloquesIda, horarioIda }, 'ida');
+    window.scratch = { wrapper, grid, view: renderTimetableGrid(wrapper, grid, { corner: 'Stop', empty: '·' }) };
+}"""
+
+CELLS = "() => scratch.view.body.querySelectorAll('.tt-cell:not(.tt-stop-name)').length"
+
+SCROLL = """async ([top, left]) => {
+    scratch.wrapper.scrollTo(left, top);
+    await new Promise(requestAnimationFrame);
+    await new Promise(requestAnimationFrame);
+}"""
+
+
+def timetable_url(line=M110):
+    return f"{BASE_URL}/timetable.html?c={MALAGA_ID}&l={line}&code=M-110"
+
+
+def open_timetable(page):
+    page.goto(timetable_url(), timeout=TIMEOUT)
+    expect(page.locator(".tt-grid")).to_be_visible(timeout=TIMEOUT)
+
+
+@pytest.fixture()
+def scratch(page):
+    open_timetable(page)
+    page.evaluate(SCRATCH)
+    return page
+
+
+class TestVirtualGrid:
+    def test_only_cells_in_view(self, scratch):
+        size = scratch.evaluate("() => [scratch.grid.rows, scratch.grid.cols, scratch.view.stops.size]")
+        assert size[:2] == [80, 300]
+        assert size[2] < 20
+        assert 0 < scratch.evaluate(CELLS) < 300
+
+    def test_scrolling_draws_the_new_cells(self, scratch):
+        scratch.evaluate(SCROLL, [42 * 32, 150 * 58])
+        cell = scratch.evaluate("""() => {
+            const { grid, view } = scratch;
+            const el = view.cells.get(42 * grid.cols + 152);   // stop 43 of the raw blocks, trip 152
+            return [el?.textContent, view.stops.get(42)?.textContent, view.heads.get(152)?.textContent,
+                    view.cells.has(0), view.cells.size];
+        }""")
+        assert cell[:4] == ["152.43", "Parada 43", "152.0", False]
+        assert cell[4] < 300
+        assert scratch.evaluate(CELLS) == cell[4]
+
+    def test_empty_cells_and_row_shading(self, scratch):
+        cells = scratch.evaluate("""() => {
+            const { grid, view } = scratch;
+            const empty = view.cells.get(0 * grid.cols + 0);    // (0 + 0) % 7 → '--'
+            const odd = view.cells.get(1 * grid.cols + 0);
+            return [empty.textContent, empty.classList.contains('tt-cell-empty'),
+                    odd.classList.contains('tt-row-alt'), view.stops.get(1).classList.contains('tt-row-alt')];
+        }""")
+        assert cells == ["·", True, True, True]
+
+    def test_header_and_stop_column_stay_put(self, scratch):
+        scratch.evaluate(SCROLL, [20 * 32, 40 * 58])
+        boxes = scratch.evaluate("""() => {
+            const { wrapper, view } = scratch;
+            const w = wrapper.getBoundingClientRect();
+            const head = view.head.getBoundingClientRect();
+            const stop = view.stops.get(25).getBoundingClientRect();
+            const corner = view.head.querySelector('.tt-corner').getBoundingClientRect();
+            return [Math.round(head.top - w.top), Math.round(stop.left - w.left),
+                    Math.round(corner.left - w.left), Math.round(corner.top - w.top)];
+        }""")
+        assert boxes == [0, 0, 0, 0]
+
+
+@pytest.mark.skipif(LIVE_API, reason="compares with the stub's recorded timetable")
+class TestTimetablePage:
+    def expected(self, freq="1", dir_="Ida"):
+        planificador = FixtureSource().get(
+            f"{MALAGA_ID}/horarios_lineas?idLinea={M110}&idFrecuencia={freq}")["planificadores"][0]
+        bloques = planificador[f"bloques{dir_}"]
+        stops = [i for i, b in enumerate(bloques) if b["tipo"] != "1"]
+        trips = planificador[f"horario{dir_}"]
+        return len(stops), len(trips), [t["horas"][stops[-1]] for t in trips]
+
+    def test_grid_matches_response(self, page):
+        open_timetable(page)
+        rows, cols, last_stop = self.expected()
+        grid = page.evaluate("""() => {
+            const grid = timetableGridView(ttGridWrapper).grid;
+            return [grid.rows, grid.cols, grid.cells.slice(-grid.cols)];
+        }""")
+        assert grid == [rows, cols, [h if h != "--" else "" for h in last_stop]]
+        assert page.locator(".tt-grid .tt-cell").count() < rows * cols
+
+    def test_tab_switches_parse_once(self, page):
+        open_timetable(page)
+        expect(page.locator(".dir-tab")).to_have_count(2)
+        page.evaluate("""() => {
+            window.compiled = [];
+            const compile = compileTimetable;
+            compileTimetable = (planificador, dir, opts) => { compiled.push(dir); return compile(planificador, dir, opts); };
+        }""")
+        for direction in ["vuelta", "ida", "vuelta"]:
+            page.locator(f".dir-tab[data-dir='{direction}']").click()
+        page.locator(".tt-freq-tab").nth(1).click()
+        expect(page.locator(".tt-freq-tab").nth(1)).to_have_class("tt-freq-tab active")
+        expect(page.locator(".tt-grid")).to_be_visible(timeout=TIMEOUT)
+        page.locator(".tt-freq-tab").nth(0).click()
+        expect(page.locator(".tt-grid")).to_be_visible(timeout=TIMEOUT)
+        page.wait_for_function("() => timetableGridView(ttGridWrapper).grid.cols === 49", timeout=TIMEOUT)
+        # vuelta on L-V, then vuelta on sdf; back on L-V both directions are parsed already
+        assert len(page.evaluate("() => compiled")) == 2
@@ -0,0 +1,366 @@
+"""
+Network snapshot builder — one static file per consortium.
+-----------------------------------------------------------
+Crawls a consortium once (or reads the recorded fixtures) and writes a compact
+columnar snapshot that pages load instead of re-downloading /paradas/,
+/nucleos, /lineas and every line's stop list. Trip times from horarios_lineas
+are packed alongside so routing can run client-side.
+
+Usage:
+    python3 -m tools.build_snapshot 4                     # crawl api.ctan.es → data/
+    python3 -m tools.build_snapshot --all
+    python3 -m tools.build_snapshot 4 --fixtures          # from tests/fixtures/ctan
+    python3 -m tools.build_snapshot 4 --api http://localhost:8788/v1/Consorcios --out /tmp/data
+
+Output (data/):
+    manifest.json              {schema, built, snapshots: {c: {file, hash, bytes, …}}}
+    snapshot-<c>.<hash12>.json immutable, content-addressed
+
+Format (schema 1) — every table is columnar; integer and float columns are
+base64 little-endian typed arrays (see src/js/snapshot.js for the reader):
+    strings                   interned string table; *Str columns index into it
+    nucleos   id/municipio Int32, nameStr/zoneStr Uint16,
+              lineStart Uint32 → nucleoLines Uint16 (rows in lines, from
+              /nucleos/{id}/lineas — paradas use different idNucleo values)
+    stops     id/nucleoId Int32 (idNucleo as the paradas API reports it),
+              nameStr/zoneStr/municipioStr/nucleoNameStr Uint16,
+              lat/lng Float32 (NaN = no GPS)
+    lines     id Int32, codeStr/nameStr/modoStr/operadoresStr Uint16, noticias Uint8
+    patterns  line Uint16, sentido Uint8, stopStart Uint32 → patternStops Uint16
+    freqs     id Int32, codeStr/nameStr Uint16
+    timetables pattern Uint16, freq Uint16, trips Uint16, timeStart Uint32 → times Int16
+              times are minutes after midnight, row-major trips × pattern stops,
+              -1 where the trip doesn't serve the stop; past-midnight stays > 1440
+"""
+
+import argparse, base64, hashlib, json, math, os, re, struct, sys, unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+ROOT     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIVE_API = "https://api.ctan.es/v1/Consorcios"
+OUT_DIR  = os.path.join(ROOT, "data")
+SCHEMA   = 1
+
+NO_TIME = -1
+
+
+# ── Sources ────────────────────────────────────────────────────────────────────
+class HttpSource:
+    def __init__(self, base=LIVE_API):
+        self.base = base.rstrip("/")
+
+    def get(self, path):
+        try:
+            with urlopen(f"{self.base}/{path}", timeout=30) as r:
+                return json.loads(r.read())
+        except Exception:
+            return None
+
+
+class FixtureSource:
+    """Reads straight from the recorded fixture store used by tools/ctan_stub.py."""
+
+    def __init__(self, store=None):
+        from tools.ctan_stub import FixtureStore
+        self.store = store or FixtureStore()
+
+    def get(self, path):
+        url = urlsplit(path)
+        status, body = self.store.lookup(url.path, url.query)
+        return json.loads(body) if status == 200 else None
+
+
+# ── Packing helpers ────────────────────────────────────────────────────────────
+class Strings:
+    def __init__(self):
+        self.table, self.index = [], {}
+
+    def __call__(self, s):
+        s = s or ""
+        if s not in self.index:
+            self.index[s] = len(self.table)
+            self.table.append(s)
+        return self.index[s]
+
+
+def pack(fmt, values):
+    """Base64 of a little-endian typed array. fmt: struct code (i, H, I, B, h, f)."""
+    return base64.b64encode(struct.pack(f"<{len(values)}{fmt}", *values)).decode("ascii")
+
+
+def unpack(fmt, data):
+    raw = base64.b64decode(data)
+    return list(struct.unpack(f"<{len(raw) // struct.calcsize(fmt)}{fmt}", raw))
+
+
+def parse_coord(value):
+    try:
+        f = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return math.nan if f == 0 else f
+
+
+def to_minutes(hhmm):
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})", (hhmm or "").strip())
+    return int(m.group(1)) * 60 + int(m.group(2)) if m else NO_TIME
+
+
+def normalize(s):
+    s = unicodedata.normalize("NFD", s or "")
+    return re.sub(r"[\u0300-\u036f]", "", s).lower().strip()
+
+
+def match_columns(bloques, pattern_names):
+    """
+    horarios_lineas only labels its columns with stop names. Walk the bloques
+    in order and map each stop column to the next pattern stop with the same
+    name; columns that don't match (label rows, renamed stops) are dropped.
+    Returns {column index: pattern position}.
+    """
+    cols, pos = {}, 0
+    for ci, b in enumerate(bloques):
+        if b.get("tipo") == "1":
+            continue
+        name = normalize(b.get("nombre"))
+        for k in range(pos, len(pattern_names)):
+            if pattern_names[k] == name:
+                cols[ci] = k
+                pos = k + 1
+                break
+    return cols
+
+
+def trip_times(horas, cols, n_stops):
+    row = [NO_TIME] * n_stops
+    last = -1
+    for ci, k in sorted(cols.items(), key=lambda x: x[1]):
+        t = to_minutes(horas[ci]) if ci < len(horas) else NO_TIME
+        if t == NO_TIME:
+            continue
+        while t < last:          # trip runs past midnight
+            t += 24 * 60
+        row[k] = last = t
+    return row
+
+
+# ── Crawl + build ──────────────────────────────────────────────────────────────
+def crawl(source, c, workers=8):
+    """Fetch everything a snapshot needs. Returns a dict of raw API responses."""
+    get = source.get
+    raw = {
+        "paradas": (get(f"{c}/paradas/") or {}).get("paradas", []),
+        "nucleos": (get(f"{c}/nucleos") or {}).get("nucleos", []),
+        "lineas": (get(f"{c}/lineas") or {}).get("lineas", []),
+        "frecuencias": (get(f"{c}/frecuencias") or {}).get("frecuencias", []),
+    }
+    ids = [l["idLinea"] for l in raw["lineas"]]
+    with ThreadPoolExecutor(workers) as pool:
+        meta = pool.map(lambda i: get(f"{c}/lineas/{i}"), ids)
+        stops = pool.map(lambda i: get(f"{c}/lineas/{i}/paradas"), ids)
+        raw["lineMeta"] = dict(zip(ids, meta))
+        raw["lineStops"] = {i: (d or {}).get("paradas", []) for i, d in zip(ids, stops)}
+
+        nuc_ids = [n["idNucleo"] for n in raw["nucleos"]]
+        nuc_lines = pool.map(lambda n: get(f"{c}/nucleos/{n}/lineas"), nuc_ids)
+        raw["nucleoLines"] = {n: (d or {}).get("lineas", []) for n, d in zip(nuc_ids, nuc_lines)}
+
+        jobs = [(i, f["idFreq"]) for i in ids for f in raw["frecuencias"]]
+        sched = pool.map(lambda j: get(f"{c}/horarios_lineas?idLinea={j[0]}&idFrecuencia={j[1]}"), jobs)
+        raw["horarios"] = {j: d for j, d in zip(jobs, sched)
+                           if d and d.get("planificadores")}
+    return raw
+
+
+def build(c, raw):
+    S = Strings()
+
+    nucleos = raw["nucleos"]
+
+    stops = [p for p in raw["paradas"] if str(p.get("idParada", "")).isdigit()]
+    stop_row = {p["idParada"]: i for i, p in enumerate(stops)}
+    # Stops that only appear on line stop lists (not in /paradas/) still need rows
+    for lst in raw["lineStops"].values():
+        for p in lst:
+            if p["idParada"] not in stop_row and str(p["idParada"]).isdigit():
+                stop_row[p["idParada"]] = len(stops)
+                stops.append(p)
+
+    lines = raw["lineas"]
+    line_row = {l["idLinea"]: i for i, l in enumerate(lines)}
+    nuc_lines = {"lineStart": [0], "nucleoLines": []}
+    for n in nucleos:
+        rows = sorted({line_row[l["idLinea"]] for l in raw["nucleoLines"].get(n["idNucleo"], [])
+                       if l["idLinea"] in line_row})
+        nuc_lines["nucleoLines"].extend(rows)
+        nuc_lines["lineStart"].append(len(nuc_lines["nucleoLines"]))
+    freqs = raw["frecuencias"]
+    freq_row = {f["idFreq"]: i for i, f in enumerate(freqs)}
+
+    patterns = {"line": [], "sentido": [], "stopStart": [0], "patternStops": []}
+    pattern_of = {}
+    for li, l in enumerate(lines):
+        by_dir = {}
+        for p in raw["lineStops"].get(l["idLinea"], []):
+            if p["idParada"] in stop_row:
+                by_dir.setdefault(str(p.get("sentido", "1")), []).append(p)
+        for sentido in sorted(by_dir):
+            seq = sorted(by_dir[sentido], key=lambda p: int(p.get("orden") or 0))
+            pattern_of[(l["idLinea"], sentido)] = (len(patterns["line"]), seq)
+            patterns["line"].append(li)
+            patterns["sentido"].append(int(sentido))
+            patterns["patternStops"].extend(stop_row[p["idParada"]] for p in seq)
+            patterns["stopStart"].append(len(patterns["patternStops"]))
+
+    tt = {"pattern": [], "freq": [], "trips": [], "timeStart": [0], "times": []}
+    for (line_id, freq_id), data in sorted(raw["horarios"].items(),
+                                           key=lambda kv: (int(kv[0][0]), int(kv[0][1]))):
+        plan = data["planificadores"][0]
+        for sentido, suffix in (("1", "Ida"), ("2", "Vuelta")):
+            if (line_id, sentido) not in pattern_of:
+                continue
+            pi, seq = pattern_of[(line_id, sentido)]
+            names = [normalize(p.get("nombre")) for p in seq]
+            cols = match_columns(plan.get("bloques" + suffix) or [], names)
+            rows = [trip_times(h.get("horas", []), cols, len(seq))
+                    for h in plan.get("horario" + suffix) or []]
+            rows = [r for r in rows if any(t != NO_TIME for t in r)]
+            if not rows:
+                continue
+            rows.sort(key=lambda r: next(t for t in r if t != NO_TIME))
+            tt["pattern"].append(pi)
+            tt["freq"].append(freq_row[freq_id])
+            tt["trips"].append(len(rows))
+            for r in rows:
+                tt["times"].extend(r)
+            tt["timeStart"].append(len(tt["times"]))
+
+    meta = raw.get("lineMeta", {})
+    snap = {
+        "schema": SCHEMA,
+        "consorcio": str(c),
+        "counts": {"stops": len(stops), "lines": len(lines), "nucleos": len(nucleos),
+                   "patterns": len(patterns["line"]), "timetables": len(tt["pattern"]),
+                   "trips": sum(tt["trips"])},
+        "nucleos": {
+            "id": pack("i", [int(n["idNucleo"]) for n in nucleos]),
+            "nameStr": pack("H", [S(n.get("nombre")) for n in nucleos]),
+            "zoneStr": pack("H", [S(n.get("idZona")) for n in nucleos]),
+            "municipio": pack("i", [int(n.get("idMunicipio") or 0) for n in nucleos]),
+            "lineStart": pack("I", nuc_lines["lineStart"]),
+            "nucleoLines": pack("H", nuc_lines["nucleoLines"]),
+        },
+        "stops": {
+            "id": pack("i", [int(p["idParada"]) for p in stops]),
+            "nameStr": pack("H", [S(p.get("nombre")) for p in stops]),
+            "zoneStr": pack("H", [S(p.get("idZona")) for p in stops]),
+            "municipioStr": pack("H", [S(p.get("municipio")) for p in stops]),
+            "nucleoNameStr": pack("H", [S(p.get("nucleo")) for p in stops]),
+            "nucleoId": pack("i", [int(p.get("idNucleo") or 0) for p in stops]),
+            "lat": pack("f", [parse_coord(p.get("latitud")) for p in stops]),
+            "lng": pack("f", [parse_coord(p.get("longitud")) for p in stops]),
+        },
+        "lines": {
+            "id": pack("i", [int(l["idLinea"]) for l in lines]),
+            "codeStr": pack("H", [S(l.get("codigo")) for l in lines]),
+            "nameStr": pack("H", [S(l.get("nombre")) for l in lines]),
+            "modoStr": pack("H", [S((meta.get(l["idLinea"]) or l).get("modo")) for l in lines]),
+            "operadoresStr": pack("H", [S((meta.get(l["idLinea"]) or l).get("operadores")) for l in lines]),
+            "noticias": pack("B", [1 if (meta.get(l["idLinea"]) or {}).get("hayNoticias") else 0 for l in lines]),
+        },
+        "patterns": {
+            "line": pack("H", patterns["line"]),
+            "sentido": pack("B", patterns["sentido"]),
+            "stopStart": pack("I", patterns["stopStart"]),
+            "patternStops": pack("H", patterns["patternStops"]),
+        },
+        "freqs": {
+            "id": pack("i", [int(f["idFreq"]) for f in freqs]),
+            "codeStr": pack("H", [S(f.get("codigo")) for f in freqs]),
+            "nameStr": pack("H", [S(f.get("nombre")) for f in freqs]),
+        },
+        "timetables": {
+            "pattern": pack("H", tt["pattern"]),
+            "freq": pack("H", tt["freq"]),
+            "trips": pack("H", tt["trips"]),
+            "timeStart": pack("I", tt["timeStart"]),
+            "times": pack("h", tt["times"]),
+        },
+    }
+    if len(S.table) > 0xFFFF:
+        raise ValueError(f"Consortium {c}: {len(S.table)} strings overflow Uint16 indices")
+    snap["strings"] = S.table
+    return snap
+
+
+def serialize(snap):
+    return json.dumps(snap, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def manifest_entry(snap, body):
+    digest = hashlib.sha256(body).hexdigest()
+    return {"file": f"snapshot-{snap['consorcio']}.{digest[:12]}.json",
+            "hash": digest, "bytes": len(body), **snap["counts"]}
+
+
+def write(snaps, out_dir=OUT_DIR):
+    """Write content-addressed snapshot files plus manifest.json; prune stale files."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    manifest = {"schema": SCHEMA, "snapshots": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest["snapshots"] = json.load(f).get("snapshots", {})
+
+    for snap in snaps:
+        body = serialize(snap)
+        entry = manifest_entry(snap, body)
+        with open(os.path.join(out_dir, entry["file"]), "wb") as f:
+            f.write(body)
+        manifest["snapshots"][snap["consorcio"]] = entry
+
+    manifest["built"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    keep = {s["file"] for s in manifest["snapshots"].values()}
+    for fn in os.listdir(out_dir):
+        if fn.startswith("snapshot-") and fn not in keep:
+            os.remove(os.path.join(out_dir, fn))
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build per-consortium network snapshots")
+    ap.add_argument("consorcios", nargs="*", help="consortium ids (default: all with --all)")
+    ap.add_argument("--all", action="store_true", help="every consortium in /consorcios")
+    ap.add_argument("--api", default=LIVE_API, help="API base to crawl")
+    ap.add_argument("--fixtures", action="store_true", help="read tests/fixtures/ctan instead of the API")
+    ap.add_argument("--out", default=OUT_DIR)
+    args = ap.parse_args()
+
+    source = FixtureSource() if args.fixtures else HttpSource(args.api)
+    ids = args.consorcios
+    if args.all:
+        ids = [c["idConsorcio"] for c in (source.get("consorcios") or {}).get("consorcios", [])]
+    if not ids:
+        ap.error("give consortium ids or --all")
+
+    snaps = []
+    for c in ids:
+        raw = crawl(source, c)
+        if not raw["paradas"]:
+            print(f"  {c}: no stops — skipped", file=sys.stderr)
+            continue
+        snaps.append(build(c, raw))
+        print(f"  {c}: {snaps[-1]['counts']}")
+    manifest = write(snaps, args.out)
+    for c, s in sorted(manifest["snapshots"].items()):
+        print(f"  {s['file']}  {s['bytes'] / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
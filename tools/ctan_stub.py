@@ -0,0 +1,403 @@
+"""
+CTAN API stand-in — replays recorded responses from tests/fixtures/ctan.
+-------------------------------------------------------------------------
+Serves every endpoint in docs/api.md from a versioned fixture store so the
+test suites (and local development) can run without api.ctan.es. Latency,
+jitter and error injection make it possible to measure the app's request
+fan-out under realistic network conditions.
+
+Usage:
+    python3 -m tools.ctan_stub                         # serve on :8788
+    python3 -m tools.ctan_stub --latency 120 --jitter 40
+    python3 -m tools.ctan_stub --error-rate 0.05 --error-status 503
+    python3 -m tools.ctan_stub --fail-pattern 'horarios_origen_destino'
+    python3 -m tools.ctan_stub --record --upstream https://api.ctan.es/v1/Consorcios
+
+Point a page at it with the apiBase cookie (see src/js/api.js):
+    document.cookie = 'apiBase=http://localhost:8788/v1/Consorcios;path=/'
+
+Network snapshots (tools/build_snapshot.py), line frequency indexes
+(tools/freq_index.py) and transfer indexes (tools/transfer_index.py) are
+built from the same fixtures on first request and served under /data/ —
+point pages at them with the dataBase cookie, as conftest.py does.
+
+Control endpoints (JSON):
+    GET  /__stub__/stats    per-endpoint request counts, bytes served, peak concurrent requests
+    POST /__stub__/reset    clear the stats
+    POST /__stub__/config   update latency / jitter / error_rate / error_status / fail_pattern
+"""
+
+import argparse, json, os, random, re, threading, time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode, unquote
+from urllib.request import urlopen
+
+# ── Paths ──────────────────────────────────────────────────────────────────────
+ROOT         = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, "tests", "fixtures", "ctan")
+PREFIX       = "/v1/Consorcios/"
+DEFAULT_PORT = 8788
+
+# Query parameters that only pin the response to a date; the recorded
+# fixture is keyed without them so one recording serves every day.
+VOLATILE_PARAMS = {"dia", "mes", "horaIni"}
+
+# servicios responses are windowed like upstream: one hour per call.
+SERVICE_WINDOW_MINS = 60
+
+NOT_FOUND = {"error": "No se encuentran los datos"}
+
+
+# ── Fixture store ──────────────────────────────────────────────────────────────
+def load_manifest(fixtures_dir=FIXTURES_DIR):
+    with open(os.path.join(fixtures_dir, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fixture_key(path, query):
+    """
+    Map an API path + query to a fixture file path relative to the version dir.
+
+        4/paradas/149                          → 4/paradas/149.json
+        4/horarios_origen_destino?idNucleo…    → 4/horarios_origen_destino/idNucleoDestino=83&idNucleoOrigen=201.json
+    """
+    path = unquote(path).strip("/")
+    params = sorted((k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+                    if k not in VOLATILE_PARAMS)
+    if not params:
+        return f"{path}.json"
+    return f"{path}/{urlencode(params, safe=',')}.json"
+
+
+class FixtureStore:
+    def __init__(self, fixtures_dir=FIXTURES_DIR, version=None):
+        self.fixtures_dir = fixtures_dir
+        self.manifest = load_manifest(fixtures_dir)
+        self.version = version or self.manifest["current"]
+        self.base = os.path.join(fixtures_dir, self.version)
+        self._cache = {}
+        self._snapshots = None
+        self._lock = threading.Lock()
+
+    def _read(self, rel):
+        with self._lock:
+            if rel in self._cache:
+                return self._cache[rel]
+        full = os.path.join(self.base, rel)
+        if not os.path.isfile(full):
+            return None
+        with open(full, "rb") as f:
+            body = f.read()
+        with self._lock:
+            self._cache[rel] = body
+        return body
+
+    def lookup(self, path, query):
+        """Return (status, body bytes) for an API request."""
+        m = re.fullmatch(r"(\d+)/paradas/(\d+)/servicios/?", path.strip("/"))
+        if m:
+            return self._servicios(m.group(1), m.group(2), query)
+        body = self._read(fixture_key(path, query))
+        if body is None:
+            return 404, _dump(NOT_FOUND)
+        return 200, body
+
+    def snapshot_files(self):
+        """
+        {filename: bytes} for data/manifest.json + one snapshot, one line
+        frequency index (tools/freq_index.py) and one transfer index
+        (tools/transfer_index.py) per recorded consortium.
+        """
+        if self._snapshots is not None:
+            return self._snapshots
+        from tools.build_snapshot import SCHEMA, FixtureSource, crawl, build, serialize, manifest_entry
+        from tools import freq_index, transfer_index
+        source = FixtureSource(self)
+        files, entries = {}, {}
+        for c in self.manifest["versions"][self.version].get("consorcios", []):
+            index = freq_index.build(c, freq_index.crawl(source, c, workers=1))
+            files[f"freqs-{c}.json"] = freq_index.serialize(index)
+            transfers = transfer_index.build(c, transfer_index.crawl(source, c, workers=1))
+            files[f"transfers-{c}.json"] = transfer_index.serialize(transfers)
+            snap = build(c, crawl(source, c, workers=1))
+            body = serialize(snap)
+            entry = manifest_entry(snap, body)
+            files[entry["file"]] = body
+            entries[c] = entry
+        # Built now, like tools/build_snapshot.write(): pages reject old snapshots
+        files["manifest.json"] = _dump({"schema": SCHEMA,
+                                        "built": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                                        "snapshots": entries})
+        self._snapshots = files
+        return files
+
+    def save(self, path, query, body):
+        full = os.path.join(self.base, fixture_key(path, query))
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        data = json.loads(body)
+        with open(full, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            f.write("\n")
+        with self._lock:
+            self._cache.pop(fixture_key(path, query), None)
+
+    # ── servicios ──────────────────────────────────────────────────────────────
+    def _servicios(self, consorcio, stop_id, query):
+        """
+        Departures are recorded as one full-day schedule per stop and sliced
+        into windows here, so the app's window-walking logic sees the same
+        shape as upstream: services in [horaIni, horaFin] plus horaFin, and
+        the next window starts the minute after horaFin (advanceCursor()).
+        """
+        if self._read(f"{consorcio}/paradas/{stop_id}.json") is None:
+            return 404, _dump(NOT_FOUND)
+        start = parse_hora_ini(dict(parse_qsl(query)).get("horaIni", ""))
+        end = start + timedelta(minutes=SERVICE_WINDOW_MINS)
+        day = self._read(f"{consorcio}/paradas/{stop_id}/servicios.json")
+        services = json.loads(day)["servicios"] if day else []
+
+        lo = start.hour * 60 + start.minute
+        hi = lo + SERVICE_WINDOW_MINS if end.date() == start.date() else 24 * 60
+        window = [s for s in services if lo <= _mins(s["servicio"]) < hi]
+        last = end - timedelta(minutes=1)
+        return 200, _dump({"servicios": window, "horaFin": last.strftime("%Y-%m-%d %H:%M:%S")})
+
+
+def parse_hora_ini(value):
+    """'DD-MM-YYYY HH:MM' (the '+' arrives decoded as a space) → datetime."""
+    try:
+        return datetime.strptime(value.strip(), "%d-%m-%Y %H:%M")
+    except ValueError:
+        return datetime.now().replace(second=0, microsecond=0)
+
+
+def _mins(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+def _dump(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ── Fault injection + stats ────────────────────────────────────────────────────
+class StubConfig:
+    FIELDS = ("latency", "jitter", "error_rate", "error_status", "fail_pattern")
+
+    def __init__(self, latency=0, jitter=0, error_rate=0.0, error_status=503,
+                 fail_pattern=None, seed=None):
+        self.latency = latency          # ms added to every API response
+        self.jitter = jitter            # ± ms, uniform
+        self.error_rate = error_rate    # 0..1 probability of an injected error
+        self.error_status = error_status
+        self.fail_pattern = fail_pattern  # regex; matching paths always fail
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def update(self, values):
+        with self.lock:
+            for k in self.FIELDS:
+                if k in values:
+                    setattr(self, k, values[k])
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def delay_secs(self):
+        with self.lock:
+            ms = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        return max(0, ms) / 1000
+
+    def should_fail(self, path):
+        with self.lock:
+            if self.fail_pattern and re.search(self.fail_pattern, path):
+                return True
+            return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+
+def endpoint_name(path):
+    """Collapse ids so stats group by endpoint: 4/paradas/149/servicios → paradas/:id/servicios."""
+    parts = path.strip("/").split("/")
+    if parts[0].isdigit():
+        parts = parts[1:]   # drop the consortium id
+    return "/".join(":id" if p.isdigit() else p for p in parts) or "consorcios"
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints, self.total, self.errors, self.bytes = {}, 0, 0, 0
+        self.inflight, self.peak_inflight = 0, 0   # concurrent API requests being served
+
+    def reset(self):
+        with self.lock:
+            self.endpoints, self.total, self.errors, self.bytes = {}, 0, 0, 0
+            self.peak_inflight = self.inflight
+
+    def begin(self):
+        with self.lock:
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+
+    def end(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def record(self, path, status, size):
+        name = endpoint_name(path)
+        with self.lock:
+            e = self.endpoints.setdefault(name, {"count": 0, "errors": 0, "bytes": 0})
+            e["count"] += 1
+            e["bytes"] += size
+            self.total += 1
+            self.bytes += size
+            if status >= 400:
+                e["errors"] += 1
+                self.errors += 1
+
+    def as_dict(self):
+        with self.lock:
+            return {"total": self.total, "errors": self.errors, "bytes": self.bytes,
+                    "peak_inflight": self.peak_inflight,
+                    "endpoints": json.loads(json.dumps(self.endpoints))}
+
+
+# ── HTTP handler ───────────────────────────────────────────────────────────────
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store = None      # FixtureStore
+    config = None     # StubConfig
+    stats = None      # Stats
+    upstream = None   # base URL when recording
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, status, body, extra_headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "ETag, X-Stub-Version")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("X-Stub-Version", self.store.version)
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, If-None-Match")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if url.path == "/__stub__/config":
+            self.config.update(payload)
+            return self._send(200, _dump(self.config.as_dict()))
+        if url.path == "/__stub__/reset":
+            self.stats.reset()
+            return self._send(200, _dump({"ok": True}))
+        self._send(404, _dump(NOT_FOUND))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/__stub__/stats":
+            return self._send(200, _dump(self.stats.as_dict()))
+        if url.path == "/__stub__/config":
+            return self._send(200, _dump(self.config.as_dict()))
+        if url.path.startswith("/data/"):
+            body = self.store.snapshot_files().get(url.path[len("/data/"):])
+            return self._send(200, body) if body else self._send(404, _dump(NOT_FOUND))
+        if not url.path.startswith(PREFIX):
+            return self._send(404, _dump(NOT_FOUND))
+
+        api_path = url.path[len(PREFIX):]
+        self.stats.begin()
+        try:
+            time.sleep(self.config.delay_secs())
+            if self.config.should_fail(api_path):
+                status = int(self.config.error_status)
+                body = _dump({"error": "Injected failure"})
+            elif self.upstream:
+                status, body = self._record(api_path, url.query)
+            else:
+                status, body = self.store.lookup(api_path, url.query)
+        finally:
+            self.stats.end()
+
+        self.stats.record(api_path, status, len(body))
+        self._send(status, body)
+
+    do_HEAD = do_GET
+
+    def _record(self, api_path, query):
+        target = self.upstream.rstrip("/") + "/" + api_path + (f"?{query}" if query else "")
+        try:
+            with urlopen(target, timeout=20) as r:
+                body = r.read()
+        except Exception as e:
+            return 502, _dump({"error": f"Upstream failed: {e}"})
+        if not re.search(r"/servicios/?$", api_path):
+            self.store.save(api_path, query, body)
+        return 200, body
+
+
+# ── Server lifecycle ───────────────────────────────────────────────────────────
+def make_server(port=DEFAULT_PORT, host="", version=None, upstream=None, **config):
+    handler = type("BoundStubHandler", (StubHandler,), {
+        "store": FixtureStore(version=version),
+        "config": StubConfig(**config),
+        "stats": Stats(),
+        "upstream": upstream,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_in_thread(port=DEFAULT_PORT, **kwargs):
+    server = make_server(port, **kwargs)
+    server.daemon_threads = True
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay server for the CTAN API")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--version", help="fixture version (default: manifest 'current')")
+    ap.add_argument("--latency", type=float, default=0, help="ms added to every response")
+    ap.add_argument("--jitter", type=float, default=0, help="± ms of uniform jitter")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="probability 0..1 of an injected error")
+    ap.add_argument("--error-status", type=int, default=503)
+    ap.add_argument("--fail-pattern", help="regex; matching API paths always fail")
+    ap.add_argument("--seed", type=int, help="RNG seed for reproducible jitter/errors")
+    ap.add_argument("--record", action="store_true", help="proxy to --upstream and save responses")
+    ap.add_argument("--upstream", default="https://api.ctan.es/v1/Consorcios")
+    args = ap.parse_args()
+
+    server = make_server(
+        args.port, version=args.version,
+        upstream=args.upstream if args.record else None,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        error_status=args.error_status, fail_pattern=args.fail_pattern, seed=args.seed,
+    )
+    mode = f"recording from {args.upstream}" if args.record else "replaying"
+    print(f"CTAN stub {mode} fixtures {server.RequestHandlerClass.store.version} "
+          f"on http://localhost:{args.port}{PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
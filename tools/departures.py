@@ -0,0 +1,276 @@
+"""
+Departures aggregator — one request per stop board instead of a window walk.
+----------------------------------------------------------------------------
+station.js walks paradas/{id}/servicios?horaIni= one window at a time until
+23:59. This service does that walk server-side: it learns the upstream window
+size from the first call, fetches the rest of the day concurrently, fills any
+gaps, dedups on idLinea|servicio and answers with the whole board at once.
+Responses carry a strong ETag, so a client refreshing an unchanged board gets
+a 304 and no body.
+
+Usage:
+    python3 -m tools.departures                                        # :8789 → api.ctan.es
+    python3 -m tools.departures --upstream http://localhost:8788/v1/Consorcios   # → tools/ctan_stub.py
+
+Point station.html at it with the departuresBase cookie (see src/js/api.js):
+    document.cookie = 'departuresBase=http://localhost:8789;path=/'
+
+Endpoints (JSON):
+    GET /departures/{consorcio}/{idParada}?horaIni=DD-MM-YYYY+HH:MM
+        → {"servicios": [...], "horaFin": "YYYY-MM-DD 23:59:00"}
+    GET /__departures__/stats   requests, 304s, upstream calls and window cache hits
+"""
+
+import argparse, hashlib, json, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import urlsplit, parse_qsl
+from urllib.request import urlopen
+
+UPSTREAM     = "https://api.ctan.es/v1/Consorcios"
+DEFAULT_PORT = 8789
+WORKERS      = 8
+
+# Upstream windows are shared between clients for this long, so a station
+# display and a phone on the same stop cost one walk between them.
+WINDOW_TTL = 20
+
+# Same step as advanceCursor() in station.js when upstream sends no horaFin.
+FALLBACK_WINDOW_MINS = 15
+
+NOT_FOUND = {"error": "No se encuentran los datos"}
+
+
+class UpstreamError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ── Time helpers ───────────────────────────────────────────────────────────────
+def parse_hora_ini(value):
+    """'DD-MM-YYYY HH:MM' (the '+' arrives decoded as a space) → datetime."""
+    try:
+        return datetime.strptime(value.strip(), "%d-%m-%Y %H:%M")
+    except ValueError:
+        return datetime.now().replace(second=0, microsecond=0)
+
+
+def format_hora_ini(dt):
+    return dt.strftime("%d-%m-%Y+%H:%M")
+
+
+def next_start(start, window):
+    """Where the next window begins — the minute after horaFin, like advanceCursor()."""
+    try:
+        return datetime.strptime(window["horaFin"], "%Y-%m-%d %H:%M:%S") + timedelta(minutes=1)
+    except (KeyError, TypeError, ValueError):
+        return start + timedelta(minutes=FALLBACK_WINDOW_MINS)
+
+
+# ── Upstream ───────────────────────────────────────────────────────────────────
+class Upstream:
+    """servicios windows from the CTAN API, memoised for WINDOW_TTL seconds."""
+
+    def __init__(self, base=UPSTREAM, ttl=WINDOW_TTL):
+        self.base = base.rstrip("/")
+        self.ttl = ttl
+        self.calls = 0
+        self.hits = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def window(self, consorcio, stop, start):
+        key = (consorcio, stop, start)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and time.monotonic() - hit[0] < self.ttl:
+                self.hits += 1
+                return hit[1]
+            self.calls += 1
+
+        url = f"{self.base}/{consorcio}/paradas/{stop}/servicios?horaIni={format_hora_ini(start)}"
+        try:
+            with urlopen(url, timeout=20) as r:
+                data = json.load(r)
+        except HTTPError as e:
+            raise UpstreamError(e.code, f"Upstream {e.code} for {url}")
+        except Exception as e:
+            raise UpstreamError(502, f"Upstream failed: {e}")
+
+        # horaIni moves on every minute, so expired windows are never asked for again
+        with self._lock:
+            now = time.monotonic()
+            for old in [k for k, (at, _) in self._cache.items() if now - at >= self.ttl]:
+                del self._cache[old]
+            self._cache[key] = (now, data)
+        return data
+
+    def reset(self):
+        with self._lock:
+            self._cache.clear()
+            self.calls = self.hits = 0
+
+
+# ── Aggregation ────────────────────────────────────────────────────────────────
+def collect(upstream, consorcio, stop, start, workers=WORKERS):
+    """
+    Every window from `start` to 23:59, fetched concurrently.
+
+    The first window is fetched alone to learn the upstream stride; the rest
+    are requested in one batch at that stride. A window that comes back shorter
+    than the stride leaves a gap, which is walked in the next batch.
+    """
+    end = start.replace(hour=23, minute=59, second=0, microsecond=0)
+    windows = {start: upstream.window(consorcio, stop, start)}
+    step = max(next_start(start, windows[start]) - start, timedelta(minutes=1))
+
+    pending = []
+    t = start + step
+    while t <= end:
+        pending.append(t)
+        t += step
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending:
+            windows.update(zip(pending, pool.map(lambda s: upstream.window(consorcio, stop, s), pending)))
+            starts = sorted(windows)
+            pending = []
+            for s, following in zip(starts, starts[1:] + [None]):
+                n = next_start(s, windows[s])
+                if s < n <= end and n not in windows and (following is None or n < following):
+                    pending.append(n)
+    return windows
+
+
+def merge(windows):
+    """Dedup on idLinea|servicio and sort by departure time."""
+    seen, services = set(), []
+    for s in sorted(windows):
+        for svc in windows[s].get("servicios") or []:
+            key = f"{svc.get('idLinea')}|{svc.get('servicio')}"
+            if key not in seen:
+                seen.add(key)
+                services.append(svc)
+    services.sort(key=lambda svc: svc.get("servicio") or "")
+    return services
+
+
+def board(upstream, consorcio, stop, start, workers=WORKERS):
+    """(body bytes, etag) for the rest of the day at a stop."""
+    services = merge(collect(upstream, consorcio, stop, start, workers))
+    body = _dump({"servicios": services, "horaFin": start.strftime("%Y-%m-%d 23:59:00")})
+    return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _dump(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ── HTTP handler ───────────────────────────────────────────────────────────────
+class DeparturesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    upstream = None   # Upstream
+    workers = WORKERS
+    stats = None      # {"requests": n, "not_modified": n}
+    stats_lock = None
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, status, body=b"", extra_headers=None):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+        self.send_header("Cache-Control", "no-cache")
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "If-None-Match")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/__departures__/stats":
+            with self.stats_lock:
+                stats = dict(self.stats, upstream_calls=self.upstream.calls, window_hits=self.upstream.hits)
+            return self._send(200, _dump(stats))
+
+        m = re.fullmatch(r"/departures/(\d+)/(\d+)/?", url.path)
+        if not m:
+            return self._send(404, _dump(NOT_FOUND))
+        with self.stats_lock:
+            self.stats["requests"] += 1
+
+        start = parse_hora_ini(dict(parse_qsl(url.query)).get("horaIni", ""))
+        try:
+            body, etag = board(self.upstream, m.group(1), m.group(2), start, self.workers)
+        except UpstreamError as e:
+            return self._send(e.status, _dump({"error": str(e)}))
+
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            with self.stats_lock:
+                self.stats["not_modified"] += 1
+            return self._send(304, extra_headers={"ETag": etag})
+        self._send(200, body, {"ETag": etag})
+
+    do_HEAD = do_GET
+
+
+# ── Server lifecycle ───────────────────────────────────────────────────────────
+def make_server(port=DEFAULT_PORT, host="", upstream=UPSTREAM, workers=WORKERS, ttl=WINDOW_TTL):
+    handler = type("BoundDeparturesHandler", (DeparturesHandler,), {
+        "upstream": Upstream(upstream, ttl),
+        "workers": workers,
+        "stats": {"requests": 0, "not_modified": 0},
+        "stats_lock": threading.Lock(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_in_thread(port=DEFAULT_PORT, **kwargs):
+    server = make_server(port, **kwargs)
+    server.daemon_threads = True
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Full-day departures aggregator for station.html")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--upstream", default=UPSTREAM, help="CTAN API base (or the stub's)")
+    ap.add_argument("--workers", type=int, default=WORKERS, help="concurrent upstream windows")
+    ap.add_argument("--ttl", type=float, default=WINDOW_TTL, help="seconds to reuse an upstream window")
+    args = ap.parse_args()
+
+    server = make_server(args.port, upstream=args.upstream, workers=args.workers, ttl=args.ttl)
+    print(f"Departures aggregator for {args.upstream} on http://localhost:{args.port}/departures/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Line frequency index — which frequencies each line runs on, per consortium.
+---------------------------------------------------------------------------
+timetable.js and linetimetable.js used to find a line's frequencies by probing
+horarios_lineas once per global /frecuencias entry before the first grid could
+paint. This crawler does that probe offline for every line and writes a small
+index the pages read first; they only fall back to probing when the index is
+missing, stale, or doesn't list the line.
+
+Usage:
+    python3 -m tools.freq_index 4                       # crawl api.ctan.es → data/
+    python3 -m tools.freq_index --all
+    python3 -m tools.freq_index 4 --fixtures            # from tests/fixtures/ctan
+    python3 -m tools.freq_index 4 --api http://localhost:8788/v1/Consorcios --out /tmp/data
+
+Output (data/freqs-<c>.json):
+    {"schema": 1, "consorcio": "4", "built": "2026-02-16T04:00:00Z",
+     "lineas": {"3": [{"idfrecuencia": "1", "acronimo": "L-V", "nombre": "…"}, …]}}
+
+Lines with no timetable under any frequency are left out. Labels come from the
+horarios_lineas response, or /frecuencias when the response has none — the
+same rule the pages apply to their own probes.
+"""
+
+import argparse, json, os, sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from tools.build_snapshot import LIVE_API, OUT_DIR, HttpSource, FixtureSource
+
+SCHEMA = 1
+
+
+# ── Crawl ──────────────────────────────────────────────────────────────────────
+def crawl(source, c, day=None, workers=8):
+    """{idLinea: [freq, …]} for every line with a timetable on `day` (default today)."""
+    day = day or datetime.now()
+    get = source.get
+    lines = (get(f"{c}/lineas") or {}).get("lineas", [])
+    freqs = (get(f"{c}/frecuencias") or {}).get("frecuencias", [])
+
+    jobs = [(l["idLinea"], f) for l in lines for f in freqs]
+    with ThreadPoolExecutor(workers) as pool:
+        found = pool.map(lambda j: get(f"{c}/horarios_lineas?idLinea={j[0]}&idFrecuencia={j[1]['idFreq']}"
+                                       f"&dia={day.day}&mes={day.month}"), jobs)
+
+        index = {}
+        for (line_id, gf), d in zip(jobs, found):
+            if not d or not d.get("planificadores"):
+                continue
+            listed = index.setdefault(line_id, [])
+            seen = {f["idfrecuencia"] for f in listed}
+            labels = d.get("frecuencias") or [{"idfrecuencia": gf["idFreq"], "acronimo": gf.get("codigo"),
+                                               "nombre": gf.get("nombre")}]
+            for f in labels:
+                if f["idfrecuencia"] not in seen:
+                    seen.add(f["idfrecuencia"])
+                    listed.append({"idfrecuencia": f["idfrecuencia"], "acronimo": f.get("acronimo"),
+                                   "nombre": f.get("nombre")})
+    return index
+
+
+def build(c, index, built=None):
+    built = built or datetime.now(timezone.utc)
+    return {"schema": SCHEMA, "consorcio": str(c), "built": built.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "lineas": index}
+
+
+def serialize(doc):
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def write(docs, out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    for doc in docs:
+        with open(os.path.join(out_dir, f"freqs-{doc['consorcio']}.json"), "wb") as f:
+            f.write(serialize(doc))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build per-consortium line frequency indexes")
+    ap.add_argument("consorcios", nargs="*", help="consortium ids (default: all with --all)")
+    ap.add_argument("--all", action="store_true", help="every consortium in /consorcios")
+    ap.add_argument("--api", default=LIVE_API, help="API base to crawl")
+    ap.add_argument("--fixtures", action="store_true", help="read tests/fixtures/ctan instead of the API")
+    ap.add_argument("--out", default=OUT_DIR)
+    args = ap.parse_args()
+
+    source = FixtureSource() if args.fixtures else HttpSource(args.api)
+    ids = args.consorcios
+    if args.all:
+        ids = [c["idConsorcio"] for c in (source.get("consorcios") or {}).get("consorcios", [])]
+    if not ids:
+        ap.error("give consortium ids or --all")
+
+    docs = []
+    for c in ids:
+        index = crawl(source, c)
+        if not index:
+            print(f"  {c}: no timetables — skipped", file=sys.stderr)
+            continue
+        docs.append(build(c, index))
+        print(f"  {c}: {len(index)} lines")
+    write(docs, args.out)
+
+
+if __name__ == "__main__":
+    main()
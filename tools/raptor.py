@@ -0,0 +1,359 @@
+"""
+RAPTOR reference router — Python twin of src/js/raptor.js.
+-----------------------------------------------------------
+Same algorithm, same network projection (line patterns collapsed to towns),
+same walking transfers, same tie-breaking, so the two can be checked against
+one corpus (tests/fixtures/raptor/cases.json).
+
+Usage:
+    python3 -m tools.raptor 201 1 --date 2026-02-16 --at 06:00      # Coín → Málaga
+    python3 -m tools.raptor 111 202 --date 2026-02-21 --max-transfers 3
+    python3 -m tools.raptor --corpus tests/fixtures/raptor/cases.json  # regenerate expectations
+
+Reads the Málaga fixture snapshot by default (--consorcio to change).
+"""
+
+import argparse, json, math, re, sys, unicodedata
+from datetime import date
+
+from tools.build_snapshot import FixtureSource, crawl, build, unpack
+from tools.schedule import DAY_SAT, DAY_SUN, DAYS_WEEKDAYS, freq_day_mask
+from tools.service_calendar import runs_on
+
+INF = 0x7FFF
+MAX_TRANSFERS = 2
+MIN_TRANSFER = 10
+WALK_M = 400
+WALK_M_PER_MIN = 80
+EARTH_RADIUS_M = 6371008.8
+
+
+# ── Snapshot decoding ──────────────────────────────────────────────────────────
+class Snapshot:
+    """The columns raptor needs, decoded from a build_snapshot dict."""
+
+    def __init__(self, raw):
+        self.strings = raw["strings"]
+        st, nu, pt, fq, tt, ln = (raw[k] for k in ("stops", "nucleos", "patterns", "freqs", "timetables", "lines"))
+        self.stop_ids = unpack("i", st["id"])
+        self.stop_nucleo_id = unpack("i", st["nucleoId"])
+        self.stop_nucleo_name = [self.strings[i] for i in unpack("H", st["nucleoNameStr"])]
+        self.stop_lat = unpack("f", st["lat"])
+        self.stop_lng = unpack("f", st["lng"])
+        self.nucleo_ids = unpack("i", nu["id"])
+        self.nucleo_names = [self.strings[i] for i in unpack("H", nu["nameStr"])]
+        self.line_ids = unpack("i", ln["id"])
+        self.line_codes = [self.strings[i] for i in unpack("H", ln["codeStr"])]
+        self.pattern_line = unpack("H", pt["line"])
+        self.pattern_start = unpack("I", pt["stopStart"])
+        self.pattern_stops = unpack("H", pt["patternStops"])
+        self.freq_codes = [self.strings[i] for i in unpack("H", fq["codeStr"])]
+        self.freq_names = [self.strings[i] for i in unpack("H", fq["nameStr"])]
+        self.tt_pattern = unpack("H", tt["pattern"])
+        self.tt_freq = unpack("H", tt["freq"])
+        self.tt_trips = unpack("H", tt["trips"])
+        self.tt_start = unpack("I", tt["timeStart"])
+        self.tt_times = unpack("h", tt["times"])
+
+    def stops_of(self, p):
+        return self.pattern_stops[self.pattern_start[p]:self.pattern_start[p + 1]]
+
+    def nucleo_row(self, id_nucleo):
+        return self.nucleo_ids.index(int(id_nucleo))
+
+
+def load_fixture_snapshot(consorcio="4"):
+    return Snapshot(build(consorcio, crawl(FixtureSource(), consorcio, workers=1)))
+
+
+# ── Calendar ───────────────────────────────────────────────────────────────────
+def freq_runs(name, is_weekday, is_sat, is_sun):
+    days = (DAYS_WEEKDAYS if is_weekday else 0) | (DAY_SAT if is_sat else 0) | (DAY_SUN if is_sun else 0)
+    return bool(freq_day_mask(name) & days)
+
+
+def active_freq_rows(snap, day):
+    return {i for i, n in enumerate(snap.freq_names) if runs_on(freq_day_mask(n), day)}
+
+
+# ── Network ────────────────────────────────────────────────────────────────────
+def _normalize(s):
+    s = unicodedata.normalize("NFD", s or "")
+    return re.sub(r"[\u0300-\u036f]", "", s).lower().strip()
+
+
+def stop_nucleo_rows(snap):
+    by_name = {_normalize(n): i for i, n in enumerate(snap.nucleo_names)}
+    by_id = {n: i for i, n in enumerate(snap.nucleo_ids)}
+    return [by_name.get(_normalize(name), by_id.get(nid, -1))
+            for name, nid in zip(snap.stop_nucleo_name, snap.stop_nucleo_id)]
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    rad = math.pi / 180
+    d_lat, d_lng = (lat2 - lat1) * rad, (lng2 - lng1) * rad
+    h = math.sin(d_lat / 2) ** 2 + math.cos(lat1 * rad) * math.cos(lat2 * rad) * math.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1, h)))
+
+
+def walks(snap, stop_nuc, walk_m=WALK_M):
+    """Per town, [(town, minutes)] to towns with a stop within walk_m metres, quickest first."""
+    stops = sorted((snap.stop_lat[si], snap.stop_lng[si], n) for si, n in enumerate(stop_nuc)
+                   if n >= 0 and math.isfinite(snap.stop_lat[si]) and math.isfinite(snap.stop_lng[si]))
+    d_lat = walk_m / (EARTH_RADIUS_M * math.pi / 180)
+    found = [{} for _ in snap.nucleo_ids]
+    for a, (lat, lng, frm) in enumerate(stops):
+        for lat2, lng2, to in stops[a + 1:]:
+            if lat2 - lat > d_lat:
+                break
+            if to == frm:
+                continue
+            m = haversine_m(lat, lng, lat2, lng2)
+            if m <= walk_m:
+                mins = max(1, math.ceil(m / WALK_M_PER_MIN))
+                for x, y in ((frm, to), (to, frm)):
+                    if found[x].get(y, INF) > mins:
+                        found[x][y] = mins
+    return [sorted(f.items(), key=lambda w: (w[1], w[0])) for f in found]
+
+
+class Network:
+    def __init__(self, snap, walk_m=WALK_M):
+        self.snap = snap
+        self.routes = []
+        self.node_routes = [[] for _ in snap.nucleo_ids]
+        stop_nuc = stop_nucleo_rows(snap)
+
+        for t, p in enumerate(snap.tt_pattern):
+            stops = snap.stops_of(p)
+            n_trips = snap.tt_trips[t]
+            times = snap.tt_times[snap.tt_start[t]:snap.tt_start[t + 1]]
+
+            groups = []
+            for k, si in enumerate(stops):
+                n = stop_nuc[si]
+                if n < 0:
+                    continue
+                if groups and groups[-1][0] == n and groups[-1][2] == k:
+                    groups[-1][2] = k + 1
+                else:
+                    groups.append([n, k, k + 1])
+            if len(groups) < 2:
+                continue
+
+            length = len(groups)
+            dep = [-1] * (n_trips * length)
+            arr = [-1] * (n_trips * length)
+            for trip in range(n_trips):
+                row = trip * len(stops)
+                for pos, (_, start, end) in enumerate(groups):
+                    for k in range(start, end):
+                        v = times[row + k]
+                        if v < 0:
+                            continue
+                        if dep[trip * length + pos] < 0:
+                            dep[trip * length + pos] = v
+                        arr[trip * length + pos] = v
+
+            r = len(self.routes)
+            self.routes.append({
+                "timetable": t, "line": snap.pattern_line[p], "freq": snap.tt_freq[t],
+                "nodes": [g[0] for g in groups], "n_trips": n_trips, "dep": dep, "arr": arr,
+            })
+            for pos, g in enumerate(groups):
+                self.node_routes[g[0]].append((r, pos))
+
+        self.walks = walks(snap, stop_nuc, walk_m)
+
+
+# ── Query ──────────────────────────────────────────────────────────────────────
+def query(net, origin, dest, depart, freqs, max_transfers=MAX_TRANSFERS, min_transfer=MIN_TRANSFER):
+    n_nodes = len(net.node_routes)
+    best = [INF] * n_nodes
+    labels = [[INF] * n_nodes]
+    parents = [None]
+    labels[0][origin] = depart
+    best[origin] = depart
+    marked = [origin]                 # insertion-ordered, like a JS Set
+    results = []
+
+    k = 1
+    while k <= max_transfers + 1 and marked:
+        prev = labels[k - 1]
+        cur = [INF] * n_nodes
+        parent = [None] * n_nodes
+        labels.append(cur)
+        parents.append(parent)
+
+        queue = {}                    # insertion-ordered, like a JS Map
+        for node in marked:
+            for r, pos in net.node_routes[node]:
+                if net.routes[r]["freq"] not in freqs:
+                    continue
+                if r not in queue or pos < queue[r]:
+                    queue[r] = pos
+        marked, marked_set = [], set()
+
+        for r, start in queue.items():
+            route = net.routes[r]
+            nodes, dep, arr, length = route["nodes"], route["dep"], route["arr"], len(route["nodes"])
+            trip, board_pos = -1, -1
+            for pos in range(start, length):
+                node = nodes[pos]
+                if trip >= 0:
+                    a = arr[trip * length + pos]
+                    if a >= 0 and a < min(best[node], best[dest]):
+                        cur[node] = a
+                        best[node] = a
+                        parent[node] = (r, trip, board_pos, pos)
+                        if node not in marked_set:
+                            marked_set.add(node)
+                            marked.append(node)
+                if prev[node] == INF:
+                    continue
+                ready = prev[node] if k == 1 else prev[node] + min_transfer
+                limit = trip if trip >= 0 else route["n_trips"]
+                for t in range(limit):
+                    d = dep[t * length + pos]
+                    if d >= 0 and d >= ready:
+                        trip, board_pos = t, pos
+                        break
+
+        # Footpaths from the towns a ride reached; a walk never starts from a walk
+        if k <= max_transfers:
+            walked = [(node, to, cur[node], cur[node] + mins, parent[node])
+                      for node in marked for to, mins in net.walks[node] if to != dest]
+            for frm, to, dep_, arr_, ride in walked:
+                if arr_ < min(best[to], best[dest]):
+                    cur[to] = arr_
+                    best[to] = arr_
+                    parent[to] = ("walk", frm, dep_, arr_, ride)
+                    if to not in marked_set:
+                        marked_set.add(to)
+                        marked.append(to)
+
+        if cur[dest] != INF and (not results or cur[dest] < results[-1]["arr"]):
+            results.append(_journey(net, parents, k, dest))
+        k += 1
+    return results
+
+
+def _journey(net, parents, k, dest):
+    legs, node = [], dest
+    for rnd in range(k, 0, -1):
+        p = parents[rnd][node]
+        if p[0] == "walk":
+            _, frm, dep_, arr_, p = p
+            legs.insert(0, {"walk": True, "from": frm, "to": node, "dep": dep_, "arr": arr_})
+            node = frm
+        r, trip, board_pos, alight_pos = p
+        route = net.routes[r]
+        length = len(route["nodes"])
+        legs.insert(0, {
+            "route": r, "trip": trip,
+            "from": route["nodes"][board_pos], "to": route["nodes"][alight_pos],
+            "dep": route["dep"][trip * length + board_pos],
+            "arr": route["arr"][trip * length + alight_pos],
+        })
+        node = route["nodes"][board_pos]
+    return {"transfers": k - 1, "dep": legs[0]["dep"], "arr": legs[-1]["arr"], "legs": legs}
+
+
+def profile(net, origin, dest, depart, freqs, count=5, **opts):
+    seen, out = set(), []
+    guard = 0
+    while guard < count * 4 and len(out) < count:
+        found = query(net, origin, dest, depart, freqs, **opts)
+        if not found:
+            break
+        for j in found:
+            key = ">".join(f"walk:{l['to']}" if l.get("walk") else f"{l['route']}:{l['trip']}"
+                           for l in j["legs"])
+            if key not in seen:
+                seen.add(key)
+                out.append(j)
+        depart = min(j["dep"] for j in found) + 1
+        guard += 1
+    out.sort(key=lambda j: (j["arr"], j["transfers"], -j["dep"]))
+    return out[:count]
+
+
+# ── Corpus ─────────────────────────────────────────────────────────────────────
+def fmt(mins):
+    return f"{mins // 60:02d}:{mins % 60:02d}"
+
+
+def to_mins(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+def describe(net, journey):
+    """Stable, id-based form of a journey (route/trip indices are build-specific)."""
+    snap = net.snap
+    return {
+        "transfers": journey["transfers"],
+        "dep": fmt(journey["dep"]),
+        "arr": fmt(journey["arr"]),
+        "legs": [{
+            **({"walk": True} if l.get("walk") else {
+                "line": snap.line_codes[net.routes[l["route"]]["line"]],
+                "dias": snap.freq_codes[net.routes[l["route"]]["freq"]],
+            }),
+            "from": str(snap.nucleo_ids[l["from"]]),
+            "to": str(snap.nucleo_ids[l["to"]]),
+            "dep": fmt(l["dep"]),
+            "arr": fmt(l["arr"]),
+        } for l in journey["legs"]],
+    }
+
+
+def run_case(net, case):
+    snap = net.snap
+    opts = {"max_transfers": case.get("maxTransfers", MAX_TRANSFERS),
+            "min_transfer": case.get("minTransfer", MIN_TRANSFER)}
+    origin, dest = snap.nucleo_row(case["from"]), snap.nucleo_row(case["to"])
+    freqs = active_freq_rows(snap, date.fromisoformat(case["date"]))
+    depart = to_mins(case["depart"])
+    return {
+        "pareto": [describe(net, j) for j in query(net, origin, dest, depart, freqs, **opts)],
+        "profile": [describe(net, j) for j in profile(net, origin, dest, depart, freqs,
+                                                      count=case.get("count", 5), **opts)],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="RAPTOR reference router over a fixture snapshot")
+    ap.add_argument("origin", nargs="?", help="idNucleo")
+    ap.add_argument("dest", nargs="?", help="idNucleo")
+    ap.add_argument("--consorcio", default="4")
+    ap.add_argument("--date", default=date.today().isoformat())
+    ap.add_argument("--at", default="06:00", help="HH:MM")
+    ap.add_argument("--max-transfers", type=int, default=MAX_TRANSFERS)
+    ap.add_argument("--min-transfer", type=int, default=MIN_TRANSFER)
+    ap.add_argument("--corpus", help="rewrite the expected results in this cases.json")
+    args = ap.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = json.load(f)
+        net = Network(load_fixture_snapshot(corpus["consorcio"]))
+        for case in corpus["cases"]:
+            case["expected"] = run_case(net, case)
+        with open(args.corpus, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Updated {len(corpus['cases'])} cases in {args.corpus}")
+        return
+
+    if not (args.origin and args.dest):
+        ap.error("give origin and dest nucleo ids, or --corpus")
+    net = Network(load_fixture_snapshot(args.consorcio))
+    result = run_case(net, {"from": args.origin, "to": args.dest, "date": args.date, "depart": args.at,
+                            "maxTransfers": args.max_transfers, "minTransfer": args.min_transfer})
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
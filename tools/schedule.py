@@ -0,0 +1,190 @@
+"""
+Timetable compiler — Python twin of src/js/schedule.js.
+-------------------------------------------------------
+Compiles a horarios_origen_destino response into the typed trip table the
+planner and journey pages query: minutes after midnight per column, a day
+bitmask per trip, origin/destination column indices and trips in departure
+order. serialize() writes the same bytes as serializeSchedule() in the
+browser, so tables can be precomputed offline and checked against goldens.
+
+Usage:
+    python3 -m tools.schedule response.json                     # print the compiled table
+    python3 -m tools.schedule --golden tests/fixtures/schedule/golden.json   # regenerate goldens
+
+The goldens cover every recorded horarios_origen_destino fixture.
+"""
+
+import argparse, json, os, re, sys
+
+from tools.build_snapshot import pack
+from tools import service_calendar
+from tools.service_calendar import DAY_HOLIDAY
+
+SCHEMA = 1
+
+DAY_SUN = 1 << 0
+DAY_SAT = 1 << 6
+DAYS_WEEKDAYS = 0b0111110
+DAYS_ALL = 0xFF     # every weekday and DAY_HOLIDAY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OD_FIXTURES = os.path.join(ROOT, "tests", "fixtures", "ctan", "v1")
+
+# First rule whose every pattern matches wins; no match runs daily. Weekend
+# rules also run on public holidays when the name says so.
+FREQ_HOLIDAYS = re.compile(r"holiday|festivo")
+FREQ_DAY_RULES = [
+    ([r"monday to friday|lunes a viernes"], DAYS_WEEKDAYS),
+    ([r"monday to saturday|lunes a s[aá]bado"], DAYS_WEEKDAYS | DAY_SAT),
+    ([r"saturday", r"sunday"], DAY_SAT | DAY_SUN),
+    ([r"sábado", r"domingo"], DAY_SAT | DAY_SUN),
+    ([r"saturday|sábado"], DAY_SAT),
+    ([r"sunday|domingo"], DAY_SUN),
+    ([FREQ_HOLIDAYS.pattern], DAY_HOLIDAY),
+]
+_RULES = [([re.compile(p) for p in patterns], days) for patterns, days in FREQ_DAY_RULES]
+_HHMM = re.compile(r"([0-9]{1,2}):([0-9]{2})")
+
+
+# ── Compile ────────────────────────────────────────────────────────────────────
+def freq_day_mask(name):
+    """Day bitmask for a frecuencia name; bit d = JS getDay() d (Sunday = 0),
+    plus DAY_HOLIDAY for services that run on public holidays."""
+    key = (name or "").lower()
+    for patterns, days in _RULES:
+        if all(p.search(key) for p in patterns):
+            if not days & DAYS_WEEKDAYS and FREQ_HOLIDAYS.search(key):
+                days |= DAY_HOLIDAY
+            return days
+    return DAYS_ALL
+
+
+def minutes(value):
+    m = _HHMM.fullmatch(str(value if value is not None else "").strip())
+    return int(m.group(1)) * 60 + int(m.group(2)) if m else -1
+
+
+def clock(mins):
+    return f"{mins // 60:02d}:{mins % 60:02d}"
+
+
+def columns(data):
+    """(origin, dest) column indices from the nucleos header."""
+    col, origin, dest = 0, [], []
+    for i, n in enumerate(data.get("nucleos") or []):
+        if i == 0:
+            continue
+        span = n.get("colspan") or 1
+        if i == 1:
+            origin = list(range(col, col + span))
+        elif i == 2:
+            dest = list(range(col, col + span))
+        col += span
+    if not origin:
+        origin = [0]
+    if not dest:
+        first = ((data.get("horario") or [{}])[0] or {}).get("horas") or []
+        dest = [len(first) - 1] if first else []
+    return origin, dest
+
+
+def _label(value):
+    return "" if value is None else str(value)
+
+
+def compile_od(data):
+    horario = data.get("horario") or []
+    n = len(horario)
+    cols = max((len(t.get("horas") or []) for t in horario), default=0)
+    origin, dest = columns(data)
+
+    acronym_days = {}
+    for f in data.get("frecuencias") or []:
+        acronym_days[_label(f.get("acronimo")).strip()] = freq_day_mask(f.get("nombre"))
+
+    times = [-1] * (n * cols)
+    dep, arr, days = [-1] * n, [-1] * n, [0] * n
+    for i, trip in enumerate(horario):
+        horas = trip.get("horas") or []
+        for c, h in enumerate(horas):
+            times[i * cols + c] = minutes(h)
+        filled = [c for c in range(len(horas)) if horas[c] and horas[c] != "--"]
+        d = next((c for c in origin if c in filled), None)
+        if d is not None:
+            dep[i] = minutes(horas[d])
+        a = next((c for c in reversed(dest) if c in filled), None)
+        if a is not None:
+            arr[i] = minutes(horas[a])
+        days[i] = acronym_days.get((trip.get("dias") or "").strip(), DAYS_ALL)
+
+    order = sorted((i for i in range(n) if dep[i] >= 0), key=lambda i: (dep[i], i))
+    return {
+        "trips": n, "cols": cols, "origin": origin, "dest": dest,
+        "times": times, "dep": dep, "arr": arr, "days": days, "order": order,
+        "codigo": [_label(t.get("codigo")) for t in horario],
+        "idlinea": [_label(t.get("idlinea")) for t in horario],
+        "dias": [_label(t.get("dias")) for t in horario],
+    }
+
+
+# ── Queries ────────────────────────────────────────────────────────────────────
+def runs_on(table, i, day):
+    return service_calendar.runs_on(table["days"][i], day)
+
+
+def trips_on(table, day, start=0):
+    """Trip rows running on `day` that depart at or after `start`, by departure."""
+    return [i for i in table["order"] if table["dep"][i] >= start and runs_on(table, i, day)]
+
+
+# ── Serialization ──────────────────────────────────────────────────────────────
+def serialize(table):
+    """Bytes identical to serializeSchedule() in schedule.js."""
+    doc = {
+        "schema": SCHEMA, "trips": table["trips"], "cols": table["cols"],
+        "origin": pack("h", table["origin"]), "dest": pack("h", table["dest"]),
+        "times": pack("h", table["times"]), "dep": pack("h", table["dep"]), "arr": pack("h", table["arr"]),
+        "days": pack("B", table["days"]), "order": pack("H", table["order"]),
+        "codigo": table["codigo"], "idlinea": table["idlinea"], "dias": table["dias"],
+    }
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fixture_responses(root=OD_FIXTURES):
+    """{relative path: response} for every recorded horarios_origen_destino file."""
+    out = {}
+    for c in sorted(os.listdir(root)):
+        folder = os.path.join(root, c, "horarios_origen_destino")
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            with open(os.path.join(folder, name), encoding="utf-8") as f:
+                out[f"{c}/horarios_origen_destino/{name}"] = json.load(f)
+    return out
+
+
+def golden(responses):
+    return {path: serialize(compile_od(data)).decode("utf-8") for path, data in responses.items()}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compile horarios_origen_destino responses into trip tables")
+    ap.add_argument("response", nargs="?", help="response JSON file to compile")
+    ap.add_argument("--golden", metavar="PATH", help="write goldens for every recorded fixture")
+    args = ap.parse_args()
+
+    if args.golden:
+        goldens = golden(fixture_responses())
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump(goldens, f, ensure_ascii=False, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"  {len(goldens)} tables → {args.golden}")
+    elif args.response:
+        with open(args.response, encoding="utf-8") as f:
+            sys.stdout.write(serialize(compile_od(json.load(f))).decode("utf-8") + "\n")
+    else:
+        ap.error("give a response file or --golden")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Service calendar — Python twin of src/js/calendar.js.
+------------------------------------------------------
+Resolves dates to the day-type bit the frecuencia masks in tools/schedule.py
+use: the weekday (bit 0 = Sunday, like JS getDay()) or DAY_HOLIDAY on the
+national and Andalusian public holidays listed in src/data/holidays.json.
+year_bits() expands a mask into the same little-endian Uint32 bitset over the
+days of the year that serviceYearBits() builds in the browser.
+
+Usage:
+    python3 -m tools.service_calendar 2026                 # list the holidays of a year
+    python3 -m tools.service_calendar 2026 --mask 0xc1     # days a mask runs on
+
+Years the data file doesn't list have no holidays; the listing says so, and
+the pages' date pickers stop at last_listed_day() (serviceCalendarLastDay()).
+"""
+
+import argparse, json, os
+from datetime import date, timedelta
+from functools import lru_cache
+
+DAY_HOLIDAY = 1 << 7
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOLIDAYS_PATH = os.path.join(ROOT, "src", "data", "holidays.json")
+
+
+# ── Holidays ───────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=None)
+def load_holidays(path=HOLIDAYS_PATH):
+    """{date: name} for every listed holiday."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {date.fromisoformat(h["date"]): h["name"]
+            for year in (data.get("years") or {}).values() for h in year}
+
+
+@lru_cache(maxsize=None)
+def holiday_years(path=HOLIDAYS_PATH):
+    """The years the data file lists, ascending."""
+    with open(path, encoding="utf-8") as f:
+        return sorted(int(year) for year in (json.load(f).get("years") or {}))
+
+
+def last_listed_day(path=HOLIDAYS_PATH):
+    """31 December of the last listed year, or None."""
+    years = holiday_years(path)
+    return date(years[-1], 12, 31) if years else None
+
+
+def day_type(day, holidays=None):
+    """DAY_HOLIDAY on a public holiday, else 1 << weekday (Sunday = 0)."""
+    holidays = load_holidays() if holidays is None else holidays
+    return DAY_HOLIDAY if day in holidays else 1 << (day.isoweekday() % 7)
+
+
+def runs_on(mask, day, holidays=None):
+    return bool(mask & day_type(day, holidays))
+
+
+# ── Bitsets ────────────────────────────────────────────────────────────────────
+def year_days(year):
+    first = date(year, 1, 1)
+    return [first + timedelta(days=d) for d in range((date(year + 1, 1, 1) - first).days)]
+
+
+def year_bits(year, mask, holidays=None):
+    """Uint32 words, bit d set when `mask` runs on day d of the year."""
+    days = year_days(year)
+    words = [0] * ((len(days) + 31) // 32)
+    for d, day in enumerate(days):
+        if runs_on(mask, day, holidays):
+            words[d >> 5] |= 1 << (d & 31)
+    return words
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Public holidays and service days of a year")
+    ap.add_argument("year", type=int)
+    ap.add_argument("--mask", type=lambda v: int(v, 0), help="frecuencia day mask to expand")
+    args = ap.parse_args()
+    if args.year not in holiday_years():
+        print(f"  {args.year} is not in {os.path.relpath(HOLIDAYS_PATH, ROOT)}: holidays count as weekdays")
+
+    if args.mask is None:
+        for day, name in sorted(load_holidays().items()):
+            if day.year == args.year:
+                print(f"  {day.isoformat()}  {day.strftime('%a')}  {name}")
+    else:
+        days = [day for day in year_days(args.year) if runs_on(args.mask, day)]
+        print(f"  mask {args.mask:#04x}: {len(days)} days in {args.year}")
+        for day in days:
+            print(f"  {day.isoformat()}  {day.strftime('%a')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Map tile stand-in — serves basemap-shaped PNG tiles locally.
+-------------------------------------------------------------
+Answers the same paths as basemaps.cartocdn.com so map.html and the service
+worker's tile cache (sw.js, src/js/tiles.js) can be exercised without the
+network. Every tile is a valid 256×256 PNG whose colour depends on z/x/y,
+padded to a fixed size so cache budgets are easy to reason about. Latency and
+an offline switch make cache-first and prefetch behaviour measurable.
+
+Usage:
+    python3 -m tools.tile_stub                          # serve on :8790
+    python3 -m tools.tile_stub --latency 200 --tile-bytes 20000
+
+Point map.html at it with the tileBase cookie (see src/js/tiles.js):
+    document.cookie = 'tileBase=http://localhost:8790;path=/'
+
+Endpoints:
+    GET  /{light_all|dark_all}/{z}/{x}/{y}[@2x].png   a tile
+    GET  /__tiles__/stats    requests in total and per zoom, bytes served
+    POST /__tiles__/reset    clear the stats
+    POST /__tiles__/config   update latency / tile_bytes / offline (every tile → 503)
+"""
+
+import argparse, json, re, struct, threading, time, zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+DEFAULT_PORT = 8790
+TILE_PX      = 256
+TILE_PATH    = re.compile(r"/(light_all|dark_all)/(\d+)/(\d+)/(\d+)(@2x)?\.png")
+
+
+# ── Tiles ──────────────────────────────────────────────────────────────────────
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def render_tile(style, z, x, y, size=0):
+    """A solid-colour PNG for the tile, padded with an ancillary chunk to `size` bytes."""
+    shade = 40 if style == "dark_all" else 215
+    rgb = bytes(((shade + 37 * z) % 256, (shade + 11 * x) % 256, (shade + 13 * y) % 256))
+    raw = (b"\x00" + rgb * TILE_PX) * TILE_PX
+    png = (b"\x89PNG\r\n\x1a\n"
+           + _chunk(b"IHDR", struct.pack(">IIBBBBB", TILE_PX, TILE_PX, 8, 2, 0, 0, 0))
+           + _chunk(b"IDAT", zlib.compress(raw, 9)))
+    pad = size - len(png) - 12 - 12   # the padding chunk's own overhead + IEND
+    if pad > 0:
+        png += _chunk(b"stUb", b"\x00" * pad)
+    return png + _chunk(b"IEND", b"")
+
+
+# ── Config + stats ─────────────────────────────────────────────────────────────
+class TileConfig:
+    FIELDS = ("latency", "tile_bytes", "offline")
+
+    def __init__(self, latency=0, tile_bytes=0, offline=False):
+        self.latency = latency        # ms added to every tile
+        self.tile_bytes = tile_bytes  # pad tiles to this size (0: as rendered)
+        self.offline = offline        # answer every tile with 503
+        self.lock = threading.Lock()
+
+    def update(self, values):
+        with self.lock:
+            for k in self.FIELDS:
+                if k in values:
+                    setattr(self, k, values[k])
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+
+class TileStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.total, self.bytes, self.zooms, self.tiles = 0, 0, {}, []
+
+    def record(self, key, size):
+        with self.lock:
+            self.total += 1
+            self.bytes += size
+            self.zooms[key[1]] = self.zooms.get(key[1], 0) + 1
+            self.tiles.append("/".join(map(str, key)))
+
+    def as_dict(self):
+        with self.lock:
+            return {"total": self.total, "bytes": self.bytes,
+                    "zooms": dict(self.zooms), "tiles": list(self.tiles)}
+
+
+# ── HTTP handler ───────────────────────────────────────────────────────────────
+class TileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None     # TileConfig
+    stats = None      # TileStats
+    cache = None      # {(style, z, x, y, size): bytes}
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if url.path == "/__tiles__/config":
+            self.config.update(payload)
+            return self._send(200, _dump(self.config.as_dict()))
+        if url.path == "/__tiles__/reset":
+            self.stats.reset()
+            return self._send(200, _dump({"ok": True}))
+        self._send(404, _dump({"error": "not found"}))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/__tiles__/stats":
+            return self._send(200, _dump(self.stats.as_dict()))
+        if url.path == "/__tiles__/config":
+            return self._send(200, _dump(self.config.as_dict()))
+        m = TILE_PATH.fullmatch(url.path)
+        if not m:
+            return self._send(404, _dump({"error": "not found"}))
+
+        style, z, x, y = m.group(1), int(m.group(2)), int(m.group(3)), int(m.group(4))
+        if x >= 2 ** z or y >= 2 ** z:
+            return self._send(404, _dump({"error": "tile out of range"}))
+        time.sleep(max(0, self.config.latency) / 1000)
+        if self.config.offline:
+            return self._send(503, _dump({"error": "offline"}))
+        size = int(self.config.tile_bytes)
+        key = (style, z, x, y, size)
+        body = self.cache.get(key)
+        if body is None:
+            body = self.cache[key] = render_tile(style, z, x, y, size)
+        self.stats.record(key[:4], len(body))
+        self._send(200, body, "image/png")
+
+    do_HEAD = do_GET
+
+
+def _dump(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+# ── Server lifecycle ───────────────────────────────────────────────────────────
+def make_server(port=DEFAULT_PORT, host="", **config):
+    handler = type("BoundTileHandler", (TileHandler,), {
+        "config": TileConfig(**config),
+        "stats": TileStats(),
+        "cache": {},
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_in_thread(port=DEFAULT_PORT, **kwargs):
+    server = make_server(port, **kwargs)
+    server.daemon_threads = True
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-in for the basemap tile server")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--latency", type=float, default=0, help="ms added to every tile")
+    ap.add_argument("--tile-bytes", type=int, default=0, help="pad every tile to this many bytes")
+    args = ap.parse_args()
+
+    server = make_server(args.port, latency=args.latency, tile_bytes=args.tile_bytes)
+    print(f"Tile stub on http://localhost:{args.port}/light_all/{{z}}/{{x}}/{{y}}.png")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Transfer index — which nucleos share a line, per consortium.
+-------------------------------------------------------------
+Without a snapshot, journey.js finds 1-transfer trips by probing
+horarios_origen_destino from the origin to every nucleo and from every nucleo
+to the destination. A nucleo can only be a transfer point if some line serves
+it and the origin, and some line serves it and the destination; this crawler
+writes the nucleo ↔ line adjacency so the page probes only those.
+
+Usage:
+    python3 -m tools.transfer_index 4                   # crawl api.ctan.es → data/
+    python3 -m tools.transfer_index --all
+    python3 -m tools.transfer_index 4 --fixtures        # from tests/fixtures/ctan
+    python3 -m tools.transfer_index 4 --api http://localhost:8788/v1/Consorcios --out /tmp/data
+
+Output (data/transfers-<c>.json):
+    {"schema": 1, "consorcio": "4", "built": "2026-02-16T04:00:00Z",
+     "nucleos": {"201": ["3", "4"], …},          # nucleo → lines, /nucleos/{id}/lineas
+     "lineas": {"3": ["1", "201", "83", "90"], …}} # line → nucleos
+
+A line's nucleos are the nucleos listing it, plus the nucleos of its stops
+(/lineas/{id}/paradas against /paradas/) where those ids are in the nucleos
+list — the stop endpoints don't always use the same nucleo ids.
+"""
+
+import argparse, json, os, sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from tools.build_snapshot import LIVE_API, OUT_DIR, HttpSource, FixtureSource
+
+SCHEMA = 1
+
+
+# ── Crawl ──────────────────────────────────────────────────────────────────────
+def crawl(source, c, workers=8):
+    """(nucleo → sorted line ids, line → sorted nucleo ids)."""
+    get = source.get
+    nucleos = [n["idNucleo"] for n in (get(f"{c}/nucleos") or {}).get("nucleos", [])]
+    lines = [l["idLinea"] for l in (get(f"{c}/lineas") or {}).get("lineas", [])]
+    stop_nucleo = {p["idParada"]: p.get("idNucleo")
+                   for p in (get(f"{c}/paradas/") or {}).get("paradas", [])}
+
+    with ThreadPoolExecutor(workers) as pool:
+        nuc_lines = pool.map(lambda n: get(f"{c}/nucleos/{n}/lineas"), nucleos)
+        line_stops = pool.map(lambda l: get(f"{c}/lineas/{l}/paradas"), lines)
+
+        line_nucs = {l: set() for l in lines}
+        by_nucleo = {}
+        for n, d in zip(nucleos, nuc_lines):
+            served = {l["idLinea"] for l in (d or {}).get("lineas", [])}
+            by_nucleo[n] = served
+            for l in served:
+                line_nucs.setdefault(l, set()).add(n)
+
+        known = set(nucleos)
+        for l, d in zip(lines, line_stops):
+            for p in (d or {}).get("paradas", []):
+                n = stop_nucleo.get(p["idParada"])
+                if n in known:
+                    line_nucs[l].add(n)
+                    by_nucleo[n].add(l)
+
+    by_id = lambda ids: sorted(ids, key=lambda v: (len(v), v))
+    return ({n: by_id(ls) for n, ls in by_nucleo.items() if ls},
+            {l: by_id(ns) for l, ns in line_nucs.items() if ns})
+
+
+def transfer_points(nucleos, lineas, origin, dest):
+    """Nucleos sharing a line with both origin and dest — journey.js's candidates."""
+    def reach(n):
+        return {m for l in nucleos.get(str(n), []) for m in lineas.get(l, [])}
+    return reach(origin) & reach(dest) - {str(origin), str(dest)}
+
+
+def build(c, index, built=None):
+    built = built or datetime.now(timezone.utc)
+    nucleos, lineas = index
+    return {"schema": SCHEMA, "consorcio": str(c), "built": built.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "nucleos": nucleos, "lineas": lineas}
+
+
+def serialize(doc):
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def write(docs, out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    for doc in docs:
+        with open(os.path.join(out_dir, f"transfers-{doc['consorcio']}.json"), "wb") as f:
+            f.write(serialize(doc))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build per-consortium nucleo/line transfer indexes")
+    ap.add_argument("consorcios", nargs="*", help="consortium ids (default: all with --all)")
+    ap.add_argument("--all", action="store_true", help="every consortium in /consorcios")
+    ap.add_argument("--api", default=LIVE_API, help="API base to crawl")
+    ap.add_argument("--fixtures", action="store_true", help="read tests/fixtures/ctan instead of the API")
+    ap.add_argument("--out", default=OUT_DIR)
+    args = ap.parse_args()
+
+    source = FixtureSource() if args.fixtures else HttpSource(args.api)
+    ids = args.consorcios
+    if args.all:
+        ids = [c["idConsorcio"] for c in (source.get("consorcios") or {}).get("consorcios", [])]
+    if not ids:
+        ap.error("give consortium ids or --all")
+
+    docs = []
+    for c in ids:
+        nucleos, lineas = crawl(source, c)
+        if not nucleos:
+            print(f"  {c}: no nucleo lines — skipped", file=sys.stderr)
+            continue
+        docs.append(build(c, (nucleos, lineas)))
+        print(f"  {c}: {len(nucleos)} nucleos, {len(lineas)} lines")
+    write(docs, args.out)
+
+
+if __name__ == "__main__":
+    main()